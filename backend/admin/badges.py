@@ -1,5 +1,6 @@
 """admin/badges.py — Campus404
-Admin CRUD for Badges (linked to Modules, with image upload support).
+Admin CRUD for Badges (linked to Modules or auto-awarded by a rule, with image upload support).
+Setting a rule queues a backfill job that awards it to every user who already qualifies.
 """
 from typing import Optional, List
 from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Form, Request
@@ -12,8 +13,11 @@ from jose import jwt, JWTError
 
 from database import get_db
 from authentications.security import SECRET_KEY, ALGORITHM
+from jobs.services import enqueue_job
+from admin.bulk import badge_backfill_payload
 import models
 import curriculum.models as cm
+from curriculum.badge_rules import dump_rule, invalidate_badge_rules, load_rule, parse_rule
 
 router = APIRouter()
 UPLOADS_ROOT = Path("/app/uploads")
@@ -44,24 +48,48 @@ class BadgeOut(BaseModel):
     image_url: Optional[str]
     module_id: Optional[int]
     module_title: Optional[str]
+    rule: Optional[dict]
     created_at: datetime
     earned_count: int
+    backfill_job_id: Optional[int] = None
 
     model_config = {"from_attributes": True}
 
 
-def _build_badge_out(badge: cm.Badge, request: Request) -> BadgeOut:
+def _build_badge_out(badge: cm.Badge, request: Request, backfill_job_id: Optional[int] = None) -> BadgeOut:
     img = badge.image_url or (f"/uploads/{badge.image_path}" if badge.image_path else None)
     earned = len(badge.earned_by)
     mod_title = badge.module.title if badge.module else None
+    rule = load_rule(badge)
     return BadgeOut(
         id=badge.id, name=badge.name, description=badge.description,
         image_path=badge.image_path, image_url=img,
         module_id=badge.module_id, module_title=mod_title,
+        rule=rule.model_dump() if rule else None,
         created_at=badge.created_at, earned_count=earned,
+        backfill_job_id=backfill_job_id,
     )
 
 
+# ── Rule helpers ───────────────────────────────────────────────────────────────
+def _parse_rule_form(rule: Optional[str]) -> Optional[str]:
+    """Normalised rule JSON from the form field; "null" (or blank) means no rule."""
+    if not rule or rule.strip() in ("", "null"):
+        return None
+    try:
+        return dump_rule(parse_rule(rule))
+    except ValueError as exc:
+        raise HTTPException(422, str(exc))
+
+
+def _queue_rule_backfill(db: Session, badge: cm.Badge, actor: models.User) -> int:
+    job = enqueue_job(
+        db, "bulk.badge_grant", badge_backfill_payload(badge).model_dump(mode="json"),
+        created_by_admin_id=actor.id,
+    )
+    return job.id
+
+
 # ── CRUD ───────────────────────────────────────────────────────────────────────
 @router.get("/badges", response_model=List[BadgeOut])
 def list_badges(request: Request, db: Session = Depends(get_db)):
@@ -77,10 +105,15 @@ async def create_badge(
     description: str = Form(None),
     module_id: int = Form(None),
     image_url: str = Form(None),
+    rule: str = Form(None),
     image: UploadFile = File(None),
     db: Session = Depends(get_db),
 ):
-    _require_admin(request, db)
+    actor = _require_admin(request, db)
+
+    rule_json = _parse_rule_form(rule)
+    if module_id and rule_json:
+        raise HTTPException(400, "A badge is earned either by its module or by a rule, not both.")
 
     if module_id:
         existing = db.query(cm.Badge).filter(cm.Badge.module_id == module_id).first()
@@ -98,12 +131,14 @@ async def create_badge(
         dest.write_bytes(content)
         img_path = f"badges/{safe_name}"
 
-    badge = cm.Badge(name=name, description=description, module_id=module_id,
+    badge = cm.Badge(name=name, description=description, module_id=module_id, rule_json=rule_json,
                       image_path=img_path, image_url=image_url if not img_path else None)
     db.add(badge)
     db.commit()
     db.refresh(badge)
-    return _build_badge_out(badge, request)
+    invalidate_badge_rules()
+    job_id = _queue_rule_backfill(db, badge, actor) if rule_json else None
+    return _build_badge_out(badge, request, backfill_job_id=job_id)
 
 
 @router.patch("/badges/{badge_id}", response_model=BadgeOut)
@@ -114,17 +149,25 @@ async def update_badge(
     description: str = Form(None),
     module_id: int = Form(None),
     image_url: str = Form(None),
+    rule: str = Form(None),
     image: UploadFile = File(None),
     db: Session = Depends(get_db),
 ):
-    _require_admin(request, db)
+    actor = _require_admin(request, db)
     badge = db.query(cm.Badge).filter(cm.Badge.id == badge_id).first()
     if not badge:
         raise HTTPException(404, "Badge not found.")
 
+    rule_changed = False
     if name: badge.name = name
     if description is not None: badge.description = description
     if module_id is not None: badge.module_id = module_id
+    if rule is not None:
+        rule_json = _parse_rule_form(rule)
+        rule_changed = rule_json != badge.rule_json
+        badge.rule_json = rule_json
+    if badge.module_id and badge.rule_json:
+        raise HTTPException(400, "A badge is earned either by its module or by a rule, not both.")
 
     if image and image.filename:
         ext = Path(image.filename).suffix.lower()
@@ -142,7 +185,9 @@ async def update_badge(
 
     db.commit()
     db.refresh(badge)
-    return _build_badge_out(badge, request)
+    invalidate_badge_rules()
+    job_id = _queue_rule_backfill(db, badge, actor) if rule_changed and badge.rule_json else None
+    return _build_badge_out(badge, request, backfill_job_id=job_id)
 
 
 @router.delete("/badges/{badge_id}")
@@ -153,4 +198,5 @@ def delete_badge(badge_id: int, request: Request, db: Session = Depends(get_db))
         raise HTTPException(404, "Badge not found.")
     db.delete(badge)
     db.commit()
+    invalidate_badge_rules()
     return {"message": "Badge deleted.", "id": badge_id}
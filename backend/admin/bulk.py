@@ -0,0 +1,480 @@
+"""
+admin/bulk.py — Campus404
+Bulk admin operations over many users: progress reset, XP recalculation, and badge
+grant/revoke. Each operation is queued as a background job and runs in chunks of set-based
+SQL, with one batched AdminAuditLog insert per chunk.
+"""
+from datetime import datetime, timezone
+from typing import Callable, Iterator, List, Literal, Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Request
+from jose import JWTError, jwt
+from pydantic import BaseModel, Field, model_validator
+from sqlalchemy import and_, delete, exists, func, insert, select, update
+from sqlalchemy.orm import Session
+
+from admin.users import _apply_user_search, _json_dumps
+from authentications.security import ALGORITHM, SECRET_KEY
+from database import get_db, insert_ignore
+from jobs.schemas import JobOut
+from jobs.services import JobContext, enqueue_job, job_handler, job_to_out
+import curriculum.models as cm
+from curriculum.attempt_buffer import flush_attempt_buffer
+from curriculum.attempts import clear_attempt_stats
+from curriculum.badge_rules import load_rule
+import models
+from xp import models as xp_models
+from xp.services import set_xp_bulk
+
+router = APIRouter()
+
+BULK_CHUNK_SIZE = 500
+BULK_MAX_USER_IDS = 50_000
+
+
+# ── Auth helper ──────────────────────────────────────────────────────────────
+def _require_admin(request: Request, db: Session) -> models.User:
+    auth = request.headers.get("Authorization", "")
+    if not auth.startswith("Bearer "):
+        raise HTTPException(status_code=401, detail="Not authenticated.")
+    try:
+        payload = jwt.decode(auth[7:], SECRET_KEY, algorithms=[ALGORITHM])
+        user_id = payload.get("id")
+    except JWTError:
+        raise HTTPException(status_code=401, detail="Invalid token.")
+
+    user = db.query(models.User).filter(models.User.id == user_id).first()
+    if not user:
+        raise HTTPException(status_code=401, detail="User not found.")
+    if not user.is_admin:
+        raise HTTPException(status_code=403, detail="Admin access required.")
+    return user
+
+
+# ── Input models ─────────────────────────────────────────────────────────────
+class BulkUserFilter(BaseModel):
+    role: Optional[Literal["admin", "editor", "student", "banned"]] = None
+    search: Optional[str] = Field(None, max_length=100)
+    created_after: Optional[datetime] = None
+    created_before: Optional[datetime] = None
+
+
+class BulkTargetIn(BaseModel):
+    user_ids: Optional[List[int]] = Field(None, max_length=BULK_MAX_USER_IDS)
+    filter: Optional[BulkUserFilter] = None
+    reason: Optional[str] = Field(None, max_length=255)
+
+    @model_validator(mode="after")
+    def validate_target(self):
+        if (self.user_ids is None) == (self.filter is None):
+            raise ValueError("Provide exactly one of user_ids or filter.")
+        if self.user_ids is not None:
+            if any(uid < 1 for uid in self.user_ids):
+                raise ValueError("user_ids must contain positive integers.")
+            self.user_ids = sorted(set(self.user_ids))
+        return self
+
+
+class BulkProgressResetIn(BulkTargetIn):
+    target_type: Literal["module", "all"] = "all"
+    module_id: Optional[int] = Field(None, ge=1)
+    clear_attempts: bool = True
+    clear_completions: bool = True
+    clear_badges: bool = False
+    reset_streaks: bool = False
+    set_xp_to: Optional[int] = Field(None, ge=0, le=1_000_000)
+
+    @model_validator(mode="after")
+    def validate_reset(self):
+        if self.target_type == "module" and not self.module_id:
+            raise ValueError("module_id is required when target_type is 'module'.")
+        return self
+
+
+class BulkXpRecalculateIn(BulkTargetIn):
+    pass
+
+
+class BulkBadgeIn(BulkTargetIn):
+    badge_id: int = Field(..., ge=1)
+    force: bool = False
+
+
+# ── Target resolution ────────────────────────────────────────────────────────
+def _filtered_user_query(db: Session, user_filter: BulkUserFilter):
+    q = db.query(models.User.id)
+    if user_filter.search:
+        q = _apply_user_search(db, q, user_filter.search)
+    if user_filter.role == "admin":
+        q = q.filter(models.User.is_admin == True)
+    elif user_filter.role == "editor":
+        q = q.filter(models.User.is_editor == True, models.User.is_admin == False)
+    elif user_filter.role == "student":
+        q = q.filter(
+            models.User.is_admin == False,
+            models.User.is_editor == False,
+            models.User.is_banned == False,
+        )
+    elif user_filter.role == "banned":
+        q = q.filter(models.User.is_banned == True)
+    if user_filter.created_after:
+        q = q.filter(models.User.created_at >= user_filter.created_after)
+    if user_filter.created_before:
+        q = q.filter(models.User.created_at < user_filter.created_before)
+    return q
+
+
+def _count_targets(db: Session, target: BulkTargetIn) -> int:
+    if target.user_ids is not None:
+        return len(target.user_ids)
+    return int(_filtered_user_query(db, target.filter).order_by(None).count())
+
+
+def _iter_target_chunks(db: Session, target: BulkTargetIn) -> Iterator[List[int]]:
+    if target.user_ids is not None:
+        for start in range(0, len(target.user_ids), BULK_CHUNK_SIZE):
+            chunk = target.user_ids[start:start + BULK_CHUNK_SIZE]
+            # Drop ids that no longer exist so audit rows only reference real users.
+            yield [int(row[0]) for row in db.query(models.User.id).filter(models.User.id.in_(chunk)).all()]
+        return
+
+    last_id = 0
+    while True:
+        chunk = [
+            int(row[0])
+            for row in _filtered_user_query(db, target.filter)
+            .filter(models.User.id > last_id)
+            .order_by(models.User.id.asc())
+            .limit(BULK_CHUNK_SIZE)
+            .all()
+        ]
+        if not chunk:
+            return
+        yield chunk
+        last_id = chunk[-1]
+
+
+# ── Set-based chunk operations ───────────────────────────────────────────────
+def _completion_xp_sum():
+    return (
+        select(func.coalesce(func.sum(cm.ChallengeCompletion.xp_awarded), 0))
+        .where(cm.ChallengeCompletion.user_id == models.User.id)
+        .scalar_subquery()
+    )
+
+
+def _recalculate_xp_for(
+    db: Session,
+    user_ids: List[int],
+    source: str,
+    actor_admin_id: int,
+    reason: Optional[str],
+) -> None:
+    set_xp_bulk(db, user_ids, _completion_xp_sum(), source, actor_admin_id=actor_admin_id, note=reason)
+
+
+def _write_audit_chunk(
+    db: Session,
+    actor_admin_id: int,
+    user_ids: List[int],
+    action: str,
+    reason: Optional[str],
+    context: dict,
+) -> None:
+    if not user_ids:
+        return
+    now = datetime.now(timezone.utc)
+    context_json = _json_dumps(context)
+    db.execute(
+        insert(models.AdminAuditLog),
+        [
+            {
+                "actor_admin_id": actor_admin_id,
+                "target_user_id": uid,
+                "action": action,
+                "reason": reason,
+                "context_json": context_json,
+                "created_at": now,
+            }
+            for uid in user_ids
+        ],
+    )
+
+
+def _reset_chunk(db: Session, user_ids: List[int], payload: BulkProgressResetIn, actor_admin_id: int, job_id: int) -> int:
+    challenge_scope = None
+    badge_scope = None
+    if payload.target_type == "module":
+        challenge_scope = select(cm.Challenge.id).where(cm.Challenge.module_id == payload.module_id)
+        badge_scope = select(cm.Badge.id).where(cm.Badge.module_id == payload.module_id)
+
+    counts = {"deleted_attempts": 0, "deleted_completions": 0, "deleted_badges": 0}
+
+    if payload.clear_attempts:
+        flush_attempt_buffer()   # this worker only; see curriculum/attempt_buffer.py for the gap
+        stmt = delete(cm.ChallengeAttempt).where(cm.ChallengeAttempt.user_id.in_(user_ids))
+        if challenge_scope is not None:
+            stmt = stmt.where(cm.ChallengeAttempt.challenge_id.in_(challenge_scope))
+        counts["deleted_attempts"] = int(db.execute(stmt.execution_options(synchronize_session=False)).rowcount or 0)
+        clear_attempt_stats(db, user_ids, challenge_scope)
+
+    if payload.clear_completions:
+        stmt = delete(cm.ChallengeCompletion).where(cm.ChallengeCompletion.user_id.in_(user_ids))
+        if challenge_scope is not None:
+            stmt = stmt.where(cm.ChallengeCompletion.challenge_id.in_(challenge_scope))
+        counts["deleted_completions"] = int(db.execute(stmt.execution_options(synchronize_session=False)).rowcount or 0)
+
+    if payload.clear_badges:
+        stmt = delete(cm.UserBadge).where(cm.UserBadge.user_id.in_(user_ids))
+        if badge_scope is not None:
+            stmt = stmt.where(cm.UserBadge.badge_id.in_(badge_scope))
+        counts["deleted_badges"] = int(db.execute(stmt.execution_options(synchronize_session=False)).rowcount or 0)
+
+    if payload.reset_streaks:
+        db.execute(
+            update(models.User)
+            .where(models.User.id.in_(user_ids))
+            .values(current_streak=0, longest_streak=0, streak_last_day=None)
+            .execution_options(synchronize_session=False)
+        )
+
+    if payload.set_xp_to is not None:
+        set_xp_bulk(
+            db,
+            user_ids,
+            int(payload.set_xp_to),
+            xp_models.XP_SOURCE_PROGRESS_RESET,
+            actor_admin_id=actor_admin_id,
+            note=payload.reason,
+        )
+    else:
+        _recalculate_xp_for(db, user_ids, xp_models.XP_SOURCE_PROGRESS_RESET, actor_admin_id, payload.reason)
+
+    _write_audit_chunk(
+        db,
+        actor_admin_id,
+        user_ids,
+        "user.progress.bulk_reset",
+        payload.reason,
+        {
+            "job_id": job_id,
+            "target_type": payload.target_type,
+            "module_id": payload.module_id,
+            "clear_attempts": bool(payload.clear_attempts),
+            "clear_completions": bool(payload.clear_completions),
+            "clear_badges": bool(payload.clear_badges),
+            "reset_streaks": bool(payload.reset_streaks),
+            "set_xp_to": payload.set_xp_to,
+            "chunk_size": len(user_ids),
+            **counts,
+        },
+    )
+    return len(user_ids)
+
+
+def _recalculate_chunk(db: Session, user_ids: List[int], payload: BulkXpRecalculateIn, actor_admin_id: int, job_id: int) -> int:
+    drifted = [
+        int(row[0])
+        for row in db.query(models.User.id)
+        .filter(models.User.id.in_(user_ids), models.User.total_xp != _completion_xp_sum())
+        .all()
+    ]
+    if not drifted:
+        return 0
+
+    _recalculate_xp_for(db, drifted, xp_models.XP_SOURCE_RECALCULATE, actor_admin_id, payload.reason)
+    _write_audit_chunk(
+        db,
+        actor_admin_id,
+        drifted,
+        "user.xp.bulk_recalculate",
+        payload.reason,
+        {"job_id": job_id},
+    )
+    return len(drifted)
+
+
+def _module_badge_eligible_clause(badge: cm.Badge):
+    """SQL predicate on users.id: has completed every published level of the badge's module.
+
+    A module without published levels matches nobody, as nobody can complete it at runtime.
+    """
+    published_total = (
+        select(func.count(cm.Challenge.id))
+        .where(cm.Challenge.module_id == badge.module_id, cm.Challenge.is_published == True)
+        .scalar_subquery()
+    )
+    completed = (
+        select(func.count(cm.ChallengeCompletion.id))
+        .join(cm.Challenge, cm.Challenge.id == cm.ChallengeCompletion.challenge_id)
+        .where(
+            cm.ChallengeCompletion.user_id == models.User.id,
+            cm.Challenge.module_id == badge.module_id,
+            cm.Challenge.is_published == True,
+        )
+        .scalar_subquery()
+    )
+    return and_(published_total > 0, completed >= published_total)
+
+
+def _grant_chunk(db: Session, user_ids: List[int], payload: BulkBadgeIn, actor_admin_id: int, job_id: int) -> int:
+    badge = db.query(cm.Badge).filter(cm.Badge.id == payload.badge_id).first()
+    if not badge:
+        raise RuntimeError("Badge no longer exists.")
+
+    q = db.query(models.User.id).filter(
+        models.User.id.in_(user_ids),
+        ~exists().where(and_(cm.UserBadge.user_id == models.User.id, cm.UserBadge.badge_id == badge.id)),
+    )
+    rule = load_rule(badge) if not badge.module_id else None
+    if badge.module_id and not payload.force:
+        q = q.filter(_module_badge_eligible_clause(badge))
+    elif rule is not None and not payload.force:
+        q = q.filter(rule.eligible_clause())
+    candidate_ids = [int(row[0]) for row in q.all()]
+    now = datetime.now(timezone.utc)
+    # The NOT EXISTS above takes no lock, so a runtime award can still land first.
+    grant_ids = [
+        uid for uid in candidate_ids
+        if insert_ignore(db, cm.UserBadge, {"user_id": uid, "badge_id": badge.id, "earned_at": now}, ("user_id", "badge_id"))
+    ]
+    if not grant_ids:
+        return 0
+
+    _write_audit_chunk(
+        db,
+        actor_admin_id,
+        grant_ids,
+        "user.badge.bulk_grant",
+        payload.reason,
+        {"job_id": job_id, "badge_id": badge.id, "badge_name": badge.name, "module_id": badge.module_id, "force": bool(payload.force)},
+    )
+    return len(grant_ids)
+
+
+def _revoke_chunk(db: Session, user_ids: List[int], payload: BulkBadgeIn, actor_admin_id: int, job_id: int) -> int:
+    revoke_ids = [
+        int(row[0])
+        for row in db.query(cm.UserBadge.user_id)
+        .filter(cm.UserBadge.user_id.in_(user_ids), cm.UserBadge.badge_id == payload.badge_id)
+        .all()
+    ]
+    if not revoke_ids:
+        return 0
+
+    db.execute(
+        delete(cm.UserBadge)
+        .where(cm.UserBadge.user_id.in_(revoke_ids), cm.UserBadge.badge_id == payload.badge_id)
+        .execution_options(synchronize_session=False)
+    )
+    _write_audit_chunk(
+        db,
+        actor_admin_id,
+        revoke_ids,
+        "user.badge.bulk_revoke",
+        payload.reason,
+        {"job_id": job_id, "badge_id": payload.badge_id},
+    )
+    return len(revoke_ids)
+
+
+ChunkHandler = Callable[[Session, List[int], BulkTargetIn, int, int], int]
+
+
+def _execute_bulk(ctx: JobContext, handler: ChunkHandler, payload: BulkTargetIn) -> dict:
+    """Run a bulk operation chunk by chunk, one transaction per chunk.
+
+    Every chunk handler is idempotent, so a retried job simply re-walks the targets.
+    """
+    db = ctx.db
+    total = _count_targets(db, payload)
+    processed = 0
+    affected = 0
+    chunks = 0
+    ctx.progress(0.0, f"0/{total} users")
+    for chunk in _iter_target_chunks(db, payload):
+        if chunk:
+            affected += handler(db, chunk, payload, ctx.created_by_admin_id, ctx.job_id)
+            db.commit()
+        processed += len(chunk)
+        chunks += 1
+        ctx.progress(processed / total * 100.0 if total else 100.0, f"{processed}/{total} users")
+    return {"total_users": total, "processed_users": processed, "affected_users": affected, "chunks": chunks}
+
+
+@job_handler("bulk.progress_reset", payload_model=BulkProgressResetIn)
+def _run_bulk_progress_reset(ctx: JobContext, payload: BulkProgressResetIn) -> dict:
+    return _execute_bulk(ctx, _reset_chunk, payload)
+
+
+@job_handler("bulk.xp_recalculate", payload_model=BulkXpRecalculateIn)
+def _run_bulk_xp_recalculate(ctx: JobContext, payload: BulkXpRecalculateIn) -> dict:
+    return _execute_bulk(ctx, _recalculate_chunk, payload)
+
+
+@job_handler("bulk.badge_grant", payload_model=BulkBadgeIn)
+def _run_bulk_badge_grant(ctx: JobContext, payload: BulkBadgeIn) -> dict:
+    return _execute_bulk(ctx, _grant_chunk, payload)
+
+
+@job_handler("bulk.badge_revoke", payload_model=BulkBadgeIn)
+def _run_bulk_badge_revoke(ctx: JobContext, payload: BulkBadgeIn) -> dict:
+    return _execute_bulk(ctx, _revoke_chunk, payload)
+
+
+def _enqueue(db: Session, request: Request, kind: str, payload: BulkTargetIn, actor: models.User) -> JobOut:
+    job = enqueue_job(
+        db,
+        kind,
+        payload.model_dump(mode="json"),
+        created_by_admin_id=actor.id,
+        idempotency_key=request.headers.get("Idempotency-Key") or None,
+    )
+    return job_to_out(job)
+
+
+# ── Endpoints ────────────────────────────────────────────────────────────────
+@router.post("/progress/reset", response_model=JobOut, status_code=202)
+def bulk_reset_progress(payload: BulkProgressResetIn, request: Request, db: Session = Depends(get_db)):
+    actor = _require_admin(request, db)
+    if payload.target_type == "module":
+        if not db.query(cm.Module.id).filter(cm.Module.id == payload.module_id).first():
+            raise HTTPException(status_code=404, detail="Module not found.")
+    return _enqueue(db, request, "bulk.progress_reset", payload, actor)
+
+
+@router.post("/xp/recalculate", response_model=JobOut, status_code=202)
+def bulk_recalculate_xp(payload: BulkXpRecalculateIn, request: Request, db: Session = Depends(get_db)):
+    actor = _require_admin(request, db)
+    return _enqueue(db, request, "bulk.xp_recalculate", payload, actor)
+
+
+@router.post("/badges/grant", response_model=JobOut, status_code=202)
+def bulk_grant_badge(payload: BulkBadgeIn, request: Request, db: Session = Depends(get_db)):
+    actor = _require_admin(request, db)
+    if not db.query(cm.Badge.id).filter(cm.Badge.id == payload.badge_id).first():
+        raise HTTPException(status_code=404, detail="Badge not found.")
+    return _enqueue(db, request, "bulk.badge_grant", payload, actor)
+
+
+@router.post("/badges/revoke", response_model=JobOut, status_code=202)
+def bulk_revoke_badge(payload: BulkBadgeIn, request: Request, db: Session = Depends(get_db)):
+    actor = _require_admin(request, db)
+    return _enqueue(db, request, "bulk.badge_revoke", payload, actor)
+
+
+@router.post("/badges/{badge_id}/backfill", response_model=JobOut, status_code=202)
+def backfill_badge(badge_id: int, request: Request, db: Session = Depends(get_db)):
+    """Award a module or rule badge to every user who already qualifies for it."""
+    actor = _require_admin(request, db)
+    badge = db.query(cm.Badge).filter(cm.Badge.id == badge_id).first()
+    if not badge:
+        raise HTTPException(status_code=404, detail="Badge not found.")
+    if not badge.module_id and load_rule(badge) is None:
+        raise HTTPException(status_code=400, detail="Only module badges and rule badges can be backfilled.")
+    return _enqueue(db, request, "bulk.badge_grant", badge_backfill_payload(badge), actor)
+
+
+def badge_backfill_payload(badge: cm.Badge) -> BulkBadgeIn:
+    reason = "Module badge backfill" if badge.module_id else "Badge rule backfill"
+    return BulkBadgeIn(filter=BulkUserFilter(), badge_id=badge.id, reason=reason)
@@ -1,19 +1,32 @@
 """
 admin/site_settings.py — Campus404
 Persisted site branding settings for logo and favicon.
+
+The single settings row is served from an immutable in-memory snapshot with an ETag.
+Each worker re-checks the row's updated_at at most every SITE_SETTINGS_REFRESH_SECONDS,
+so a save on one worker reaches the others without a per-request query.
 """
+from dataclasses import dataclass
 from datetime import datetime, timezone
-from typing import Optional
+import hashlib
+import json
+import os
+import threading
+import time
+from types import MappingProxyType
+from typing import Mapping, Optional
 from urllib.parse import urlparse
 
-from fastapi import APIRouter, Depends, HTTPException, Request
+from fastapi import APIRouter, Depends, HTTPException, Request, Response
 from jose import JWTError, jwt
 from pydantic import BaseModel, Field, field_validator
+from sqlalchemy.engine import Engine
 from sqlalchemy.orm import Session
 from sqlalchemy import inspect, text
 
 from authentications.security import ALGORITHM, SECRET_KEY
 from database import get_db
+from guide.services import queue_guide_rerender
 import models
 
 public_router = APIRouter()
@@ -29,6 +42,10 @@ REQUIRED_SITE_SETTINGS_COLUMNS = {
     "guide_show_social_share": "BOOLEAN NOT NULL DEFAULT 1",
 }
 
+SITE_SETTINGS_REFRESH_SECONDS = float(os.getenv("SITE_SETTINGS_REFRESH_SECONDS", "5"))
+# Browsers and the navbar may reuse the body but must revalidate with If-None-Match.
+SITE_SETTINGS_CACHE_CONTROL = "no-cache"
+
 
 def _normalize_optional(value: Optional[str]) -> Optional[str]:
     if value is None:
@@ -92,30 +109,24 @@ def _require_admin(request: Request, db: Session) -> models.User:
     return user
 
 
-def _ensure_site_settings_schema(db: Session) -> None:
-    bind = db.get_bind()
-    insp = inspect(bind)
-
+def ensure_site_settings_schema(engine: Engine) -> None:
+    """Add any missing settings columns. Runs once at startup (and in migrate.py), not per request."""
+    insp = inspect(engine)
     if "site_settings" not in insp.get_table_names():
         return
 
     existing = {col["name"] for col in insp.get_columns("site_settings")}
-    added_any = False
-
-    for col_name, ddl in REQUIRED_SITE_SETTINGS_COLUMNS.items():
-        if col_name in existing:
-            continue
-
-        db.execute(text(f"ALTER TABLE site_settings ADD COLUMN {col_name} {ddl}"))
-        added_any = True
+    missing = [(name, ddl) for name, ddl in REQUIRED_SITE_SETTINGS_COLUMNS.items() if name not in existing]
+    if not missing:
+        return
 
-    if added_any:
-        db.commit()
+    with engine.begin() as conn:
+        for col_name, ddl in missing:
+            conn.execute(text(f"ALTER TABLE site_settings ADD COLUMN {col_name} {ddl}"))
+    print(f"[Campus404] Added site_settings columns: {', '.join(name for name, _ in missing)}")
 
 
 def _get_or_create_settings(db: Session) -> models.SiteSetting:
-    _ensure_site_settings_schema(db)
-
     settings = db.query(models.SiteSetting).order_by(models.SiteSetting.id.asc()).first()
     if settings:
         return settings
@@ -157,6 +168,70 @@ def _to_response(settings: models.SiteSetting) -> dict:
     }
 
 
+# ── Snapshot cache ───────────────────────────────────────────────────────────
+@dataclass(frozen=True)
+class SettingsSnapshot:
+    data: Mapping[str, object]
+    body: bytes
+    etag: str
+    version: Optional[datetime]
+
+
+_snapshot: Optional[SettingsSnapshot] = None
+_snapshot_checked_at = 0.0
+_snapshot_lock = threading.Lock()
+
+
+def _build_snapshot(settings: models.SiteSetting) -> SettingsSnapshot:
+    data = _to_response(settings)
+    body = json.dumps(data, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+    return SettingsSnapshot(
+        data=MappingProxyType(data),
+        body=body,
+        etag=f'"settings-{hashlib.sha256(body).hexdigest()[:32]}"',
+        version=settings.updated_at,
+    )
+
+
+def _publish_snapshot(settings: models.SiteSetting) -> SettingsSnapshot:
+    global _snapshot, _snapshot_checked_at
+    snapshot = _build_snapshot(settings)
+    with _snapshot_lock:
+        _snapshot = snapshot
+        _snapshot_checked_at = time.monotonic()
+    return snapshot
+
+
+def get_settings_snapshot(db: Session) -> SettingsSnapshot:
+    """Current settings snapshot; revalidated against updated_at at most every refresh interval."""
+    global _snapshot_checked_at
+    snapshot = _snapshot
+    if snapshot is not None and time.monotonic() - _snapshot_checked_at < SITE_SETTINGS_REFRESH_SECONDS:
+        return snapshot
+
+    if snapshot is not None:
+        version = (
+            db.query(models.SiteSetting.updated_at)
+            .order_by(models.SiteSetting.id.asc())
+            .limit(1)
+            .scalar()
+        )
+        if version == snapshot.version:
+            _snapshot_checked_at = time.monotonic()
+            return snapshot
+
+    return _publish_snapshot(_get_or_create_settings(db))
+
+
+def _snapshot_response(request: Request, snapshot: SettingsSnapshot) -> Response:
+    headers = {"ETag": snapshot.etag, "Cache-Control": SITE_SETTINGS_CACHE_CONTROL}
+    if_none_match = request.headers.get("if-none-match", "")
+    # CompressionMiddleware weakens the ETag on gzipped bodies; compare the tag itself.
+    if snapshot.etag in [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]:
+        return Response(status_code=304, headers=headers)
+    return Response(content=snapshot.body, media_type="application/json", headers=headers)
+
+
 class SiteSettingsIn(BaseModel):
     site_name: str = Field(default="Campus404", min_length=2, max_length=120)
     meta_description: Optional[str] = Field(default=None, max_length=320)
@@ -184,16 +259,14 @@ class SiteSettingsIn(BaseModel):
 
 
 @public_router.get("/site-settings")
-def get_site_settings(db: Session = Depends(get_db)):
-    settings = _get_or_create_settings(db)
-    return _to_response(settings)
+def get_site_settings(request: Request, db: Session = Depends(get_db)):
+    return _snapshot_response(request, get_settings_snapshot(db))
 
 
 @admin_router.get("/site-settings")
 def get_site_settings_admin(request: Request, db: Session = Depends(get_db)):
     _require_admin(request, db)
-    settings = _get_or_create_settings(db)
-    return _to_response(settings)
+    return _snapshot_response(request, get_settings_snapshot(db))
 
 
 @admin_router.put("/site-settings")
@@ -202,8 +275,9 @@ def update_site_settings(
     request: Request,
     db: Session = Depends(get_db),
 ):
-    _require_admin(request, db)
+    actor = _require_admin(request, db)
     settings = _get_or_create_settings(db)
+    toc_depth_changed = int(settings.guide_toc_depth or 3) != payload.guide_toc_depth
 
     settings.site_name = payload.site_name
     settings.meta_description = payload.meta_description
@@ -219,4 +293,9 @@ def update_site_settings(
 
     db.commit()
     db.refresh(settings)
-    return _to_response(settings)
+    snapshot = _publish_snapshot(settings)
+
+    # Cached guide TOCs are built to the configured depth; rebuild them in the background.
+    if toc_depth_changed:
+        queue_guide_rerender(db, snapshot.data["guide_toc_depth"], created_by_admin_id=actor.id)
+    return dict(snapshot.data)
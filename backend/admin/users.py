@@ -2,19 +2,28 @@
 admin/users.py — Campus404
 Admin user-management API with activity insights, XP controls, and custom reset tooling.
 """
+import base64
 import json
+import re
+from datetime import datetime
 from typing import Dict, List, Literal, Optional, Tuple
 
 from fastapi import APIRouter, Depends, HTTPException, Query, Request
 from jose import JWTError, jwt
 from pydantic import BaseModel, Field, model_validator
-from sqlalchemy import case, func
+from sqlalchemy import func, inspect, text
 from sqlalchemy.orm import Session, joinedload
 
 from authentications.security import ALGORITHM, SECRET_KEY
 from database import get_db
+from responses import FastJSONResponse
 import curriculum.models as cm
+from curriculum.attempt_buffer import flush_attempt_buffer
+from curriculum.attempts import clear_attempt_stats
+from curriculum.badge_rules import UserCounters, load_rule
 import models
+from xp import models as xp_models
+from xp import services as xp_services
 
 router = APIRouter()
 
@@ -113,7 +122,12 @@ def _badge_image_url(badge: cm.Badge) -> Optional[str]:
 
 def _module_badge_eligibility(db: Session, user_id: int, badge: cm.Badge) -> Tuple[bool, str]:
     if not badge.module_id:
-        return True, "Standalone badge can be granted manually."
+        rule = load_rule(badge)
+        if rule is None:
+            return True, "Standalone badge can be granted manually."
+        if rule.qualifies(UserCounters(db, user_id)):
+            return True, "Eligible: the badge rule is met."
+        return False, f"Badge rule not met: {rule.describe()}."
 
     total_levels = int(
         db.query(func.count(cm.Challenge.id))
@@ -199,7 +213,88 @@ class BadgeGrantIn(BaseModel):
     reason: Optional[str] = Field(None, max_length=255)
 
 
-# ── GET /users — paginated with search + role filter ───────────────────────
+# ── Directory search + keyset pagination helpers ──────────────────────────
+USER_SEARCH_MIN_NGRAM = 2          # matches MySQL's default ngram_token_size
+USER_COUNT_ESTIMATE_CAP = 10_000   # bounded COUNT for filtered "estimate" totals
+_user_fulltext_available: Optional[bool] = None
+
+
+def _encode_user_cursor(user: models.User) -> str:
+    raw = json.dumps([user.created_at.isoformat(), int(user.id)], separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def _decode_user_cursor(cursor: str) -> Tuple[datetime, int]:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        created_at_raw, user_id = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+        return datetime.fromisoformat(created_at_raw), int(user_id)
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor.")
+
+
+def _users_fulltext_enabled(db: Session) -> bool:
+    """True when the ft_users_search_ngram FULLTEXT index exists (MySQL after migrate.py)."""
+    global _user_fulltext_available
+    if _user_fulltext_available is None:
+        bind = db.get_bind()
+        if bind.dialect.name != "mysql":
+            _user_fulltext_available = False
+        else:
+            indexes = inspect(bind).get_indexes("users")
+            _user_fulltext_available = any(
+                ix.get("name") == "ft_users_search_ngram" and ix.get("type") == "FULLTEXT"
+                for ix in indexes
+            )
+    return _user_fulltext_available
+
+
+def _apply_user_search(db: Session, q, search: str):
+    terms = [t for t in re.split(r"[^\w@.+-]+", search.strip()) if t]
+    if not terms:
+        return q
+
+    if _users_fulltext_enabled(db) and all(len(t) >= USER_SEARCH_MIN_NGRAM for t in terms):
+        # ngram parser: each quoted term is matched as a phrase of n-grams (substring-like).
+        boolean_query = " ".join('+"' + t.replace('"', "") + '"' for t in terms)
+        return q.filter(
+            text("MATCH (username, email, first_name, last_name) AGAINST (:user_search IN BOOLEAN MODE)")
+            .bindparams(user_search=boolean_query)
+        )
+
+    # Substring match (as the ngram index gives) for short terms or non-MySQL databases.
+    for term in terms:
+        pattern = "%" + term.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+        q = q.filter(
+            (models.User.username.like(pattern, escape="\\"))
+            | (models.User.email.like(pattern, escape="\\"))
+            | (models.User.first_name.like(pattern, escape="\\"))
+            | (models.User.last_name.like(pattern, escape="\\"))
+        )
+    return q
+
+
+def _estimate_user_total(db: Session, q, filtered: bool) -> Tuple[int, bool]:
+    bind = db.get_bind()
+    if not filtered and bind.dialect.name == "mysql":
+        estimate = db.execute(
+            text(
+                "SELECT TABLE_ROWS FROM information_schema.TABLES "
+                "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'users'"
+            )
+        ).scalar()
+        return int(estimate or 0), True
+
+    capped = int(
+        db.query(func.count())
+        .select_from(q.with_entities(models.User.id).limit(USER_COUNT_ESTIMATE_CAP + 1).subquery())
+        .scalar()
+        or 0
+    )
+    return min(capped, USER_COUNT_ESTIMATE_CAP), capped > USER_COUNT_ESTIMATE_CAP
+
+
+# ── GET /users — keyset-paginated with search + role filter ────────────────
 @router.get("")
 async def list_users(
     request: Request,
@@ -207,19 +302,15 @@ async def list_users(
     per_page: int = Query(20, ge=1, le=100),
     search: Optional[str] = Query(None),
     role: Optional[str] = Query(None),
+    cursor: Optional[str] = Query(None, description="Opaque next_cursor from a previous page."),
+    count: Literal["exact", "estimate", "none"] = Query("exact"),
     db: Session = Depends(get_db),
 ):
     _require_admin(request, db)
 
     q = db.query(models.User)
     if search:
-        like = f"%{search}%"
-        q = q.filter(
-            (models.User.username.ilike(like))
-            | (models.User.email.ilike(like))
-            | (models.User.first_name.ilike(like))
-            | (models.User.last_name.ilike(like))
-        )
+        q = _apply_user_search(db, q, search)
     if role == "admin":
         q = q.filter(models.User.is_admin == True)
     elif role == "editor":
@@ -233,14 +324,35 @@ async def list_users(
     elif role == "banned":
         q = q.filter(models.User.is_banned == True)
 
-    total = q.count()
-    users = q.order_by(models.User.created_at.desc()).offset((page - 1) * per_page).limit(per_page).all()
+    total: Optional[int] = None
+    total_is_estimate = False
+    if count == "exact":
+        total = q.order_by(None).count()
+    elif count == "estimate":
+        total, total_is_estimate = _estimate_user_total(db, q, filtered=bool(search or role))
+
+    page_q = q.order_by(models.User.created_at.desc(), models.User.id.desc())
+    if cursor:
+        after_created_at, after_id = _decode_user_cursor(cursor)
+        page_q = page_q.filter(
+            (models.User.created_at < after_created_at)
+            | ((models.User.created_at == after_created_at) & (models.User.id < after_id))
+        )
+    elif page > 1:
+        # Legacy page-number access; prefer cursor for deep pages.
+        page_q = page_q.offset((page - 1) * per_page)
+
+    rows = page_q.limit(per_page + 1).all()
+    users = rows[:per_page]
+    next_cursor = _encode_user_cursor(users[-1]) if len(rows) > per_page else None
 
     return {
         "total": total,
+        "total_is_estimate": total_is_estimate,
         "page": page,
         "per_page": per_page,
-        "total_pages": max(1, (total + per_page - 1) // per_page),
+        "total_pages": max(1, (total + per_page - 1) // per_page) if total is not None else None,
+        "next_cursor": next_cursor,
         "users": [
             {
                 "id": u.id,
@@ -262,85 +374,322 @@ async def list_users(
     }
 
 
-# ── GET /{id}/activity — deep activity snapshot for admin popup ────────────
-@router.get("/{user_id}/activity")
+# ── Activity section helpers (column queries, keyset by id) ────────────────
+ACTIVITY_SECTION_MAX_LIMIT = 200
+
+
+def _page_rows(rows: list, limit: int) -> Tuple[list, Optional[int]]:
+    page = rows[:limit]
+    next_before_id = int(page[-1].id) if len(rows) > limit and page else None
+    return page, next_before_id
+
+
+def _level_context(row) -> dict:
+    has_level = row.level_number is not None
+    return {
+        "challenge_id": row.challenge_id if has_level else None,
+        "level_number": row.level_number,
+        "display_title": _challenge_title(row) if has_level else "Unknown level",
+        "challenge_type": row.challenge_type,
+        "module_id": row.module_id,
+        "module_title": row.module_title,
+        "lab_id": row.lab_id,
+        "lab_title": row.lab_title,
+    }
+
+
+def _with_level_context(q, challenge_id_column):
+    return (
+        q.outerjoin(cm.Challenge, cm.Challenge.id == challenge_id_column)
+        .outerjoin(cm.Module, cm.Module.id == cm.Challenge.module_id)
+        .outerjoin(cm.Lab, cm.Lab.id == cm.Module.lab_id)
+    )
+
+
+_LEVEL_CONTEXT_COLUMNS = (
+    cm.Challenge.level_number,
+    cm.Challenge.challenge_type,
+    cm.Challenge.custom_title,
+    cm.Module.id.label("module_id"),
+    cm.Module.title.label("module_title"),
+    cm.Lab.id.label("lab_id"),
+    cm.Lab.title.label("lab_title"),
+)
+
+
+def _attempt_section(db: Session, user_id: int, limit: int, before_id: Optional[int] = None) -> dict:
+    q = _with_level_context(
+        db.query(
+            cm.ChallengeAttempt.id,
+            cm.ChallengeAttempt.challenge_id,
+            cm.ChallengeAttempt.attempt_number,
+            cm.ChallengeAttempt.status_id,
+            cm.ChallengeAttempt.is_passed,
+            cm.ChallengeAttempt.xp_awarded,
+            cm.ChallengeAttempt.created_at,
+            *_LEVEL_CONTEXT_COLUMNS,
+        ),
+        cm.ChallengeAttempt.challenge_id,
+    ).filter(cm.ChallengeAttempt.user_id == user_id)
+    if before_id is not None:
+        q = q.filter(cm.ChallengeAttempt.id < before_id)
+    rows, next_before_id = _page_rows(q.order_by(cm.ChallengeAttempt.id.desc()).limit(limit + 1).all(), limit)
+
+    return {
+        "items": [
+            {
+                "type": "attempt",
+                "id": row.id,
+                "occurred_at": _to_iso(row.created_at),
+                **_level_context(row),
+                "attempt_number": row.attempt_number,
+                "passed": bool(row.is_passed),
+                "status_id": row.status_id,
+                "xp_awarded": int(row.xp_awarded or 0),
+            }
+            for row in rows
+        ],
+        "next_before_id": next_before_id,
+    }
+
+
+def _completion_section(db: Session, user_id: int, limit: int, before_id: Optional[int] = None) -> dict:
+    q = _with_level_context(
+        db.query(
+            cm.ChallengeCompletion.id,
+            cm.ChallengeCompletion.challenge_id,
+            cm.ChallengeCompletion.xp_awarded,
+            cm.ChallengeCompletion.completed_at,
+            *_LEVEL_CONTEXT_COLUMNS,
+        ),
+        cm.ChallengeCompletion.challenge_id,
+    ).filter(cm.ChallengeCompletion.user_id == user_id)
+    if before_id is not None:
+        q = q.filter(cm.ChallengeCompletion.id < before_id)
+    rows, next_before_id = _page_rows(q.order_by(cm.ChallengeCompletion.id.desc()).limit(limit + 1).all(), limit)
+
+    return {
+        "items": [
+            {
+                "type": "completion",
+                "id": row.id,
+                "occurred_at": _to_iso(row.completed_at),
+                **_level_context(row),
+                "xp_awarded": int(row.xp_awarded or 0),
+            }
+            for row in rows
+        ],
+        "next_before_id": next_before_id,
+    }
+
+
+def _audit_section(db: Session, user_id: int, limit: int, before_id: Optional[int] = None) -> dict:
+    q = db.query(models.AdminAuditLog).filter(models.AdminAuditLog.target_user_id == user_id)
+    if before_id is not None:
+        q = q.filter(models.AdminAuditLog.id < before_id)
+    rows, next_before_id = _page_rows(q.order_by(models.AdminAuditLog.id.desc()).limit(limit + 1).all(), limit)
+
+    actor_ids = sorted({int(row.actor_admin_id) for row in rows if row.actor_admin_id is not None})
+    actors_by_id = {}
+    if actor_ids:
+        for actor in (
+            db.query(models.User.id, models.User.username, models.User.first_name, models.User.last_name)
+            .filter(models.User.id.in_(actor_ids))
+            .all()
+        ):
+            actors_by_id[actor.id] = {
+                "username": actor.username,
+                "display_name": (
+                    f"{actor.first_name or ''} {actor.last_name or ''}".strip() if (actor.first_name or actor.last_name) else actor.username
+                ),
+            }
+
+    items = []
+    for row in rows:
+        actor_info = actors_by_id.get(row.actor_admin_id or -1, None)
+        items.append(
+            {
+                "audit_id": row.id,
+                "action": row.action,
+                "reason": row.reason,
+                "actor_admin_id": row.actor_admin_id,
+                "actor_username": actor_info["username"] if actor_info else None,
+                "actor_display_name": actor_info["display_name"] if actor_info else None,
+                "created_at": _to_iso(row.created_at),
+                "context": _json_loads(row.context_json),
+            }
+        )
+    return {"items": items, "next_before_id": next_before_id}
+
+
+def _badge_catalog(db: Session, user_id: int, owned_badge_ids: set) -> List[dict]:
+    badge_rows = (
+        db.query(
+            cm.Badge.id,
+            cm.Badge.name,
+            cm.Badge.description,
+            cm.Badge.module_id,
+            cm.Badge.image_url,
+            cm.Badge.image_path,
+            cm.Module.title.label("module_title"),
+            cm.Lab.title.label("lab_title"),
+        )
+        .outerjoin(cm.Module, cm.Module.id == cm.Badge.module_id)
+        .outerjoin(cm.Lab, cm.Lab.id == cm.Module.lab_id)
+        .order_by(cm.Badge.name.asc())
+        .all()
+    )
+
+    badge_module_ids = {int(row.module_id) for row in badge_rows if row.module_id is not None}
+    published_by_module: Dict[int, int] = {}
+    completed_by_module: Dict[int, int] = {}
+    if badge_module_ids:
+        published_by_module = {
+            int(module_id): int(total or 0)
+            for module_id, total in db.query(cm.Challenge.module_id, func.count(cm.Challenge.id))
+            .filter(cm.Challenge.module_id.in_(badge_module_ids), cm.Challenge.is_published == True)
+            .group_by(cm.Challenge.module_id)
+            .all()
+        }
+        completed_by_module = {
+            int(module_id): int(total or 0)
+            for module_id, total in db.query(cm.Challenge.module_id, func.count(cm.ChallengeCompletion.id))
+            .join(cm.Challenge, cm.Challenge.id == cm.ChallengeCompletion.challenge_id)
+            .filter(
+                cm.ChallengeCompletion.user_id == user_id,
+                cm.Challenge.module_id.in_(badge_module_ids),
+                cm.Challenge.is_published == True,
+            )
+            .group_by(cm.Challenge.module_id)
+            .all()
+        }
+
+    catalog = []
+    for row in badge_rows:
+        if not row.module_id:
+            eligible, validation_message = True, "Standalone badge can be granted manually."
+        else:
+            total_levels = published_by_module.get(int(row.module_id), 0)
+            completed_levels = completed_by_module.get(int(row.module_id), 0)
+            if total_levels == 0:
+                eligible, validation_message = True, "Module has no published levels yet."
+            elif completed_levels >= total_levels:
+                eligible, validation_message = True, "Eligible: all module levels are completed."
+            else:
+                eligible, validation_message = False, f"Needs full module completion ({completed_levels}/{total_levels})."
+
+        catalog.append(
+            {
+                "badge_id": row.id,
+                "name": row.name,
+                "description": row.description,
+                "module_id": row.module_id,
+                "module_title": row.module_title,
+                "lab_title": row.lab_title,
+                "image_url": _badge_image_url(row),
+                "already_owned": row.id in owned_badge_ids,
+                "eligible": eligible,
+                "validation_message": validation_message,
+            }
+        )
+    return catalog
+
+
+# ── GET /{id}/activity — bounded activity snapshot for admin popup ─────────
+@router.get("/{user_id}/activity", response_class=FastJSONResponse)
 async def get_user_activity(
     user_id: int,
     request: Request,
     limit: int = Query(40, ge=10, le=200),
     db: Session = Depends(get_db),
 ):
+    """
+    Snapshot restricted to the user's own footprint: only modules the user has attempted
+    or completed are expanded, per-level numbers come from grouped aggregates, and the
+    activity/audit sections return their first page plus a cursor for the section endpoints.
+    """
     _require_admin(request, db)
     user = _managed_user_or_404(db, user_id)
 
-    completion_rows = (
-        db.query(cm.ChallengeCompletion)
-        .options(
-            joinedload(cm.ChallengeCompletion.challenge)
-            .joinedload(cm.Challenge.module)
-            .joinedload(cm.Module.lab)
+    completion_map = {
+        int(row.challenge_id): row
+        for row in db.query(
+            cm.ChallengeCompletion.challenge_id,
+            cm.ChallengeCompletion.xp_awarded,
+            cm.ChallengeCompletion.completed_at,
         )
         .filter(cm.ChallengeCompletion.user_id == user_id)
         .all()
-    )
-    completion_map: Dict[int, cm.ChallengeCompletion] = {
-        row.challenge_id: row for row in completion_rows if row.challenge is not None
     }
 
-    attempt_agg_rows = (
-        db.query(
-            cm.ChallengeAttempt.challenge_id.label("challenge_id"),
-            func.count(cm.ChallengeAttempt.id).label("attempt_count"),
-            func.coalesce(
-                func.sum(case((cm.ChallengeAttempt.is_passed == True, 1), else_=0)),
-                0,
-            ).label("passed_count"),
-            func.max(cm.ChallengeAttempt.created_at).label("last_attempt_at"),
+    attempt_map = {
+        int(row.challenge_id): row
+        for row in db.query(
+            cm.UserChallengeStat.challenge_id.label("challenge_id"),
+            cm.UserChallengeStat.attempt_count.label("attempt_count"),
+            cm.UserChallengeStat.pass_count.label("passed_count"),
+            cm.UserChallengeStat.last_attempt_at.label("last_attempt_at"),
         )
-        .filter(cm.ChallengeAttempt.user_id == user_id)
-        .group_by(cm.ChallengeAttempt.challenge_id)
+        .filter(cm.UserChallengeStat.user_id == user_id)
         .all()
-    )
-    attempt_map = {
-        int(row.challenge_id): {
-            "attempt_count": int(row.attempt_count or 0),
-            "passed_count": int(row.passed_count or 0),
-            "last_attempt_at": row.last_attempt_at,
-        }
-        for row in attempt_agg_rows
     }
-
-    total_attempts = int(
-        db.query(func.count(cm.ChallengeAttempt.id))
-        .filter(cm.ChallengeAttempt.user_id == user_id)
-        .scalar()
-        or 0
-    )
+    total_attempts = int(sum(int(row.attempt_count or 0) for row in attempt_map.values()))
     attended_level_ids = set(attempt_map.keys()) | set(completion_map.keys())
 
-    modules = (
-        db.query(cm.Module)
-        .options(joinedload(cm.Module.lab), joinedload(cm.Module.challenges))
-        .order_by(cm.Module.lab_id.asc(), cm.Module.order_index.asc(), cm.Module.title.asc())
-        .all()
-    )
+    touched_module_ids = set()
+    if attended_level_ids:
+        touched_module_ids = {
+            int(row[0])
+            for row in db.query(cm.Challenge.module_id)
+            .filter(cm.Challenge.id.in_(attended_level_ids))
+            .distinct()
+            .all()
+        }
+
+    modules = []
+    levels_by_module: Dict[int, list] = {}
+    if touched_module_ids:
+        modules = (
+            db.query(
+                cm.Module.id,
+                cm.Module.title,
+                cm.Module.slug,
+                cm.Lab.id.label("lab_id"),
+                cm.Lab.title.label("lab_title"),
+            )
+            .outerjoin(cm.Lab, cm.Lab.id == cm.Module.lab_id)
+            .filter(cm.Module.id.in_(touched_module_ids))
+            .order_by(cm.Module.lab_id.asc(), cm.Module.order_index.asc(), cm.Module.title.asc())
+            .all()
+        )
+        for level in (
+            db.query(
+                cm.Challenge.id,
+                cm.Challenge.module_id,
+                cm.Challenge.level_number,
+                cm.Challenge.challenge_type,
+                cm.Challenge.custom_title,
+                cm.Challenge.is_published,
+                cm.Challenge.xp_reward,
+            )
+            .filter(cm.Challenge.module_id.in_(touched_module_ids))
+            .order_by(cm.Challenge.module_id.asc(), cm.Challenge.level_number.asc())
+            .all()
+        ):
+            levels_by_module.setdefault(int(level.module_id), []).append(level)
 
     module_progress = []
     reset_modules = []
     reset_levels = []
-    total_published_levels = 0
-    published_completed_levels = 0
+    empty_attempts = {"attempt_count": 0, "passed_count": 0, "last_attempt_at": None}
 
     for module in modules:
-        ordered_levels = sorted(module.challenges, key=lambda c: c.level_number)
+        ordered_levels = levels_by_module.get(int(module.id), [])
         published_levels = [level for level in ordered_levels if level.is_published]
         published_total = len(published_levels)
         published_completed = len([level for level in published_levels if level.id in completion_map])
         published_attempted = len([level for level in published_levels if level.id in attended_level_ids])
 
-        total_published_levels += published_total
-        published_completed_levels += published_completed
-
         module_total_xp = int(sum(int(level.xp_reward or 0) for level in published_levels))
         module_earned_xp = int(
             sum(int(completion_map[level.id].xp_awarded or 0) for level in published_levels if level.id in completion_map)
@@ -349,7 +698,8 @@ async def get_user_activity(
         levels_out = []
         for level in ordered_levels:
             completion = completion_map.get(level.id)
-            attempt_stats = attempt_map.get(level.id, {"attempt_count": 0, "passed_count": 0, "last_attempt_at": None})
+            attempt_stats = attempt_map.get(level.id)
+            attempt_stats = attempt_stats._asdict() if attempt_stats is not None else empty_attempts
             level_item = {
                 "challenge_id": level.id,
                 "level_number": level.level_number,
@@ -360,8 +710,8 @@ async def get_user_activity(
                 "is_completed": completion is not None,
                 "xp_awarded": int(completion.xp_awarded or 0) if completion else 0,
                 "completed_at": _to_iso(completion.completed_at if completion else None),
-                "attempt_count": int(attempt_stats["attempt_count"]),
-                "passed_attempts": int(attempt_stats["passed_count"]),
+                "attempt_count": int(attempt_stats["attempt_count"] or 0),
+                "passed_attempts": int(attempt_stats["passed_count"] or 0),
                 "last_attempt_at": _to_iso(attempt_stats["last_attempt_at"]),
             }
             levels_out.append(level_item)
@@ -371,7 +721,7 @@ async def get_user_activity(
                     "challenge_id": level.id,
                     "module_id": module.id,
                     "module_title": module.title,
-                    "lab_title": module.lab.title if module.lab else None,
+                    "lab_title": module.lab_title,
                     "level_number": level.level_number,
                     "display_title": level_item["display_title"],
                     "challenge_type": level.challenge_type,
@@ -383,8 +733,8 @@ async def get_user_activity(
                 "module_id": module.id,
                 "module_title": module.title,
                 "module_slug": module.slug,
-                "lab_id": module.lab.id if module.lab else None,
-                "lab_title": module.lab.title if module.lab else None,
+                "lab_id": module.lab_id,
+                "lab_title": module.lab_title,
                 "published_levels": published_total,
                 "completed_levels": published_completed,
                 "attended_levels": published_attempted,
@@ -400,176 +750,61 @@ async def get_user_activity(
             {
                 "module_id": module.id,
                 "module_title": module.title,
-                "lab_title": module.lab.title if module.lab else None,
+                "lab_title": module.lab_title,
                 "published_levels": published_total,
             }
         )
 
+    total_published_levels = int(
+        db.query(func.count(cm.Challenge.id)).filter(cm.Challenge.is_published == True).scalar() or 0
+    )
+    published_completed_levels = 0
+    if completion_map:
+        published_completed_levels = int(
+            db.query(func.count(cm.Challenge.id))
+            .filter(cm.Challenge.id.in_(completion_map.keys()), cm.Challenge.is_published == True)
+            .scalar()
+            or 0
+        )
+    completion_percent = round((published_completed_levels / total_published_levels) * 100.0, 2) if total_published_levels > 0 else 0.0
+
     owned_badge_rows = (
-        db.query(cm.UserBadge, cm.Badge)
+        db.query(
+            cm.UserBadge.earned_at,
+            cm.Badge.id,
+            cm.Badge.name,
+            cm.Badge.description,
+            cm.Badge.module_id,
+            cm.Badge.image_url,
+            cm.Badge.image_path,
+            cm.Module.title.label("module_title"),
+        )
         .join(cm.Badge, cm.Badge.id == cm.UserBadge.badge_id)
+        .outerjoin(cm.Module, cm.Module.id == cm.Badge.module_id)
         .filter(cm.UserBadge.user_id == user_id)
         .order_by(cm.UserBadge.earned_at.desc())
         .all()
     )
     owned_badges = [
         {
-            "badge_id": badge.id,
-            "name": badge.name,
-            "description": badge.description,
-            "module_id": badge.module_id,
-            "module_title": badge.module.title if badge.module else None,
-            "image_url": _badge_image_url(badge),
-            "earned_at": _to_iso(user_badge.earned_at),
+            "badge_id": row.id,
+            "name": row.name,
+            "description": row.description,
+            "module_id": row.module_id,
+            "module_title": row.module_title,
+            "image_url": _badge_image_url(row),
+            "earned_at": _to_iso(row.earned_at),
         }
-        for user_badge, badge in owned_badge_rows
+        for row in owned_badge_rows
     ]
     owned_badge_ids = {badge["badge_id"] for badge in owned_badges}
 
-    all_badges = (
-        db.query(cm.Badge)
-        .options(joinedload(cm.Badge.module).joinedload(cm.Module.lab))
-        .order_by(cm.Badge.name.asc())
-        .all()
-    )
-    badge_catalog = []
-    for badge in all_badges:
-        eligible, validation_message = _module_badge_eligibility(db, user_id, badge)
-        badge_catalog.append(
-            {
-                "badge_id": badge.id,
-                "name": badge.name,
-                "description": badge.description,
-                "module_id": badge.module_id,
-                "module_title": badge.module.title if badge.module else None,
-                "lab_title": badge.module.lab.title if badge.module and badge.module.lab else None,
-                "image_url": _badge_image_url(badge),
-                "already_owned": badge.id in owned_badge_ids,
-                "eligible": eligible,
-                "validation_message": validation_message,
-            }
-        )
+    attempts_page = _attempt_section(db, user_id, limit)
+    completions_page = _completion_section(db, user_id, limit)
+    audit_page = _audit_section(db, user_id, limit)
 
-    recent_attempts = (
-        db.query(cm.ChallengeAttempt)
-        .options(
-            joinedload(cm.ChallengeAttempt.challenge)
-            .joinedload(cm.Challenge.module)
-            .joinedload(cm.Module.lab)
-        )
-        .filter(cm.ChallengeAttempt.user_id == user_id)
-        .order_by(cm.ChallengeAttempt.created_at.desc())
-        .limit(limit)
-        .all()
-    )
-    recent_completions = (
-        db.query(cm.ChallengeCompletion)
-        .options(
-            joinedload(cm.ChallengeCompletion.challenge)
-            .joinedload(cm.Challenge.module)
-            .joinedload(cm.Module.lab)
-        )
-        .filter(cm.ChallengeCompletion.user_id == user_id)
-        .order_by(cm.ChallengeCompletion.completed_at.desc())
-        .limit(limit)
-        .all()
-    )
-
-    activity_rows: List[dict] = []
-    for attempt in recent_attempts:
-        challenge = attempt.challenge
-        module = challenge.module if challenge else None
-        lab = module.lab if module else None
-        activity_rows.append(
-            {
-                "type": "attempt",
-                "occurred_at": _to_iso(attempt.created_at),
-                "_epoch": attempt.created_at.timestamp() if attempt.created_at else 0,
-                "challenge_id": challenge.id if challenge else None,
-                "level_number": challenge.level_number if challenge else None,
-                "display_title": _challenge_title(challenge) if challenge else "Unknown level",
-                "challenge_type": challenge.challenge_type if challenge else None,
-                "module_id": module.id if module else None,
-                "module_title": module.title if module else None,
-                "lab_id": lab.id if lab else None,
-                "lab_title": lab.title if lab else None,
-                "attempt_number": attempt.attempt_number,
-                "passed": bool(attempt.is_passed),
-                "status_id": attempt.status_id,
-                "xp_awarded": int(attempt.xp_awarded or 0),
-            }
-        )
-
-    for completion in recent_completions:
-        challenge = completion.challenge
-        module = challenge.module if challenge else None
-        lab = module.lab if module else None
-        activity_rows.append(
-            {
-                "type": "completion",
-                "occurred_at": _to_iso(completion.completed_at),
-                "_epoch": completion.completed_at.timestamp() if completion.completed_at else 0,
-                "challenge_id": challenge.id if challenge else None,
-                "level_number": challenge.level_number if challenge else None,
-                "display_title": _challenge_title(challenge) if challenge else "Unknown level",
-                "challenge_type": challenge.challenge_type if challenge else None,
-                "module_id": module.id if module else None,
-                "module_title": module.title if module else None,
-                "lab_id": lab.id if lab else None,
-                "lab_title": lab.title if lab else None,
-                "xp_awarded": int(completion.xp_awarded or 0),
-            }
-        )
-
-    activity_rows.sort(key=lambda item: item.get("_epoch", 0), reverse=True)
-    trimmed_activity = []
-    for item in activity_rows[:limit]:
-        item.pop("_epoch", None)
-        trimmed_activity.append(item)
-
-    completion_percent = round((published_completed_levels / total_published_levels) * 100.0, 2) if total_published_levels > 0 else 0.0
-
-    admin_action_rows = (
-        db.query(models.AdminAuditLog)
-        .filter(models.AdminAuditLog.target_user_id == user_id)
-        .order_by(models.AdminAuditLog.created_at.desc())
-        .limit(limit)
-        .all()
-    )
-
-    actor_ids = sorted({int(row.actor_admin_id) for row in admin_action_rows if row.actor_admin_id is not None})
-    actor_rows = []
-    if actor_ids:
-        actor_rows = (
-            db.query(models.User)
-            .filter(models.User.id.in_(actor_ids))
-            .all()
-        )
-    actors_by_id = {
-        actor.id: {
-            "username": actor.username,
-            "display_name": (
-                f"{actor.first_name or ''} {actor.last_name or ''}".strip() if (actor.first_name or actor.last_name) else actor.username
-            ),
-        }
-        for actor in actor_rows
-    }
-
-    recent_admin_actions = []
-    for row in admin_action_rows:
-        actor_info = actors_by_id.get(row.actor_admin_id or -1, None)
-        recent_admin_actions.append(
-            {
-                "audit_id": row.id,
-                "action": row.action,
-                "reason": row.reason,
-                "actor_admin_id": row.actor_admin_id,
-                "actor_username": actor_info["username"] if actor_info else None,
-                "actor_display_name": actor_info["display_name"] if actor_info else None,
-                "created_at": _to_iso(row.created_at),
-                "context": _json_loads(row.context_json),
-            }
-        )
+    activity_rows = attempts_page["items"] + completions_page["items"]
+    activity_rows.sort(key=lambda item: item.get("occurred_at") or "", reverse=True)
 
     return {
         "user": {
@@ -598,9 +833,14 @@ async def get_user_activity(
         },
         "module_progress": module_progress,
         "owned_badges": owned_badges,
-        "badge_catalog": badge_catalog,
-        "recent_activity": trimmed_activity,
-        "recent_admin_actions": recent_admin_actions,
+        "badge_catalog": _badge_catalog(db, user_id, owned_badge_ids),
+        "recent_activity": activity_rows[:limit],
+        "recent_admin_actions": audit_page["items"],
+        "sections": {
+            "attempts": {"next_before_id": attempts_page["next_before_id"]},
+            "completions": {"next_before_id": completions_page["next_before_id"]},
+            "audit_log": {"next_before_id": audit_page["next_before_id"]},
+        },
         "reset_options": {
             "modules": reset_modules,
             "levels": reset_levels,
@@ -608,6 +848,46 @@ async def get_user_activity(
     }
 
 
+# ── GET /{id}/activity/{section} — lazily paginated activity sections ───────
+@router.get("/{user_id}/activity/attempts", response_class=FastJSONResponse)
+async def list_user_attempts(
+    user_id: int,
+    request: Request,
+    limit: int = Query(40, ge=1, le=ACTIVITY_SECTION_MAX_LIMIT),
+    before_id: Optional[int] = Query(None, ge=1),
+    db: Session = Depends(get_db),
+):
+    _require_admin(request, db)
+    _managed_user_or_404(db, user_id)
+    return _attempt_section(db, user_id, limit, before_id)
+
+
+@router.get("/{user_id}/activity/completions", response_class=FastJSONResponse)
+async def list_user_completions(
+    user_id: int,
+    request: Request,
+    limit: int = Query(40, ge=1, le=ACTIVITY_SECTION_MAX_LIMIT),
+    before_id: Optional[int] = Query(None, ge=1),
+    db: Session = Depends(get_db),
+):
+    _require_admin(request, db)
+    _managed_user_or_404(db, user_id)
+    return _completion_section(db, user_id, limit, before_id)
+
+
+@router.get("/{user_id}/activity/audit-log", response_class=FastJSONResponse)
+async def list_user_audit_log(
+    user_id: int,
+    request: Request,
+    limit: int = Query(40, ge=1, le=ACTIVITY_SECTION_MAX_LIMIT),
+    before_id: Optional[int] = Query(None, ge=1),
+    db: Session = Depends(get_db),
+):
+    _require_admin(request, db)
+    _managed_user_or_404(db, user_id)
+    return _audit_section(db, user_id, limit, before_id)
+
+
 # ── POST /{id}/xp — increase/decrease/set/reset XP ─────────────────────────
 @router.post("/{user_id}/xp")
 async def adjust_user_xp(
@@ -619,7 +899,7 @@ async def adjust_user_xp(
     actor = _require_admin(request, db)
     user = _managed_user_or_404(db, user_id)
 
-    before = int(user.total_xp or 0)
+    before = xp_services.locked_total_xp(db, user.id)
     if payload.operation == "increase":
         after = before + payload.amount
     elif payload.operation == "decrease":
@@ -629,7 +909,14 @@ async def adjust_user_xp(
     else:
         after = 0
 
-    user.total_xp = int(after)
+    xp_services.record_xp(
+        db,
+        user.id,
+        after - before,
+        xp_models.XP_SOURCE_ADMIN_ADJUST,
+        actor_admin_id=actor.id,
+        note=payload.reason,
+    )
 
     _write_audit_log(
         db,
@@ -646,6 +933,7 @@ async def adjust_user_xp(
     )
 
     db.commit()
+    db.refresh(user)
 
     return {
         "message": "XP updated successfully.",
@@ -692,6 +980,7 @@ async def reset_user_progress(
     deleted_badges = 0
 
     if payload.clear_attempts:
+        flush_attempt_buffer()   # this worker only; see curriculum/attempt_buffer.py for the gap
         q = db.query(cm.ChallengeAttempt).filter(cm.ChallengeAttempt.user_id == user_id)
         if challenge_ids is not None:
             if challenge_ids:
@@ -699,6 +988,7 @@ async def reset_user_progress(
             else:
                 q = q.filter(cm.ChallengeAttempt.challenge_id == -1)
         deleted_attempts = int(q.delete(synchronize_session=False) or 0)
+        clear_attempt_stats(db, [user_id], challenge_ids)
 
     if payload.clear_completions:
         q = db.query(cm.ChallengeCompletion).filter(cm.ChallengeCompletion.user_id == user_id)
@@ -730,11 +1020,17 @@ async def reset_user_progress(
     if payload.reset_streaks:
         user.current_streak = 0
         user.longest_streak = 0
+        user.streak_last_day = None
 
-    if payload.set_xp_to is not None:
-        user.total_xp = int(payload.set_xp_to)
-    else:
-        user.total_xp = _recalculate_user_xp(db, user_id)
+    target_xp = payload.set_xp_to if payload.set_xp_to is not None else _recalculate_user_xp(db, user_id)
+    _, result_xp = xp_services.set_xp(
+        db,
+        user_id,
+        target_xp,
+        xp_models.XP_SOURCE_PROGRESS_RESET,
+        actor_admin_id=actor.id,
+        note=payload.reason,
+    )
 
     _write_audit_log(
         db,
@@ -754,11 +1050,12 @@ async def reset_user_progress(
             "deleted_attempts": int(deleted_attempts),
             "deleted_completions": int(deleted_completions),
             "deleted_badges": int(deleted_badges),
-            "result_total_xp": int(user.total_xp or 0),
+            "result_total_xp": result_xp,
         },
     )
 
     db.commit()
+    db.refresh(user)
 
     return {
         "message": "User progress reset completed.",
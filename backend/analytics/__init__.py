@@ -0,0 +1 @@
+"""Attempt analytics rollup package."""
@@ -0,0 +1,80 @@
+"""
+analytics/models.py — Campus404
+Pre-aggregated hourly/daily rollups over the ChallengeAttempt log, and the monthly
+summaries left behind when old attempts are archived out of it.
+"""
+from datetime import datetime, timezone
+
+from sqlalchemy import Column, Date, DateTime, ForeignKey, Index, Integer, String, Text, UniqueConstraint
+
+from database import Base
+
+
+GRANULARITY_HOUR = "hour"
+GRANULARITY_DAY = "day"
+VALID_GRANULARITIES = (GRANULARITY_HOUR, GRANULARITY_DAY)
+
+SCOPE_CHALLENGE = "challenge"
+SCOPE_MODULE = "module"
+SCOPE_LAB = "lab"
+VALID_SCOPES = (SCOPE_CHALLENGE, SCOPE_MODULE, SCOPE_LAB)
+
+ATTEMPT_ROLLUP_WATERMARK = "challenge_attempts"
+
+
+class AttemptRollup(Base):
+    """One time bucket of attempt metrics for a challenge, module, or lab."""
+    __tablename__ = "attempt_rollups"
+
+    id              = Column(Integer, primary_key=True, index=True)
+    granularity     = Column(String(8), nullable=False)
+    scope_type      = Column(String(16), nullable=False)
+    scope_id        = Column(Integer, nullable=False)
+    bucket_start    = Column(DateTime, nullable=False)
+    attempts        = Column(Integer, nullable=False, default=0)
+    passes          = Column(Integer, nullable=False, default=0)
+    first_passes    = Column(Integer, nullable=False, default=0)
+    distinct_users  = Column(Integer, nullable=False, default=0)
+    # JSON maps kept mergeable so new batches can be folded in without rescans.
+    attempts_to_pass_json = Column(Text, nullable=True)   # {"<attempt_number>": count}
+    status_histogram_json = Column(Text, nullable=True)   # {"<status_id>": count}
+    updated_at      = Column(DateTime, default=lambda: datetime.now(timezone.utc),
+                             onupdate=lambda: datetime.now(timezone.utc), nullable=False)
+
+    __table_args__ = (
+        UniqueConstraint("granularity", "scope_type", "scope_id", "bucket_start", name="uq_attempt_rollup_bucket"),
+        Index("ix_attempt_rollups_scope_series", "scope_type", "scope_id", "granularity", "bucket_start"),
+    )
+
+
+class AttemptRollupUser(Base):
+    """Users already counted in a rollup bucket, so distinct_users stays exact across batches."""
+    __tablename__ = "attempt_rollup_users"
+
+    rollup_id = Column(Integer, ForeignKey("attempt_rollups.id", ondelete="CASCADE"), primary_key=True)
+    user_id   = Column(Integer, primary_key=True)
+
+
+class RollupWatermark(Base):
+    """High-water mark of the last source row folded into the rollups."""
+    __tablename__ = "rollup_watermarks"
+
+    name       = Column(String(64), primary_key=True)
+    last_id    = Column(Integer, nullable=False, default=0)
+    updated_at = Column(DateTime, default=lambda: datetime.now(timezone.utc),
+                        onupdate=lambda: datetime.now(timezone.utc), nullable=False)
+
+
+class AttemptArchiveSummary(Base):
+    """What remains of one user's archived attempts at one level in one calendar month."""
+    __tablename__ = "attempt_archive_summaries"
+
+    user_id          = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
+    challenge_id     = Column(Integer, ForeignKey("challenges.id", ondelete="CASCADE"), primary_key=True, index=True)
+    month            = Column(Date, primary_key=True)
+    attempts         = Column(Integer, nullable=False, default=0)
+    passes           = Column(Integer, nullable=False, default=0)
+    xp_awarded       = Column(Integer, nullable=False, default=0)
+    first_attempt_at = Column(DateTime, nullable=False)
+    last_attempt_at  = Column(DateTime, nullable=False)
+    max_attempt_id   = Column(Integer, nullable=False)   # highest archived challenge_attempts.id
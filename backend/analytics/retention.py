@@ -0,0 +1,266 @@
+"""
+analytics/retention.py — Campus404
+Hot/cold retention for challenge_attempts: whole calendar months older than
+ATTEMPT_RETENTION_DAYS are exported to gzipped JSON-lines files on local disk, folded into
+attempt_archive_summaries and deleted from the hot table by a scheduled job.
+
+Only attempts already folded into the rollups (id <= watermark) are archived, so the
+analytics series keep every attempt; per-level attempt counters live in
+user_challenge_stats and are not touched. Each batch reaches disk before its delete
+commits, so a crash can repeat rows in a file (they carry their ids) but never lose them.
+Nothing is archived while the archive directory sits on a filesystem that does not outlive
+the container (its overlay writable layer, tmpfs): docker-compose mounts the
+campus_attempt_archive volume at /app/archive for this.
+"""
+import gzip
+import json
+import os
+from datetime import date, datetime, timedelta, timezone
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
+
+from sqlalchemy import case, func
+from sqlalchemy.orm import Session
+
+import curriculum.models as cm
+from database import upsert
+from jobs.services import JobContext, job_handler, periodic_job
+from . import models, schemas
+from .services import _get_watermark, refresh_attempt_rollups
+
+ATTEMPT_RETENTION_DAYS = int(os.getenv("ATTEMPT_RETENTION_DAYS", "180"))   # <= 0 keeps everything hot
+ATTEMPT_ARCHIVE_DIR = Path(os.getenv("ATTEMPT_ARCHIVE_DIR", "/app/archive/attempts"))
+ATTEMPT_ARCHIVE_BATCH_SIZE = 5000
+ATTEMPT_ARCHIVE_INTERVAL_SECONDS = float(os.getenv("ATTEMPT_ARCHIVE_INTERVAL_SECONDS", "86400"))
+ATTEMPT_ARCHIVE_JOB = "analytics.archive_attempts"
+# Set to 1 to archive onto storage the check below calls ephemeral (e.g. a host without /proc).
+ATTEMPT_ARCHIVE_ALLOW_EPHEMERAL = os.getenv("ATTEMPT_ARCHIVE_ALLOW_EPHEMERAL", "0") == "1"
+_EPHEMERAL_FS_TYPES = {"overlay", "aufs", "tmpfs", "ramfs"}
+
+_ARCHIVE_COLUMNS = (
+    cm.ChallengeAttempt.id,
+    cm.ChallengeAttempt.user_id,
+    cm.ChallengeAttempt.challenge_id,
+    cm.ChallengeAttempt.attempt_number,
+    cm.ChallengeAttempt.status_id,
+    cm.ChallengeAttempt.is_passed,
+    cm.ChallengeAttempt.xp_awarded,
+    cm.ChallengeAttempt.correct_answers,
+    cm.ChallengeAttempt.total_questions,
+    cm.ChallengeAttempt.optimization_score,
+    cm.ChallengeAttempt.created_at,
+)
+
+SummaryKey = Tuple[int, int, date]
+
+
+def _month_start(value) -> date:
+    return date(value.year, value.month, 1)
+
+
+def retention_cutoff(now: Optional[datetime] = None) -> Optional[datetime]:
+    """Start of the oldest month that stays hot (naive UTC), or None when retention is off."""
+    if ATTEMPT_RETENTION_DAYS <= 0:
+        return None
+    now = now or datetime.now(timezone.utc)
+    oldest_kept = (now - timedelta(days=ATTEMPT_RETENTION_DAYS)).astimezone(timezone.utc)
+    return datetime(oldest_kept.year, oldest_kept.month, 1)
+
+
+def archive_path(month: date) -> Path:
+    return ATTEMPT_ARCHIVE_DIR / f"challenge_attempts-{month:%Y-%m}.jsonl.gz"
+
+
+def _mount_fs_type(path: Path) -> Optional[str]:
+    """Filesystem type of the mount holding path, from /proc/self/mountinfo; None if unknown."""
+    try:
+        lines = Path("/proc/self/mountinfo").read_text().splitlines()
+    except OSError:
+        return None
+    path = path.resolve()
+    best = -1
+    fs_type = None
+    for line in lines:
+        head, _, tail = line.partition(" - ")
+        fields = head.split()
+        if len(fields) < 5 or not tail:
+            continue
+        mount_point = Path(fields[4].replace("\\040", " "))
+        depth = len(mount_point.parts)
+        # Later entries for the same mount point are mounted over the earlier ones.
+        if (mount_point == path or mount_point in path.parents) and depth >= best:
+            best = depth
+            fs_type = tail.split()[0]
+    return fs_type
+
+
+def archive_dir_persistent() -> bool:
+    if ATTEMPT_ARCHIVE_ALLOW_EPHEMERAL:
+        return True
+    return _mount_fs_type(ATTEMPT_ARCHIVE_DIR) not in _EPHEMERAL_FS_TYPES
+
+
+def _row_to_record(row) -> dict:
+    record = row._asdict()
+    record["is_passed"] = bool(record["is_passed"])
+    record["created_at"] = record["created_at"].isoformat()
+    return record
+
+
+def _write_archive(rows) -> List[date]:
+    """Append rows to their month files (one gzip member per batch) and fsync them."""
+    by_month: Dict[date, List[str]] = {}
+    for row in rows:
+        by_month.setdefault(_month_start(row.created_at), []).append(json.dumps(_row_to_record(row)))
+    ATTEMPT_ARCHIVE_DIR.mkdir(parents=True, exist_ok=True)
+    for month, lines in by_month.items():
+        with open(archive_path(month), "ab") as raw:
+            with gzip.GzipFile(fileobj=raw, mode="ab") as gz:
+                gz.write(("\n".join(lines) + "\n").encode("utf-8"))
+            raw.flush()
+            os.fsync(raw.fileno())
+    return sorted(by_month)
+
+
+def _summarise(db: Session, rows) -> None:
+    acc: Dict[SummaryKey, dict] = {}
+    for row in rows:
+        key = (int(row.user_id), int(row.challenge_id), _month_start(row.created_at))
+        item = acc.get(key)
+        if item is None:
+            item = acc[key] = {
+                "user_id": key[0], "challenge_id": key[1], "month": key[2],
+                "attempts": 0, "passes": 0, "xp_awarded": 0,
+                "first_attempt_at": row.created_at, "last_attempt_at": row.created_at,
+                "max_attempt_id": int(row.id),
+            }
+        item["attempts"] += 1
+        item["passes"] += 1 if row.is_passed else 0
+        item["xp_awarded"] += int(row.xp_awarded or 0)
+        item["first_attempt_at"] = min(item["first_attempt_at"], row.created_at)
+        item["last_attempt_at"] = max(item["last_attempt_at"], row.created_at)
+        item["max_attempt_id"] = max(item["max_attempt_id"], int(row.id))
+
+    summary = models.AttemptArchiveSummary
+    for values in acc.values():
+        upsert(
+            db,
+            summary,
+            values,
+            ("user_id", "challenge_id", "month"),
+            lambda incoming: {
+                "attempts": summary.attempts + incoming.attempts,
+                "passes": summary.passes + incoming.passes,
+                "xp_awarded": summary.xp_awarded + incoming.xp_awarded,
+                "first_attempt_at": case(
+                    (incoming.first_attempt_at < summary.first_attempt_at, incoming.first_attempt_at),
+                    else_=summary.first_attempt_at,
+                ),
+                "last_attempt_at": case(
+                    (incoming.last_attempt_at > summary.last_attempt_at, incoming.last_attempt_at),
+                    else_=summary.last_attempt_at,
+                ),
+                "max_attempt_id": case(
+                    (incoming.max_attempt_id > summary.max_attempt_id, incoming.max_attempt_id),
+                    else_=summary.max_attempt_id,
+                ),
+            },
+        )
+
+
+def archive_attempts(
+    db: Session,
+    before: Optional[datetime] = None,
+    max_batches: Optional[int] = None,
+    batch_size: int = ATTEMPT_ARCHIVE_BATCH_SIZE,
+    progress: Optional[Callable[[float, str], None]] = None,
+) -> dict:
+    """Move settled attempts older than the cutoff to disk and summaries, one transaction per batch."""
+    cutoff = before or retention_cutoff()
+    if cutoff is None:
+        return {"archived_attempts": 0, "batches": 0, "cutoff": None, "months": []}
+    if not archive_dir_persistent():
+        raise RuntimeError(
+            f"{ATTEMPT_ARCHIVE_DIR} is on {_mount_fs_type(ATTEMPT_ARCHIVE_DIR)}, which does not survive "
+            "the container; mount a volume there (or set ATTEMPT_ARCHIVE_ALLOW_EPHEMERAL=1). "
+            "No attempts were archived."
+        )
+
+    watermark_id = int(_get_watermark(db, models.ATTEMPT_ROLLUP_WATERMARK).last_id or 0)
+    eligible = (
+        cm.ChallengeAttempt.id <= watermark_id,
+        cm.ChallengeAttempt.created_at < cutoff,
+    )
+    total = int(db.query(func.count(cm.ChallengeAttempt.id)).filter(*eligible).scalar() or 0)
+    db.commit()
+
+    archived = 0
+    batches = 0
+    months = set()
+    while total and (max_batches is None or batches < max_batches):
+        rows = (
+            db.query(*_ARCHIVE_COLUMNS)
+            .filter(*eligible)
+            .order_by(cm.ChallengeAttempt.id)
+            .limit(batch_size)
+            .all()
+        )
+        if not rows:
+            break
+        months.update(_write_archive(rows))
+        _summarise(db, rows)
+        db.query(cm.ChallengeAttempt).filter(
+            cm.ChallengeAttempt.id.in_([int(row.id) for row in rows])
+        ).delete(synchronize_session=False)
+        db.commit()
+
+        archived += len(rows)
+        batches += 1
+        if progress:
+            progress(min(99.0, archived * 100.0 / total), f"Archived {archived} of {total} attempts")
+        if len(rows) < batch_size:
+            break
+
+    return {
+        "archived_attempts": archived,
+        "batches": batches,
+        "cutoff": cutoff.isoformat(),
+        "months": [f"{month:%Y-%m}" for month in sorted(months)],
+    }
+
+
+def get_archive_status(db: Session) -> schemas.AttemptArchiveStatusOut:
+    totals = db.query(
+        func.count(),
+        func.coalesce(func.sum(models.AttemptArchiveSummary.attempts), 0),
+    ).select_from(models.AttemptArchiveSummary).one()
+    files = []
+    if ATTEMPT_ARCHIVE_DIR.is_dir():
+        for path in sorted(ATTEMPT_ARCHIVE_DIR.glob("challenge_attempts-*.jsonl.gz")):
+            stat = path.stat()
+            files.append(schemas.AttemptArchiveFileOut(
+                name=path.name,
+                size_bytes=stat.st_size,
+                modified_at=datetime.fromtimestamp(stat.st_mtime, tz=timezone.utc),
+            ))
+    return schemas.AttemptArchiveStatusOut(
+        retention_days=ATTEMPT_RETENTION_DAYS,
+        cutoff=retention_cutoff(),
+        archive_dir=str(ATTEMPT_ARCHIVE_DIR),
+        archive_dir_persistent=archive_dir_persistent(),
+        summary_rows=int(totals[0] or 0),
+        archived_attempts=int(totals[1] or 0),
+        files=files,
+    )
+
+
+@job_handler(ATTEMPT_ARCHIVE_JOB, payload_model=schemas.AttemptArchivePayload)
+def _run_attempt_archive_job(ctx: JobContext, payload: schemas.AttemptArchivePayload) -> dict:
+    """Catch the rollups up first so everything below the cutoff is eligible, then archive."""
+    ctx.progress(0, "Refreshing attempt rollups")
+    refresh_attempt_rollups(ctx.db)
+    before = datetime.combine(payload.before, datetime.min.time()) if payload.before else None
+    return archive_attempts(ctx.db, before=before, max_batches=payload.max_batches, progress=ctx.progress)
+
+
+periodic_job(ATTEMPT_ARCHIVE_JOB, ATTEMPT_ARCHIVE_INTERVAL_SECONDS if ATTEMPT_RETENTION_DAYS > 0 else 0)
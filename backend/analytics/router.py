@@ -0,0 +1,100 @@
+"""
+analytics/router.py — Campus404
+Admin analytics API. Reads only the pre-aggregated attempt rollups.
+"""
+from datetime import datetime
+from typing import Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from jose import JWTError, jwt
+from sqlalchemy.orm import Session
+
+from authentications.security import ALGORITHM, SECRET_KEY
+from database import get_db
+from curriculum import attempt_buffer
+import models as user_models
+from . import retention, schemas, services
+
+router = APIRouter()
+
+
+def _require_admin(request: Request, db: Session) -> user_models.User:
+    auth = request.headers.get("Authorization", "")
+    if not auth.startswith("Bearer "):
+        raise HTTPException(status_code=401, detail="Not authenticated.")
+    try:
+        payload = jwt.decode(auth[7:], SECRET_KEY, algorithms=[ALGORITHM])
+        user_id = payload.get("id")
+    except JWTError:
+        raise HTTPException(status_code=401, detail="Invalid token.")
+
+    user = db.query(user_models.User).filter(user_models.User.id == user_id).first()
+    if not user:
+        raise HTTPException(status_code=401, detail="User not found.")
+    if not user.is_admin:
+        raise HTTPException(status_code=403, detail="Admin access required.")
+    return user
+
+
+@router.get("/rollups/status", response_model=schemas.RollupStatusOut)
+def get_rollup_status(request: Request, db: Session = Depends(get_db)):
+    _require_admin(request, db)
+    return services.get_rollup_status(db)
+
+
+@router.post("/rollups/refresh", response_model=schemas.RollupRefreshOut)
+def refresh_rollups(
+    request: Request,
+    max_batches: int = Query(20, ge=1, le=500),
+    db: Session = Depends(get_db),
+):
+    _require_admin(request, db)
+    return services.refresh_attempt_rollups(db, max_batches=max_batches)
+
+
+@router.get("/attempt-buffer", response_model=schemas.AttemptBufferStatsOut)
+def get_attempt_buffer_stats(request: Request, db: Session = Depends(get_db)):
+    """Write-behind metrics for Run attempts in this process (rejected rows were written synchronously)."""
+    _require_admin(request, db)
+    return attempt_buffer.buffer.stats()
+
+
+@router.post("/attempt-buffer/flush", response_model=schemas.AttemptBufferStatsOut)
+def flush_attempt_buffer(request: Request, db: Session = Depends(get_db)):
+    _require_admin(request, db)
+    attempt_buffer.flush_attempt_buffer()
+    return attempt_buffer.buffer.stats()
+
+
+@router.get("/attempt-archive", response_model=schemas.AttemptArchiveStatusOut)
+def get_attempt_archive_status(request: Request, db: Session = Depends(get_db)):
+    _require_admin(request, db)
+    return retention.get_archive_status(db)
+
+
+@router.get("/{scope_type}/{scope_id}/series", response_model=schemas.RollupSeriesOut)
+def get_rollup_series(
+    scope_type: schemas.ScopeType,
+    scope_id: int,
+    request: Request,
+    granularity: schemas.Granularity = Query("day"),
+    start: Optional[datetime] = Query(None),
+    end: Optional[datetime] = Query(None),
+    db: Session = Depends(get_db),
+):
+    _require_admin(request, db)
+    return services.get_rollup_series(db, scope_type, scope_id, granularity, start, end)
+
+
+@router.get("/{scope_type}/{scope_id}/summary", response_model=schemas.RollupSummaryOut)
+def get_rollup_summary(
+    scope_type: schemas.ScopeType,
+    scope_id: int,
+    request: Request,
+    granularity: schemas.Granularity = Query("day"),
+    start: Optional[datetime] = Query(None),
+    end: Optional[datetime] = Query(None),
+    db: Session = Depends(get_db),
+):
+    _require_admin(request, db)
+    return services.get_rollup_summary(db, scope_type, scope_id, granularity, start, end)
@@ -0,0 +1,97 @@
+"""
+analytics/schemas.py — Campus404
+Pydantic schemas for the admin analytics API.
+"""
+from datetime import date, datetime
+from typing import Dict, List, Literal, Optional
+
+from pydantic import BaseModel, Field
+
+Granularity = Literal["hour", "day"]
+ScopeType = Literal["challenge", "module", "lab"]
+
+
+class RollupBucketOut(BaseModel):
+    bucket_start: datetime
+    attempts: int
+    passes: int
+    first_passes: int
+    distinct_users: int
+    pass_rate: float
+    median_attempts_to_pass: Optional[float]
+    status_histogram: Dict[str, int]
+
+
+class RollupSeriesOut(BaseModel):
+    scope_type: ScopeType
+    scope_id: int
+    granularity: Granularity
+    start: Optional[datetime]
+    end: Optional[datetime]
+    buckets: List[RollupBucketOut]
+
+
+class RollupSummaryOut(BaseModel):
+    scope_type: ScopeType
+    scope_id: int
+    granularity: Granularity
+    start: Optional[datetime]
+    end: Optional[datetime]
+    bucket_count: int
+    attempts: int
+    passes: int
+    first_passes: int
+    distinct_users: int
+    pass_rate: float
+    median_attempts_to_pass: Optional[float]
+    status_histogram: Dict[str, int]
+
+
+class RollupStatusOut(BaseModel):
+    watermark_id: int
+    watermark_updated_at: Optional[datetime]
+
+
+class RollupRefreshOut(BaseModel):
+    processed_attempts: int
+    batches: int
+    watermark_id: int
+
+
+class AttemptBufferStatsOut(BaseModel):
+    enabled: bool
+    running: bool
+    pending: int
+    capacity: int
+    batch_size: int
+    flush_interval_seconds: float
+    enqueued: int
+    written: int
+    rejected: int
+    dropped: int
+    flushes: int
+    failed_flushes: int
+    last_flush_at: Optional[datetime]
+    last_error: Optional[str]
+
+
+class AttemptArchivePayload(BaseModel):
+    # Archive attempts created before this day instead of the retention cutoff.
+    before: Optional[date] = None
+    max_batches: Optional[int] = Field(None, ge=1)
+
+
+class AttemptArchiveFileOut(BaseModel):
+    name: str
+    size_bytes: int
+    modified_at: datetime
+
+
+class AttemptArchiveStatusOut(BaseModel):
+    retention_days: int
+    cutoff: Optional[datetime]
+    archive_dir: str
+    archive_dir_persistent: bool
+    summary_rows: int
+    archived_attempts: int
+    files: List[AttemptArchiveFileOut]
@@ -0,0 +1,440 @@
+"""
+analytics/services.py — Campus404
+Incremental attempt rollups: fold new ChallengeAttempt rows (by id high-water mark)
+into hourly/daily buckets per challenge, module and lab. Read paths touch rollups only.
+"""
+import json
+import os
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import func, insert
+from sqlalchemy.orm import Session
+
+import curriculum.models as cm
+from jobs.services import JobContext, job_handler, periodic_job
+from . import models, schemas
+
+ROLLUP_BATCH_SIZE = 5000
+# Rows younger than this may still belong to an uncommitted transaction with a lower id,
+# so the watermark never advances past them.
+ROLLUP_SETTLE_SECONDS = 30
+ANALYTICS_REFRESH_SECONDS = float(os.getenv("ANALYTICS_REFRESH_SECONDS", "60"))
+ROLLUP_REFRESH_JOB = "analytics.refresh_rollups"
+
+RollupKey = Tuple[str, str, int, datetime]
+
+
+def _utcnow_naive() -> datetime:
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+def _as_naive_utc(value: datetime) -> datetime:
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+
+def bucket_start(value: datetime, granularity: str) -> datetime:
+    value = _as_naive_utc(value)
+    if granularity == models.GRANULARITY_DAY:
+        return value.replace(hour=0, minute=0, second=0, microsecond=0)
+    return value.replace(minute=0, second=0, microsecond=0)
+
+
+def _load_counter(raw: Optional[str]) -> Counter:
+    if not raw:
+        return Counter()
+    try:
+        parsed = json.loads(raw)
+    except Exception:
+        return Counter()
+    if not isinstance(parsed, dict):
+        return Counter()
+    return Counter({str(k): int(v) for k, v in parsed.items()})
+
+
+def _dump_counter(counter: Counter) -> str:
+    return json.dumps(
+        {k: int(v) for k, v in sorted(counter.items(), key=lambda kv: int(kv[0])) if v},
+        separators=(",", ":"),
+    )
+
+
+def median_from_histogram(histogram: Dict[str, int]) -> Optional[float]:
+    total = sum(int(v) for v in histogram.values())
+    if total <= 0:
+        return None
+
+    ordered = sorted((int(k), int(v)) for k, v in histogram.items() if int(v) > 0)
+    lower_rank = (total - 1) // 2
+    upper_rank = total // 2
+    lower = upper = None
+    seen = 0
+    for value, count in ordered:
+        if lower is None and lower_rank < seen + count:
+            lower = value
+        if upper_rank < seen + count:
+            upper = value
+            break
+        seen += count
+    return (lower + upper) / 2.0
+
+
+def _get_watermark(db: Session, name: str, for_update: bool = False) -> models.RollupWatermark:
+    q = db.query(models.RollupWatermark).filter(models.RollupWatermark.name == name)
+    if for_update:
+        q = q.with_for_update()
+    mark = q.first()
+    if mark:
+        return mark
+
+    mark = models.RollupWatermark(name=name, last_id=0)
+    db.add(mark)
+    db.flush()
+    return mark
+
+
+def _fetch_attempt_batch(db: Session, after_id: int, limit: int):
+    return (
+        db.query(
+            cm.ChallengeAttempt.id,
+            cm.ChallengeAttempt.user_id,
+            cm.ChallengeAttempt.challenge_id,
+            cm.ChallengeAttempt.attempt_number,
+            cm.ChallengeAttempt.status_id,
+            cm.ChallengeAttempt.is_passed,
+            cm.ChallengeAttempt.created_at,
+            cm.Challenge.module_id,
+            cm.Module.lab_id,
+        )
+        .join(cm.Challenge, cm.Challenge.id == cm.ChallengeAttempt.challenge_id)
+        .join(cm.Module, cm.Module.id == cm.Challenge.module_id)
+        .filter(cm.ChallengeAttempt.id > after_id)
+        .order_by(cm.ChallengeAttempt.id.asc())
+        .limit(limit)
+        .all()
+    )
+
+
+def _first_pass_ids(db: Session, rows) -> set:
+    """Ids of attempts that are the earliest passing attempt for their (user, challenge)."""
+    passed = [row for row in rows if row.is_passed]
+    if not passed:
+        return set()
+
+    user_ids = {int(row.user_id) for row in passed}
+    challenge_ids = {int(row.challenge_id) for row in passed}
+    first_rows = (
+        db.query(func.min(cm.ChallengeAttempt.id))
+        .filter(
+            cm.ChallengeAttempt.is_passed == True,
+            cm.ChallengeAttempt.user_id.in_(user_ids),
+            cm.ChallengeAttempt.challenge_id.in_(challenge_ids),
+        )
+        .group_by(cm.ChallengeAttempt.user_id, cm.ChallengeAttempt.challenge_id)
+        .all()
+    )
+    # A pass that was archived out of the hot table still came first.
+    archived_passes = {
+        (int(row.user_id), int(row.challenge_id))
+        for row in db.query(models.AttemptArchiveSummary.user_id, models.AttemptArchiveSummary.challenge_id)
+        .filter(
+            models.AttemptArchiveSummary.passes > 0,
+            models.AttemptArchiveSummary.user_id.in_(user_ids),
+            models.AttemptArchiveSummary.challenge_id.in_(challenge_ids),
+        )
+        .distinct()
+    }
+    first_ids = {int(row[0]) for row in first_rows}
+    return {
+        int(row.id) for row in passed
+        if int(row.id) in first_ids and (int(row.user_id), int(row.challenge_id)) not in archived_passes
+    }
+
+
+def _aggregate_batch(rows, first_pass_ids: set) -> Dict[RollupKey, dict]:
+    acc: Dict[RollupKey, dict] = {}
+    for row in rows:
+        scopes = (
+            (models.SCOPE_CHALLENGE, int(row.challenge_id)),
+            (models.SCOPE_MODULE, int(row.module_id)),
+            (models.SCOPE_LAB, int(row.lab_id)),
+        )
+        for granularity in models.VALID_GRANULARITIES:
+            start = bucket_start(row.created_at, granularity)
+            for scope_type, scope_id in scopes:
+                key = (granularity, scope_type, scope_id, start)
+                item = acc.get(key)
+                if item is None:
+                    item = acc[key] = {
+                        "attempts": 0,
+                        "passes": 0,
+                        "first_passes": 0,
+                        "users": set(),
+                        "attempts_to_pass": Counter(),
+                        "statuses": Counter(),
+                    }
+                item["attempts"] += 1
+                item["users"].add(int(row.user_id))
+                item["statuses"][str(int(row.status_id or 0))] += 1
+                if row.is_passed:
+                    item["passes"] += 1
+                if int(row.id) in first_pass_ids:
+                    item["first_passes"] += 1
+                    item["attempts_to_pass"][str(int(row.attempt_number or 1))] += 1
+    return acc
+
+
+def _merge_into_rollups(db: Session, acc: Dict[RollupKey, dict]) -> None:
+    if not acc:
+        return
+
+    starts = {key[3] for key in acc}
+    scope_ids = {key[2] for key in acc}
+    existing = {
+        (row.granularity, row.scope_type, int(row.scope_id), _as_naive_utc(row.bucket_start)): row
+        for row in db.query(models.AttemptRollup)
+        .filter(
+            models.AttemptRollup.bucket_start.in_(starts),
+            models.AttemptRollup.scope_id.in_(scope_ids),
+        )
+        .all()
+    }
+
+    rollups: Dict[RollupKey, models.AttemptRollup] = {}
+    for key, item in acc.items():
+        row = existing.get(key)
+        if row is None:
+            granularity, scope_type, scope_id, start = key
+            row = models.AttemptRollup(
+                granularity=granularity,
+                scope_type=scope_type,
+                scope_id=scope_id,
+                bucket_start=start,
+                attempts=0,
+                passes=0,
+                first_passes=0,
+                distinct_users=0,
+            )
+            db.add(row)
+
+        row.attempts = int(row.attempts or 0) + item["attempts"]
+        row.passes = int(row.passes or 0) + item["passes"]
+        row.first_passes = int(row.first_passes or 0) + item["first_passes"]
+        row.attempts_to_pass_json = _dump_counter(_load_counter(row.attempts_to_pass_json) + item["attempts_to_pass"])
+        row.status_histogram_json = _dump_counter(_load_counter(row.status_histogram_json) + item["statuses"])
+        rollups[key] = row
+
+    db.flush()
+
+    rollup_ids = [row.id for row in rollups.values()]
+    batch_user_ids = set().union(*(item["users"] for item in acc.values()))
+    seen_pairs = {
+        (int(rollup_id), int(user_id))
+        for rollup_id, user_id in db.query(
+            models.AttemptRollupUser.rollup_id,
+            models.AttemptRollupUser.user_id,
+        )
+        .filter(
+            models.AttemptRollupUser.rollup_id.in_(rollup_ids),
+            models.AttemptRollupUser.user_id.in_(batch_user_ids),
+        )
+        .all()
+    }
+
+    new_pairs: List[dict] = []
+    for key, item in acc.items():
+        row = rollups[key]
+        fresh = [uid for uid in item["users"] if (row.id, uid) not in seen_pairs]
+        row.distinct_users = int(row.distinct_users or 0) + len(fresh)
+        new_pairs.extend({"rollup_id": row.id, "user_id": uid} for uid in fresh)
+
+    if new_pairs:
+        db.execute(insert(models.AttemptRollupUser), new_pairs)
+
+
+def refresh_attempt_rollups(
+    db: Session,
+    max_batches: Optional[int] = None,
+    batch_size: int = ROLLUP_BATCH_SIZE,
+) -> schemas.RollupRefreshOut:
+    """Fold every settled attempt above the watermark into the rollups, one transaction per batch."""
+    processed = 0
+    batches = 0
+    last_id = 0
+
+    while max_batches is None or batches < max_batches:
+        mark = _get_watermark(db, models.ATTEMPT_ROLLUP_WATERMARK, for_update=True)
+        last_id = int(mark.last_id or 0)
+        rows = _fetch_attempt_batch(db, last_id, batch_size)
+
+        cutoff = _utcnow_naive() - timedelta(seconds=ROLLUP_SETTLE_SECONDS)
+        settled = []
+        for row in rows:
+            if _as_naive_utc(row.created_at) > cutoff:
+                break
+            settled.append(row)
+
+        if not settled:
+            db.commit()
+            break
+
+        _merge_into_rollups(db, _aggregate_batch(settled, _first_pass_ids(db, settled)))
+        last_id = int(settled[-1].id)
+        mark.last_id = last_id
+        db.commit()
+
+        processed += len(settled)
+        batches += 1
+        if len(settled) < len(rows) or len(rows) < batch_size:
+            break
+
+    return schemas.RollupRefreshOut(processed_attempts=processed, batches=batches, watermark_id=last_id)
+
+
+@job_handler(ROLLUP_REFRESH_JOB)
+def _run_rollup_refresh_job(ctx: JobContext, payload: dict) -> dict:
+    """Drain the attempt backlog one batch per transaction, reporting progress between batches."""
+    mark = _get_watermark(ctx.db, models.ATTEMPT_ROLLUP_WATERMARK)
+    start_id = int(mark.last_id or 0)
+    backlog = int(
+        ctx.db.query(func.count(cm.ChallengeAttempt.id)).filter(cm.ChallengeAttempt.id > start_id).scalar() or 0
+    )
+    ctx.db.commit()
+
+    processed = 0
+    batches = 0
+    watermark_id = start_id
+    while True:
+        step = refresh_attempt_rollups(ctx.db, max_batches=1)
+        watermark_id = step.watermark_id
+        if not step.batches:
+            break
+        processed += step.processed_attempts
+        batches += step.batches
+        ctx.progress(processed / backlog * 100.0 if backlog else 100.0, f"{processed}/{backlog} attempts")
+    return {"processed_attempts": processed, "batches": batches, "watermark_id": watermark_id}
+
+
+# The admin analytics endpoints read rollups only, so keep them caught up in the background.
+periodic_job(ROLLUP_REFRESH_JOB, ANALYTICS_REFRESH_SECONDS)
+
+
+def get_rollup_status(db: Session) -> schemas.RollupStatusOut:
+    mark = (
+        db.query(models.RollupWatermark)
+        .filter(models.RollupWatermark.name == models.ATTEMPT_ROLLUP_WATERMARK)
+        .first()
+    )
+    return schemas.RollupStatusOut(
+        watermark_id=int(mark.last_id or 0) if mark else 0,
+        watermark_updated_at=mark.updated_at if mark else None,
+    )
+
+
+def _series_rows(
+    db: Session,
+    scope_type: str,
+    scope_id: int,
+    granularity: str,
+    start: Optional[datetime],
+    end: Optional[datetime],
+) -> List[models.AttemptRollup]:
+    q = db.query(models.AttemptRollup).filter(
+        models.AttemptRollup.scope_type == scope_type,
+        models.AttemptRollup.scope_id == scope_id,
+        models.AttemptRollup.granularity == granularity,
+    )
+    if start is not None:
+        q = q.filter(models.AttemptRollup.bucket_start >= bucket_start(start, granularity))
+    if end is not None:
+        q = q.filter(models.AttemptRollup.bucket_start < _as_naive_utc(end))
+    return q.order_by(models.AttemptRollup.bucket_start.asc()).all()
+
+
+def _pass_rate(attempts: int, passes: int) -> float:
+    return round((passes / attempts) * 100.0, 2) if attempts > 0 else 0.0
+
+
+def get_rollup_series(
+    db: Session,
+    scope_type: str,
+    scope_id: int,
+    granularity: str,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+) -> schemas.RollupSeriesOut:
+    buckets = []
+    for row in _series_rows(db, scope_type, scope_id, granularity, start, end):
+        attempts_to_pass = _load_counter(row.attempts_to_pass_json)
+        buckets.append(
+            schemas.RollupBucketOut(
+                bucket_start=row.bucket_start,
+                attempts=int(row.attempts or 0),
+                passes=int(row.passes or 0),
+                first_passes=int(row.first_passes or 0),
+                distinct_users=int(row.distinct_users or 0),
+                pass_rate=_pass_rate(int(row.attempts or 0), int(row.passes or 0)),
+                median_attempts_to_pass=median_from_histogram(attempts_to_pass),
+                status_histogram=dict(_load_counter(row.status_histogram_json)),
+            )
+        )
+
+    return schemas.RollupSeriesOut(
+        scope_type=scope_type,
+        scope_id=scope_id,
+        granularity=granularity,
+        start=start,
+        end=end,
+        buckets=buckets,
+    )
+
+
+def _distinct_users_across(db: Session, rollup_ids: Iterable[int]) -> int:
+    rollup_ids = list(rollup_ids)
+    if not rollup_ids:
+        return 0
+    return int(
+        db.query(func.count(func.distinct(models.AttemptRollupUser.user_id)))
+        .filter(models.AttemptRollupUser.rollup_id.in_(rollup_ids))
+        .scalar()
+        or 0
+    )
+
+
+def get_rollup_summary(
+    db: Session,
+    scope_type: str,
+    scope_id: int,
+    granularity: str,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+) -> schemas.RollupSummaryOut:
+    rows = _series_rows(db, scope_type, scope_id, granularity, start, end)
+
+    attempts = sum(int(row.attempts or 0) for row in rows)
+    passes = sum(int(row.passes or 0) for row in rows)
+    first_passes = sum(int(row.first_passes or 0) for row in rows)
+    attempts_to_pass: Counter = Counter()
+    statuses: Counter = Counter()
+    for row in rows:
+        attempts_to_pass += _load_counter(row.attempts_to_pass_json)
+        statuses += _load_counter(row.status_histogram_json)
+
+    return schemas.RollupSummaryOut(
+        scope_type=scope_type,
+        scope_id=scope_id,
+        granularity=granularity,
+        start=start,
+        end=end,
+        bucket_count=len(rows),
+        attempts=attempts,
+        passes=passes,
+        first_passes=first_passes,
+        distinct_users=_distinct_users_across(db, (row.id for row in rows)),
+        pass_rate=_pass_rate(attempts, passes),
+        median_attempts_to_pass=median_from_histogram(attempts_to_pass),
+        status_histogram=dict(statuses),
+    )
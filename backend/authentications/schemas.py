@@ -11,6 +11,7 @@ class RegisterRequest(BaseModel):
     password: str
     first_name: str = ""
     last_name: str = ""
+    time_zone: Optional[str] = None  # IANA name, e.g. "Europe/Berlin"; streak days use UTC when unset
 
 class TokenResponse(BaseModel):
     access_token: str
@@ -2,6 +2,7 @@ from sqlalchemy.orm import Session
 from fastapi import HTTPException, status
 from authentications import schemas, security
 import models
+from progress.streaks import validate_time_zone
 
 def authenticate_user(db: Session, login_data: schemas.LoginRequest) -> models.User:
     # Look up user by email or username
@@ -50,6 +51,13 @@ def register_user(db: Session, reg_data: schemas.RegisterRequest) -> models.User
             detail="Email already registered"
         )
     
+    time_zone = None
+    if reg_data.time_zone:
+        try:
+            time_zone = validate_time_zone(reg_data.time_zone)
+        except ValueError as exc:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(exc))
+
     # Create new user with all profile fields — username saved as lowercase
     hashed_pwd = security.get_password_hash(reg_data.password)
     new_user = models.User(
@@ -58,6 +66,7 @@ def register_user(db: Session, reg_data: schemas.RegisterRequest) -> models.User
         hashed_password=hashed_pwd,
         first_name=reg_data.first_name.strip() or None,
         last_name=reg_data.last_name.strip() or None,
+        time_zone=time_zone,
     )
     
     db.add(new_user)
@@ -0,0 +1,138 @@
+"""
+bench_deferred.py — Campus404
+Measures memory and latency of curriculum listing paths on a lab with large level bodies,
+comparing the deferred Text columns against loading them eagerly as before.
+
+Run inside the backend container: python bench_deferred.py [modules] [levels] [body_kb]
+A throwaway SQLite database is used; the configured database is not touched.
+"""
+import os
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+
+_db_dir = tempfile.mkdtemp(prefix="campus404-bench-")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_db_dir, 'bench.sqlite')}"
+_backend_dir = os.path.dirname(os.path.abspath(__file__))
+for _path in (_backend_dir, os.path.dirname(_backend_dir)):  # backend modules + repo-root 'sandbox'
+    if _path not in sys.path:
+        sys.path.insert(0, _path)
+
+from sqlalchemy import event, insert
+from sqlalchemy.orm import defaultload, selectinload
+from starlette.requests import Request
+
+from database import Base, SessionLocal, engine
+import curriculum.models as cm
+import curriculum.services as curriculum_services
+import guide.models  # noqa: F401  (Module.guide relationship)
+import models  # noqa: F401  (users table for foreign keys)
+
+ROUNDS = 5
+FILES_PER_LEVEL = 3
+
+
+def seed(modules: int, levels: int, body_kb: int) -> int:
+    Base.metadata.create_all(bind=engine)
+    body = "<p>" + ("lorem ipsum dolor sit amet " * (body_kb * 1024 // 27)) + "</p>"
+    source = "print('hello')\n" * (body_kb * 1024 // 15)
+    db = SessionLocal()
+    try:
+        lab = cm.Lab(title="Bench", slug="bench", is_published=True)
+        db.add(lab)
+        db.flush()
+        for m in range(modules):
+            module = cm.Module(lab_id=lab.id, title=f"Module {m}", slug=f"module-{m}", unique_id=f"b{m:03d}", order_index=m)
+            db.add(module)
+            db.flush()
+            group = cm.ChallengeGroup(module_id=module.id, title="Practice", order_index=0)
+            db.add(group)
+            db.flush()
+            rows = [
+                {
+                    "module_id": module.id, "challenge_group_id": group.id, "level_number": n,
+                    "challenge_type": cm.CHALLENGE_TYPE_LEVEL, "xp_reward": 50,
+                    "expected_output": body, "content_html": body, "is_published": True,
+                }
+                for n in range(1, levels + 1)
+            ]
+            db.execute(insert(cm.Challenge), rows)
+            level_ids = [row.id for row in db.query(cm.Challenge.id).filter(cm.Challenge.module_id == module.id)]
+            db.execute(insert(cm.ChallengeFile), [
+                {
+                    "challenge_id": level_id, "filename": f"file{i}.py", "content": source,
+                    "content_hash": cm.content_hash(source), "is_main": i == 0, "order_index": i,
+                }
+                for level_id in level_ids for i in range(FILES_PER_LEVEL)
+            ])
+        db.commit()
+        return lab.id
+    finally:
+        db.close()
+
+
+def measure(label: str, fn) -> None:
+    statements = []
+
+    def count(*_args):
+        statements.append(1)
+
+    event.listen(engine, "before_cursor_execute", count)
+    try:
+        elapsed = 0.0
+        peak = 0
+        for _ in range(ROUNDS):
+            db = SessionLocal()
+            tracemalloc.start()
+            start = time.perf_counter()
+            fn(db)
+            elapsed += time.perf_counter() - start
+            peak = max(peak, tracemalloc.get_traced_memory()[1])
+            tracemalloc.stop()
+            db.close()
+    finally:
+        event.remove(engine, "before_cursor_execute", count)
+    print(f"  {label:<34} {elapsed / ROUNDS * 1000:>9.2f} ms  {peak / 1024 / 1024:>8.2f} MiB peak"
+          f"  {len(statements) // ROUNDS:>4} queries")
+
+
+def main() -> None:
+    args = [int(arg) for arg in sys.argv[1:4]]
+    modules, levels, body_kb = args + [20, 10, 32][len(args):]
+    lab_id = seed(modules, levels, body_kb)
+    request = Request({"type": "http", "scheme": "http", "server": ("bench", 80), "path": "/", "headers": []})
+
+    def listing_eager(db):
+        # Previous _module_to_response: lazy-load every level row, bodies included, to count and sum XP.
+        for module in (
+            db.query(cm.Module)
+            .filter(cm.Module.lab_id == lab_id)
+            .order_by(cm.Module.order_index)
+            .options(defaultload(cm.Module.challenges).undefer_group("content"))
+        ):
+            module.guide, len(module.challenges), sum(c.xp_reward for c in module.challenges)
+
+    def listing_deferred(db):
+        curriculum_services.get_modules(db, request, lab_id)
+
+    def tree(db, *options):
+        for module in db.query(cm.Module).filter(cm.Module.lab_id == lab_id).options(*options):
+            [(c.id, c.level_number, c.xp_reward) for c in module.challenges]
+
+    print(f"[Campus404] Lab: {modules} modules x {levels} levels, {body_kb} KiB bodies, "
+          f"{FILES_PER_LEVEL} files/level; mean of {ROUNDS} rounds")
+    measure("module listing, eager bodies", listing_eager)
+    measure("module listing, aggregates", listing_deferred)
+    measure("progress tree, eager bodies", lambda db: tree(db, selectinload(cm.Module.challenges).undefer_group("content")))
+    measure("progress tree, deferred bodies", lambda db: tree(db, selectinload(cm.Module.challenges)))
+    measure("level content (one group)", lambda db: curriculum_services.get_levels(db, 1))
+
+
+if __name__ == "__main__":
+    try:
+        main()
+    finally:
+        engine.dispose()
+        shutil.rmtree(_db_dir, ignore_errors=True)
@@ -0,0 +1,137 @@
+"""
+bench_payloads.py — Campus404
+Measures payload size and serialization time for a synthetic 40-module lab progress response.
+
+Run inside the backend container: python bench_payloads.py [modules] [groups] [levels]
+No database is touched; the payload is built from the LabProgressOut schema directly.
+"""
+import gzip
+import json
+import os
+import sys
+import time
+
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+_backend_dir = os.path.dirname(os.path.abspath(__file__))
+for _path in (_backend_dir, os.path.dirname(_backend_dir)):  # backend modules + repo-root 'sandbox'
+    if _path not in sys.path:
+        sys.path.insert(0, _path)
+
+from compression import COMPRESSION_BROTLI_QUALITY, COMPRESSION_GZIP_LEVEL, brotli
+from progress.router import (
+    BadgeOut,
+    ChallengeGroupProgressOut,
+    ChallengeProgressOut,
+    LabProgressOut,
+    ModuleProgressOut,
+)
+from responses import orjson
+
+ROUNDS = 50
+
+
+def build_lab(modules: int, groups: int, levels: int) -> LabProgressOut:
+    module_rows = []
+    for m in range(1, modules + 1):
+        group_rows, flat = [], []
+        for g in range(1, groups + 1):
+            level_rows = [
+                ChallengeProgressOut(
+                    challenge_id=m * 10000 + g * 100 + n,
+                    level_number=(g - 1) * levels + n,
+                    challenge_type="exam" if g == groups and n == levels else "standard",
+                    display_title=f"Level {(g - 1) * levels + n}: Practice problem {n}",
+                    xp_reward=50,
+                    is_completed=n % 3 == 0,
+                    is_locked=n % 5 == 0,
+                )
+                for n in range(1, levels + 1)
+            ]
+            flat.extend(level_rows)
+            group_rows.append(ChallengeGroupProgressOut(
+                challenge_id=m * 100 + g,
+                title=f"Challenge {g}",
+                description="Work through each level to master the concepts introduced in this challenge.",
+                order_index=g,
+                total_xp=50 * levels,
+                level_count=levels,
+                completed_levels=levels // 3,
+                levels=level_rows,
+            ))
+        module_rows.append(ModuleProgressOut(
+            module_id=m,
+            unique_id=f"M{m:03d}",
+            slug=f"module-{m}",
+            title=f"Module {m}",
+            description="An introductory module covering syntax, control flow and data structures.",
+            banner_image_path=f"/uploads/modules/module-{m}.webp",
+            banner_url=f"/uploads/modules/module-{m}.webp",
+            order_index=m,
+            total_xp=50 * groups * levels,
+            earned_xp=50 * groups * (levels // 3),
+            progress_percent=33.3,
+            unlock_threshold_percent=70.0,
+            unlock_eligible=False,
+            is_locked=m > 1,
+            is_completed=False,
+            challenge_count=groups * levels,
+            completed_challenges=groups * (levels // 3),
+            challenge_groups=group_rows,
+            badge=BadgeOut(
+                id=m, name=f"Module {m} Badge", description="Awarded for completing the module.",
+                image_url=f"/uploads/badges/{m}.webp", module_id=m, earned_at=None,
+            ),
+            challenges=flat,
+        ))
+    return LabProgressOut(
+        lab_id=1,
+        slug="python",
+        title="Python",
+        description="Learn Python from the ground up.",
+        banner_url="/uploads/labs/python.webp",
+        hero_image_url="/uploads/labs/python-hero.webp",
+        language_id=71,
+        total_xp=sum(row.total_xp for row in module_rows),
+        earned_xp=sum(row.earned_xp for row in module_rows),
+        modules=module_rows,
+    )
+
+
+def timed(fn) -> float:
+    start = time.perf_counter()
+    for _ in range(ROUNDS):
+        fn()
+    return (time.perf_counter() - start) / ROUNDS * 1000
+
+
+def main() -> None:
+    args = [int(arg) for arg in sys.argv[1:4]]
+    modules, groups, levels = args + [40, 4, 5][len(args):]
+    lab = build_lab(modules, groups, levels)
+    data = lab.model_dump(mode="json")
+    body = json.dumps(data, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+    print(f"[Campus404] Lab progress payload: {modules} modules x {groups} challenges x {levels} levels")
+    print(f"  raw                {len(body):>10,} bytes")
+    gz = gzip.compress(body, compresslevel=COMPRESSION_GZIP_LEVEL, mtime=0)
+    print(f"  gzip (level {COMPRESSION_GZIP_LEVEL})     {len(gz):>10,} bytes  ({len(gz) / len(body):.1%})")
+    if brotli is not None:
+        br = brotli.compress(body, quality=COMPRESSION_BROTLI_QUALITY)
+        print(f"  brotli (quality {COMPRESSION_BROTLI_QUALITY}) {len(br):>10,} bytes  ({len(br) / len(body):.1%})")
+    else:
+        print("  brotli             not installed")
+
+    print(f"[Campus404] Serialization, mean of {ROUNDS} rounds")
+    print(f"  model_dump         {timed(lambda: lab.model_dump(mode='json')):>8.2f} ms")
+    print(f"  json.dumps         {timed(lambda: json.dumps(data, ensure_ascii=False, separators=(',', ':'))):>8.2f} ms")
+    if orjson is not None:
+        print(f"  orjson.dumps       {timed(lambda: orjson.dumps(data)):>8.2f} ms")
+    else:
+        print("  orjson.dumps       not installed")
+    print(f"  gzip compress      {timed(lambda: gzip.compress(body, compresslevel=COMPRESSION_GZIP_LEVEL)):>8.2f} ms")
+    if brotli is not None:
+        print(f"  brotli compress    {timed(lambda: brotli.compress(body, quality=COMPRESSION_BROTLI_QUALITY)):>8.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,139 @@
+"""
+compression.py — Campus404
+ASGI response compression (brotli when installed and accepted, else gzip).
+
+Only buffered, compressible responses above a size threshold are encoded. Responses that
+already carry a Content-Encoding (e.g. the cached published-level payload), streaming
+bodies, and paths that return encrypted envelopes are passed through untouched, since
+ciphertext does not compress.
+"""
+import gzip
+import os
+from typing import Iterable, Optional, Tuple
+
+try:
+    import brotli
+except ModuleNotFoundError:  # optional dependency
+    brotli = None
+
+COMPRESSION_ENABLED = os.getenv("COMPRESSION_ENABLED", "1") != "0"
+COMPRESSION_MIN_BYTES = int(os.getenv("COMPRESSION_MIN_BYTES", "1024"))
+COMPRESSION_GZIP_LEVEL = int(os.getenv("COMPRESSION_GZIP_LEVEL", "6"))
+COMPRESSION_BROTLI_QUALITY = int(os.getenv("COMPRESSION_BROTLI_QUALITY", "4"))
+
+# Workspace run/submit return AES-GCM envelopes; the judge proxy returns small payloads.
+DEFAULT_EXCLUDED_PREFIXES = ("/api/workspace/", "/api/judge/", "/uploads/")
+COMPRESSIBLE_TYPES = ("application/json", "text/", "application/javascript", "image/svg+xml")
+
+
+def _header(headers: Iterable[Tuple[bytes, bytes]], name: bytes) -> Optional[bytes]:
+    for key, value in headers:
+        if key.lower() == name:
+            return value
+    return None
+
+
+def _choose_encoding(accept_encoding: str) -> Optional[str]:
+    accepted = {}
+    for part in accept_encoding.lower().split(","):
+        token, _, params = part.strip().partition(";")
+        quality = 1.0
+        if params.strip().startswith("q="):
+            try:
+                quality = float(params.strip()[2:])
+            except ValueError:
+                quality = 0.0
+        if token:
+            accepted[token] = quality
+    if brotli is not None and accepted.get("br", 0) > 0:
+        return "br"
+    if accepted.get("gzip", 0) > 0:
+        return "gzip"
+    return None
+
+
+def compress(body: bytes, encoding: str) -> bytes:
+    if encoding == "br":
+        return brotli.compress(body, quality=COMPRESSION_BROTLI_QUALITY)
+    return gzip.compress(body, compresslevel=COMPRESSION_GZIP_LEVEL, mtime=0)
+
+
+class CompressionMiddleware:
+    def __init__(
+        self,
+        app,
+        minimum_size: int = COMPRESSION_MIN_BYTES,
+        excluded_prefixes: Tuple[str, ...] = DEFAULT_EXCLUDED_PREFIXES,
+    ):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.excluded_prefixes = excluded_prefixes
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not COMPRESSION_ENABLED or scope.get("method") == "HEAD":
+            await self.app(scope, receive, send)
+            return
+        if scope.get("path", "").startswith(self.excluded_prefixes):
+            await self.app(scope, receive, send)
+            return
+        encoding = _choose_encoding((_header(scope["headers"], b"accept-encoding") or b"").decode("latin-1"))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        start_message = None
+        passthrough = False
+
+        async def send_wrapper(message):
+            nonlocal start_message, passthrough
+            if passthrough:
+                await send(message)
+                return
+
+            if message["type"] == "http.response.start":
+                start_message = message
+                return
+
+            if message["type"] != "http.response.body":
+                await send(message)
+                return
+
+            headers = start_message.get("headers", [])
+            body = message.get("body", b"")
+            content_type = (_header(headers, b"content-type") or b"").decode("latin-1").lower()
+            eligible = (
+                not message.get("more_body", False)
+                and _header(headers, b"content-encoding") is None
+                and start_message["status"] not in (204, 304)
+                and len(body) >= self.minimum_size
+                and content_type.startswith(COMPRESSIBLE_TYPES)
+            )
+            if not eligible:
+                passthrough = True
+                await send(start_message)
+                await send(message)
+                return
+
+            compressed = compress(body, encoding)
+            new_headers = [
+                (key, value) for key, value in headers
+                if key.lower() not in (b"content-length", b"vary", b"etag")
+            ]
+            etag = _header(headers, b"etag")
+            if etag is not None:
+                # The encoded body differs byte-for-byte, so a strong validator must be weakened.
+                new_headers.append((b"etag", etag if etag.startswith(b"W/") else b"W/" + etag))
+            vary = _header(headers, b"vary")
+            vary_value = b"Accept-Encoding" if not vary else (
+                vary if b"accept-encoding" in vary.lower() else vary + b", Accept-Encoding"
+            )
+            new_headers += [
+                (b"content-encoding", encoding.encode("latin-1")),
+                (b"content-length", str(len(compressed)).encode("latin-1")),
+                (b"vary", vary_value),
+            ]
+            passthrough = True
+            await send({**start_message, "headers": new_headers})
+            await send({"type": "http.response.body", "body": compressed, "more_body": False})
+
+        await self.app(scope, receive, send_wrapper)
@@ -0,0 +1,274 @@
+"""
+curriculum/attempt_buffer.py — Campus404
+Write-behind buffer for non-scoring ChallengeAttempt rows (workspace Run).
+
+Run attempts award no XP and nothing in the request depends on their row ids, so the
+request only queues them here and makes no write of its own. A flusher thread writes them
+once ATTEMPT_BUFFER_BATCH_SIZE rows are waiting or every ATTEMPT_BUFFER_FLUSH_SECONDS: one
+transaction per batch applies a single user_challenge_stats upsert per (user, level),
+numbers the rows from the new counters and inserts them with one multi-row INSERT. The
+counters therefore never run ahead of challenge_attempts; a row that is dropped (or lost
+in a crash) takes its count with it. The attempt number a Run reports is provisional:
+the stored count plus this process's queued rows for that level.
+
+The queue is bounded: when it is full (or the buffer is not running) offer() returns False
+and the caller writes the row and its counter itself. Pending rows are flushed on
+shutdown. A batch that keeps failing is retried ATTEMPT_BUFFER_RETRIES times and then
+written row by row; rows that still fail are dropped and counted.
+
+The buffer is per process, as are its metrics. Progress resets flush the buffer of the
+worker handling them only; Run rows queued in other workers can still land up to
+ATTEMPT_BUFFER_FLUSH_SECONDS after a reset.
+"""
+import os
+import threading
+from collections import Counter, deque
+from datetime import datetime, timezone
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+from sqlalchemy import insert
+
+from database import SessionLocal
+from . import models
+from .attempts import add_attempt_stats, best_of_statuses
+
+ATTEMPT_BUFFER_ENABLED = os.getenv("ATTEMPT_BUFFER_ENABLED", "1") != "0"
+ATTEMPT_BUFFER_MAX_ROWS = max(1, int(os.getenv("ATTEMPT_BUFFER_MAX_ROWS", "10000")))
+ATTEMPT_BUFFER_BATCH_SIZE = max(1, int(os.getenv("ATTEMPT_BUFFER_BATCH_SIZE", "500")))
+# Keep well below analytics ROLLUP_SETTLE_SECONDS so rollups never skip a late row.
+ATTEMPT_BUFFER_FLUSH_SECONDS = float(os.getenv("ATTEMPT_BUFFER_FLUSH_SECONDS", "1"))
+ATTEMPT_BUFFER_RETRIES = 3
+
+_ATTEMPT_COLUMNS = (
+    "user_id", "challenge_id", "attempt_number", "status_id", "is_passed", "xp_awarded",
+    "correct_answers", "total_questions", "optimization_score", "created_at",
+)
+
+# (rows, failed tries)
+Batch = Tuple[List[Dict[str, Any]], int]
+
+
+class AttemptWriteBuffer:
+    """A bounded in-memory queue of attempt rows with one flusher thread."""
+
+    def __init__(
+        self,
+        max_rows: int = ATTEMPT_BUFFER_MAX_ROWS,
+        batch_size: int = ATTEMPT_BUFFER_BATCH_SIZE,
+        flush_seconds: float = ATTEMPT_BUFFER_FLUSH_SECONDS,
+    ):
+        self.max_rows = max_rows
+        self.batch_size = batch_size
+        self.flush_seconds = flush_seconds
+        self._rows: Deque[Dict[str, Any]] = deque()
+        self._queued_per_level: Counter = Counter()   # (user_id, challenge_id) -> rows not yet written
+        self._retry: Deque[Batch] = deque()
+        self._cond = threading.Condition()
+        self._flush_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._stats = {
+            "enqueued": 0, "written": 0, "rejected": 0, "dropped": 0,
+            "flushes": 0, "failed_flushes": 0,
+        }
+        self._last_flush_at: Optional[datetime] = None
+        self._last_error: Optional[str] = None
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None
+
+    def start(self) -> None:
+        if self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._loop, name="campus404-attempt-flusher", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 10.0) -> None:
+        if self._thread is None:
+            return
+        self._stop.set()
+        with self._cond:
+            self._cond.notify_all()
+        self._thread.join(timeout=timeout)
+        self._thread = None
+        # Last chance for anything queued after the flusher's final pass.
+        self.flush(final=True)
+
+    def offer(self, **values: Any) -> bool:
+        """Queue one attempt row; False means the caller must write it synchronously.
+
+        attempt_number is assigned when the row is written.
+        """
+        row = {column: values.get(column) for column in _ATTEMPT_COLUMNS}
+        row["created_at"] = row["created_at"] or datetime.now(timezone.utc)
+        with self._cond:
+            if self._thread is None or self._stop.is_set() or self._pending() >= self.max_rows:
+                self._stats["rejected"] += 1
+                return False
+            self._rows.append(row)
+            self._queued_per_level[(row["user_id"], row["challenge_id"])] += 1
+            self._stats["enqueued"] += 1
+            if len(self._rows) >= self.batch_size:
+                self._cond.notify()
+        return True
+
+    def flush(self, final: bool = False) -> int:
+        """Write everything queued right now; returns the number of rows written."""
+        written = 0
+        with self._flush_lock:
+            while True:
+                batch = self._take_batch()
+                if batch is None:
+                    break
+                written += self._write(batch, final)
+                if self._retry and not final:
+                    break  # a failing batch waits for the next tick instead of spinning
+        return written
+
+    def queued_for(self, user_id: int, challenge_id: int) -> int:
+        """Rows of this (user, level) queued here and not written yet."""
+        with self._cond:
+            return self._queued_per_level.get((user_id, challenge_id), 0)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._cond:
+            return {
+                "enabled": ATTEMPT_BUFFER_ENABLED,
+                "running": self._thread is not None,
+                "pending": self._pending(),
+                "capacity": self.max_rows,
+                "batch_size": self.batch_size,
+                "flush_interval_seconds": self.flush_seconds,
+                **self._stats,
+                "last_flush_at": self._last_flush_at,
+                "last_error": self._last_error,
+            }
+
+    def _pending(self) -> int:
+        return len(self._rows) + sum(len(rows) for rows, _ in self._retry)
+
+    def _take_batch(self) -> Optional[Batch]:
+        with self._cond:
+            if self._retry:
+                return self._retry.popleft()
+            if not self._rows:
+                return None
+            count = min(self.batch_size, len(self._rows))
+            return [self._rows.popleft() for _ in range(count)], 0
+
+    def _write(self, batch: Batch, final: bool) -> int:
+        rows, tries = batch
+        try:
+            self._insert(rows)
+        except Exception as exc:
+            error = str(exc).splitlines()[0][:500] if str(exc) else type(exc).__name__
+            with self._cond:
+                self._stats["failed_flushes"] += 1
+                self._last_error = error
+            print(f"[Campus404] Attempt buffer flush of {len(rows)} row(s) failed: {error}")
+            if tries + 1 < ATTEMPT_BUFFER_RETRIES and not final:
+                with self._cond:
+                    self._retry.append((rows, tries + 1))
+                return 0
+            return self._write_rows_individually(rows)
+        self._record_flush(len(rows))
+        self._release(rows)
+        return len(rows)
+
+    def _write_rows_individually(self, rows: List[Dict[str, Any]]) -> int:
+        written = 0
+        for row in rows:
+            try:
+                self._insert([row])
+                written += 1
+            except Exception as exc:
+                with self._cond:
+                    self._stats["dropped"] += 1
+                    self._last_error = str(exc).splitlines()[0][:500] if str(exc) else type(exc).__name__
+        if written:
+            self._record_flush(written)
+        self._release(rows)
+        if written < len(rows):
+            print(f"[Campus404] Attempt buffer dropped {len(rows) - written} row(s).")
+        return written
+
+    def _insert(self, rows: List[Dict[str, Any]]) -> None:
+        """Count and write rows in one transaction, numbering them from the new counters."""
+        by_level: Dict[Tuple[int, int], List[Dict[str, Any]]] = {}
+        for row in rows:
+            by_level.setdefault((row["user_id"], row["challenge_id"]), []).append(row)
+        db = SessionLocal()
+        try:
+            # Sorted so concurrent flushers (one per worker) lock counter rows in the same order.
+            for (user_id, challenge_id), level_rows in sorted(by_level.items()):
+                last = add_attempt_stats(
+                    db,
+                    user_id,
+                    challenge_id,
+                    attempts=len(level_rows),
+                    passes=sum(1 for row in level_rows if row["is_passed"]),
+                    best_status_id=best_of_statuses([row["status_id"] for row in level_rows]),
+                    at=max(row["created_at"] for row in level_rows),
+                )
+                first = last - len(level_rows) + 1
+                for offset, row in enumerate(level_rows):
+                    row["attempt_number"] = first + offset
+            db.execute(insert(models.ChallengeAttempt), rows)
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+    def _release(self, rows: List[Dict[str, Any]]) -> None:
+        with self._cond:
+            for row in rows:
+                key = (row["user_id"], row["challenge_id"])
+                self._queued_per_level[key] -= 1
+                if self._queued_per_level[key] <= 0:
+                    del self._queued_per_level[key]
+
+    def _record_flush(self, count: int) -> None:
+        with self._cond:
+            self._stats["written"] += count
+            self._stats["flushes"] += 1
+            self._last_flush_at = datetime.now(timezone.utc)
+
+    def _loop(self) -> None:
+        while not self._stop.is_set():
+            with self._cond:
+                self._cond.wait_for(
+                    lambda: self._stop.is_set() or len(self._rows) >= self.batch_size,
+                    timeout=self.flush_seconds,
+                )
+            try:
+                self.flush()
+            except Exception as exc:
+                print(f"[Campus404] Attempt buffer flusher error: {exc}")
+
+
+buffer = AttemptWriteBuffer()
+
+
+def start_attempt_buffer() -> None:
+    if ATTEMPT_BUFFER_ENABLED:
+        buffer.start()
+
+
+def stop_attempt_buffer() -> None:
+    buffer.stop()
+
+
+def buffer_attempt(**values: Any) -> bool:
+    return buffer.offer(**values)
+
+
+def queued_attempts(user_id: int, challenge_id: int) -> int:
+    return buffer.queued_for(user_id, challenge_id)
+
+
+def flush_attempt_buffer() -> int:
+    return buffer.flush()
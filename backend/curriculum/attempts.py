@@ -0,0 +1,115 @@
+"""
+curriculum/attempts.py — Campus404
+Per-(user, level) attempt counters kept beside the append-only challenge_attempts log.
+
+Each attempt bumps its user_challenge_stats row with one atomic upsert, which also hands
+out the attempt number: the row stays locked until the caller commits, so two tabs
+submitting at once get consecutive numbers instead of racing on MAX(attempt_number).
+The attempt write buffer counts a whole batch of Run attempts per (user, level) at once
+with add_attempt_stats. Nothing here commits.
+"""
+from datetime import datetime, timezone
+from typing import Optional, Sequence
+
+from sqlalchemy import case, or_
+from sqlalchemy.orm import Session
+
+from database import upsert
+from . import models
+
+
+def status_rank(column):
+    """SQL rank of a judge status column (lower is better), see JUDGE_STATUS_RANK."""
+    return case(models.JUDGE_STATUS_RANK, value=column, else_=models.JUDGE_STATUS_RANK_DEFAULT)
+
+
+def better_status(current: Optional[int], candidate: int) -> int:
+    if current is None:
+        return candidate
+    rank = models.JUDGE_STATUS_RANK
+    default = models.JUDGE_STATUS_RANK_DEFAULT
+    return candidate if rank.get(candidate, default) < rank.get(current, default) else current
+
+
+def bump_attempt_stats(
+    db: Session,
+    user_id: int,
+    challenge_id: int,
+    status_id: int,
+    is_passed: bool,
+    at: Optional[datetime] = None,
+) -> int:
+    """Count one attempt and return its attempt number."""
+    return add_attempt_stats(db, user_id, challenge_id, 1, 1 if is_passed else 0, status_id, at)
+
+
+def add_attempt_stats(
+    db: Session,
+    user_id: int,
+    challenge_id: int,
+    attempts: int,
+    passes: int,
+    best_status_id: int,
+    at: Optional[datetime] = None,
+) -> int:
+    """Count several attempts at once and return the new attempt_count (the last attempt number)."""
+    stat = models.UserChallengeStat
+    at = at or datetime.now(timezone.utc)
+    upsert(
+        db,
+        stat,
+        {
+            "user_id": user_id,
+            "challenge_id": challenge_id,
+            "attempt_count": attempts,
+            "pass_count": passes,
+            "best_status_id": best_status_id,
+            "last_attempt_at": at,
+        },
+        ("user_id", "challenge_id"),
+        lambda incoming: {
+            "attempt_count": stat.attempt_count + incoming.attempt_count,
+            "pass_count": stat.pass_count + incoming.pass_count,
+            "best_status_id": case(
+                (
+                    or_(
+                        stat.best_status_id.is_(None),
+                        status_rank(incoming.best_status_id) < status_rank(stat.best_status_id),
+                    ),
+                    incoming.best_status_id,
+                ),
+                else_=stat.best_status_id,
+            ),
+            "last_attempt_at": incoming.last_attempt_at,
+        },
+    )
+    # Our own uncommitted write is visible to us, and the row lock keeps others out.
+    return attempt_count(db, user_id, challenge_id)
+
+
+def attempt_count(db: Session, user_id: int, challenge_id: int) -> int:
+    stat = models.UserChallengeStat
+    return int(
+        db.query(stat.attempt_count)
+        .filter(stat.user_id == user_id, stat.challenge_id == challenge_id)
+        .scalar()
+        or 0
+    )
+
+
+def best_of_statuses(status_ids: Sequence[int]) -> int:
+    best = None
+    for status_id in status_ids:
+        best = better_status(best, status_id)
+    return best
+
+
+def clear_attempt_stats(db: Session, user_ids: Sequence[int], challenge_scope=None) -> int:
+    """Drop counters alongside deleted attempts.
+
+    challenge_scope is a list of level ids or a SELECT of them; None clears every level.
+    """
+    q = db.query(models.UserChallengeStat).filter(models.UserChallengeStat.user_id.in_(user_ids))
+    if challenge_scope is not None:
+        q = q.filter(models.UserChallengeStat.challenge_id.in_(challenge_scope))
+    return int(q.delete(synchronize_session=False) or 0)
@@ -0,0 +1,369 @@
+"""
+curriculum/badge_rules.py — Campus404
+Declarative auto-award rules for standalone badges (badges.rule_json).
+
+A rule is one condition on a user counter, e.g. {"type": "total_xp", "threshold": 1000}
+or {"type": "lab_completed", "lab_id": 3}. Each rule type names the progress events that
+can change its outcome, and the rule index groups the rule badges by those events, so a
+completion only evaluates the rules it can affect. Counters are read lazily, at most once
+per evaluation, and xp / streak rules use the totals already kept on the users row.
+
+Every rule also compiles to a SQL predicate on users.id; the bulk badge grant job uses it
+to backfill a new or edited rule for all existing users in set-based chunks.
+"""
+import json
+import os
+import threading
+import time
+from abc import ABC, abstractmethod
+from datetime import datetime, timezone
+from functools import cached_property
+from typing import Annotated, ClassVar, Dict, FrozenSet, Iterable, List, Literal, Optional, Tuple, Union
+
+from pydantic import BaseModel, Field, TypeAdapter, ValidationError
+from sqlalchemy import and_, func, select
+from sqlalchemy.orm import Session
+
+import models as user_models
+from database import insert_ignore
+from . import models
+
+BADGE_RULES_REFRESH_SECONDS = float(os.getenv("BADGE_RULES_REFRESH_SECONDS", "30"))
+
+BADGE_EVENT_XP = "xp"
+BADGE_EVENT_STREAK = "streak"
+BADGE_EVENT_COMPLETION = "completion"
+
+
+# ── Counters ─────────────────────────────────────────────────────────────────
+class UserCounters:
+    """One user's badge counters for a single evaluation; each is queried on first use."""
+
+    def __init__(self, db: Session, user_id: int):
+        self.db = db
+        self.user_id = user_id
+        self._labs: Dict[int, bool] = {}
+
+    @cached_property
+    def _totals(self) -> Tuple[int, int]:
+        User = user_models.User
+        row = self.db.query(User.total_xp, User.longest_streak).filter(User.id == self.user_id).first()
+        return (int(row[0] or 0), int(row[1] or 0)) if row else (0, 0)
+
+    @property
+    def total_xp(self) -> int:
+        return self._totals[0]
+
+    @property
+    def longest_streak(self) -> int:
+        return self._totals[1]
+
+    @cached_property
+    def levels_completed(self) -> int:
+        return int(
+            self.db.query(func.count(models.ChallengeCompletion.id))
+            .filter(models.ChallengeCompletion.user_id == self.user_id)
+            .scalar()
+            or 0
+        )
+
+    @cached_property
+    def exams_passed(self) -> int:
+        return int(
+            self.db.query(func.count(models.ChallengeCompletion.id))
+            .join(models.Challenge, models.Challenge.id == models.ChallengeCompletion.challenge_id)
+            .filter(
+                models.ChallengeCompletion.user_id == self.user_id,
+                models.Challenge.challenge_type == models.CHALLENGE_TYPE_EXAM,
+            )
+            .scalar()
+            or 0
+        )
+
+    def lab_completed(self, lab_id: int) -> bool:
+        if lab_id not in self._labs:
+            total, completed = self.db.query(
+                func.count(models.Challenge.id),
+                func.count(models.ChallengeCompletion.id),
+            ).select_from(models.Challenge).join(
+                models.Module, models.Module.id == models.Challenge.module_id
+            ).outerjoin(
+                models.ChallengeCompletion,
+                and_(
+                    models.ChallengeCompletion.challenge_id == models.Challenge.id,
+                    models.ChallengeCompletion.user_id == self.user_id,
+                ),
+            ).filter(
+                models.Module.lab_id == lab_id,
+                models.Challenge.is_published == True,
+            ).one()
+            self._labs[lab_id] = bool(total) and int(completed or 0) >= int(total)
+        return self._labs[lab_id]
+
+
+# ── Rule types ───────────────────────────────────────────────────────────────
+class _Rule(BaseModel, ABC):
+    model_config = {"extra": "forbid"}
+
+    events: ClassVar[FrozenSet[str]] = frozenset()
+
+    @abstractmethod
+    def qualifies(self, counters: UserCounters) -> bool:
+        """Whether the user meets the rule, from counters read for this evaluation."""
+
+    @abstractmethod
+    def eligible_clause(self):
+        """SQL predicate on users.id that holds when the user meets the rule."""
+
+    @abstractmethod
+    def describe(self) -> str:
+        """Short condition for messages, e.g. "reach 1000 XP"."""
+
+
+class TotalXpRule(_Rule):
+    type: Literal["total_xp"]
+    threshold: int = Field(..., ge=1)
+
+    events: ClassVar[FrozenSet[str]] = frozenset({BADGE_EVENT_XP})
+
+    def qualifies(self, counters: UserCounters) -> bool:
+        return counters.total_xp >= self.threshold
+
+    def eligible_clause(self):
+        return user_models.User.total_xp >= self.threshold
+
+    def describe(self) -> str:
+        return f"reach {self.threshold} XP"
+
+
+class StreakDaysRule(_Rule):
+    """Met once the user's longest streak reaches the threshold; a later break keeps the badge."""
+    type: Literal["streak_days"]
+    threshold: int = Field(..., ge=1)
+
+    events: ClassVar[FrozenSet[str]] = frozenset({BADGE_EVENT_STREAK})
+
+    def qualifies(self, counters: UserCounters) -> bool:
+        return counters.longest_streak >= self.threshold
+
+    def eligible_clause(self):
+        return user_models.User.longest_streak >= self.threshold
+
+    def describe(self) -> str:
+        return f"keep a {self.threshold}-day streak"
+
+
+class LevelsCompletedRule(_Rule):
+    type: Literal["levels_completed"]
+    threshold: int = Field(..., ge=1)
+
+    events: ClassVar[FrozenSet[str]] = frozenset({BADGE_EVENT_COMPLETION})
+
+    def qualifies(self, counters: UserCounters) -> bool:
+        return counters.levels_completed >= self.threshold
+
+    def eligible_clause(self):
+        completed = (
+            select(func.count(models.ChallengeCompletion.id))
+            .where(models.ChallengeCompletion.user_id == user_models.User.id)
+            .scalar_subquery()
+        )
+        return completed >= self.threshold
+
+    def describe(self) -> str:
+        return f"complete {self.threshold} levels"
+
+
+class ExamsPassedRule(_Rule):
+    type: Literal["exams_passed"]
+    threshold: int = Field(..., ge=1)
+
+    events: ClassVar[FrozenSet[str]] = frozenset({BADGE_EVENT_COMPLETION})
+
+    def qualifies(self, counters: UserCounters) -> bool:
+        return counters.exams_passed >= self.threshold
+
+    def eligible_clause(self):
+        passed = (
+            select(func.count(models.ChallengeCompletion.id))
+            .join(models.Challenge, models.Challenge.id == models.ChallengeCompletion.challenge_id)
+            .where(
+                models.ChallengeCompletion.user_id == user_models.User.id,
+                models.Challenge.challenge_type == models.CHALLENGE_TYPE_EXAM,
+            )
+            .scalar_subquery()
+        )
+        return passed >= self.threshold
+
+    def describe(self) -> str:
+        return f"pass {self.threshold} exams"
+
+
+class LabCompletedRule(_Rule):
+    """Every published level of the lab completed; a lab without published levels never qualifies."""
+    type: Literal["lab_completed"]
+    lab_id: int = Field(..., ge=1)
+
+    events: ClassVar[FrozenSet[str]] = frozenset({BADGE_EVENT_COMPLETION})
+
+    def qualifies(self, counters: UserCounters) -> bool:
+        return counters.lab_completed(self.lab_id)
+
+    def eligible_clause(self):
+        published_total = (
+            select(func.count(models.Challenge.id))
+            .join(models.Module, models.Module.id == models.Challenge.module_id)
+            .where(models.Module.lab_id == self.lab_id, models.Challenge.is_published == True)
+            .scalar_subquery()
+        )
+        completed = (
+            select(func.count(models.ChallengeCompletion.id))
+            .join(models.Challenge, models.Challenge.id == models.ChallengeCompletion.challenge_id)
+            .join(models.Module, models.Module.id == models.Challenge.module_id)
+            .where(
+                models.ChallengeCompletion.user_id == user_models.User.id,
+                models.Module.lab_id == self.lab_id,
+                models.Challenge.is_published == True,
+            )
+            .scalar_subquery()
+        )
+        return and_(published_total > 0, completed >= published_total)
+
+    def describe(self) -> str:
+        return f"complete every level of lab {self.lab_id}"
+
+
+BadgeRule = Annotated[
+    Union[TotalXpRule, StreakDaysRule, LevelsCompletedRule, ExamsPassedRule, LabCompletedRule],
+    Field(discriminator="type"),
+]
+_rule_adapter = TypeAdapter(BadgeRule)
+RULE_TYPES = ("total_xp", "streak_days", "levels_completed", "exams_passed", "lab_completed")
+
+
+def parse_rule(raw: Union[str, dict]) -> BadgeRule:
+    """Validate a rule from JSON text or a dict; raises ValueError with a readable message."""
+    try:
+        data = json.loads(raw) if isinstance(raw, str) else raw
+    except json.JSONDecodeError:
+        raise ValueError("Badge rule must be a JSON object.")
+    if not isinstance(data, dict):
+        raise ValueError("Badge rule must be a JSON object.")
+    try:
+        return _rule_adapter.validate_python(data)
+    except ValidationError as exc:
+        first = exc.errors()[0]
+        where = ".".join(str(part) for part in first.get("loc", ()) if part not in RULE_TYPES)
+        message = f"{where}: {first['msg']}" if where else first["msg"]
+        raise ValueError(f"Invalid badge rule ({message}). Supported types: {', '.join(RULE_TYPES)}.")
+
+
+def dump_rule(rule: BadgeRule) -> str:
+    return json.dumps(rule.model_dump(), separators=(",", ":"))
+
+
+def load_rule(badge: models.Badge) -> Optional[BadgeRule]:
+    """The badge's rule, or None when it has none (or a stored rule no longer parses)."""
+    if not badge.rule_json:
+        return None
+    try:
+        return parse_rule(badge.rule_json)
+    except ValueError:
+        return None
+
+
+# ── Rule index ───────────────────────────────────────────────────────────────
+class BadgeRuleIndex:
+    """Rule badges grouped by event type, per process.
+
+    Badge edits in this process invalidate it directly; edits made by other workers are
+    picked up within BADGE_RULES_REFRESH_SECONDS.
+    """
+
+    def __init__(self, refresh_seconds: float = BADGE_RULES_REFRESH_SECONDS):
+        self.refresh_seconds = refresh_seconds
+        self._lock = threading.Lock()
+        self._by_event: Dict[str, List[Tuple[int, BadgeRule]]] = {}
+        self._loaded_at: Optional[float] = None
+        self._generation = 0
+
+    def invalidate(self) -> None:
+        with self._lock:
+            self._loaded_at = None
+            self._generation += 1
+
+    def rules_for(self, db: Session, events: Iterable[str]) -> List[Tuple[int, BadgeRule]]:
+        with self._lock:
+            stale = self._loaded_at is None or time.monotonic() - self._loaded_at >= self.refresh_seconds
+        if stale:
+            self._load(db)
+        with self._lock:
+            by_event = self._by_event
+        seen = set()
+        rules = []
+        for event in events:
+            for badge_id, rule in by_event.get(event, ()):
+                if badge_id not in seen:
+                    seen.add(badge_id)
+                    rules.append((badge_id, rule))
+        return rules
+
+    def _load(self, db: Session) -> None:
+        with self._lock:
+            generation = self._generation
+        by_event: Dict[str, List[Tuple[int, BadgeRule]]] = {}
+        rows = db.query(models.Badge.id, models.Badge.rule_json).filter(
+            models.Badge.rule_json.isnot(None),
+            models.Badge.module_id.is_(None),
+        ).order_by(models.Badge.id).all()
+        for badge_id, raw in rows:
+            try:
+                rule = parse_rule(raw)
+            except ValueError as exc:
+                print(f"[Campus404] Skipping badge {badge_id} rule: {exc}")
+                continue
+            for event in rule.events:
+                by_event.setdefault(event, []).append((int(badge_id), rule))
+        with self._lock:
+            self._by_event = by_event
+            # An edit that landed while we were reading forces the next call to reload again.
+            self._loaded_at = time.monotonic() if generation == self._generation else None
+
+
+rule_index = BadgeRuleIndex()
+
+
+def invalidate_badge_rules() -> None:
+    rule_index.invalidate()
+
+
+def award_rule_badges(db: Session, user_id: int, events: Iterable[str]) -> List[models.Badge]:
+    """Evaluate the rules these events can affect and award the ones met. Does not commit."""
+    candidates = rule_index.rules_for(db, events)
+    if not candidates:
+        return []
+
+    owned = {
+        int(badge_id)
+        for (badge_id,) in db.query(models.UserBadge.badge_id).filter(
+            models.UserBadge.user_id == user_id,
+            models.UserBadge.badge_id.in_([badge_id for badge_id, _ in candidates]),
+        )
+    }
+    counters = UserCounters(db, user_id)
+    now = datetime.now(timezone.utc)
+    earned = [
+        badge_id
+        for badge_id, rule in candidates
+        if badge_id not in owned
+        and rule.qualifies(counters)
+        and insert_ignore(
+            db,
+            models.UserBadge,
+            {"user_id": user_id, "badge_id": badge_id, "earned_at": now},
+            ("user_id", "badge_id"),
+        )
+    ]
+    if not earned:
+        return []
+    return db.query(models.Badge).filter(models.Badge.id.in_(earned)).order_by(models.Badge.id).all()
@@ -3,12 +3,14 @@ curriculum/models.py — Campus404
 SQLAlchemy ORM models for Labs, Modules, ChallengeGroups, Levels, files, badges, and progress.
 """
 from datetime import datetime, timezone
+from typing import Dict, Iterable, Optional, Tuple
+import hashlib
 import random, string
 from sqlalchemy import (
     Boolean, Column, DateTime, ForeignKey,
     Integer, String, Text, func, UniqueConstraint, CheckConstraint
 )
-from sqlalchemy.orm import relationship, Session
+from sqlalchemy.orm import deferred, relationship, selectinload, undefer, Session
 from database import Base
 
 
@@ -17,6 +19,11 @@ CHALLENGE_TYPE_EXAM = "exam"
 VALID_CHALLENGE_TYPES = (CHALLENGE_TYPE_LEVEL, CHALLENGE_TYPE_EXAM)
 
 
+def content_hash(content: Optional[str]) -> str:
+    """sha256 hex digest of a file body, as stored in ChallengeFile.content_hash."""
+    return hashlib.sha256((content or "").encode("utf-8")).hexdigest()
+
+
 def _gen_uid(length=4):
     """Generate a short alphanumeric unique ID (e.g. 'a3k9')."""
     chars = string.ascii_lowercase + string.digits
@@ -87,8 +94,9 @@ class Challenge(Base):
     challenge_type = Column(String(20), default=CHALLENGE_TYPE_LEVEL, nullable=False, index=True)
     custom_title = Column(String(255), nullable=True)
     xp_reward    = Column(Integer, default=50, nullable=False)
-    expected_output = Column(Text, nullable=True)
-    content_html = Column(Text, nullable=False)
+    # Level bodies are deferred; content endpoints opt in with level_content_options().
+    expected_output = deferred(Column(Text, nullable=True), group="content")
+    content_html = deferred(Column(Text, nullable=False), group="content")
     is_published = Column(Boolean, default=False, nullable=False)
     created_at   = Column(DateTime, default=lambda: datetime.now(timezone.utc), nullable=False)
     updated_at   = Column(DateTime, default=lambda: datetime.now(timezone.utc),
@@ -141,19 +149,30 @@ class ChallengeFile(Base):
     id           = Column(Integer, primary_key=True, index=True)
     challenge_id = Column(Integer, ForeignKey("challenges.id", ondelete="CASCADE"), nullable=False, index=True)
     filename     = Column(String(100), nullable=False)
-    content      = Column(Text, default="", nullable=False)
+    content      = deferred(Column(Text, default="", nullable=False))
+    content_hash = Column(String(64), nullable=True)  # sha256 hex of content, for diffing and ETags
     is_main      = Column(Boolean, default=False, nullable=False)
     order_index  = Column(Integer, default=0, nullable=False)
 
     challenge = relationship("Challenge", back_populates="files")
 
 
+def level_content_options():
+    """Loader options for queries whose results are serialized with bodies and files."""
+    return (
+        undefer(Challenge.content_html),
+        undefer(Challenge.expected_output),
+        selectinload(Challenge.files).undefer(ChallengeFile.content),
+    )
+
+
 # ── Badges ─────────────────────────────────────────────────────────────────────
 class Badge(Base):
     """
     Each Badge is optionally linked to a Module.
     Earning the badge requires completing ALL published challenges in that module.
-    Badges can also be standalone (module_id = null) for platform-level achievements.
+    Badges can also be standalone (module_id = null) for platform-level achievements,
+    optionally with a declarative rule_json condition (see curriculum/badge_rules.py).
     """
     __tablename__ = "badges"
 
@@ -163,6 +182,7 @@ class Badge(Base):
     image_path    = Column(String(512), nullable=True)   # relative path, served from /uploads
     image_url     = Column(String(512), nullable=True)   # OR external URL override
     module_id     = Column(Integer, ForeignKey("modules.id", ondelete="SET NULL"), nullable=True, unique=True, index=True)
+    rule_json     = Column(Text, nullable=True)          # auto-award condition, e.g. {"type": "total_xp", "threshold": 1000}
     created_at    = Column(DateTime, default=lambda: datetime.now(timezone.utc), nullable=False)
 
     module        = relationship("Module", back_populates="badge")
@@ -217,6 +237,34 @@ class ChallengeAttempt(Base):
     challenge = relationship("Challenge", back_populates="attempts")
 
 
+# Judge0 status ids ranked best-first for UserChallengeStat.best_status_id:
+# accepted, wrong answer, time limit, runtime errors (7-12), compilation error, then anything else.
+JUDGE_STATUS_RANK = {3: 0, 4: 1, 5: 2, 7: 3, 8: 3, 9: 3, 10: 3, 11: 3, 12: 3, 6: 4}
+JUDGE_STATUS_RANK_DEFAULT = 5
+
+
+class UserChallengeStat(Base):
+    """Running attempt counters per (user, level), bumped in the same transaction as each attempt."""
+    __tablename__ = "user_challenge_stats"
+
+    user_id         = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
+    challenge_id    = Column(Integer, ForeignKey("challenges.id", ondelete="CASCADE"), primary_key=True, index=True)
+    attempt_count   = Column(Integer, nullable=False, default=0)   # also the latest attempt_number
+    pass_count      = Column(Integer, nullable=False, default=0)
+    best_status_id  = Column(Integer, nullable=True)
+    last_attempt_at = Column(DateTime, nullable=True)
+
+
+class SequenceCounter(Base):
+    """Named monotonic counter; rows are locked while a block of values is reserved."""
+    __tablename__ = "sequence_counters"
+
+    name       = Column(String(64), primary_key=True)
+    value      = Column(Integer, nullable=False, default=0)  # last value handed out
+    updated_at = Column(DateTime, default=lambda: datetime.now(timezone.utc),
+                        onupdate=lambda: datetime.now(timezone.utc), nullable=False)
+
+
 # ── Helpers ─────────────────────────────────────────────────────────────────────
 def compute_lab_total_xp(db: Session, lab_id: int) -> int:
     result = (
@@ -228,6 +276,43 @@ def compute_lab_total_xp(db: Session, lab_id: int) -> int:
     return int(result or 0)
 
 
+def compute_lab_listing_totals(db: Session, lab_ids: Iterable[int]) -> Dict[int, Tuple[int, int]]:
+    """{lab_id: (total_xp, module_count)} for many labs in one grouped query."""
+    lab_ids = list(lab_ids)
+    if not lab_ids:
+        return {}
+    rows = (
+        db.query(
+            Module.lab_id,
+            func.coalesce(func.sum(Challenge.xp_reward), 0),
+            func.count(func.distinct(Module.id)),
+        )
+        .outerjoin(Challenge, Challenge.module_id == Module.id)
+        .filter(Module.lab_id.in_(lab_ids))
+        .group_by(Module.lab_id)
+        .all()
+    )
+    return {int(lab_id): (int(xp), int(count)) for lab_id, xp, count in rows}
+
+
+def compute_module_listing_totals(db: Session, module_ids: Iterable[int]) -> Dict[int, Tuple[int, int]]:
+    """{module_id: (challenge_count, total_xp)} for many modules in one grouped query."""
+    module_ids = list(module_ids)
+    if not module_ids:
+        return {}
+    rows = (
+        db.query(
+            Challenge.module_id,
+            func.count(Challenge.id),
+            func.coalesce(func.sum(Challenge.xp_reward), 0),
+        )
+        .filter(Challenge.module_id.in_(module_ids))
+        .group_by(Challenge.module_id)
+        .all()
+    )
+    return {int(module_id): (int(count), int(xp)) for module_id, count, xp in rows}
+
+
 def compute_module_total_xp(db: Session, module_id: int) -> int:
     result = (
         db.query(func.coalesce(func.sum(Challenge.xp_reward), 0))
@@ -2,11 +2,14 @@
 curriculum/router.py — Campus404 (updated)
 """
 from typing import Optional, List
-from fastapi import APIRouter, Depends, Request, Query, status
+from fastapi import APIRouter, Depends, File, Form, Header, HTTPException, Request, Response, Query, UploadFile, status
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
 
 from database import get_db
-from . import services, schemas
+from jobs.schemas import JobOut
+from jobs.services import enqueue_job, job_to_out
+from . import services, schemas, transfer
 
 router = APIRouter()
 
@@ -54,6 +57,38 @@ def list_labs(
     return services.get_labs(db, request, language_id, published_only, skip, limit)
 
 
+@router.post("/labs/import", response_model=JobOut, status_code=202)
+async def import_lab(
+    file: UploadFile = File(...),
+    slug: Optional[str] = Form(None),
+    title: Optional[str] = Form(None),
+    db: Session = Depends(get_db),
+):
+    """Queue a lab archive produced by /labs/{lab_id}/export for import; poll the returned job."""
+    archive_path = await transfer.spool_import_upload(file)
+    try:
+        job = enqueue_job(
+            db,
+            transfer.IMPORT_LAB_JOB,
+            {"archive_path": str(archive_path), "slug": slug or None, "title": title or None},
+            max_attempts=1,
+        )
+    except ValueError as exc:
+        archive_path.unlink(missing_ok=True)
+        raise HTTPException(status_code=422, detail=str(exc))
+    return job_to_out(job)
+
+
+@router.get("/labs/{lab_id}/export")
+def export_lab(lab_id: int, db: Session = Depends(get_db)):
+    filename, stream = transfer.stream_lab_export(db, lab_id)
+    return StreamingResponse(
+        stream,
+        media_type="application/gzip",
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
+
+
 @router.get("/labs/{lab_id}", response_model=schemas.LabResponse)
 def get_lab(lab_id: int, request: Request, db: Session = Depends(get_db)):
     return services.get_lab(db, request, lab_id)
@@ -95,6 +130,11 @@ def delete_module(module_id: int, db: Session = Depends(get_db)):
     return services.delete_module(db, module_id)
 
 
+@router.put("/labs/{lab_id}/modules/order", response_model=list[schemas.ModuleResponse])
+def reorder_modules(lab_id: int, data: schemas.ModuleOrderUpdate, request: Request, db: Session = Depends(get_db)):
+    return services.reorder_modules(db, request, lab_id, data)
+
+
 # ── CHALLENGE GROUP (Concept) ────────────────────────────────────────────────
 @router.post("/challenge-groups", response_model=schemas.ChallengeGroupResponse, status_code=201)
 def create_challenge_group(data: schemas.ChallengeGroupCreate, db: Session = Depends(get_db)):
@@ -125,6 +165,11 @@ def delete_challenge_group(challenge_group_id: int, db: Session = Depends(get_db
     return services.delete_challenge_group(db, challenge_group_id)
 
 
+@router.put("/modules/{module_id}/challenge-groups/order", response_model=list[schemas.ChallengeGroupResponse])
+def reorder_challenge_groups(module_id: int, data: schemas.ChallengeGroupOrderUpdate, db: Session = Depends(get_db)):
+    return services.reorder_challenge_groups(db, module_id, data)
+
+
 # ── LEVEL (Exercise) ─────────────────────────────────────────────────────────
 @router.post("/levels", response_model=schemas.LevelResponse, status_code=201)
 def create_level(data: schemas.LevelCreate, db: Session = Depends(get_db)):
@@ -151,13 +196,49 @@ def delete_level(level_id: int, db: Session = Depends(get_db)):
     return services.delete_level(db, level_id)
 
 
+@router.put("/modules/{module_id}/levels/order", response_model=list[schemas.LevelResponse])
+def reorder_levels(module_id: int, data: schemas.LevelOrderUpdate, db: Session = Depends(get_db)):
+    return services.reorder_levels(db, module_id, data)
+
+
+@router.get("/levels/{level_id}/published")
+def get_published_level(level_id: int, request: Request, db: Session = Depends(get_db)):
+    """Student-facing level content: cacheable, but revalidated with If-None-Match on every use."""
+    etag = services.published_level_etag(db, level_id)
+    headers = {
+        "ETag": etag,
+        "Cache-Control": services.PUBLISHED_LEVEL_CACHE_CONTROL,
+        "Vary": "Accept-Encoding",
+    }
+    if_none_match = request.headers.get("if-none-match", "")
+    if etag in [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]:
+        return Response(status_code=304, headers=headers)
+
+    body, compressed = services.published_level_payload(db, level_id, etag)
+    if "gzip" in request.headers.get("accept-encoding", "").lower():
+        headers["Content-Encoding"] = "gzip"
+        body = compressed
+    return Response(content=body, media_type="application/json", headers=headers)
+
+
+@router.get("/levels/{level_id}/files", response_model=list[schemas.ChallengeFileResponse])
+def list_level_files(level_id: int, response: Response, db: Session = Depends(get_db)):
+    files, etag = services.get_challenge_files(db, level_id)
+    response.headers["ETag"] = etag
+    return files
+
+
 @router.put("/levels/{level_id}/files", response_model=list[schemas.ChallengeFileResponse])
 def replace_level_files(
     level_id: int,
     files: list[schemas.ChallengeFileCreate],
+    response: Response,
+    if_match: Optional[str] = Header(None),
     db: Session = Depends(get_db),
 ):
-    return services.upsert_level_files(db, level_id, files)
+    files, etag = services.upsert_level_files(db, level_id, files, if_match=if_match)
+    response.headers["ETag"] = etag
+    return files
 
 
 # ── CHALLENGE (legacy level endpoints, kept for compatibility) ──────────────
@@ -187,11 +268,22 @@ def delete_challenge(challenge_id: int, db: Session = Depends(get_db)):
 
 
 # ── CHALLENGE FILES (bulk replace) ────────────────────────────────────────────
+@router.get("/challenges/{challenge_id}/files", response_model=list[schemas.ChallengeFileResponse])
+def list_challenge_files(challenge_id: int, response: Response, db: Session = Depends(get_db)):
+    files, etag = services.get_challenge_files(db, challenge_id)
+    response.headers["ETag"] = etag
+    return files
+
+
 @router.put("/challenges/{challenge_id}/files", response_model=list[schemas.ChallengeFileResponse])
 def replace_challenge_files(
     challenge_id: int,
     files: list[schemas.ChallengeFileCreate],
+    response: Response,
+    if_match: Optional[str] = Header(None),
     db: Session = Depends(get_db),
 ):
-    """Replace all files for a challenge. Max 5 files. Exactly one must be the main file."""
-    return services.upsert_challenge_files(db, challenge_id, files)
+    """Sync files for a challenge. Max 5 files. Send If-Match with the last ETag to avoid lost updates."""
+    files, etag = services.upsert_challenge_files(db, challenge_id, files, if_match=if_match)
+    response.headers["ETag"] = etag
+    return files
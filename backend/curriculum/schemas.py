@@ -271,6 +271,40 @@ class LevelResponse(BaseModel):
     model_config = {"from_attributes": True}
 
 
+# ── ORDERING ──────────────────────────────────────────────────────────────────
+def _validate_unique_ids(ids: List[int]) -> List[int]:
+    if len(set(ids)) != len(ids):
+        raise ValueError("Ordering contains duplicate ids.")
+    return ids
+
+
+class ModuleOrderUpdate(BaseModel):
+    module_ids: List[int] = Field(..., min_length=1, max_length=1000)
+
+    @model_validator(mode='after')
+    def check_unique(self):
+        _validate_unique_ids(self.module_ids)
+        return self
+
+
+class ChallengeGroupOrderUpdate(BaseModel):
+    group_ids: List[int] = Field(..., min_length=1, max_length=1000)
+
+    @model_validator(mode='after')
+    def check_unique(self):
+        _validate_unique_ids(self.group_ids)
+        return self
+
+
+class LevelOrderUpdate(BaseModel):
+    level_ids: List[int] = Field(..., min_length=1, max_length=5000)
+
+    @model_validator(mode='after')
+    def check_unique(self):
+        _validate_unique_ids(self.level_ids)
+        return self
+
+
 # ── LANGUAGE ──────────────────────────────────────────────────────────────────
 class LanguageResponse(BaseModel):
     id:        int
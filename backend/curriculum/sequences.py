@@ -0,0 +1,125 @@
+"""
+curriculum/sequences.py — Campus404
+Race-free allocation of per-module level numbers and module unique_ids.
+
+Counters live in sequence_counters and are row-locked while a block is reserved, so
+concurrent editors and bulk imports never compute the same value. Nothing here commits:
+the reservation becomes durable (and the lock is released) with the caller's transaction.
+"""
+from typing import Callable, List
+
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from database import insert_ignore
+from . import models
+
+MODULE_UID_SEQUENCE = "module_uid"
+UID_ALPHABET = "0123456789abcdefghijklmnopqrstuvwxyz"
+UID_MIN_LENGTH = 4
+UID_MAX_LENGTH = 8
+# Affine permutation n -> (A*n + B) mod 36**k. A shares no factor with 36, so the map is a
+# bijection: every counter value yields a distinct uid and consecutive uids look unrelated.
+_UID_MULTIPLIER = 1_299_709
+_UID_OFFSET = 482_711
+
+
+def _level_sequence_name(module_id: int) -> str:
+    return f"level_number:module:{module_id}"
+
+
+def reserve(db: Session, name: str, count: int = 1, seed: Callable[[], int] = lambda: 0) -> List[int]:
+    """Reserve `count` consecutive values from a named counter and return them.
+
+    A missing counter is created from seed() (e.g. the current MAX) exactly once.
+    """
+    if count < 1:
+        raise ValueError("count must be at least 1.")
+
+    q = db.query(models.SequenceCounter).filter(models.SequenceCounter.name == name)
+    # Seed before locking: a locking read of a missing row takes a gap lock on MySQL, and two
+    # first users inserting into each other's gap deadlock (1213) instead of conflicting.
+    if not db.query(q.exists()).scalar():
+        insert_ignore(db, models.SequenceCounter, {"name": name, "value": int(seed() or 0)}, ("name",))
+    counter = q.with_for_update().populate_existing().one()
+
+    start = int(counter.value or 0) + 1
+    counter.value = start + count - 1
+    db.flush()
+    return list(range(start, start + count))
+
+
+def set_value(db: Session, name: str, value: int) -> None:
+    """Re-align a counter after rows were removed (no-op if it was never seeded)."""
+    db.query(models.SequenceCounter).filter(models.SequenceCounter.name == name).update(
+        {models.SequenceCounter.value: int(value)}, synchronize_session=False
+    )
+
+
+def drop(db: Session, name: str) -> None:
+    db.query(models.SequenceCounter).filter(models.SequenceCounter.name == name).delete(synchronize_session=False)
+
+
+# ── Level numbers ────────────────────────────────────────────────────────────
+def reserve_level_numbers(db: Session, module_id: int, count: int = 1) -> List[int]:
+    """Next `count` level numbers for a module, seeded once from MAX(level_number)."""
+    def seed() -> int:
+        return int(
+            db.query(func.coalesce(func.max(models.Challenge.level_number), 0))
+            .filter(models.Challenge.module_id == module_id)
+            .scalar()
+            or 0
+        )
+
+    return reserve(db, _level_sequence_name(module_id), count, seed)
+
+
+def release_level_number(db: Session, module_id: int) -> None:
+    """One level left the module and the rest were shifted down; pull the counter back by one."""
+    db.query(models.SequenceCounter).filter(
+        models.SequenceCounter.name == _level_sequence_name(module_id),
+        models.SequenceCounter.value > 0,
+    ).update({models.SequenceCounter.value: models.SequenceCounter.value - 1}, synchronize_session=False)
+
+
+def sync_level_counter(db: Session, module_id: int, value: int) -> None:
+    set_value(db, _level_sequence_name(module_id), value)
+
+
+def drop_level_counter(db: Session, module_id: int) -> None:
+    drop(db, _level_sequence_name(module_id))
+
+
+# ── Module unique_ids ────────────────────────────────────────────────────────
+def encode_uid(n: int) -> str:
+    """Map a counter value to a short base36 uid; distinct inputs give distinct outputs."""
+    offset = 0
+    for length in range(UID_MIN_LENGTH, UID_MAX_LENGTH + 1):
+        space = len(UID_ALPHABET) ** length
+        if n < offset + space:
+            x = (_UID_MULTIPLIER * (n - offset) + _UID_OFFSET) % space
+            chars = []
+            for _ in range(length):
+                x, rem = divmod(x, len(UID_ALPHABET))
+                chars.append(UID_ALPHABET[rem])
+            return "".join(reversed(chars))
+        offset += space
+    raise ValueError("uid space exhausted.")
+
+
+def reserve_module_uids(db: Session, count: int = 1) -> List[str]:
+    """Reserve `count` unused module uids with one counter lock and one collision query per block.
+
+    Legacy rows carry random uids, so a generated value can already be taken; those are
+    skipped and the block is topped up.
+    """
+    uids: List[str] = []
+    while len(uids) < count:
+        needed = count - len(uids)
+        candidates = [encode_uid(n) for n in reserve(db, MODULE_UID_SEQUENCE, needed)]
+        taken = {
+            row[0]
+            for row in db.query(models.Module.unique_id).filter(models.Module.unique_id.in_(candidates)).all()
+        }
+        uids.extend(uid for uid in candidates if uid not in taken)
+    return uids
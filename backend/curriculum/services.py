@@ -2,18 +2,30 @@
 curriculum/services.py — Campus404 (updated)
 Business logic for Labs, Modules, ChallengeGroups, Levels, and files.
 """
+import gzip
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+from datetime import datetime, timezone
 from pathlib import Path
-from typing import Optional, List
-from sqlalchemy.orm import Session
-from sqlalchemy import func
+from typing import Optional, List, Tuple
+from sqlalchemy.orm import Session, undefer
+from sqlalchemy import case, func, update
 from sqlalchemy.exc import IntegrityError
 from fastapi import HTTPException, Request
 
-from . import models, schemas
+from search import services as search_index
+from . import models, schemas, sequences
 
 UPLOADS_ROOT = Path("/app/uploads")
 MAX_FILES_PER_CHALLENGE = 5
 
+# Published level payloads are shared across users, but unpublishing the level or its lab
+# must take effect at once: caches may store them, yet revalidate every use via the ETag.
+PUBLISHED_LEVEL_CACHE_CONTROL = "public, no-cache"
+PUBLISHED_LEVEL_CACHE_SIZE = 512
+
 
 def build_image_url(request: Request, relative_path: Optional[str]) -> Optional[str]:
     if not relative_path:
@@ -42,7 +54,21 @@ def _safe_delete_image(relative_path: Optional[str]) -> None:
         parent = parent.parent
 
 
-def _lab_to_response(db: Session, request: Request, lab: models.Lab) -> schemas.LabResponse:
+def _labs_to_responses(db: Session, request: Request, labs: List[models.Lab]) -> List[schemas.LabResponse]:
+    """Serialize labs with their XP and module totals from one grouped query."""
+    totals = models.compute_lab_listing_totals(db, [lab.id for lab in labs])
+    return [_lab_to_response(db, request, lab, totals.get(lab.id, (0, 0))) for lab in labs]
+
+
+def _lab_to_response(
+    db: Session,
+    request: Request,
+    lab: models.Lab,
+    totals: Optional[Tuple[int, int]] = None,
+) -> schemas.LabResponse:
+    if totals is None:
+        totals = models.compute_lab_listing_totals(db, [lab.id]).get(lab.id, (0, 0))
+    total_xp, module_count = totals
     return schemas.LabResponse(
         id=lab.id,
         title=lab.title,
@@ -55,13 +81,43 @@ def _lab_to_response(db: Session, request: Request, lab: models.Lab) -> schemas.
         hero_image_url=lab.hero_image_url,
         language_id=lab.language_id,
         is_published=lab.is_published,
-        total_xp=models.compute_lab_total_xp(db, lab.id),
-        module_count=len(lab.modules),
+        total_xp=total_xp,
+        module_count=module_count,
         created_at=lab.created_at,
     )
 
 
-def _module_to_response(db: Session, request: Request, module: models.Module) -> schemas.ModuleResponse:
+def _modules_to_responses(db: Session, request: Request, modules: List[models.Module]) -> List[schemas.ModuleResponse]:
+    """Serialize modules with level totals and guide links from two column-only queries."""
+    # Imported lazily to avoid circular imports at module import-time.
+    from guide.models import GuidePage
+
+    module_ids = [m.id for m in modules]
+    totals = models.compute_module_listing_totals(db, module_ids)
+    guides = {}
+    if module_ids:
+        guides = {
+            row.module_id: row
+            for row in db.query(GuidePage.id, GuidePage.title, GuidePage.slug, GuidePage.module_id)
+            .filter(GuidePage.module_id.in_(module_ids))
+            .all()
+        }
+    return [
+        _module_to_response(db, request, m, totals.get(m.id, (0, 0)), guides.get(m.id))
+        for m in modules
+    ]
+
+
+def _module_to_response(
+    db: Session,
+    request: Request,
+    module: models.Module,
+    totals: Optional[Tuple[int, int]] = None,
+    guide=None,
+) -> schemas.ModuleResponse:
+    if totals is None:
+        return _modules_to_responses(db, request, [module])[0]
+    challenge_count, total_xp = totals
     return schemas.ModuleResponse(
         id=module.id,
         unique_id=module.unique_id,
@@ -69,14 +125,14 @@ def _module_to_response(db: Session, request: Request, module: models.Module) ->
         lab_id=module.lab_id,
         title=module.title,
         description=module.description,
-        guide_id=module.guide.id if module.guide else None,
-        guide_title=module.guide.title if module.guide else None,
-        guide_slug=module.guide.slug if module.guide else None,
+        guide_id=guide.id if guide else None,
+        guide_title=guide.title if guide else None,
+        guide_slug=guide.slug if guide else None,
         banner_image_path=module.banner_image_path,
         banner_url=build_image_url(request, module.banner_image_path),
         order_index=module.order_index,
-        challenge_count=len(module.challenges),
-        total_xp=sum(c.xp_reward for c in module.challenges),
+        challenge_count=challenge_count,
+        total_xp=total_xp,
         created_at=module.created_at,
     )
 
@@ -140,8 +196,19 @@ def _level_to_response(level: models.Challenge) -> schemas.LevelResponse:
     )
 
 
-def _challenge_group_to_response(group: models.ChallengeGroup) -> schemas.ChallengeGroupResponse:
-    levels = list(group.levels or [])
+def _level_query(db: Session):
+    """Challenge query that also loads the deferred bodies and files, for content responses."""
+    return db.query(models.Challenge).options(*models.level_content_options())
+
+
+def _challenge_group_to_response(
+    group: models.ChallengeGroup,
+    totals: Optional[Tuple[int, int]] = None,
+) -> schemas.ChallengeGroupResponse:
+    if totals is None:
+        levels = list(group.levels or [])
+        totals = (len(levels), int(sum(level.xp_reward for level in levels)))
+    level_count, total_xp = totals
     return schemas.ChallengeGroupResponse(
         id=group.id,
         module_id=group.module_id,
@@ -149,8 +216,8 @@ def _challenge_group_to_response(group: models.ChallengeGroup) -> schemas.Challe
         description=group.description,
         order_index=group.order_index,
         is_published=group.is_published,
-        level_count=len(levels),
-        total_xp=int(sum(level.xp_reward for level in levels)),
+        level_count=level_count,
+        total_xp=total_xp,
         created_at=group.created_at,
         updated_at=group.updated_at,
     )
@@ -204,6 +271,8 @@ def create_lab(db: Session, request: Request, data: schemas.LabCreate) -> schema
         raise HTTPException(status_code=409, detail=f"Slug '{data.slug}' is already in use.")
     lab = models.Lab(**data.model_dump())
     db.add(lab)
+    db.flush()
+    search_index.index_lab(db, lab)
     db.commit()
     db.refresh(lab)
     return _lab_to_response(db, request, lab)
@@ -217,7 +286,7 @@ def get_labs(db, request, language_id=None, published_only=False, skip=0, limit=
         q = q.filter(models.Lab.language_id == language_id)
     total = q.count()
     labs = q.order_by(models.Lab.created_at.desc()).offset(skip).limit(limit).all()
-    return {"total": total, "items": [_lab_to_response(db, request, lab) for lab in labs]}
+    return {"total": total, "items": _labs_to_responses(db, request, labs)}
 
 
 def get_lab(db, request, lab_id):
@@ -238,6 +307,8 @@ def update_lab(db, request, lab_id, data):
         _safe_delete_image(lab.isometric_image_path)
     for field, value in update_data.items():
         setattr(lab, field, value)
+    # Module and level result URLs embed the lab slug.
+    search_index.index_lab(db, lab, cascade="slug" in update_data)
     db.commit()
     db.refresh(lab)
     return _lab_to_response(db, request, lab)
@@ -249,6 +320,9 @@ def delete_lab(db, lab_id):
         raise HTTPException(status_code=404, detail="Lab not found.")
     _safe_delete_image(lab.banner_image_path)
     _safe_delete_image(lab.isometric_image_path)
+    for (module_id,) in db.query(models.Module.id).filter(models.Module.lab_id == lab_id).all():
+        sequences.drop_level_counter(db, module_id)
+    search_index.remove_lab_documents(db, lab_id)
     db.delete(lab)
     db.commit()
     return {"message": f"Lab '{lab.title}' deleted.", "id": lab_id}
@@ -261,11 +335,7 @@ def create_module(db, request, data):
 
     _validate_guide_link(db, data.guide_id)
 
-    # Generate a unique 4-char ID; retry up to 10 times on collision
-    for _ in range(10):
-        uid = models._gen_uid(4)
-        if not db.query(models.Module).filter(models.Module.unique_id == uid).first():
-            break
+    uid = sequences.reserve_module_uids(db, 1)[0]
 
     # Build slug: "module-title-uid"
     from re import sub
@@ -276,6 +346,8 @@ def create_module(db, request, data):
     module = models.Module(**module_data, unique_id=uid, slug=slug)
     db.add(module)
     try:
+        db.flush()
+        search_index.index_module(db, module)
         db.commit()
     except IntegrityError:
         db.rollback()
@@ -294,9 +366,13 @@ def create_module(db, request, data):
 
 
 def get_modules(db, request, lab_id):
-    return [_module_to_response(db, request, m) for m in
-            db.query(models.Module).filter(models.Module.lab_id == lab_id)
-            .order_by(models.Module.order_index).all()]
+    modules = (
+        db.query(models.Module)
+        .filter(models.Module.lab_id == lab_id)
+        .order_by(models.Module.order_index)
+        .all()
+    )
+    return _modules_to_responses(db, request, modules)
 
 
 def get_module(db, request, module_id):
@@ -323,6 +399,7 @@ def update_module(db, request, module_id, data):
         _safe_delete_image(m.banner_image_path)
     for field, value in update_data.items():
         setattr(m, field, value)
+    search_index.index_module(db, m)
     try:
         db.commit()
     except IntegrityError:
@@ -352,11 +429,115 @@ def delete_module(db, module_id):
     if not m:
         raise HTTPException(status_code=404, detail="Module not found.")
     _safe_delete_image(m.banner_image_path)
+    sequences.drop_level_counter(db, module_id)
+    search_index.remove_module_documents(db, module_id)
     db.delete(m)
     db.commit()
     return {"message": f"Module '{m.title}' deleted.", "id": module_id}
 
 
+# ── ORDERING ─────────────────────────────────────────────────────────────────
+def _close_position_gap(db: Session, column, scope_column, scope_id: int, removed_position: int) -> None:
+    """Shift every sibling after a removed position down by one in a single UPDATE.
+
+    Does not commit, so the caller's delete and the renumber land in one transaction.
+    """
+    model = column.class_
+    db.execute(
+        update(model)
+        .where(scope_column == scope_id, column > removed_position)
+        .values({column.key: column - 1})
+        .execution_options(synchronize_session=False)
+    )
+
+
+def _apply_positions(db: Session, column, positions: dict) -> None:
+    """Write {row_id: position} for many rows with one CASE-based UPDATE. Does not commit."""
+    if not positions:
+        return
+    model = column.class_
+    db.execute(
+        update(model)
+        .where(model.id.in_(list(positions)))
+        .values({column.key: case(positions, value=model.id)})
+        .execution_options(synchronize_session=False)
+    )
+
+
+def _check_permutation(requested: List[int], existing: List[int], label: str) -> None:
+    if set(requested) != set(existing):
+        raise HTTPException(
+            status_code=422,
+            detail=f"Ordering must list every {label} in this scope exactly once.",
+        )
+
+
+def reorder_modules(db: Session, request: Request, lab_id: int, data: schemas.ModuleOrderUpdate):
+    if not db.query(models.Lab.id).filter(models.Lab.id == lab_id).first():
+        raise HTTPException(status_code=404, detail="Lab not found.")
+    existing = [row[0] for row in db.query(models.Module.id).filter(models.Module.lab_id == lab_id).all()]
+    _check_permutation(data.module_ids, existing, "module")
+
+    _apply_positions(db, models.Module.order_index, {mid: i for i, mid in enumerate(data.module_ids)})
+    db.commit()
+    db.expire_all()
+    return get_modules(db, request, lab_id)
+
+
+def reorder_challenge_groups(db: Session, module_id: int, data: schemas.ChallengeGroupOrderUpdate):
+    if not db.query(models.Module.id).filter(models.Module.id == module_id).first():
+        raise HTTPException(status_code=404, detail="Module not found.")
+    existing = [
+        row[0]
+        for row in db.query(models.ChallengeGroup.id).filter(models.ChallengeGroup.module_id == module_id).all()
+    ]
+    _check_permutation(data.group_ids, existing, "challenge group")
+
+    _apply_positions(db, models.ChallengeGroup.order_index, {gid: i for i, gid in enumerate(data.group_ids)})
+    db.commit()
+    db.expire_all()
+    return get_challenge_groups(db, module_id)
+
+
+def reorder_levels(db: Session, module_id: int, data: schemas.LevelOrderUpdate):
+    if not db.query(models.Module.id).filter(models.Module.id == module_id).first():
+        raise HTTPException(status_code=404, detail="Module not found.")
+    rows = (
+        db.query(models.Challenge.id, models.Challenge.challenge_type)
+        .filter(models.Challenge.module_id == module_id)
+        .all()
+    )
+    _check_permutation(data.level_ids, [row.id for row in rows], "level")
+
+    exam_ids = {row.id for row in rows if row.challenge_type == models.CHALLENGE_TYPE_EXAM}
+    if exam_ids and data.level_ids[-1] not in exam_ids:
+        raise HTTPException(status_code=409, detail="The final exam must remain the last level.")
+
+    _apply_positions(db, models.Challenge.level_number, {lid: i for i, lid in enumerate(data.level_ids, start=1)})
+    db.commit()
+    db.expire_all()
+    return [
+        _level_to_response(level)
+        for level in _level_query(db)
+        .filter(models.Challenge.module_id == module_id)
+        .order_by(models.Challenge.level_number, models.Challenge.id)
+        .all()
+    ]
+
+
+def _compact_level_numbers(db: Session, module_id: int) -> int:
+    """Renumber a module's levels 1..n in current order with a single UPDATE. Does not commit."""
+    ordered_ids = [
+        row[0]
+        for row in db.query(models.Challenge.id)
+        .filter(models.Challenge.module_id == module_id)
+        .order_by(models.Challenge.level_number, models.Challenge.id)
+        .all()
+    ]
+    _apply_positions(db, models.Challenge.level_number, {lid: i for i, lid in enumerate(ordered_ids, start=1)})
+    return len(ordered_ids)
+
+
 # ── CHALLENGE GROUP (Concept) ────────────────────────────────────────────────
 def create_challenge_group(db: Session, data: schemas.ChallengeGroupCreate):
     module = db.query(models.Module).filter(models.Module.id == data.module_id).first()
@@ -380,13 +561,25 @@ def create_challenge_group(db: Session, data: schemas.ChallengeGroupCreate):
 
 
 def get_challenge_groups(db: Session, module_id: int):
-    return [
-        _challenge_group_to_response(group)
-        for group in db.query(models.ChallengeGroup)
+    groups = (
+        db.query(models.ChallengeGroup)
         .filter(models.ChallengeGroup.module_id == module_id)
         .order_by(models.ChallengeGroup.order_index, models.ChallengeGroup.id)
         .all()
-    ]
+    )
+    totals = {
+        int(group_id): (int(count), int(xp))
+        for group_id, count, xp in db.query(
+            models.Challenge.challenge_group_id,
+            func.count(models.Challenge.id),
+            func.coalesce(func.sum(models.Challenge.xp_reward), 0),
+        )
+        .filter(models.Challenge.module_id == module_id)
+        .group_by(models.Challenge.challenge_group_id)
+        .all()
+        if group_id is not None
+    }
+    return [_challenge_group_to_response(group, totals.get(group.id, (0, 0))) for group in groups]
 
 
 def get_challenge_group(db: Session, challenge_group_id: int):
@@ -405,6 +598,14 @@ def update_challenge_group(db: Session, challenge_group_id: int, data: schemas.C
     for field, value in update_data.items():
         setattr(group, field, value)
 
+    # Level documents inherit the group's title and visibility.
+    if {"title", "is_published"} & update_data.keys():
+        for level in (
+            db.query(models.Challenge)
+            .options(undefer(models.Challenge.content_html))
+            .filter(models.Challenge.challenge_group_id == challenge_group_id)
+        ):
+            search_index.index_level(db, level)
     db.commit()
     db.refresh(group)
     return _challenge_group_to_response(group)
@@ -416,34 +617,24 @@ def delete_challenge_group(db: Session, challenge_group_id: int):
         raise HTTPException(status_code=404, detail="Challenge group not found.")
 
     module_id, deleted_order = group.module_id, group.order_index
+    level_ids = [
+        level_id for (level_id,) in
+        db.query(models.Challenge.id).filter(models.Challenge.challenge_group_id == challenge_group_id).all()
+    ]
+    had_levels = bool(level_ids)
+    search_index.remove_level_documents(db, level_ids)
     db.delete(group)
-    db.commit()
+    db.flush()
 
-    remaining = (
-        db.query(models.ChallengeGroup)
-        .filter(
-            models.ChallengeGroup.module_id == module_id,
-            models.ChallengeGroup.order_index > deleted_order,
-        )
-        .order_by(models.ChallengeGroup.order_index)
-        .all()
-    )
-    for row in remaining:
-        row.order_index -= 1
+    _close_position_gap(db, models.ChallengeGroup.order_index, models.ChallengeGroup.module_id, module_id, deleted_order)
+    if had_levels:
+        # The group's levels went with it; close the holes they left in the module numbering.
+        sequences.sync_level_counter(db, module_id, _compact_level_numbers(db, module_id))
     db.commit()
     return {"message": "Challenge group deleted.", "id": challenge_group_id}
 
 
 # ── LEVEL (legacy Challenge-compatible) ──────────────────────────────────────
-def _next_level_number(db, module_id):
-    max_level = (
-        db.query(func.max(models.Challenge.level_number))
-        .filter(models.Challenge.module_id == module_id)
-        .scalar()
-    )
-    return 1 if max_level is None else max_level + 1
-
-
 def _create_level_record(
     db: Session,
     module_id: int,
@@ -479,7 +670,7 @@ def _create_level_record(
     challenge = models.Challenge(
         module_id=module_id,
         challenge_group_id=challenge_group_id,
-        level_number=_next_level_number(db, module_id),
+        level_number=sequences.reserve_level_numbers(db, module_id)[0],
         challenge_type=challenge_type,
         custom_title=custom_title,
         xp_reward=xp_reward,
@@ -502,14 +693,15 @@ def _create_level_record(
                 challenge_id=challenge.id,
                 filename=fd.filename,
                 content=fd.content,
+                content_hash=models.content_hash(fd.content),
                 is_main=fd.is_main,
                 order_index=i,
             )
         )
 
+    search_index.index_level(db, challenge)
     db.commit()
-    db.refresh(challenge)
-    return challenge
+    return _level_query(db).filter(models.Challenge.id == challenge.id).one()
 
 
 def create_challenge(db, data: schemas.ChallengeCreate):
@@ -544,7 +736,7 @@ def create_challenge(db, data: schemas.ChallengeCreate):
 def get_challenges(db, module_id):
     return [
         _challenge_to_response(c)
-        for c in db.query(models.Challenge)
+        for c in _level_query(db)
         .filter(models.Challenge.module_id == module_id)
         .order_by(models.Challenge.level_number, models.Challenge.id)
         .all()
@@ -552,7 +744,7 @@ def get_challenges(db, module_id):
 
 
 def get_challenge(db, challenge_id):
-    c = db.query(models.Challenge).filter(models.Challenge.id == challenge_id).first()
+    c = _level_query(db).filter(models.Challenge.id == challenge_id).first()
     if not c:
         raise HTTPException(status_code=404, detail="Challenge not found.")
     return _challenge_to_response(c)
@@ -609,22 +801,14 @@ def update_challenge(db, challenge_id, data):
             .scalar()
         )
         if max_level and c.level_number != max_level:
-            trailing = (
-                db.query(models.Challenge)
-                .filter(
-                    models.Challenge.module_id == c.module_id,
-                    models.Challenge.level_number > c.level_number,
-                )
-                .order_by(models.Challenge.level_number)
-                .all()
-            )
-            for row in trailing:
-                row.level_number -= 1
+            _close_position_gap(db, models.Challenge.level_number, models.Challenge.module_id, c.module_id, c.level_number)
             c.level_number = max_level
 
+    db.flush()
+    db.expire(c, ["challenge_group"])
+    search_index.index_level(db, c)
     db.commit()
-    db.refresh(c)
-    return _challenge_to_response(c)
+    return _challenge_to_response(_level_query(db).filter(models.Challenge.id == c.id).one())
 
 
 def delete_challenge(db, challenge_id):
@@ -632,20 +816,11 @@ def delete_challenge(db, challenge_id):
     if not c:
         raise HTTPException(status_code=404, detail="Challenge not found.")
     module_id, deleted_level = c.module_id, c.level_number
+    search_index.remove_level_documents(db, [challenge_id])
     db.delete(c)
-    db.commit()
-
-    remaining = (
-        db.query(models.Challenge)
-        .filter(
-            models.Challenge.module_id == module_id,
-            models.Challenge.level_number > deleted_level,
-        )
-        .order_by(models.Challenge.level_number)
-        .all()
-    )
-    for ch in remaining:
-        ch.level_number -= 1
+    db.flush()
+    _close_position_gap(db, models.Challenge.level_number, models.Challenge.module_id, module_id, deleted_level)
+    sequences.release_level_number(db, module_id)
     db.commit()
     return {"message": "Challenge deleted and levels re-numbered.", "id": challenge_id}
 
@@ -673,7 +848,7 @@ def create_level(db: Session, data: schemas.LevelCreate):
 def get_levels(db: Session, challenge_group_id: int):
     return [
         _level_to_response(level)
-        for level in db.query(models.Challenge)
+        for level in _level_query(db)
         .filter(models.Challenge.challenge_group_id == challenge_group_id)
         .order_by(models.Challenge.level_number, models.Challenge.id)
         .all()
@@ -681,7 +856,7 @@ def get_levels(db: Session, challenge_group_id: int):
 
 
 def get_level(db: Session, level_id: int):
-    level = db.query(models.Challenge).filter(models.Challenge.id == level_id).first()
+    level = _level_query(db).filter(models.Challenge.id == level_id).first()
     if not level:
         raise HTTPException(status_code=404, detail="Level not found.")
     return _level_to_response(level)
@@ -689,7 +864,7 @@ def get_level(db: Session, level_id: int):
 
 def update_level(db: Session, level_id: int, data: schemas.LevelUpdate):
     challenge_like = update_challenge(db, level_id, data)
-    level = db.query(models.Challenge).filter(models.Challenge.id == challenge_like.id).first()
+    level = _level_query(db).filter(models.Challenge.id == challenge_like.id).first()
     return _level_to_response(level)
 
 
@@ -698,43 +873,201 @@ def delete_level(db: Session, level_id: int):
 
 
 # ── CHALLENGE FILE ─────────────────────────────────────────────────────────────
-def upsert_challenge_files(db, challenge_id: int, files: List[schemas.ChallengeFileCreate]):
+def files_etag(rows) -> str:
+    """Strong ETag for a challenge's file set: changes iff a name, body, flag or position changes."""
+    digest = hashlib.sha256()
+    for f in sorted(rows, key=lambda r: (r.order_index, r.filename)):
+        digest.update(
+            f"{f.filename}\0{f.content_hash or models.content_hash(f.content)}\0{int(bool(f.is_main))}\0{f.order_index}\n"
+            .encode("utf-8")
+        )
+    return f'"files-{digest.hexdigest()[:32]}"'
+
+
+def _etag_matches(if_match: Optional[str], etag: str) -> bool:
+    candidates = [tag.strip() for tag in if_match.split(",")]
+    return "*" in candidates or etag in candidates or f"W/{etag}" in candidates
+
+
+def get_challenge_files(db: Session, challenge_id: int):
+    """Current files plus their ETag, for editors that save conditionally."""
+    if not db.query(models.Challenge.id).filter(models.Challenge.id == challenge_id).first():
+        raise HTTPException(status_code=404, detail="Challenge not found.")
+    rows = (
+        db.query(models.ChallengeFile)
+        .options(undefer(models.ChallengeFile.content))
+        .filter(models.ChallengeFile.challenge_id == challenge_id)
+        .order_by(models.ChallengeFile.order_index, models.ChallengeFile.id)
+        .all()
+    )
+    return [_file_to_response(f) for f in rows], files_etag(rows)
+
+
+def upsert_challenge_files(
+    db,
+    challenge_id: int,
+    files: List[schemas.ChallengeFileCreate],
+    if_match: Optional[str] = None,
+):
     """
-    Replace all files for a challenge. Enforces max 5 files and exactly one is_main.
+    Sync a challenge's files to the given list. Enforces max 5 files and at least one is_main.
+    Rows are matched by filename and only changed ones are written, in one transaction.
+    Returns (files, etag); a request that changes nothing performs no writes.
     """
     if len(files) > MAX_FILES_PER_CHALLENGE:
         raise HTTPException(status_code=400, detail=f"Maximum {MAX_FILES_PER_CHALLENGE} files per challenge.")
-    c = db.query(models.Challenge).filter(models.Challenge.id == challenge_id).first()
+    if len({f.filename for f in files}) != len(files):
+        raise HTTPException(status_code=422, detail="Filenames must be unique within a challenge.")
+    # The challenge row lock serialises concurrent saves, so the If-Match check and the
+    # writes below see the same file set.
+    c = db.query(models.Challenge).filter(models.Challenge.id == challenge_id).with_for_update().first()
     if not c:
         raise HTTPException(status_code=404, detail="Challenge not found.")
 
-    # Delete existing files
-    db.query(models.ChallengeFile).filter(models.ChallengeFile.challenge_id == challenge_id).delete()
-
-    if not files:
-        db.commit()
-        return []
+    # Bodies stay deferred: the ETag and the diff use content_hash, and only legacy rows
+    # without one load their content.
+    existing = (
+        db.query(models.ChallengeFile)
+        .filter(models.ChallengeFile.challenge_id == challenge_id)
+        .order_by(models.ChallengeFile.order_index, models.ChallengeFile.id)
+        .all()
+    )
+    if if_match is not None and not _etag_matches(if_match, files_etag(existing)):
+        raise HTTPException(status_code=412, detail="Files were changed by someone else; reload and retry.")
 
     # If no file is marked as main, mark first
-    if not any(f.is_main for f in files):
+    if files and not any(f.is_main for f in files):
         files[0].is_main = True
 
-    created = []
+    by_name = {}
+    stale = []
+    for row in existing:
+        if row.filename in by_name:
+            stale.append(row)  # legacy duplicate filename
+        else:
+            by_name[row.filename] = row
+
+    changed = bool(stale)
+    keep = []
     for i, fd in enumerate(files):
-        f = models.ChallengeFile(
-            challenge_id=challenge_id,
-            filename=fd.filename,
-            content=fd.content,
-            is_main=fd.is_main,
-            order_index=i,
+        digest = models.content_hash(fd.content)
+        row = by_name.pop(fd.filename, None)
+        if row is None:
+            row = models.ChallengeFile(
+                challenge_id=challenge_id,
+                filename=fd.filename,
+                content=fd.content,
+                content_hash=digest,
+                is_main=fd.is_main,
+                order_index=i,
+            )
+            db.add(row)
+            changed = True
+        else:
+            if (row.content_hash or models.content_hash(row.content)) != digest:
+                row.content = fd.content
+                row.content_hash = digest
+                changed = True
+            elif row.content_hash is None:
+                row.content_hash = digest
+            if bool(row.is_main) != bool(fd.is_main) or row.order_index != i:
+                row.is_main = fd.is_main
+                row.order_index = i
+                changed = True
+        keep.append(row)
+
+    stale.extend(by_name.values())
+    for row in stale:
+        db.delete(row)
+        changed = True
+
+    if changed:
+        c.updated_at = datetime.now(timezone.utc)
+        db.commit()
+    elif db.dirty:
+        db.commit()  # only content_hash backfills; not a content change
+
+    return [_file_to_response(f) for f in keep], files_etag(keep)
+
+
+# ── PUBLISHED LEVEL PAYLOAD (student workspace) ────────────────────────────────
+_published_level_cache: "OrderedDict[int, Tuple[str, bytes, bytes]]" = OrderedDict()
+_published_level_lock = threading.Lock()
+
+
+def published_level_etag(db: Session, level_id: int) -> str:
+    """Strong ETag from the level's and its lab's updated_at plus file hashes, read without
+    loading any content. A level is only published while its lab is."""
+    level = (
+        db.query(
+            models.Challenge.updated_at,
+            models.Challenge.is_published,
+            models.Lab.updated_at.label("lab_updated_at"),
+            models.Lab.is_published.label("lab_is_published"),
         )
-        db.add(f)
-        db.flush()
-        created.append(_file_to_response(f))
+        .join(models.Module, models.Module.id == models.Challenge.module_id)
+        .join(models.Lab, models.Lab.id == models.Module.lab_id)
+        .filter(models.Challenge.id == level_id)
+        .first()
+    )
+    if not level or not level.is_published or not level.lab_is_published:
+        raise HTTPException(status_code=404, detail="Level not found.")
 
-    db.commit()
-    return created
+    file_rows = (
+        db.query(
+            models.ChallengeFile.filename,
+            models.ChallengeFile.content_hash,
+            models.ChallengeFile.is_main,
+            models.ChallengeFile.order_index,
+        )
+        .filter(models.ChallengeFile.challenge_id == level_id)
+        .all()
+    )
+    if any(row.content_hash is None for row in file_rows):
+        # Rows written before content_hash existed; hash them from content.
+        file_rows = (
+            db.query(models.ChallengeFile)
+            .options(undefer(models.ChallengeFile.content))
+            .filter(models.ChallengeFile.challenge_id == level_id)
+            .all()
+        )
+
+    digest = hashlib.sha256(
+        f"{level_id}\0{level.updated_at.isoformat()}\0{level.lab_updated_at.isoformat()}\0{files_etag(file_rows)}"
+        .encode("utf-8")
+    )
+    return f'"level-{digest.hexdigest()[:32]}"'
+
+
+def published_level_payload(db: Session, level_id: int, etag: str) -> Tuple[bytes, bytes]:
+    """Return (json, gzip) bodies for a published level, serialized once per ETag."""
+    with _published_level_lock:
+        cached = _published_level_cache.get(level_id)
+        if cached and cached[0] == etag:
+            _published_level_cache.move_to_end(level_id)
+            return cached[1], cached[2]
+
+    level = (
+        _level_query(db)
+        .join(models.Module, models.Module.id == models.Challenge.module_id)
+        .join(models.Lab, models.Lab.id == models.Module.lab_id)
+        .filter(models.Challenge.id == level_id, models.Challenge.is_published == True, models.Lab.is_published == True)
+        .first()
+    )
+    if not level:
+        raise HTTPException(status_code=404, detail="Level not found.")
+
+    payload = _level_to_response(level).model_dump(mode="json", exclude={"expected_output"})
+    body = json.dumps(payload, separators=(",", ":")).encode("utf-8")
+    compressed = gzip.compress(body, compresslevel=6, mtime=0)
+
+    with _published_level_lock:
+        _published_level_cache[level_id] = (etag, body, compressed)
+        _published_level_cache.move_to_end(level_id)
+        while len(_published_level_cache) > PUBLISHED_LEVEL_CACHE_SIZE:
+            _published_level_cache.popitem(last=False)
+    return body, compressed
 
 
-def upsert_level_files(db: Session, level_id: int, files: List[schemas.ChallengeFileCreate]):
-    return upsert_challenge_files(db, level_id, files)
+def upsert_level_files(db: Session, level_id: int, files: List[schemas.ChallengeFileCreate], if_match: Optional[str] = None):
+    return upsert_challenge_files(db, level_id, files, if_match=if_match)
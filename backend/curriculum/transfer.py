@@ -0,0 +1,567 @@
+"""
+curriculum/transfer.py — Campus404
+Whole-lab export/import as a single tar.gz archive.
+
+Archive layout:
+  manifest.json            format/version, source lab slug and record counts
+  records/NNNNNN.jsonl     one JSON record per line, in dependency order
+                           (lab, module, group, challenge, file, badge, guide)
+  media/<relative path>    referenced upload blobs (banner, isometric, badge, guide images)
+
+Export streams: records are written in small tar members and media files are copied in
+blocks, so memory stays flat regardless of lab size. Import validates the whole archive
+first, then writes everything with bulk inserts in one transaction as a background job.
+"""
+import io
+import json
+import os
+import re
+import shutil
+import tarfile
+import tempfile
+import time
+from collections import defaultdict
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from fastapi import HTTPException, UploadFile
+from pydantic import BaseModel, Field
+from sqlalchemy import insert
+from sqlalchemy.orm import Session, undefer
+
+from database import SessionLocal
+from guide.models import GuidePage
+from jobs.models import JOB_QUEUED, JOB_RUNNING, Job
+from jobs.services import JobContext, job_handler, periodic_job
+from search import services as search_index
+from . import models, sequences
+from .services import MAX_FILES_PER_CHALLENGE, UPLOADS_ROOT
+
+ARCHIVE_FORMAT = "campus404.lab"
+ARCHIVE_VERSION = 1
+RECORDS_PER_MEMBER = 500
+MAX_IMPORT_BYTES = 200 * 1024 * 1024
+IMPORT_SPOOL_DIR = Path(os.getenv("CURRICULUM_IMPORT_DIR", os.path.join(tempfile.gettempdir(), "campus404-imports")))
+IMPORT_SPOOL_MAX_AGE_HOURS = float(os.getenv("CURRICULUM_IMPORT_MAX_AGE_HOURS", "48"))
+IMPORT_LAB_JOB = "curriculum.import_lab"
+IMPORT_SPOOL_SWEEP_JOB = "curriculum.import_spool_sweep"
+
+_SAFE_MEDIA_RE = re.compile(r'^[\w/.-]+$')
+
+# Columns copied verbatim per record type; ids and foreign keys are remapped separately.
+_LAB_FIELDS = ("title", "slug", "description", "banner_image_path", "isometric_image_path",
+               "hero_image_url", "language_id", "is_published")
+_MODULE_FIELDS = ("title", "description", "banner_image_path", "order_index")
+_GROUP_FIELDS = ("title", "description", "order_index", "is_published")
+_CHALLENGE_FIELDS = ("level_number", "challenge_type", "custom_title", "xp_reward",
+                     "expected_output", "content_html", "is_published")
+_FILE_FIELDS = ("filename", "content", "is_main", "order_index")
+_BADGE_FIELDS = ("name", "description", "image_path", "image_url")
+_GUIDE_FIELDS = ("title", "slug", "excerpt", "content_html", "featured_image_path", "is_published")
+
+
+class LabImportPayload(BaseModel):
+    archive_path: str
+    slug: Optional[str] = Field(None, max_length=255, pattern=r'^[a-z0-9-]+$')
+    title: Optional[str] = Field(None, max_length=255)
+
+
+# ── Export ───────────────────────────────────────────────────────────────────
+class _TarSink(io.RawIOBase):
+    """Write-only file object that buffers tar output until the generator drains it."""
+
+    def __init__(self):
+        self._chunks: List[bytes] = []
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks = []
+        return data
+
+
+def _pick(obj, fields) -> dict:
+    return {field: getattr(obj, field) for field in fields}
+
+
+def _iter_lab_records(db: Session, lab: models.Lab) -> Iterator[dict]:
+    yield {"type": "lab", "ref": lab.id, **_pick(lab, _LAB_FIELDS)}
+
+    module_ids = [
+        row[0]
+        for row in db.query(models.Module.id)
+        .filter(models.Module.lab_id == lab.id)
+        .order_by(models.Module.order_index, models.Module.id)
+        .all()
+    ]
+    for module in (
+        db.query(models.Module)
+        .filter(models.Module.lab_id == lab.id)
+        .order_by(models.Module.order_index, models.Module.id)
+        .yield_per(RECORDS_PER_MEMBER)
+    ):
+        yield {"type": "module", "ref": module.id, "lab_ref": lab.id, **_pick(module, _MODULE_FIELDS)}
+    if not module_ids:
+        return
+
+    for group in (
+        db.query(models.ChallengeGroup)
+        .filter(models.ChallengeGroup.module_id.in_(module_ids))
+        .order_by(models.ChallengeGroup.module_id, models.ChallengeGroup.order_index, models.ChallengeGroup.id)
+        .yield_per(RECORDS_PER_MEMBER)
+    ):
+        yield {"type": "group", "ref": group.id, "module_ref": group.module_id, **_pick(group, _GROUP_FIELDS)}
+
+    for challenge in (
+        db.query(models.Challenge)
+        .options(undefer(models.Challenge.content_html), undefer(models.Challenge.expected_output))
+        .filter(models.Challenge.module_id.in_(module_ids))
+        .order_by(models.Challenge.module_id, models.Challenge.level_number, models.Challenge.id)
+        .yield_per(RECORDS_PER_MEMBER)
+    ):
+        yield {
+            "type": "challenge",
+            "ref": challenge.id,
+            "module_ref": challenge.module_id,
+            "group_ref": challenge.challenge_group_id,
+            **_pick(challenge, _CHALLENGE_FIELDS),
+        }
+
+    for f in (
+        db.query(models.ChallengeFile)
+        .options(undefer(models.ChallengeFile.content))
+        .join(models.Challenge, models.Challenge.id == models.ChallengeFile.challenge_id)
+        .filter(models.Challenge.module_id.in_(module_ids))
+        .order_by(models.ChallengeFile.challenge_id, models.ChallengeFile.order_index, models.ChallengeFile.id)
+        .yield_per(RECORDS_PER_MEMBER)
+    ):
+        yield {"type": "file", "ref": f.id, "challenge_ref": f.challenge_id, **_pick(f, _FILE_FIELDS)}
+
+    for badge in db.query(models.Badge).filter(models.Badge.module_id.in_(module_ids)).all():
+        yield {"type": "badge", "ref": badge.id, "module_ref": badge.module_id, **_pick(badge, _BADGE_FIELDS)}
+
+    for guide in (
+        db.query(GuidePage)
+        .options(undefer(GuidePage.content_html))
+        .filter(GuidePage.module_id.in_(module_ids))
+        .all()
+    ):
+        yield {"type": "guide", "ref": guide.id, "module_ref": guide.module_id, **_pick(guide, _GUIDE_FIELDS)}
+
+
+def _media_paths(record: dict) -> List[str]:
+    keys = ("banner_image_path", "isometric_image_path", "image_path", "featured_image_path")
+    return [record[key] for key in keys if record.get(key)]
+
+
+def _add_bytes(tar: tarfile.TarFile, name: str, data: bytes) -> None:
+    info = tarfile.TarInfo(name=name)
+    info.size = len(data)
+    info.mtime = int(time.time())
+    tar.addfile(info, io.BytesIO(data))
+
+
+def stream_lab_export(db: Session, lab_id: int) -> Tuple[str, Iterator[bytes]]:
+    """Return (filename, chunk iterator) for a tar.gz archive of one lab."""
+    lab_slug = db.query(models.Lab.slug).filter(models.Lab.id == lab_id).scalar()
+    if not lab_slug:
+        raise HTTPException(status_code=404, detail="Lab not found.")
+
+    def generate() -> Iterator[bytes]:
+        # The request session is released before the body streams, so use a dedicated one.
+        stream_db = SessionLocal()
+        try:
+            yield from _write_lab_archive(stream_db, stream_db.query(models.Lab).filter(models.Lab.id == lab_id).one())
+        finally:
+            stream_db.close()
+
+    return f"{lab_slug}.campus404-lab.tar.gz", generate()
+
+
+def _write_lab_archive(db: Session, lab: models.Lab) -> Iterator[bytes]:
+    sink = _TarSink()
+    counts: Dict[str, int] = defaultdict(int)
+    media: List[str] = []
+    with tarfile.open(fileobj=sink, mode="w|gz") as tar:
+        batch: List[str] = []
+        member = 0
+        for record in _iter_lab_records(db, lab):
+            counts[record["type"]] += 1
+            media.extend(_media_paths(record))
+            batch.append(json.dumps(record, default=str, separators=(",", ":")))
+            if len(batch) >= RECORDS_PER_MEMBER:
+                member += 1
+                _add_bytes(tar, f"records/{member:06d}.jsonl", ("\n".join(batch) + "\n").encode("utf-8"))
+                batch = []
+                yield sink.drain()
+        if batch:
+            member += 1
+            _add_bytes(tar, f"records/{member:06d}.jsonl", ("\n".join(batch) + "\n").encode("utf-8"))
+            yield sink.drain()
+
+        root = UPLOADS_ROOT.resolve()
+        for relative in sorted(set(media)):
+            source = (UPLOADS_ROOT / relative).resolve()
+            if not str(source).startswith(str(root)) or not source.is_file():
+                continue
+            with source.open("rb") as fh:
+                tar.addfile(tar.gettarinfo(str(source), arcname=f"media/{relative}"), fh)
+            yield sink.drain()
+
+        manifest = {
+            "format": ARCHIVE_FORMAT,
+            "version": ARCHIVE_VERSION,
+            "exported_at": datetime.now(timezone.utc).isoformat(),
+            "lab_slug": lab.slug,
+            "record_members": member,
+            "counts": dict(counts),
+        }
+        _add_bytes(tar, "manifest.json", json.dumps(manifest, indent=2).encode("utf-8"))
+    yield sink.drain()
+
+
+# ── Import ───────────────────────────────────────────────────────────────────
+async def spool_import_upload(file: UploadFile) -> Path:
+    """Copy an uploaded archive to the import spool directory, enforcing the size cap."""
+    IMPORT_SPOOL_DIR.mkdir(parents=True, exist_ok=True)
+    fd, name = tempfile.mkstemp(prefix="lab-", suffix=".tar.gz", dir=str(IMPORT_SPOOL_DIR))
+    written = 0
+    try:
+        with os.fdopen(fd, "wb") as out:
+            while True:
+                chunk = await file.read(1024 * 1024)
+                if not chunk:
+                    break
+                written += len(chunk)
+                if written > MAX_IMPORT_BYTES:
+                    raise HTTPException(status_code=413, detail="Archive exceeds the import size limit.")
+                out.write(chunk)
+    except Exception:
+        Path(name).unlink(missing_ok=True)
+        raise
+    return Path(name)
+
+
+def _read_archive(tar: tarfile.TarFile) -> Dict[str, List[dict]]:
+    manifest_member = tar.getmember("manifest.json") if "manifest.json" in tar.getnames() else None
+    if manifest_member is None:
+        raise ValueError("Archive has no manifest.json.")
+    manifest = json.loads(tar.extractfile(manifest_member).read().decode("utf-8"))
+    if manifest.get("format") != ARCHIVE_FORMAT or manifest.get("version") != ARCHIVE_VERSION:
+        raise ValueError("Unsupported archive format or version.")
+
+    records: Dict[str, List[dict]] = defaultdict(list)
+    for member in sorted(
+        (m for m in tar.getmembers() if m.isfile() and m.name.startswith("records/") and m.name.endswith(".jsonl")),
+        key=lambda m: m.name,
+    ):
+        for line in tar.extractfile(member).read().decode("utf-8").splitlines():
+            if line.strip():
+                record = json.loads(line)
+                records[record.get("type", "")].append(record)
+    return records
+
+
+def _validate_records(records: Dict[str, List[dict]]) -> None:
+    """Reject archives that would violate curriculum invariants before anything is written."""
+    if len(records.get("lab", [])) != 1:
+        raise ValueError("Archive must contain exactly one lab.")
+
+    module_refs = {m["ref"] for m in records.get("module", [])}
+    group_modules = {g["ref"]: g["module_ref"] for g in records.get("group", [])}
+    if any(ref not in module_refs for ref in group_modules.values()):
+        raise ValueError("A challenge group references a module that is not in the archive.")
+
+    by_module: Dict[int, List[dict]] = defaultdict(list)
+    for c in records.get("challenge", []):
+        if c.get("module_ref") not in module_refs:
+            raise ValueError("A level references a module that is not in the archive.")
+        if c.get("group_ref") is not None and group_modules.get(c["group_ref"]) != c["module_ref"]:
+            raise ValueError("A level references a challenge group outside its module.")
+        if c.get("challenge_type") not in models.VALID_CHALLENGE_TYPES:
+            raise ValueError(f"Invalid challenge_type '{c.get('challenge_type')}'.")
+        if c["challenge_type"] == models.CHALLENGE_TYPE_EXAM and int(c.get("xp_reward") or 0) > 100:
+            raise ValueError("Module exam XP cannot exceed 100.")
+        if not c.get("content_html"):
+            raise ValueError("Every level needs content_html.")
+        by_module[c["module_ref"]].append(c)
+
+    for levels in by_module.values():
+        levels.sort(key=lambda c: (int(c.get("level_number") or 0), c["ref"]))
+        exams = [c for c in levels if c["challenge_type"] == models.CHALLENGE_TYPE_EXAM]
+        if len(exams) > 1:
+            raise ValueError("A module may contain at most one final exam.")
+        if exams and levels[-1] is not exams[0]:
+            raise ValueError("The final exam must be the last level of its module.")
+
+    challenge_refs = {c["ref"] for c in records.get("challenge", [])}
+    files_per_challenge: Dict[int, int] = defaultdict(int)
+    for f in records.get("file", []):
+        if f.get("challenge_ref") not in challenge_refs:
+            raise ValueError("A file references a level that is not in the archive.")
+        files_per_challenge[f["challenge_ref"]] += 1
+    if any(n > MAX_FILES_PER_CHALLENGE for n in files_per_challenge.values()):
+        raise ValueError(f"Maximum {MAX_FILES_PER_CHALLENGE} files per challenge.")
+
+    badge_modules = [b.get("module_ref") for b in records.get("badge", [])]
+    guide_modules = [g.get("module_ref") for g in records.get("guide", [])]
+    for refs, label in ((badge_modules, "badge"), (guide_modules, "guide page")):
+        if any(ref not in module_refs for ref in refs) or len(set(refs)) != len(refs):
+            raise ValueError(f"Each {label} must belong to a distinct module in the archive.")
+
+    for record_list in records.values():
+        for record in record_list:
+            for path in _media_paths(record):
+                if path.startswith("/") or ".." in path or not _SAFE_MEDIA_RE.match(path):
+                    raise ValueError(f"Invalid media path '{path}'.")
+
+
+def _restore_media(tar: tarfile.TarFile) -> int:
+    """Copy archived media into uploads; existing files are left untouched."""
+    root = UPLOADS_ROOT.resolve()
+    restored = 0
+    for member in tar.getmembers():
+        if not member.isfile() or not member.name.startswith("media/"):
+            continue
+        relative = member.name[len("media/"):]
+        if relative.startswith("/") or ".." in relative or not _SAFE_MEDIA_RE.match(relative):
+            continue
+        target = (UPLOADS_ROOT / relative).resolve()
+        if not str(target).startswith(str(root)) or target.exists():
+            continue
+        target.parent.mkdir(parents=True, exist_ok=True)
+        with tar.extractfile(member) as src, target.open("wb") as dst:
+            shutil.copyfileobj(src, dst)
+        restored += 1
+    return restored
+
+
+def _unique_guide_slug(db: Session, slug: str, suffix: str) -> str:
+    if not db.query(GuidePage.id).filter(GuidePage.slug == slug).first():
+        return slug
+    return f"{slug}-{suffix}"[:255]
+
+
+def import_lab_archive(db: Session, archive_path: Path, slug: Optional[str] = None,
+                       title: Optional[str] = None, ctx: Optional[JobContext] = None) -> dict:
+    """Validate and ingest an exported lab. Everything is written in one transaction."""
+    def progress(pct: float, message: str) -> None:
+        if ctx is not None:
+            ctx.progress(pct, message)
+
+    with tarfile.open(str(archive_path), mode="r:gz") as tar:
+        records = _read_archive(tar)
+        _validate_records(records)
+        progress(10, "Archive validated")
+
+        lab_record = records["lab"][0]
+        lab_data = {field: lab_record.get(field) for field in _LAB_FIELDS}
+        lab_data["slug"] = slug or lab_data["slug"]
+        lab_data["title"] = title or lab_data["title"]
+        if db.query(models.Lab.id).filter(models.Lab.slug == lab_data["slug"]).first():
+            raise ValueError(f"Slug '{lab_data['slug']}' is already in use.")
+
+        lab = models.Lab(**lab_data)
+        db.add(lab)
+        db.flush()
+
+        # Modules: bulk insert with pre-reserved uids, then map refs back through unique_id.
+        module_records = records.get("module", [])
+        uids = sequences.reserve_module_uids(db, len(module_records)) if module_records else []
+        uid_by_ref = {}
+        module_rows = []
+        for record, uid in zip(module_records, uids):
+            base_slug = re.sub(r'[^a-z0-9-]+', '-', (record.get("title") or "module").lower()).strip('-')
+            uid_by_ref[record["ref"]] = uid
+            module_rows.append({
+                **{field: record.get(field) for field in _MODULE_FIELDS},
+                "lab_id": lab.id,
+                "unique_id": uid,
+                "slug": f"{base_slug}-{uid}",
+                "created_at": datetime.now(timezone.utc),
+            })
+        if module_rows:
+            db.execute(insert(models.Module), module_rows)
+        module_id_by_uid = {
+            row.unique_id: row.id
+            for row in db.query(models.Module.id, models.Module.unique_id).filter(models.Module.lab_id == lab.id).all()
+        }
+        module_id_by_ref = {ref: module_id_by_uid[uid] for ref, uid in uid_by_ref.items()}
+        progress(25, f"{len(module_rows)} modules")
+
+        # Groups: order_index is renumbered 0..n-1 per module, which also makes it a lookup key.
+        now = datetime.now(timezone.utc)
+        group_rows = []
+        group_key_by_ref = {}
+        groups_by_module: Dict[int, List[dict]] = defaultdict(list)
+        for record in records.get("group", []):
+            groups_by_module[record["module_ref"]].append(record)
+        for module_ref, group_records in groups_by_module.items():
+            group_records.sort(key=lambda g: (int(g.get("order_index") or 0), g["ref"]))
+            for index, record in enumerate(group_records):
+                module_id = module_id_by_ref[module_ref]
+                group_key_by_ref[record["ref"]] = (module_id, index)
+                group_rows.append({
+                    **{field: record.get(field) for field in _GROUP_FIELDS},
+                    "module_id": module_id,
+                    "order_index": index,
+                    "created_at": now,
+                    "updated_at": now,
+                })
+        if group_rows:
+            db.execute(insert(models.ChallengeGroup), group_rows)
+        group_id_by_key = {
+            (row.module_id, row.order_index): row.id
+            for row in db.query(models.ChallengeGroup.id, models.ChallengeGroup.module_id, models.ChallengeGroup.order_index)
+            .filter(models.ChallengeGroup.module_id.in_(list(module_id_by_ref.values()) or [0]))
+            .all()
+        }
+        progress(40, f"{len(group_rows)} challenge groups")
+
+        # Levels: numbered 1..n per module (validated order), keyed back by (module_id, level_number).
+        challenge_rows = []
+        challenge_key_by_ref = {}
+        levels_by_module: Dict[int, List[dict]] = defaultdict(list)
+        for record in records.get("challenge", []):
+            levels_by_module[record["module_ref"]].append(record)
+        for module_ref, level_records in levels_by_module.items():
+            level_records.sort(key=lambda c: (int(c.get("level_number") or 0), c["ref"]))
+            module_id = module_id_by_ref[module_ref]
+            for number, record in enumerate(level_records, start=1):
+                group_ref = record.get("group_ref")
+                challenge_key_by_ref[record["ref"]] = (module_id, number)
+                challenge_rows.append({
+                    **{field: record.get(field) for field in _CHALLENGE_FIELDS},
+                    "module_id": module_id,
+                    "challenge_group_id": group_id_by_key.get(group_key_by_ref.get(group_ref)) if group_ref else None,
+                    "level_number": number,
+                    "created_at": now,
+                    "updated_at": now,
+                })
+        if challenge_rows:
+            db.execute(insert(models.Challenge), challenge_rows)
+        challenge_id_by_key = {
+            (row.module_id, row.level_number): row.id
+            for row in db.query(models.Challenge.id, models.Challenge.module_id, models.Challenge.level_number)
+            .filter(models.Challenge.module_id.in_(list(module_id_by_ref.values()) or [0]))
+            .all()
+        }
+        progress(65, f"{len(challenge_rows)} levels")
+
+        file_rows = [
+            {
+                **{field: record.get(field) for field in _FILE_FIELDS},
+                "content": record.get("content") or "",
+                "content_hash": models.content_hash(record.get("content")),
+                "challenge_id": challenge_id_by_key[challenge_key_by_ref[record["challenge_ref"]]],
+            }
+            for record in records.get("file", [])
+        ]
+        if file_rows:
+            db.execute(insert(models.ChallengeFile), file_rows)
+        progress(80, f"{len(file_rows)} files")
+
+        badge_rows = [
+            {
+                **{field: record.get(field) for field in _BADGE_FIELDS},
+                "module_id": module_id_by_ref[record["module_ref"]],
+                "created_at": now,
+            }
+            for record in records.get("badge", [])
+        ]
+        if badge_rows:
+            db.execute(insert(models.Badge), badge_rows)
+
+        guide_rows = []
+        for record in records.get("guide", []):
+            module_id = module_id_by_ref[record["module_ref"]]
+            guide_rows.append({
+                **{field: record.get(field) for field in _GUIDE_FIELDS},
+                "slug": _unique_guide_slug(db, record.get("slug") or "guide", uid_by_ref[record["module_ref"]]),
+                "module_id": module_id,
+                "created_at": now,
+                "updated_at": now,
+            })
+        if guide_rows:
+            db.execute(insert(GuidePage), guide_rows)
+        progress(90, f"{len(badge_rows)} badges, {len(guide_rows)} guide pages")
+
+        media_restored = _restore_media(tar)
+
+    # Rows went in through Core inserts; index the new tree in the same transaction.
+    db.expire(lab)
+    search_index.index_lab(db, lab, cascade=True)
+    for post in (
+        db.query(GuidePage)
+        .options(undefer(GuidePage.content_html))
+        .filter(GuidePage.module_id.in_(list(module_id_by_ref.values()) or [0]))
+        .all()
+    ):
+        search_index.index_guide(db, post)
+    db.commit()
+    return {
+        "lab_id": lab.id,
+        "lab_slug": lab_data["slug"],
+        "modules": len(module_rows),
+        "challenge_groups": len(group_rows),
+        "levels": len(challenge_rows),
+        "files": len(file_rows),
+        "badges": len(badge_rows),
+        "guide_pages": len(guide_rows),
+        "media_restored": media_restored,
+    }
+
+
+@job_handler(IMPORT_LAB_JOB, payload_model=LabImportPayload)
+def _run_lab_import(ctx: JobContext, payload: LabImportPayload) -> dict:
+    archive_path = Path(payload.archive_path)
+    if archive_path.parent.resolve() != IMPORT_SPOOL_DIR.resolve():
+        raise ValueError("Archive path is outside the import spool directory.")
+    if not archive_path.is_file():
+        raise ValueError("Import archive is missing; upload it again.")
+    # Failed and cancelled imports can be retried from the admin jobs page, so the archive
+    # is only removed once the import succeeded; the spool sweep collects the rest.
+    result = import_lab_archive(ctx.db, archive_path, slug=payload.slug, title=payload.title, ctx=ctx)
+    archive_path.unlink(missing_ok=True)
+    return result
+
+
+def sweep_import_spool(db: Session) -> int:
+    """Delete spooled archives older than IMPORT_SPOOL_MAX_AGE_HOURS that no queued or running
+    import still needs; a failed import can be retried until then."""
+    if not IMPORT_SPOOL_DIR.is_dir():
+        return 0
+    pending = set()
+    for (payload_json,) in db.query(Job.payload_json).filter(
+        Job.kind == IMPORT_LAB_JOB, Job.status.in_((JOB_QUEUED, JOB_RUNNING))
+    ):
+        try:
+            pending.add(Path(json.loads(payload_json or "{}").get("archive_path") or "").name)
+        except ValueError:
+            continue
+    cutoff = time.time() - IMPORT_SPOOL_MAX_AGE_HOURS * 3600
+    removed = 0
+    for path in IMPORT_SPOOL_DIR.glob("lab-*.tar.gz"):
+        try:
+            if path.name in pending or path.stat().st_mtime >= cutoff:
+                continue
+            path.unlink()
+        except OSError:
+            continue
+        removed += 1
+    return removed
+
+
+@job_handler(IMPORT_SPOOL_SWEEP_JOB)
+def _run_import_spool_sweep(ctx: JobContext, payload: dict) -> dict:
+    return {"deleted": sweep_import_spool(ctx.db)}
+
+
+periodic_job(IMPORT_SPOOL_SWEEP_JOB, 3600)
@@ -4,9 +4,10 @@ Database engine configured for Docker MySQL with retry logic.
 """
 import os
 import time
+from typing import Any, Callable, Dict, Sequence
 
 from sqlalchemy import create_engine, text
-from sqlalchemy.orm import declarative_base, sessionmaker
+from sqlalchemy.orm import Session, declarative_base, sessionmaker
 
 # ── Connection ───────────────────────────────────────────────────────
 DATABASE_URL = os.getenv(
@@ -40,3 +41,64 @@ def get_db():
         yield db
     finally:
         db.close()
+
+
+# ── Upserts ──────────────────────────────────────────────────────────
+def upsert(
+    db: Session,
+    model,
+    values: Dict[str, Any],
+    conflict_columns: Sequence[str],
+    update: Callable[[Any], Dict[str, Any]],
+) -> None:
+    """Insert a row or update the existing one in a single atomic statement.
+
+    MySQL gets INSERT ... ON DUPLICATE KEY UPDATE; SQLite and PostgreSQL get
+    INSERT ... ON CONFLICT (conflict_columns) DO UPDATE. update(incoming) returns the SET
+    clause: model columns refer to the stored row and incoming.<col> to the proposed
+    values. MySQL applies assignments left to right, so no SET expression may read a column
+    assigned before it. The row stays locked until the caller's transaction ends.
+    """
+    table = model.__table__
+    dialect = db.get_bind().dialect.name
+    if dialect == "mysql":
+        from sqlalchemy.dialects.mysql import insert as dialect_insert
+
+        stmt = dialect_insert(table).values(**values)
+        stmt = stmt.on_duplicate_key_update(**update(stmt.inserted))
+    elif dialect in ("sqlite", "postgresql"):
+        if dialect == "sqlite":
+            from sqlalchemy.dialects.sqlite import insert as dialect_insert
+        else:
+            from sqlalchemy.dialects.postgresql import insert as dialect_insert
+
+        stmt = dialect_insert(table).values(**values)
+        stmt = stmt.on_conflict_do_update(index_elements=list(conflict_columns), set_=update(stmt.excluded))
+    else:
+        raise NotImplementedError(f"upsert is not supported on '{dialect}'.")
+    db.execute(stmt)
+
+
+def insert_ignore(db: Session, model, values: Dict[str, Any], conflict_columns: Sequence[str]) -> bool:
+    """Insert a row unless one with the same conflict_columns exists; True if it was inserted.
+
+    A concurrent inserter blocks on the unique key until the first transaction ends, so
+    exactly one caller sees True. MySQL uses INSERT IGNORE, which also downgrades other
+    errors (bad foreign keys, NULLs) to warnings, so validate values before calling.
+    """
+    table = model.__table__
+    dialect = db.get_bind().dialect.name
+    if dialect == "mysql":
+        from sqlalchemy.dialects.mysql import insert as dialect_insert
+
+        stmt = dialect_insert(table).values(**values).prefix_with("IGNORE")
+    elif dialect in ("sqlite", "postgresql"):
+        if dialect == "sqlite":
+            from sqlalchemy.dialects.sqlite import insert as dialect_insert
+        else:
+            from sqlalchemy.dialects.postgresql import insert as dialect_insert
+
+        stmt = dialect_insert(table).values(**values).on_conflict_do_nothing(index_elements=list(conflict_columns))
+    else:
+        raise NotImplementedError(f"insert_ignore is not supported on '{dialect}'.")
+    return db.execute(stmt).rowcount == 1
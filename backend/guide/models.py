@@ -5,7 +5,7 @@ Custom Guide page type, linked to curriculum modules.
 from datetime import datetime, timezone
 
 from sqlalchemy import Boolean, Column, DateTime, ForeignKey, Integer, String, Table, Text
-from sqlalchemy.orm import relationship
+from sqlalchemy.orm import deferred, relationship
 
 from database import Base
 
@@ -26,10 +26,18 @@ class GuidePage(Base):
     title = Column(String(255), nullable=False)
     slug = Column(String(255), unique=True, nullable=False, index=True)
     excerpt = Column(String(320), nullable=True)
-    content_html = Column(Text, nullable=False)
+    content_html = deferred(Column(Text, nullable=False))
     featured_image_path = Column(String(512), nullable=True)
     module_id = Column(Integer, ForeignKey("modules.id", ondelete="SET NULL"), nullable=True, unique=True, index=True)
     is_published = Column(Boolean, default=False, nullable=False)
+    # Render cache, refreshed on save and when the site TOC depth changes (see guide/render.py)
+    rendered_html = deferred(Column(Text, nullable=True), group="rendered")
+    toc_json = deferred(Column(Text, nullable=True), group="rendered")
+    toc_depth = Column(Integer, nullable=True)
+    word_count = Column(Integer, nullable=False, default=0)
+    reading_minutes = Column(Integer, nullable=False, default=1)
+    text_excerpt = Column(String(320), nullable=True)
+    rendered_at = Column(DateTime, nullable=True)
     created_at = Column(DateTime, default=lambda: datetime.now(timezone.utc), nullable=False)
     updated_at = Column(
         DateTime,
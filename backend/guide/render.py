@@ -0,0 +1,258 @@
+"""
+guide/render.py — Campus404
+Save-time rendering for Guide pages: sanitized HTML with heading anchors, a TOC tree,
+word count, reading time and a plain-text excerpt.
+
+Built on the standard library HTML parser so the render runs once per save (or per TOC
+depth change) and read endpoints only serve the stored result.
+"""
+from dataclasses import dataclass
+from html import escape
+from html.parser import HTMLParser
+import json
+from math import ceil
+import re
+from typing import Dict, List, Optional, Tuple
+
+WORDS_PER_MINUTE = 220
+EXCERPT_MAX_CHARS = 300
+MIN_TOC_DEPTH = 2
+MAX_TOC_DEPTH = 4
+DEFAULT_TOC_DEPTH = 3
+
+ALLOWED_TAGS = {
+    "a", "abbr", "b", "blockquote", "br", "caption", "cite", "code", "col", "colgroup", "dd",
+    "del", "details", "div", "dl", "dt", "em", "figcaption", "figure", "h1", "h2", "h3", "h4",
+    "h5", "h6", "hr", "i", "img", "ins", "kbd", "li", "mark", "ol", "p", "pre", "q", "s",
+    "samp", "small", "span", "strike", "strong", "sub", "summary", "sup", "table", "tbody",
+    "td", "tfoot", "th", "thead", "tr", "u", "ul",
+}
+VOID_TAGS = {"br", "col", "hr", "img"}
+# Content of these elements is dropped along with the tag itself.
+DROP_CONTENT_TAGS = {"script", "style", "iframe", "object", "embed", "noscript", "template", "svg", "math"}
+BLOCK_TAGS = {
+    "blockquote", "br", "caption", "dd", "div", "dl", "dt", "figcaption", "figure", "h1", "h2",
+    "h3", "h4", "h5", "h6", "hr", "li", "ol", "p", "pre", "summary", "table", "td", "th", "tr", "ul",
+}
+HEADING_TAGS = {"h2", "h3", "h4"}
+
+GLOBAL_ATTRS = {"class", "title", "lang", "dir", "style"}
+TAG_ATTRS = {
+    "a": {"href", "target", "rel"},
+    "img": {"src", "alt", "width", "height", "loading"},
+    "ol": {"start", "type"},
+    "td": {"colspan", "rowspan", "align"},
+    "th": {"colspan", "rowspan", "align", "scope"},
+    "col": {"span"},
+    "colgroup": {"span"},
+    "details": {"open"},
+}
+URL_ATTRS = {"href", "src"}
+SAFE_URL_SCHEMES = ("http:", "https:", "mailto:")
+# Inline styles the rich editor emits (alignment, indent, colour marks).
+ALLOWED_STYLE_PROPS = {
+    "text-align", "margin-left", "padding-left", "color", "background-color",
+    "font-weight", "font-style", "text-decoration",
+}
+
+_HEADING_SLUG_STRIP_RE = re.compile(r"[^a-z0-9\s-]")
+_WS_RE = re.compile(r"\s+")
+_DASHES_RE = re.compile(r"-+")
+_URL_CONTROL_RE = re.compile(r"[\x00-\x20]+")
+
+
+@dataclass
+class RenderedGuide:
+    html: str
+    toc: List[dict]
+    word_count: int
+    reading_minutes: int
+    text_excerpt: str
+    toc_depth: int
+
+    @property
+    def toc_json(self) -> str:
+        return json.dumps(self.toc, ensure_ascii=False, separators=(",", ":"))
+
+
+def clamp_toc_depth(depth: Optional[int]) -> int:
+    return max(MIN_TOC_DEPTH, min(MAX_TOC_DEPTH, int(depth or DEFAULT_TOC_DEPTH)))
+
+
+def slugify_heading(text: str) -> str:
+    slug = _HEADING_SLUG_STRIP_RE.sub("", (text or "").lower().strip())
+    slug = _DASHES_RE.sub("-", _WS_RE.sub("-", slug)).strip("-")
+    return slug or "section"
+
+
+def reading_minutes_for(word_count: int) -> int:
+    return max(1, ceil(word_count / WORDS_PER_MINUTE))
+
+
+def _safe_url(value: str) -> Optional[str]:
+    compact = _URL_CONTROL_RE.sub("", value).lower()
+    if ":" not in compact.split("/", 1)[0].split("?", 1)[0].split("#", 1)[0]:
+        return value  # relative, fragment or root-relative
+    return value if compact.startswith(SAFE_URL_SCHEMES) else None
+
+
+def _safe_style(value: str) -> Optional[str]:
+    kept = []
+    for declaration in value.split(";"):
+        prop, _, val = declaration.partition(":")
+        prop, val = prop.strip().lower(), val.strip()
+        if prop in ALLOWED_STYLE_PROPS and val and "(" not in val and "\\" not in val:
+            kept.append(f"{prop}: {val}")
+    return "; ".join(kept) or None
+
+
+class _GuideRenderer(HTMLParser):
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.out: List[str] = []
+        self.text: List[str] = []
+        self.open_tags: List[str] = []
+        self.drop_depth = 0
+        # Heading currently being captured: (tag, output index of its open tag, text parts)
+        self.heading: Optional[Tuple[str, int, List[str]]] = None
+        self.headings: List[Tuple[int, str, str]] = []
+        self.id_counts: Dict[str, int] = {}
+
+    def _clean_attrs(self, tag: str, attrs) -> str:
+        allowed = GLOBAL_ATTRS | TAG_ATTRS.get(tag, set())
+        parts = []
+        for name, value in attrs:
+            name = name.lower()
+            if name not in allowed:
+                continue
+            value = value if value is not None else ""
+            if name in URL_ATTRS:
+                value = _safe_url(value)
+            elif name == "style":
+                value = _safe_style(value)
+            if value is None:
+                continue
+            parts.append(f' {name}="{escape(value, quote=True)}"')
+        if tag == "a" and any(name == "target" for name, _ in attrs):
+            parts.append(' rel="noopener noreferrer"')
+        return "".join(parts)
+
+    def handle_starttag(self, tag, attrs):
+        tag = tag.lower()
+        if tag in DROP_CONTENT_TAGS:
+            if tag not in VOID_TAGS and not self._self_closed(tag):
+                self.drop_depth += 1
+            return
+        if self.drop_depth or tag not in ALLOWED_TAGS:
+            return
+        if tag in BLOCK_TAGS:
+            self.text.append(" ")
+        if tag == "a":
+            attrs = [(name, value) for name, value in attrs if name.lower() != "rel"]
+        self.out.append(f"<{tag}{self._clean_attrs(tag, attrs)}>")
+        if tag in VOID_TAGS:
+            return
+        self.open_tags.append(tag)
+        if tag in HEADING_TAGS and self.heading is None:
+            self.heading = (tag, len(self.out) - 1, [])
+
+    def _self_closed(self, tag: str) -> bool:
+        """<iframe src=x/> arrives as a start tag (the slash joins the unquoted value), yet no
+        end tag follows. script/style switch the parser to raw text, so they always count."""
+        return tag not in self.CDATA_CONTENT_ELEMENTS and (self.get_starttag_text() or "").endswith("/>")
+
+    def handle_startendtag(self, tag, attrs):
+        if tag.lower() in DROP_CONTENT_TAGS:
+            return  # <svg/>, <script/>: nothing inside to drop, no end tag to wait for
+        self.handle_starttag(tag, attrs)
+        if tag.lower() not in VOID_TAGS and tag.lower() in self.open_tags:
+            self.handle_endtag(tag)
+
+    def handle_endtag(self, tag):
+        tag = tag.lower()
+        if tag in DROP_CONTENT_TAGS:
+            self.drop_depth = max(0, self.drop_depth - 1)
+            return
+        if self.drop_depth or tag not in ALLOWED_TAGS or tag in VOID_TAGS or tag not in self.open_tags:
+            return
+        # Close anything left open inside this element so the output stays well-formed.
+        while self.open_tags:
+            current = self.open_tags.pop()
+            self.out.append(f"</{current}>")
+            if self.heading and self.heading[0] == current:
+                self._finish_heading()
+            if current == tag:
+                break
+        if tag in BLOCK_TAGS:
+            self.text.append(" ")
+
+    def _finish_heading(self):
+        tag, index, parts = self.heading
+        self.heading = None
+        text = _WS_RE.sub(" ", "".join(parts)).strip()
+        if not text:
+            return
+        base_id = f"guide-{slugify_heading(text)}"
+        seen = self.id_counts.get(base_id, 0)
+        self.id_counts[base_id] = seen + 1
+        anchor = base_id if seen == 0 else f"{base_id}-{seen + 1}"
+        opening = self.out[index]
+        self.out[index] = f'{opening[:-1]} id="{anchor}">'
+        self.headings.append((int(tag[1]), anchor, text))
+
+    def handle_data(self, data):
+        if self.drop_depth:
+            return
+        self.out.append(escape(data, quote=False))
+        self.text.append(data)
+        if self.heading is not None:
+            self.heading[2].append(data)
+
+    def close(self):
+        super().close()
+        while self.open_tags:
+            current = self.open_tags.pop()
+            self.out.append(f"</{current}>")
+            if self.heading and self.heading[0] == current:
+                self._finish_heading()
+
+
+def _build_toc_tree(headings: List[Tuple[int, str, str]], depth: int) -> List[dict]:
+    root: List[dict] = []
+    stack: List[dict] = []
+    for level, anchor, text in headings:
+        if level > depth:
+            continue
+        node = {"id": anchor, "text": text, "level": level, "children": []}
+        while stack and stack[-1]["level"] >= level:
+            stack.pop()
+        (stack[-1]["children"] if stack else root).append(node)
+        stack.append(node)
+    return root
+
+
+def _excerpt(words: List[str]) -> str:
+    excerpt = ""
+    for word in words:
+        candidate = f"{excerpt} {word}" if excerpt else word
+        if len(candidate) > EXCERPT_MAX_CHARS - 1:
+            return excerpt.rstrip(" ,;:.") + "…"
+        excerpt = candidate
+    return excerpt
+
+
+def render_guide_html(content_html: str, toc_depth: Optional[int] = None) -> RenderedGuide:
+    depth = clamp_toc_depth(toc_depth)
+    parser = _GuideRenderer()
+    parser.feed(content_html or "")
+    parser.close()
+
+    words = "".join(parser.text).split()
+    return RenderedGuide(
+        html="".join(parser.out),
+        toc=_build_toc_tree(parser.headings, depth),
+        word_count=len(words),
+        reading_minutes=reading_minutes_for(len(words)),
+        text_excerpt=_excerpt(words),
+        toc_depth=depth,
+    )
@@ -11,6 +11,7 @@ from sqlalchemy.orm import Session
 import models as user_models
 from authentications.security import ALGORITHM, SECRET_KEY
 from database import get_db
+from responses import FastJSONResponse
 from . import schemas, services
 
 router = APIRouter()
@@ -44,13 +45,15 @@ def list_guide_pages(
     request: Request,
     search: Optional[str] = Query(None),
     published: Optional[bool] = Query(None),
+    skip: int = Query(0, ge=0),
+    limit: int = Query(100, ge=1, le=500),
     db: Session = Depends(get_db),
 ):
     _require_admin_or_editor(request, db)
-    return services.list_admin_posts(db, request, search=search, published=published)
+    return services.list_admin_posts(db, request, search=search, published=published, skip=skip, limit=limit)
 
 
-@router.get("/admin/guide/{post_id}", response_model=schemas.GuidePageAdminResponse)
+@router.get("/admin/guide/{post_id}", response_model=schemas.GuidePageAdminResponse, response_class=FastJSONResponse)
 def get_guide_page(post_id: int, request: Request, db: Session = Depends(get_db)):
     _require_admin_or_editor(request, db)
     return services.get_admin_post(db, request, post_id)
@@ -80,7 +83,7 @@ def delete_guide_page(post_id: int, request: Request, db: Session = Depends(get_
 
 
 # Public read endpoints (no archive endpoint by design)
-@router.get("/guide/{slug}", response_model=schemas.GuidePagePublicResponse)
+@router.get("/guide/{slug}", response_model=schemas.GuidePagePublicResponse, response_class=FastJSONResponse)
 def get_public_guide_page(slug: str, request: Request, db: Session = Depends(get_db)):
     return services.get_public_post(db, request, slug)
 
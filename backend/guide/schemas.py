@@ -125,10 +125,19 @@ class GuidePageAdminResponse(BaseModel):
     module_id: Optional[int]
     module_ids: List[int]
     modules: List[GuideModuleRef]
+    word_count: int
+    reading_minutes: int
     created_at: datetime
     updated_at: datetime
 
 
+class GuideTocItem(BaseModel):
+    id: str
+    text: str
+    level: int
+    children: List["GuideTocItem"] = Field(default_factory=list)
+
+
 class GuidePagePublicResponse(BaseModel):
     id: int
     title: str
@@ -138,6 +147,9 @@ class GuidePagePublicResponse(BaseModel):
     featured_image_url: Optional[str]
     module_id: Optional[int]
     modules: List[GuideModuleRef]
+    toc: List[GuideTocItem]
+    word_count: int
+    reading_minutes: int
     updated_at: datetime
 
 
@@ -151,6 +163,12 @@ class ModuleGuideCard(BaseModel):
     updated_at: datetime
 
 
+class GuideRerenderPayload(BaseModel):
+    toc_depth: Optional[int] = Field(None, ge=2, le=4)
+    # Re-render every page instead of only those cached at a different TOC depth.
+    force: bool = False
+
+
 class GuideModuleOption(BaseModel):
     module_id: int
     module_title: str
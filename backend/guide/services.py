@@ -2,18 +2,25 @@
 guide/services.py — Campus404
 Business logic for Guide content type.
 """
-from math import ceil
+from datetime import datetime, timezone
+import json
 import re
 from typing import List, Optional
 
 from fastapi import HTTPException, Request
-from sqlalchemy.orm import Session
+from sqlalchemy.orm import Session, contains_eager, undefer, undefer_group
 
+from jobs.services import JobContext, enqueue_job, job_handler
+from search import services as search_index
+from search.models import DOC_GUIDE
 from . import models, schemas
+from .render import clamp_toc_depth, render_guide_html
 import curriculum.models as cm
+import models as core_models
 
 _SLUG_SEP_RE = re.compile(r"[^a-z0-9-]+")
-_HTML_TAG_RE = re.compile(r"<[^>]+>")
+GUIDE_RERENDER_JOB = "guide.rerender_pages"
+GUIDE_RERENDER_CHUNK_SIZE = 50
 
 
 def build_image_url(request: Request, relative_path: Optional[str]) -> Optional[str]:
@@ -30,10 +37,75 @@ def slugify(value: str) -> str:
     return slug
 
 
-def estimate_reading_minutes(content_html: str) -> int:
-    text = _HTML_TAG_RE.sub(" ", content_html or "")
-    words = [w for w in text.split() if w.strip()]
-    return max(1, ceil(len(words) / 220))
+# ── Render cache ─────────────────────────────────────────────────────────────
+def site_toc_depth(db: Session) -> int:
+    depth = (
+        db.query(core_models.SiteSetting.guide_toc_depth)
+        .order_by(core_models.SiteSetting.id.asc())
+        .limit(1)
+        .scalar()
+    )
+    return clamp_toc_depth(depth)
+
+
+def apply_render_cache(post: models.GuidePage, toc_depth: int) -> None:
+    rendered = render_guide_html(post.content_html, toc_depth)
+    post.rendered_html = rendered.html
+    post.toc_json = rendered.toc_json
+    post.toc_depth = rendered.toc_depth
+    post.word_count = rendered.word_count
+    post.reading_minutes = rendered.reading_minutes
+    post.text_excerpt = rendered.text_excerpt
+    post.rendered_at = datetime.now(timezone.utc)
+
+
+def _ensure_rendered(db: Session, post: models.GuidePage) -> None:
+    # Rows saved before the render cache existed are filled in on first read.
+    if post.rendered_html is not None:
+        return
+    apply_render_cache(post, site_toc_depth(db))
+    db.commit()
+    db.refresh(post)
+
+
+def queue_guide_rerender(db: Session, toc_depth: int, created_by_admin_id: Optional[int] = None):
+    return enqueue_job(
+        db,
+        GUIDE_RERENDER_JOB,
+        {"toc_depth": toc_depth},
+        created_by_admin_id=created_by_admin_id,
+    )
+
+
+@job_handler(GUIDE_RERENDER_JOB, payload_model=schemas.GuideRerenderPayload)
+def _run_guide_rerender_job(ctx: JobContext, payload: schemas.GuideRerenderPayload) -> dict:
+    """Re-render cached guide pages in id order, one chunk per transaction."""
+    depth = clamp_toc_depth(payload.toc_depth) if payload.toc_depth else site_toc_depth(ctx.db)
+
+    q = ctx.db.query(models.GuidePage.id)
+    if not payload.force:
+        q = q.filter(
+            (models.GuidePage.toc_depth.is_(None))
+            | (models.GuidePage.toc_depth != depth)
+            | (models.GuidePage.rendered_html.is_(None))
+        )
+    post_ids = [row.id for row in q.order_by(models.GuidePage.id.asc()).all()]
+    ctx.db.commit()
+
+    rendered = 0
+    for start in range(0, len(post_ids), GUIDE_RERENDER_CHUNK_SIZE):
+        chunk = post_ids[start:start + GUIDE_RERENDER_CHUNK_SIZE]
+        for post in (
+            ctx.db.query(models.GuidePage)
+            .options(undefer(models.GuidePage.content_html))
+            .filter(models.GuidePage.id.in_(chunk))
+            .all()
+        ):
+            apply_render_cache(post, depth)
+        ctx.db.commit()
+        rendered += len(chunk)
+        ctx.progress(rendered / len(post_ids) * 100.0, f"{rendered}/{len(post_ids)} pages")
+    return {"toc_depth": depth, "rendered_pages": rendered}
 
 
 def _to_list_item(request: Request, post: models.GuidePage) -> schemas.GuidePageListItem:
@@ -87,6 +159,8 @@ def _to_admin_response(request: Request, post: models.GuidePage) -> schemas.Guid
         module_id=module_ids[0] if module_ids else None,
         module_ids=module_ids,
         modules=module_refs,
+        word_count=post.word_count or 0,
+        reading_minutes=post.reading_minutes or 1,
         created_at=post.created_at,
         updated_at=post.updated_at,
     )
@@ -98,11 +172,14 @@ def _to_public_response(request: Request, post: models.GuidePage) -> schemas.Gui
         id=post.id,
         title=post.title,
         slug=post.slug,
-        excerpt=post.excerpt,
-        content_html=post.content_html,
+        excerpt=post.excerpt or post.text_excerpt,
+        content_html=post.rendered_html,
         featured_image_url=build_image_url(request, post.featured_image_path),
         module_id=post.module_id,
         modules=module_refs,
+        toc=json.loads(post.toc_json or "[]"),
+        word_count=post.word_count,
+        reading_minutes=post.reading_minutes,
         updated_at=post.updated_at,
     )
 
@@ -143,6 +220,7 @@ def list_module_options(db: Session) -> List[schemas.GuideModuleOption]:
     modules = (
         db.query(cm.Module)
         .join(cm.Lab, cm.Module.lab_id == cm.Lab.id)
+        .options(contains_eager(cm.Module.lab))
         .order_by(cm.Lab.title.asc(), cm.Module.order_index.asc(), cm.Module.title.asc())
         .all()
     )
@@ -165,26 +243,44 @@ def list_admin_posts(
     request: Request,
     search: Optional[str] = None,
     published: Optional[bool] = None,
+    skip: int = 0,
+    limit: int = 100,
 ) -> List[schemas.GuidePageListItem]:
     q = db.query(models.GuidePage)
 
     if published is not None:
         q = q.filter(models.GuidePage.is_published == published)
 
-    if search:
-        like = f"%{search.strip()}%"
-        q = q.filter(
-            (models.GuidePage.title.ilike(like))
-            | (models.GuidePage.slug.ilike(like))
-            | (models.GuidePage.excerpt.ilike(like))
+    if search and search.strip():
+        # Slug-prefix matches first (the index only covers title, excerpt and body), then
+        # the index ranking, best match first. Only the requested page of ids is loaded.
+        slug_prefix = search.strip().lower().replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+        slug_ids = [
+            post_id
+            for (post_id,) in q.with_entities(models.GuidePage.id)
+            .filter(models.GuidePage.slug.like(slug_prefix, escape="\\"))
+            .order_by(models.GuidePage.slug)
+            .limit(skip + limit)
+        ]
+        ranked_ids = search_index.ranked_doc_ids(
+            db, search, DOC_GUIDE, include_unpublished=True, limit=skip + limit, is_published=published,
         )
-
-    posts = q.order_by(models.GuidePage.updated_at.desc()).all()
+        page_ids = list(dict.fromkeys(slug_ids + ranked_ids))[skip:skip + limit]
+        rank = {post_id: position for position, post_id in enumerate(page_ids)}
+        posts = q.filter(models.GuidePage.id.in_(page_ids)).all() if page_ids else []
+        posts.sort(key=lambda post: rank[post.id])
+    else:
+        posts = q.order_by(models.GuidePage.updated_at.desc()).offset(skip).limit(limit).all()
     return [_to_list_item(request, post) for post in posts]
 
 
 def get_admin_post(db: Session, request: Request, post_id: int) -> schemas.GuidePageAdminResponse:
-    post = db.query(models.GuidePage).filter(models.GuidePage.id == post_id).first()
+    post = (
+        db.query(models.GuidePage)
+        .options(undefer(models.GuidePage.content_html))
+        .filter(models.GuidePage.id == post_id)
+        .first()
+    )
     if not post:
         raise HTTPException(status_code=404, detail="Guide not found.")
     return _to_admin_response(request, post)
@@ -207,15 +303,23 @@ def create_post(db: Session, request: Request, data: schemas.GuidePageCreate) ->
         module_id=data.module_id,
         is_published=data.is_published,
     )
+    apply_render_cache(post, site_toc_depth(db))
 
     db.add(post)
+    db.flush()
+    search_index.index_guide(db, post)
     db.commit()
     db.refresh(post)
     return _to_admin_response(request, post)
 
 
 def update_post(db: Session, request: Request, post_id: int, data: schemas.GuidePageUpdate) -> schemas.GuidePageAdminResponse:
-    post = db.query(models.GuidePage).filter(models.GuidePage.id == post_id).first()
+    post = (
+        db.query(models.GuidePage)
+        .options(undefer(models.GuidePage.content_html))
+        .filter(models.GuidePage.id == post_id)
+        .first()
+    )
     if not post:
         raise HTTPException(status_code=404, detail="Guide not found.")
 
@@ -235,6 +339,8 @@ def update_post(db: Session, request: Request, post_id: int, data: schemas.Guide
         setattr(post, field, value)
 
     post.module_id = requested_module_id
+    if "content_html" in update_data:
+        apply_render_cache(post, site_toc_depth(db))
 
     if "title" in update_data and not post.slug:
         generated = slugify(post.title)
@@ -243,6 +349,7 @@ def update_post(db: Session, request: Request, post_id: int, data: schemas.Guide
         _ensure_unique_slug(db, generated, exclude_post_id=post_id)
         post.slug = generated
 
+    search_index.index_guide(db, post)
     db.commit()
     db.refresh(post)
     return _to_admin_response(request, post)
@@ -253,6 +360,7 @@ def delete_post(db: Session, post_id: int) -> dict:
     if not post:
         raise HTTPException(status_code=404, detail="Guide not found.")
 
+    search_index.remove_guide_document(db, post_id)
     db.delete(post)
     db.commit()
     return {"message": "Guide deleted.", "id": post_id}
@@ -261,11 +369,13 @@ def delete_post(db: Session, post_id: int) -> dict:
 def get_public_post(db: Session, request: Request, slug: str) -> schemas.GuidePagePublicResponse:
     post = (
         db.query(models.GuidePage)
+        .options(undefer_group("rendered"))
         .filter(models.GuidePage.slug == slug, models.GuidePage.is_published == True)
         .first()
     )
     if not post:
         raise HTTPException(status_code=404, detail="Guide not found.")
+    _ensure_rendered(db, post)
     return _to_public_response(request, post)
 
 
@@ -285,9 +395,9 @@ def list_module_guide_pages(db: Session, request: Request, module_id: int) -> Li
             id=post.id,
             title=post.title,
             slug=post.slug,
-            excerpt=post.excerpt,
+            excerpt=post.excerpt or post.text_excerpt,
             featured_image_url=build_image_url(request, post.featured_image_path),
-            reading_minutes=estimate_reading_minutes(post.content_html),
+            reading_minutes=post.reading_minutes or 1,
             updated_at=post.updated_at,
         )
         for post in posts
@@ -0,0 +1 @@
+"""Idempotency-Key records that make retried progress writes replay instead of re-running."""
@@ -0,0 +1,26 @@
+"""
+idempotency/models.py — Campus404
+Per-user Idempotency-Key records with the stored response of the request that used them.
+"""
+from datetime import datetime, timezone
+
+from sqlalchemy import Column, DateTime, ForeignKey, Integer, String, Text
+
+from database import Base
+
+
+IDEMPOTENCY_IN_PROGRESS = "in_progress"
+IDEMPOTENCY_COMPLETED = "completed"
+
+
+class IdempotencyRecord(Base):
+    """Claimed before the work starts and completed in the same transaction as its effects."""
+    __tablename__ = "idempotency_records"
+
+    user_id       = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
+    key           = Column(String(128), primary_key=True)
+    scope         = Column(String(64), nullable=False)        # e.g. "submit:42"
+    fingerprint   = Column(String(64), nullable=False)        # sha256 of the request body
+    status        = Column(String(16), nullable=False, default=IDEMPOTENCY_IN_PROGRESS)
+    response_json = Column(Text, nullable=True)
+    created_at    = Column(DateTime, default=lambda: datetime.now(timezone.utc), nullable=False, index=True)
@@ -0,0 +1,139 @@
+"""
+idempotency/services.py — Campus404
+Idempotency-Key handling for progress writes (level submit, challenge complete).
+
+claim() records the key before any work starts, in its own commit, so a concurrent
+duplicate sees it; finish() stores the response in the caller's transaction so it commits
+together with the effects; release() drops the claim when the request fails so the client
+can retry with the same key. A completed key replays its stored response, a key still in
+progress answers 409, and a key reused for a different request answers 422.
+"""
+import hashlib
+import json
+import os
+from datetime import datetime, timedelta, timezone
+from typing import Any, Optional
+
+from fastapi import HTTPException, Request
+from sqlalchemy.orm import Session
+
+from database import insert_ignore
+from jobs.services import JobContext, job_handler, periodic_job
+from . import models
+
+IDEMPOTENCY_HEADER = "Idempotency-Key"
+IDEMPOTENCY_KEY_MAX_LENGTH = 128
+IDEMPOTENCY_TTL_HOURS = float(os.getenv("IDEMPOTENCY_TTL_HOURS", "24"))
+# An in-progress claim older than this belongs to a request that died and may be taken over.
+IDEMPOTENCY_CLAIM_TIMEOUT_SECONDS = 120
+IDEMPOTENCY_PURGE_JOB = "idempotency.purge"
+
+
+def _utcnow_naive() -> datetime:
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+def _as_naive_utc(value: datetime) -> datetime:
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+
+def request_key(request: Request) -> Optional[str]:
+    key = (request.headers.get(IDEMPOTENCY_HEADER) or "").strip()
+    if not key:
+        return None
+    if len(key) > IDEMPOTENCY_KEY_MAX_LENGTH:
+        raise HTTPException(
+            status_code=400,
+            detail=f"{IDEMPOTENCY_HEADER} must be at most {IDEMPOTENCY_KEY_MAX_LENGTH} characters.",
+        )
+    return key
+
+
+def fingerprint(*parts: str) -> str:
+    return hashlib.sha256("\n".join(parts).encode("utf-8")).hexdigest()
+
+
+def _record_query(db: Session, user_id: int, key: str):
+    return db.query(models.IdempotencyRecord).filter(
+        models.IdempotencyRecord.user_id == user_id,
+        models.IdempotencyRecord.key == key,
+    )
+
+
+def claim(db: Session, user_id: int, key: str, scope: str, request_fingerprint: str) -> Optional[Any]:
+    """Claim the key for this request (commits); returns the stored response to replay instead."""
+    now = _utcnow_naive()
+    inserted = insert_ignore(
+        db,
+        models.IdempotencyRecord,
+        {
+            "user_id": user_id,
+            "key": key,
+            "scope": scope,
+            "fingerprint": request_fingerprint,
+            "status": models.IDEMPOTENCY_IN_PROGRESS,
+            "created_at": now,
+        },
+        ("user_id", "key"),
+    )
+    if inserted:
+        db.commit()
+        return None
+
+    record = _record_query(db, user_id, key).with_for_update().first()
+    if record is None or record.scope != scope or record.fingerprint != request_fingerprint:
+        db.rollback()
+        raise HTTPException(
+            status_code=422,
+            detail=f"This {IDEMPOTENCY_HEADER} was already used for a different request.",
+        )
+    if record.status == models.IDEMPOTENCY_COMPLETED:
+        response = json.loads(record.response_json or "null")
+        db.rollback()
+        return response
+    if _as_naive_utc(record.created_at) < now - timedelta(seconds=IDEMPOTENCY_CLAIM_TIMEOUT_SECONDS):
+        record.created_at = now   # abandoned claim; the row lock makes us its only new owner
+        db.commit()
+        return None
+
+    db.rollback()
+    raise HTTPException(status_code=409, detail=f"A request with this {IDEMPOTENCY_HEADER} is still in progress.")
+
+
+def finish(db: Session, user_id: int, key: str, response: Any) -> None:
+    """Store the response for replay. Does not commit; it lands with the request's effects."""
+    _record_query(db, user_id, key).update(
+        {
+            models.IdempotencyRecord.status: models.IDEMPOTENCY_COMPLETED,
+            models.IdempotencyRecord.response_json: json.dumps(response, default=str),
+        },
+        synchronize_session=False,
+    )
+
+
+def release(db: Session, user_id: int, key: str) -> None:
+    """Roll back the failed request and drop its claim so the same key can be retried."""
+    db.rollback()
+    _record_query(db, user_id, key).filter(
+        models.IdempotencyRecord.status == models.IDEMPOTENCY_IN_PROGRESS,
+    ).delete(synchronize_session=False)
+    db.commit()
+
+
+def purge_expired(db: Session) -> int:
+    cutoff = _utcnow_naive() - timedelta(hours=IDEMPOTENCY_TTL_HOURS)
+    deleted = db.query(models.IdempotencyRecord).filter(
+        models.IdempotencyRecord.created_at < cutoff,
+    ).delete(synchronize_session=False)
+    db.commit()
+    return int(deleted or 0)
+
+
+@job_handler(IDEMPOTENCY_PURGE_JOB)
+def _run_idempotency_purge_job(ctx: JobContext, payload: dict) -> dict:
+    return {"deleted": purge_expired(ctx.db)}
+
+
+periodic_job(IDEMPOTENCY_PURGE_JOB, 3600)
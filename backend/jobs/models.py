@@ -0,0 +1,53 @@
+"""
+jobs/models.py — Campus404
+Durable queue for long-running admin work, claimed by the in-process job runner.
+"""
+from datetime import datetime, timezone
+
+from sqlalchemy import Boolean, Column, DateTime, Float, ForeignKey, Index, Integer, String, Text
+
+from database import Base
+
+
+JOB_QUEUED = "queued"
+JOB_RUNNING = "running"
+JOB_SUCCEEDED = "succeeded"
+JOB_FAILED = "failed"
+JOB_CANCELLED = "cancelled"
+JOB_STATUSES = (JOB_QUEUED, JOB_RUNNING, JOB_SUCCEEDED, JOB_FAILED, JOB_CANCELLED)
+JOB_FINISHED_STATUSES = (JOB_SUCCEEDED, JOB_FAILED, JOB_CANCELLED)
+
+
+class Job(Base):
+    """One unit of background work: a registered kind plus its JSON payload."""
+    __tablename__ = "jobs"
+    __table_args__ = (
+        Index("ix_jobs_status_run_after", "status", "run_after", "id"),
+    )
+
+    id                  = Column(Integer, primary_key=True, index=True)
+    kind                = Column(String(64), nullable=False, index=True)
+    status              = Column(String(16), nullable=False, default=JOB_QUEUED)
+    payload_json        = Column(Text, nullable=True)
+    result_json         = Column(Text, nullable=True)
+    error               = Column(Text, nullable=True)
+
+    progress_pct        = Column(Float, nullable=False, default=0.0)
+    progress_message    = Column(String(255), nullable=True)
+
+    attempts            = Column(Integer, nullable=False, default=0)
+    max_attempts        = Column(Integer, nullable=False, default=3)
+    # Repeated submissions with the same key return the existing job instead of queueing another.
+    idempotency_key     = Column(String(128), nullable=True, unique=True)
+    cancel_requested    = Column(Boolean, nullable=False, default=False)
+
+    created_by_admin_id = Column(Integer, ForeignKey("users.id", ondelete="SET NULL"), nullable=True, index=True)
+    locked_by           = Column(String(64), nullable=True)
+    run_after           = Column(DateTime, nullable=False, default=lambda: datetime.now(timezone.utc))
+    heartbeat_at        = Column(DateTime, nullable=True)
+
+    created_at          = Column(DateTime, default=lambda: datetime.now(timezone.utc), nullable=False)
+    started_at          = Column(DateTime, nullable=True)
+    finished_at         = Column(DateTime, nullable=True)
+    updated_at          = Column(DateTime, default=lambda: datetime.now(timezone.utc),
+                                 onupdate=lambda: datetime.now(timezone.utc), nullable=False)
@@ -0,0 +1,112 @@
+"""
+jobs/router.py — Campus404
+Admin API for queueing, polling, cancelling and retrying background jobs.
+"""
+from typing import Optional
+
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Request
+from jose import JWTError, jwt
+from sqlalchemy.orm import Session
+
+from authentications.security import ALGORITHM, SECRET_KEY
+from database import get_db
+import models as user_models
+from . import models, schemas, services
+
+router = APIRouter()
+
+
+def _require_admin(request: Request, db: Session) -> user_models.User:
+    auth = request.headers.get("Authorization", "")
+    if not auth.startswith("Bearer "):
+        raise HTTPException(status_code=401, detail="Not authenticated.")
+    try:
+        payload = jwt.decode(auth[7:], SECRET_KEY, algorithms=[ALGORITHM])
+        user_id = payload.get("id")
+    except JWTError:
+        raise HTTPException(status_code=401, detail="Invalid token.")
+
+    user = db.query(user_models.User).filter(user_models.User.id == user_id).first()
+    if not user:
+        raise HTTPException(status_code=401, detail="User not found.")
+    if not user.is_admin:
+        raise HTTPException(status_code=403, detail="Admin access required.")
+    return user
+
+
+def _get_job_or_404(db: Session, job_id: int) -> models.Job:
+    job = db.query(models.Job).filter(models.Job.id == job_id).first()
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found.")
+    return job
+
+
+@router.get("", response_model=schemas.JobListOut)
+def list_jobs(
+    request: Request,
+    status: Optional[str] = Query(None),
+    kind: Optional[str] = Query(None),
+    limit: int = Query(50, ge=1, le=services.JOB_LIST_MAX_LIMIT),
+    before_id: Optional[int] = Query(None, ge=1),
+    db: Session = Depends(get_db),
+):
+    _require_admin(request, db)
+    if status and status not in models.JOB_STATUSES:
+        raise HTTPException(status_code=400, detail="Unknown job status.")
+    return services.list_jobs(db, status=status, kind=kind, limit=limit, before_id=before_id)
+
+
+@router.get("/kinds", response_model=schemas.JobKindsOut)
+def list_job_kinds(request: Request, db: Session = Depends(get_db)):
+    _require_admin(request, db)
+    return schemas.JobKindsOut(kinds=services.registered_kinds())
+
+
+@router.post("", response_model=schemas.JobOut, status_code=202)
+def create_job(
+    payload: schemas.JobCreate,
+    request: Request,
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key", max_length=128),
+    db: Session = Depends(get_db),
+):
+    actor = _require_admin(request, db)
+    try:
+        job = services.enqueue_job(
+            db,
+            payload.kind,
+            payload.payload,
+            created_by_admin_id=actor.id,
+            idempotency_key=payload.idempotency_key or idempotency_key,
+            max_attempts=payload.max_attempts,
+        )
+    except ValueError as exc:
+        raise HTTPException(status_code=422, detail=str(exc))
+    return services.job_to_out(job)
+
+
+@router.get("/{job_id}", response_model=schemas.JobOut)
+def get_job(job_id: int, request: Request, db: Session = Depends(get_db)):
+    _require_admin(request, db)
+    return services.job_to_out(_get_job_or_404(db, job_id))
+
+
+@router.post("/{job_id}/cancel", response_model=schemas.JobOut)
+def cancel_job(job_id: int, request: Request, db: Session = Depends(get_db)):
+    _require_admin(request, db)
+    job = _get_job_or_404(db, job_id)
+    try:
+        job = services.cancel_job(db, job)
+    except ValueError as exc:
+        raise HTTPException(status_code=409, detail=str(exc))
+    return services.job_to_out(job)
+
+
+@router.post("/{job_id}/retry", response_model=schemas.JobOut)
+def retry_job(job_id: int, request: Request, db: Session = Depends(get_db)):
+    _require_admin(request, db)
+    job = _get_job_or_404(db, job_id)
+    try:
+        job = services.retry_job(db, job)
+    except ValueError as exc:
+        raise HTTPException(status_code=409, detail=str(exc))
+    return services.job_to_out(job)
@@ -0,0 +1,45 @@
+"""
+jobs/schemas.py — Campus404
+Pydantic schemas for the admin jobs API.
+"""
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from pydantic import BaseModel, Field
+
+
+class JobCreate(BaseModel):
+    kind: str = Field(..., min_length=1, max_length=64)
+    payload: Dict[str, Any] = Field(default_factory=dict)
+    idempotency_key: Optional[str] = Field(None, min_length=1, max_length=128)
+    max_attempts: int = Field(3, ge=1, le=10)
+
+
+class JobOut(BaseModel):
+    id: int
+    kind: str
+    status: str
+    payload: Optional[Dict[str, Any]]
+    result: Optional[Any]
+    error: Optional[str]
+    progress_pct: float
+    progress_message: Optional[str]
+    attempts: int
+    max_attempts: int
+    idempotency_key: Optional[str]
+    cancel_requested: bool
+    created_by_admin_id: Optional[int]
+    run_after: Optional[datetime]
+    created_at: datetime
+    started_at: Optional[datetime]
+    finished_at: Optional[datetime]
+    updated_at: datetime
+
+
+class JobListOut(BaseModel):
+    items: List[JobOut]
+    next_before_id: Optional[int]
+
+
+class JobKindsOut(BaseModel):
+    kinds: List[str]
@@ -0,0 +1,550 @@
+"""
+jobs/services.py — Campus404
+In-process job runner: a handler registry keyed by job kind, an atomic claim on the jobs
+table, retries with backoff, progress reporting, cooperative cancellation and periodic
+(interval) jobs. Finished jobs are purged after JOB_RETENTION_DAYS by a periodic job.
+"""
+import json
+import os
+import socket
+import threading
+import traceback
+from datetime import datetime, timedelta, timezone
+from typing import Any, Callable, Dict, List, Optional, Tuple, Type
+
+from pydantic import BaseModel
+from sqlalchemy.exc import IntegrityError, SQLAlchemyError
+from sqlalchemy.orm import Session
+
+from database import SessionLocal
+from . import models, schemas
+
+JOBS_ENABLED = os.getenv("JOBS_ENABLED", "1") != "0"
+JOB_WORKERS = max(1, int(os.getenv("JOB_WORKERS", "2")))
+JOB_POLL_SECONDS = float(os.getenv("JOB_POLL_SECONDS", "2"))
+JOB_RETRY_BASE_SECONDS = 15
+# A running job whose heartbeat is older than this is assumed to have lost its worker.
+JOB_STALE_SECONDS = int(os.getenv("JOB_STALE_SECONDS", "600"))
+JOB_LIST_MAX_LIMIT = 200
+JOB_SCHEDULE_SECONDS = float(os.getenv("JOB_SCHEDULE_SECONDS", "30"))
+# Finished jobs (periodic ones add ~1,500 rows a day) are deleted after this many days; <= 0 keeps them.
+JOB_RETENTION_DAYS = float(os.getenv("JOB_RETENTION_DAYS", "14"))
+JOB_PURGE_BATCH_SIZE = 1000
+JOB_PURGE_JOB = "jobs.purge"
+
+
+def _utcnow_naive() -> datetime:
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+def _json_loads(value: Optional[str]) -> Any:
+    if not value:
+        return None
+    try:
+        return json.loads(value)
+    except (TypeError, ValueError):
+        return None
+
+
+# ── Handler registry ─────────────────────────────────────────────────────────
+class JobCancelled(Exception):
+    """Raised inside a handler once an admin has requested cancellation."""
+
+
+class JobContext:
+    """Handed to every handler: its DB session, payload, and progress/cancel hooks."""
+
+    def __init__(self, job_id: int, db: Session, payload: dict, created_by_admin_id: Optional[int], attempt: int):
+        self.job_id = job_id
+        self.db = db
+        self.payload = payload
+        self.created_by_admin_id = created_by_admin_id
+        self.attempt = attempt
+
+    def progress(self, pct: float, message: Optional[str] = None) -> None:
+        """Record progress and heartbeat on a separate session, then honour a pending cancel."""
+        session = SessionLocal()
+        try:
+            values = {
+                models.Job.progress_pct: round(max(0.0, min(100.0, float(pct))), 2),
+                models.Job.heartbeat_at: _utcnow_naive(),
+            }
+            if message is not None:
+                values[models.Job.progress_message] = message[:255]
+            session.query(models.Job).filter(models.Job.id == self.job_id).update(values, synchronize_session=False)
+            session.commit()
+            cancel = session.query(models.Job.cancel_requested).filter(models.Job.id == self.job_id).scalar()
+        except SQLAlchemyError as exc:
+            # Progress is advisory; never fail the job's own transaction over it.
+            session.rollback()
+            print(f"[Campus404] Job {self.job_id} progress update skipped: {exc.__class__.__name__}")
+            cancel = False
+        finally:
+            session.close()
+        if cancel:
+            raise JobCancelled()
+
+    def check_cancelled(self) -> None:
+        session = SessionLocal()
+        try:
+            cancel = session.query(models.Job.cancel_requested).filter(models.Job.id == self.job_id).scalar()
+        finally:
+            session.close()
+        if cancel:
+            raise JobCancelled()
+
+
+JobHandler = Callable[[JobContext, Any], Any]
+_handlers: Dict[str, Tuple[JobHandler, Optional[Type[BaseModel]]]] = {}
+
+
+def job_handler(kind: str, payload_model: Optional[Type[BaseModel]] = None):
+    """Register a handler for a job kind. Handlers must be safe to re-run after a partial failure.
+
+    When payload_model is given, payloads are validated at enqueue time and the handler
+    receives the parsed model; otherwise it receives the raw payload dict.
+    """
+    def decorator(fn: JobHandler) -> JobHandler:
+        if kind in _handlers:
+            raise RuntimeError(f"Job kind '{kind}' is already registered.")
+        _handlers[kind] = (fn, payload_model)
+        return fn
+    return decorator
+
+
+def registered_kinds() -> List[str]:
+    return sorted(_handlers)
+
+
+# ── Periodic jobs ────────────────────────────────────────────────────────────
+_periodic: Dict[str, Tuple[float, dict]] = {}
+
+
+def periodic_job(kind: str, interval_seconds: float, payload: Optional[dict] = None) -> None:
+    """Enqueue a registered kind once per interval while the runner is up (<= 0 disables)."""
+    if interval_seconds <= 0:
+        _periodic.pop(kind, None)
+        return
+    _periodic[kind] = (float(interval_seconds), payload or {})
+
+
+def enqueue_due_periodic_jobs(now: Optional[datetime] = None) -> int:
+    """Queue each periodic kind for the current interval slot.
+
+    The idempotency key is the kind plus the slot number, so every app instance can run
+    this and each slot still produces exactly one job.
+    """
+    if not _periodic:
+        return 0
+    timestamp = (now or datetime.now(timezone.utc)).timestamp()
+    queued = 0
+    db = SessionLocal()
+    try:
+        for kind, (interval, payload) in list(_periodic.items()):
+            key = f"periodic:{kind}:{int(timestamp // interval)}"
+            if db.query(models.Job.id).filter(models.Job.idempotency_key == key).first():
+                continue
+            enqueue_job(db, kind, payload, idempotency_key=key, max_attempts=1)
+            queued += 1
+    finally:
+        db.close()
+    return queued
+
+
+# ── Queue operations ─────────────────────────────────────────────────────────
+def enqueue_job(
+    db: Session,
+    kind: str,
+    payload: Optional[dict] = None,
+    created_by_admin_id: Optional[int] = None,
+    idempotency_key: Optional[str] = None,
+    max_attempts: int = 3,
+) -> models.Job:
+    """Queue a job, or return the existing one when idempotency_key was already used."""
+    if kind not in _handlers:
+        raise ValueError(f"Unknown job kind '{kind}'.")
+    _, payload_model = _handlers[kind]
+    payload = payload or {}
+    if payload_model is not None:
+        payload = payload_model.model_validate(payload).model_dump(mode="json")
+
+    if idempotency_key:
+        existing = db.query(models.Job).filter(models.Job.idempotency_key == idempotency_key).first()
+        if existing:
+            if existing.kind != kind:
+                raise ValueError("Idempotency key was already used for a different job kind.")
+            return existing
+
+    job = models.Job(
+        kind=kind,
+        status=models.JOB_QUEUED,
+        payload_json=json.dumps(payload, separators=(",", ":"), default=str),
+        max_attempts=max_attempts,
+        idempotency_key=idempotency_key,
+        created_by_admin_id=created_by_admin_id,
+        run_after=_utcnow_naive(),
+    )
+    db.add(job)
+    try:
+        db.commit()
+    except IntegrityError:
+        db.rollback()
+        existing = db.query(models.Job).filter(models.Job.idempotency_key == idempotency_key).first()
+        if existing is None:
+            raise
+        return existing
+    db.refresh(job)
+    runner.wake()
+    return job
+
+
+def cancel_job(db: Session, job: models.Job) -> models.Job:
+    if job.status in models.JOB_FINISHED_STATUSES:
+        raise ValueError(f"Job is already {job.status}.")
+    job.cancel_requested = True
+    if job.status == models.JOB_QUEUED:
+        job.status = models.JOB_CANCELLED
+        job.finished_at = _utcnow_naive()
+    db.commit()
+    db.refresh(job)
+    return job
+
+
+def retry_job(db: Session, job: models.Job) -> models.Job:
+    if job.status not in (models.JOB_FAILED, models.JOB_CANCELLED):
+        raise ValueError("Only failed or cancelled jobs can be retried.")
+    job.status = models.JOB_QUEUED
+    job.attempts = 0
+    job.cancel_requested = False
+    job.error = None
+    job.result_json = None
+    job.progress_pct = 0.0
+    job.progress_message = None
+    job.locked_by = None
+    job.run_after = _utcnow_naive()
+    job.started_at = None
+    job.finished_at = None
+    db.commit()
+    db.refresh(job)
+    runner.wake()
+    return job
+
+
+def list_jobs(
+    db: Session,
+    status: Optional[str] = None,
+    kind: Optional[str] = None,
+    limit: int = 50,
+    before_id: Optional[int] = None,
+) -> schemas.JobListOut:
+    q = db.query(models.Job)
+    if status:
+        q = q.filter(models.Job.status == status)
+    if kind:
+        q = q.filter(models.Job.kind == kind)
+    if before_id:
+        q = q.filter(models.Job.id < before_id)
+    rows = q.order_by(models.Job.id.desc()).limit(limit + 1).all()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    return schemas.JobListOut(
+        items=[job_to_out(job) for job in rows],
+        next_before_id=rows[-1].id if has_more and rows else None,
+    )
+
+
+def job_to_out(job: models.Job) -> schemas.JobOut:
+    return schemas.JobOut(
+        id=job.id,
+        kind=job.kind,
+        status=job.status,
+        payload=_json_loads(job.payload_json),
+        result=_json_loads(job.result_json),
+        error=job.error,
+        progress_pct=float(job.progress_pct or 0.0),
+        progress_message=job.progress_message,
+        attempts=int(job.attempts or 0),
+        max_attempts=int(job.max_attempts or 0),
+        idempotency_key=job.idempotency_key,
+        cancel_requested=bool(job.cancel_requested),
+        created_by_admin_id=job.created_by_admin_id,
+        run_after=job.run_after,
+        created_at=job.created_at,
+        started_at=job.started_at,
+        finished_at=job.finished_at,
+        updated_at=job.updated_at,
+    )
+
+
+# ── Execution ────────────────────────────────────────────────────────────────
+def claim_next_job(worker_id: str) -> Optional[int]:
+    """Atomically move one due job from queued to running; safe across workers and processes."""
+    db = SessionLocal()
+    try:
+        now = _utcnow_naive()
+        candidates = [
+            int(row[0])
+            for row in db.query(models.Job.id)
+            .filter(models.Job.status == models.JOB_QUEUED, models.Job.run_after <= now)
+            .order_by(models.Job.id.asc())
+            .limit(5)
+            .all()
+        ]
+        for job_id in candidates:
+            claimed = (
+                db.query(models.Job)
+                .filter(models.Job.id == job_id, models.Job.status == models.JOB_QUEUED)
+                .update(
+                    {
+                        models.Job.status: models.JOB_RUNNING,
+                        models.Job.locked_by: worker_id,
+                        models.Job.attempts: models.Job.attempts + 1,
+                        models.Job.started_at: now,
+                        models.Job.heartbeat_at: now,
+                    },
+                    synchronize_session=False,
+                )
+            )
+            db.commit()
+            if claimed:
+                return job_id
+        return None
+    finally:
+        db.close()
+
+
+def _update_job(job_id: int, **values) -> None:
+    db = SessionLocal()
+    try:
+        db.query(models.Job).filter(models.Job.id == job_id).update(
+            {getattr(models.Job, key): value for key, value in values.items()},
+            synchronize_session=False,
+        )
+        db.commit()
+    finally:
+        db.close()
+
+
+def run_job(job_id: int) -> None:
+    """Execute a claimed job and record success, retry, failure or cancellation."""
+    db = SessionLocal()
+    try:
+        job = db.query(models.Job).filter(models.Job.id == job_id).first()
+        if job is None:
+            return
+        attempts = int(job.attempts or 0)
+        max_attempts = int(job.max_attempts or 1)
+        registered = _handlers.get(job.kind)
+        if registered is None:
+            _update_job(
+                job_id,
+                status=models.JOB_FAILED,
+                error=f"No handler registered for job kind '{job.kind}'.",
+                locked_by=None,
+                finished_at=_utcnow_naive(),
+            )
+            return
+
+        handler, payload_model = registered
+        payload = _json_loads(job.payload_json) or {}
+        ctx = JobContext(job.id, db, payload, job.created_by_admin_id, attempts)
+        db.commit()
+
+        try:
+            params = payload_model.model_validate(payload) if payload_model is not None else payload
+            result = handler(ctx, params)
+            db.commit()
+        except JobCancelled:
+            db.rollback()
+            _update_job(
+                job_id,
+                status=models.JOB_CANCELLED,
+                progress_message="Cancelled by admin.",
+                locked_by=None,
+                finished_at=_utcnow_naive(),
+            )
+        except Exception as exc:
+            db.rollback()
+            error = f"{type(exc).__name__}: {exc}"
+            print(f"[Campus404] Job {job_id} ({job.kind}) attempt {attempts}/{max_attempts} failed: {error}")
+            traceback.print_exc()
+            if attempts < max_attempts:
+                delay = JOB_RETRY_BASE_SECONDS * (2 ** (attempts - 1))
+                _update_job(
+                    job_id,
+                    status=models.JOB_QUEUED,
+                    error=error,
+                    locked_by=None,
+                    run_after=_utcnow_naive() + timedelta(seconds=delay),
+                )
+            else:
+                _update_job(
+                    job_id,
+                    status=models.JOB_FAILED,
+                    error=error,
+                    locked_by=None,
+                    finished_at=_utcnow_naive(),
+                )
+        else:
+            _update_job(
+                job_id,
+                status=models.JOB_SUCCEEDED,
+                result_json=json.dumps(result, separators=(",", ":"), default=str) if result is not None else None,
+                error=None,
+                progress_pct=100.0,
+                locked_by=None,
+                finished_at=_utcnow_naive(),
+            )
+    finally:
+        db.close()
+
+
+def requeue_stale_jobs(locked_by_prefix: Optional[str] = None) -> int:
+    """Return orphaned running jobs to the queue (or fail them once out of attempts)."""
+    db = SessionLocal()
+    try:
+        q = db.query(models.Job).filter(models.Job.status == models.JOB_RUNNING)
+        if locked_by_prefix:
+            q = q.filter(models.Job.locked_by.like(f"{locked_by_prefix}%"))
+        else:
+            cutoff = _utcnow_naive() - timedelta(seconds=JOB_STALE_SECONDS)
+            q = q.filter(models.Job.heartbeat_at < cutoff)
+
+        now = _utcnow_naive()
+        failed = q.filter(models.Job.attempts >= models.Job.max_attempts).update(
+            {
+                models.Job.status: models.JOB_FAILED,
+                models.Job.error: "Worker stopped while the job was running.",
+                models.Job.locked_by: None,
+                models.Job.finished_at: now,
+            },
+            synchronize_session=False,
+        )
+        requeued = q.update(
+            {models.Job.status: models.JOB_QUEUED, models.Job.locked_by: None, models.Job.run_after: now},
+            synchronize_session=False,
+        )
+        db.commit()
+        return int(failed or 0) + int(requeued or 0)
+    finally:
+        db.close()
+
+
+class JobRunner:
+    """A small pool of daemon threads polling the jobs table."""
+
+    def __init__(self, workers: int = JOB_WORKERS, poll_seconds: float = JOB_POLL_SECONDS):
+        self.workers = workers
+        self.poll_seconds = poll_seconds
+        self.instance_id = f"{socket.gethostname()}:{os.getpid()}"
+        self._stop = threading.Event()
+        self._wake = threading.Event()
+        self._threads: List[threading.Thread] = []
+
+    @property
+    def running(self) -> bool:
+        return bool(self._threads)
+
+    def start(self) -> None:
+        if self._threads:
+            return
+        self._stop.clear()
+        requeued = requeue_stale_jobs()
+        if requeued:
+            print(f"[Campus404] Requeued {requeued} stale job(s).")
+        for index in range(self.workers):
+            thread = threading.Thread(
+                target=self._loop,
+                args=(f"{self.instance_id}:{index}",),
+                name=f"campus404-job-worker-{index}",
+                daemon=True,
+            )
+            thread.start()
+            self._threads.append(thread)
+        scheduler = threading.Thread(target=self._schedule_loop, name="campus404-job-scheduler", daemon=True)
+        scheduler.start()
+        self._threads.append(scheduler)
+
+    def stop(self, timeout: float = 10.0) -> None:
+        if not self._threads:
+            return
+        self._stop.set()
+        self._wake.set()
+        for thread in self._threads:
+            thread.join(timeout=timeout)
+        self._threads = []
+        # Anything still marked as ours was interrupted; hand it back to the queue.
+        requeue_stale_jobs(locked_by_prefix=f"{self.instance_id}:")
+
+    def wake(self) -> None:
+        self._wake.set()
+
+    def _loop(self, worker_id: str) -> None:
+        while not self._stop.is_set():
+            try:
+                job_id = claim_next_job(worker_id)
+            except Exception as exc:
+                print(f"[Campus404] Job claim failed on {worker_id}: {exc}")
+                job_id = None
+            if job_id is None:
+                self._wake.wait(self.poll_seconds)
+                self._wake.clear()
+                continue
+            run_job(job_id)
+
+    def _schedule_loop(self) -> None:
+        while not self._stop.is_set():
+            try:
+                enqueue_due_periodic_jobs()
+            except Exception as exc:
+                print(f"[Campus404] Periodic job scheduling failed: {exc}")
+            self._stop.wait(JOB_SCHEDULE_SECONDS)
+
+
+runner = JobRunner()
+
+
+def start_job_runner() -> None:
+    if JOBS_ENABLED:
+        runner.start()
+
+
+def stop_job_runner() -> None:
+    runner.stop()
+
+
+# ── Retention ────────────────────────────────────────────────────────────────
+def purge_finished_jobs(db: Session, retention_days: float = JOB_RETENTION_DAYS) -> int:
+    """Delete succeeded, failed and cancelled jobs that finished before the cutoff, in batches."""
+    if retention_days <= 0:
+        return 0
+    cutoff = _utcnow_naive() - timedelta(days=retention_days)
+    deleted = 0
+    while True:
+        ids = [
+            job_id
+            for (job_id,) in db.query(models.Job.id)
+            .filter(
+                models.Job.status.in_(models.JOB_FINISHED_STATUSES),
+                models.Job.finished_at < cutoff,
+            )
+            .order_by(models.Job.id)
+            .limit(JOB_PURGE_BATCH_SIZE)
+        ]
+        if not ids:
+            break
+        db.query(models.Job).filter(models.Job.id.in_(ids)).delete(synchronize_session=False)
+        db.commit()
+        deleted += len(ids)
+        if len(ids) < JOB_PURGE_BATCH_SIZE:
+            break
+    db.commit()
+    return deleted
+
+
+@job_handler(JOB_PURGE_JOB)
+def _run_job_purge_job(ctx: JobContext, payload: dict) -> dict:
+    return {"deleted": purge_finished_jobs(ctx.db)}
+
+
+periodic_job(JOB_PURGE_JOB, 3600 if JOB_RETENTION_DAYS > 0 else 0)
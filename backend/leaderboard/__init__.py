@@ -0,0 +1 @@
+"""In-memory XP leaderboards (global, per lab, weekly) fed by the XP ledger."""
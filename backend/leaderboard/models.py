@@ -0,0 +1,38 @@
+"""
+leaderboard/models.py — Campus404
+Persisted snapshots of the in-memory leaderboards, so a restart resumes tailing the XP
+ledger instead of re-aggregating it.
+"""
+from datetime import datetime, timezone
+
+from sqlalchemy import Column, Date, DateTime, ForeignKey, Integer, String, Text
+
+from database import Base
+
+
+SCOPE_GLOBAL = "global"
+SCOPE_LAB = "lab"
+SCOPE_WEEKLY = "weekly"
+VALID_SCOPES = (SCOPE_GLOBAL, SCOPE_LAB, SCOPE_WEEKLY)
+
+
+class LeaderboardSnapshot(Base):
+    """Where the ledger tail stood when the entries were taken; only the latest is kept."""
+    __tablename__ = "leaderboard_snapshots"
+
+    id               = Column(Integer, primary_key=True, index=True)
+    ledger_floor     = Column(Integer, nullable=False)   # every xp_ledger row with id <= floor is included
+    applied_ids_json = Column(Text, nullable=True)       # ids above the floor that are included too
+    week_start       = Column(Date, nullable=False)
+    entry_count      = Column(Integer, nullable=False, default=0)
+    taken_at         = Column(DateTime, default=lambda: datetime.now(timezone.utc), nullable=False)
+
+
+class LeaderboardSnapshotEntry(Base):
+    __tablename__ = "leaderboard_snapshot_entries"
+
+    snapshot_id = Column(Integer, ForeignKey("leaderboard_snapshots.id", ondelete="CASCADE"), primary_key=True)
+    scope       = Column(String(16), primary_key=True)
+    scope_id    = Column(Integer, primary_key=True)     # lab id for lab boards, 0 otherwise
+    user_id     = Column(Integer, primary_key=True)
+    score       = Column(Integer, nullable=False)
@@ -0,0 +1,79 @@
+"""
+leaderboard/router.py — Campus404
+XP leaderboards for signed-in users, plus admin status and rebuild.
+"""
+from typing import Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from jose import JWTError, jwt
+from sqlalchemy.orm import Session
+
+from authentications.security import ALGORITHM, SECRET_KEY
+from database import get_db
+import models as user_models
+from . import schemas, services
+
+router = APIRouter()
+admin_router = APIRouter()
+
+
+def _get_current_user(request: Request, db: Session) -> user_models.User:
+    auth = request.headers.get("Authorization", "")
+    if not auth.startswith("Bearer "):
+        raise HTTPException(status_code=401, detail="Not authenticated.")
+    try:
+        payload = jwt.decode(auth[7:], SECRET_KEY, algorithms=[ALGORITHM])
+        user_id = payload.get("id")
+    except JWTError:
+        raise HTTPException(status_code=401, detail="Invalid token.")
+
+    user = db.query(user_models.User).filter(user_models.User.id == user_id).first()
+    if not user:
+        raise HTTPException(status_code=401, detail="User not found.")
+    return user
+
+
+def _require_admin(request: Request, db: Session) -> user_models.User:
+    user = _get_current_user(request, db)
+    if not user.is_admin:
+        raise HTTPException(status_code=403, detail="Admin access required.")
+    return user
+
+
+@router.get("", response_model=schemas.LeaderboardPageOut)
+def get_leaderboard(
+    request: Request,
+    scope: schemas.Scope = Query("global"),
+    lab_id: Optional[int] = Query(None, ge=1),
+    limit: int = Query(20, ge=1, le=services.LEADERBOARD_MAX_LIMIT),
+    offset: int = Query(0, ge=0),
+    db: Session = Depends(get_db),
+):
+    _get_current_user(request, db)
+    return services.get_leaderboard_page(db, scope, lab_id, limit, offset)
+
+
+@router.get("/me", response_model=schemas.LeaderboardMeOut)
+def get_my_rank(
+    request: Request,
+    scope: schemas.Scope = Query("global"),
+    lab_id: Optional[int] = Query(None, ge=1),
+    radius: int = Query(3, ge=0, le=25),
+    db: Session = Depends(get_db),
+):
+    user = _get_current_user(request, db)
+    return services.get_leaderboard_me(db, user.id, scope, lab_id, radius)
+
+
+@admin_router.get("/status", response_model=schemas.LeaderboardStatusOut)
+def get_leaderboard_status(request: Request, db: Session = Depends(get_db)):
+    _require_admin(request, db)
+    return services.boards.status()
+
+
+@admin_router.post("/rebuild", response_model=schemas.LeaderboardStatusOut)
+def rebuild_leaderboards(request: Request, db: Session = Depends(get_db)):
+    """Re-aggregate this process's boards from the XP ledger (snapshots are not read)."""
+    _require_admin(request, db)
+    services.boards.rebuild(db)
+    return services.boards.status()
@@ -0,0 +1,50 @@
+"""
+leaderboard/schemas.py — Campus404
+Pydantic schemas for the leaderboard API.
+"""
+from datetime import date, datetime
+from typing import List, Literal, Optional
+
+from pydantic import BaseModel
+
+Scope = Literal["global", "lab", "weekly"]
+
+
+class LeaderboardEntryOut(BaseModel):
+    rank: int
+    user_id: int
+    username: str
+    first_name: Optional[str]
+    last_name: Optional[str]
+    avatar_url: Optional[str]
+    score: int
+
+
+class LeaderboardPageOut(BaseModel):
+    scope: Scope
+    lab_id: Optional[int]
+    week_start: Optional[date]
+    total: int
+    entries: List[LeaderboardEntryOut]
+
+
+class LeaderboardMeOut(BaseModel):
+    scope: Scope
+    lab_id: Optional[int]
+    week_start: Optional[date]
+    total: int
+    rank: Optional[int]
+    score: int
+    around: List[LeaderboardEntryOut]
+
+
+class LeaderboardStatusOut(BaseModel):
+    loaded: bool
+    ledger_floor: int
+    pending_ids: int
+    week_start: Optional[date]
+    global_entries: int
+    weekly_entries: int
+    lab_boards: int
+    last_sync_at: Optional[datetime]
+    last_snapshot_at: Optional[datetime]
@@ -0,0 +1,487 @@
+"""
+leaderboard/services.py — Campus404
+In-memory XP leaderboards: per scope, a sorted array of (-score, user_id) searched with
+bisect, giving O(log n) rank-of-user and cheap top-N / around-me slices.
+
+The boards tail xp_ledger by id, which records every XP change from every process.
+Global is the ledger sum (= users.total_xp), weekly is the sum of this week's earned
+deltas (completion and submission sources only, so opening balances and admin
+adjustments or resets never move it; UTC, weeks start on Monday), and lab boards hold the XP of the user's completions in
+each lab, re-derived from challenge_completions for every user whose XP moved.
+Ledger rows younger than LEDGER_SETTLE_SECONDS may sit behind a transaction that has not
+committed yet, so, as with the analytics rollups, the floor only advances past older
+rows and newer ones are remembered by id. Startup resumes from the latest snapshot, or
+aggregates the ledger when there is none.
+"""
+import bisect
+import json
+import os
+import threading
+import time
+from datetime import date, datetime, timedelta, timezone
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from fastapi import HTTPException
+from sqlalchemy import func, insert
+from sqlalchemy.orm import Session
+
+import curriculum.models as cm
+import models as user_models
+from database import SessionLocal
+from jobs.services import JobContext, job_handler, periodic_job
+from xp import models as xp_models
+from . import models, schemas
+
+LEADERBOARD_SYNC_SECONDS = float(os.getenv("LEADERBOARD_SYNC_SECONDS", "2"))
+LEADERBOARD_SNAPSHOT_SECONDS = float(os.getenv("LEADERBOARD_SNAPSHOT_SECONDS", "300"))
+LEDGER_SETTLE_SECONDS = 30
+LEDGER_SYNC_BATCH_SIZE = 5000
+SNAPSHOT_INSERT_CHUNK = 2000
+LEADERBOARD_MAX_LIMIT = 100
+LEADERBOARD_SNAPSHOT_JOB = "leaderboard.snapshot"
+WEEKLY_XP_SOURCES = (xp_models.XP_SOURCE_COMPLETION, xp_models.XP_SOURCE_SUBMISSION)
+
+Entry = Tuple[int, int, int]   # (rank, user_id, score)
+
+
+def _utcnow_naive() -> datetime:
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+def _as_naive_utc(value: datetime) -> datetime:
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+
+def week_start_of(value: datetime) -> date:
+    day = _as_naive_utc(value).date()
+    return day - timedelta(days=day.weekday())
+
+
+class RankedScores:
+    """Scores sorted as (-score, user_id). Ties share a rank: 1, 2, 2, 4."""
+
+    def __init__(self):
+        self._keys: List[Tuple[int, int]] = []
+        self._scores: Dict[int, int] = {}
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def score(self, user_id: int) -> Optional[int]:
+        return self._scores.get(user_id)
+
+    def items(self):
+        return self._scores.items()
+
+    def set(self, user_id: int, score: int) -> None:
+        old = self._scores.get(user_id)
+        if old == score:
+            return
+        if old is not None:
+            del self._keys[bisect.bisect_left(self._keys, (-old, user_id))]
+        self._scores[user_id] = score
+        bisect.insort(self._keys, (-score, user_id))
+
+    def add(self, user_id: int, delta: int) -> None:
+        self.set(user_id, self._scores.get(user_id, 0) + delta)
+
+    def remove(self, user_id: int) -> None:
+        old = self._scores.pop(user_id, None)
+        if old is not None:
+            del self._keys[bisect.bisect_left(self._keys, (-old, user_id))]
+
+    def _rank_of_score(self, score: int) -> int:
+        # (-score,) sorts before every (-score, user_id), so this counts strictly higher scores.
+        return bisect.bisect_left(self._keys, (-score,)) + 1
+
+    def rank(self, user_id: int) -> Optional[int]:
+        score = self._scores.get(user_id)
+        return None if score is None else self._rank_of_score(score)
+
+    def slice(self, offset: int, limit: int) -> List[Entry]:
+        return [(self._rank_of_score(-neg), user_id, -neg) for neg, user_id in self._keys[offset:offset + limit]]
+
+    def around(self, user_id: int, radius: int) -> List[Entry]:
+        score = self._scores.get(user_id)
+        if score is None:
+            return []
+        index = bisect.bisect_left(self._keys, (-score, user_id))
+        start = max(0, index - radius)
+        return self.slice(start, index - start + radius + 1)
+
+
+class Leaderboards:
+    """All boards of this process plus their position in the ledger tail."""
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self.last_sync_at: Optional[datetime] = None
+        self.last_snapshot_at: Optional[datetime] = None
+        self._reset()
+
+    def _reset(self) -> None:
+        self.loaded = False
+        self.floor = 0
+        self._pending: Dict[int, datetime] = {}   # applied ledger ids above the floor -> created_at
+        self._last_sync = 0.0
+        self.week_start = week_start_of(_utcnow_naive())
+        self.global_board = RankedScores()
+        self.weekly_board = RankedScores()
+        self.lab_boards: Dict[int, RankedScores] = {}
+
+    # ── Reads ─────────────────────────────────────────────────────────
+    def board(self, scope: str, lab_id: Optional[int] = None) -> RankedScores:
+        if scope == models.SCOPE_GLOBAL:
+            return self.global_board
+        if scope == models.SCOPE_WEEKLY:
+            return self.weekly_board
+        return self.lab_boards.get(int(lab_id or 0)) or RankedScores()
+
+    def ensure_fresh(self, db: Session, force: bool = False) -> None:
+        with self._lock:
+            if not self.loaded:
+                self._load(db)
+            elif force or time.monotonic() - self._last_sync >= LEADERBOARD_SYNC_SECONDS:
+                self._sync(db)
+            self._roll_week(week_start_of(_utcnow_naive()))
+
+    def read(self, db: Session, fn):
+        """Run fn() against fresh boards while holding the lock."""
+        self.ensure_fresh(db)
+        with self._lock:
+            return fn()
+
+    def drop_user(self, user_id: int) -> None:
+        with self._lock:
+            self.global_board.remove(user_id)
+            self.weekly_board.remove(user_id)
+            for board in self.lab_boards.values():
+                board.remove(user_id)
+
+    def status(self) -> schemas.LeaderboardStatusOut:
+        with self._lock:
+            return schemas.LeaderboardStatusOut(
+                loaded=self.loaded,
+                ledger_floor=self.floor,
+                pending_ids=len(self._pending),
+                week_start=self.week_start if self.loaded else None,
+                global_entries=len(self.global_board),
+                weekly_entries=len(self.weekly_board),
+                lab_boards=len(self.lab_boards),
+                last_sync_at=self.last_sync_at,
+                last_snapshot_at=self.last_snapshot_at,
+            )
+
+    # ── Loading ───────────────────────────────────────────────────────
+    def rebuild(self, db: Session) -> None:
+        """Forget everything and aggregate the ledger again, ignoring snapshots."""
+        with self._lock:
+            self._reset()
+            self._rebuild_from_ledger(db)
+            self._sync(db)
+
+    def _load(self, db: Session) -> None:
+        snapshot = db.query(models.LeaderboardSnapshot).order_by(models.LeaderboardSnapshot.id.desc()).first()
+        if snapshot is not None:
+            self._load_snapshot(db, snapshot)
+            print(f"[Campus404] Leaderboards resumed from snapshot {snapshot.id} (ledger id {self.floor}).")
+        else:
+            self._rebuild_from_ledger(db)
+            print(f"[Campus404] Leaderboards rebuilt from the XP ledger (ledger id {self.floor}).")
+        self._sync(db)
+
+    def _rebuild_from_ledger(self, db: Session) -> None:
+        ledger = xp_models.XpLedgerEntry
+        cutoff = _utcnow_naive() - timedelta(seconds=LEDGER_SETTLE_SECONDS)
+        # Walk down from the newest row to the first settled one; everything above it is pending.
+        young = []
+        floor = 0
+        last_id = None
+        while True:
+            q = db.query(ledger.id, ledger.user_id, ledger.delta, ledger.source, ledger.created_at)
+            if last_id is not None:
+                q = q.filter(ledger.id < last_id)
+            rows = q.order_by(ledger.id.desc()).limit(500).all()
+            settled = next((row for row in rows if _as_naive_utc(row.created_at) < cutoff), None)
+            if settled is not None:
+                floor = int(settled.id)
+                young.extend(row for row in rows if row.id > settled.id)
+                break
+            young.extend(rows)
+            if len(rows) < 500:
+                break
+            last_id = rows[-1].id
+
+        self.floor = floor
+        for user_id, total in (
+            db.query(ledger.user_id, func.sum(ledger.delta)).filter(ledger.id <= floor).group_by(ledger.user_id)
+        ):
+            self.global_board.set(int(user_id), int(total or 0))
+        self._load_weekly_from_ledger(db, [])
+        self._recompute_labs(db, None)
+        for row in reversed(young):
+            self._apply(row.id, row.user_id, row.delta, row.source, row.created_at)
+        self.loaded = True
+
+    def _load_snapshot(self, db: Session, snapshot: models.LeaderboardSnapshot) -> None:
+        entries = models.LeaderboardSnapshotEntry
+        same_week = snapshot.week_start == self.week_start
+        for scope, scope_id, user_id, score in db.query(
+            entries.scope, entries.scope_id, entries.user_id, entries.score
+        ).filter(entries.snapshot_id == snapshot.id):
+            if scope == models.SCOPE_GLOBAL:
+                self.global_board.set(int(user_id), int(score))
+            elif scope == models.SCOPE_WEEKLY:
+                if same_week:
+                    self.weekly_board.set(int(user_id), int(score))
+            else:
+                self.lab_boards.setdefault(int(scope_id), RankedScores()).set(int(user_id), int(score))
+
+        self.floor = int(snapshot.ledger_floor)
+        pending_ids = [int(value) for value in json.loads(snapshot.applied_ids_json or "[]")]
+        ledger = xp_models.XpLedgerEntry
+        pending_rows = (
+            db.query(ledger.id, ledger.user_id, ledger.delta, ledger.source, ledger.created_at)
+            .filter(ledger.id.in_(pending_ids))
+            .all()
+            if pending_ids else []
+        )
+        self._pending = {int(row.id): _as_naive_utc(row.created_at) for row in pending_rows}
+        if not same_week:
+            self._load_weekly_from_ledger(db, pending_rows)
+        self.loaded = True
+
+    def _load_weekly_from_ledger(self, db: Session, pending_rows) -> None:
+        ledger = xp_models.XpLedgerEntry
+        week_start = datetime.combine(self.week_start, datetime.min.time())
+        self.weekly_board = RankedScores()
+        for user_id, total in (
+            db.query(ledger.user_id, func.sum(ledger.delta))
+            .filter(
+                ledger.id <= self.floor,
+                ledger.created_at >= week_start,
+                ledger.source.in_(WEEKLY_XP_SOURCES),
+            )
+            .group_by(ledger.user_id)
+        ):
+            self.weekly_board.set(int(user_id), int(total or 0))
+        for row in pending_rows:
+            if row.source in WEEKLY_XP_SOURCES and week_start_of(row.created_at) == self.week_start:
+                self.weekly_board.add(int(row.user_id), int(row.delta))
+
+    # ── Tailing the ledger ────────────────────────────────────────────
+    def _roll_week(self, week_start: date) -> None:
+        if week_start > self.week_start:
+            self.week_start = week_start
+            self.weekly_board = RankedScores()
+
+    def _apply(self, ledger_id: int, user_id: int, delta: int, source: str, created_at: datetime) -> None:
+        created_at = _as_naive_utc(created_at)
+        self._roll_week(week_start_of(created_at))
+        self.global_board.add(int(user_id), int(delta))
+        if source in WEEKLY_XP_SOURCES and week_start_of(created_at) == self.week_start:
+            self.weekly_board.add(int(user_id), int(delta))
+        self._pending[int(ledger_id)] = created_at
+
+    def _sync(self, db: Session) -> None:
+        ledger = xp_models.XpLedgerEntry
+        moved: Set[int] = set()
+        cursor = self.floor
+        while True:
+            rows = (
+                db.query(ledger.id, ledger.user_id, ledger.delta, ledger.source, ledger.created_at)
+                .filter(ledger.id > cursor)
+                .order_by(ledger.id)
+                .limit(LEDGER_SYNC_BATCH_SIZE)
+                .all()
+            )
+            for row in rows:
+                if int(row.id) not in self._pending:
+                    self._apply(row.id, row.user_id, row.delta, row.source, row.created_at)
+                    moved.add(int(row.user_id))
+            if len(rows) < LEDGER_SYNC_BATCH_SIZE:
+                break
+            cursor = int(rows[-1].id)
+
+        cutoff = _utcnow_naive() - timedelta(seconds=LEDGER_SETTLE_SECONDS)
+        for ledger_id in sorted(self._pending):
+            if self._pending[ledger_id] >= cutoff:
+                break
+            self.floor = ledger_id
+            del self._pending[ledger_id]
+
+        if moved:
+            self._recompute_labs(db, moved)
+        db.commit()   # end the read transaction so the next sync sees new commits
+        self._last_sync = time.monotonic()
+        self.last_sync_at = datetime.now(timezone.utc)
+
+    def _recompute_labs(self, db: Session, user_ids: Optional[Iterable[int]]) -> None:
+        """Re-derive lab scores from completions, for some users or (None) everyone."""
+        q = (
+            db.query(cm.ChallengeCompletion.user_id, cm.Module.lab_id, func.sum(cm.ChallengeCompletion.xp_awarded))
+            .join(cm.Challenge, cm.Challenge.id == cm.ChallengeCompletion.challenge_id)
+            .join(cm.Module, cm.Module.id == cm.Challenge.module_id)
+            .group_by(cm.ChallengeCompletion.user_id, cm.Module.lab_id)
+        )
+        if user_ids is None:
+            self.lab_boards = {}
+        else:
+            user_ids = list(user_ids)
+            q = q.filter(cm.ChallengeCompletion.user_id.in_(user_ids))
+            for board in self.lab_boards.values():
+                for user_id in user_ids:
+                    board.remove(user_id)
+        for user_id, lab_id, total in q:
+            self.lab_boards.setdefault(int(lab_id), RankedScores()).set(int(user_id), int(total or 0))
+
+    # ── Snapshots ─────────────────────────────────────────────────────
+    def take_snapshot(self, db: Session) -> dict:
+        with self._lock:
+            if not self.loaded:
+                return {"snapshot_id": None, "entries": 0}
+            rows = [
+                {"scope": models.SCOPE_GLOBAL, "scope_id": 0, "user_id": user_id, "score": score}
+                for user_id, score in self.global_board.items()
+            ]
+            rows += [
+                {"scope": models.SCOPE_WEEKLY, "scope_id": 0, "user_id": user_id, "score": score}
+                for user_id, score in self.weekly_board.items()
+            ]
+            for lab_id, board in self.lab_boards.items():
+                rows += [
+                    {"scope": models.SCOPE_LAB, "scope_id": lab_id, "user_id": user_id, "score": score}
+                    for user_id, score in board.items()
+                ]
+            snapshot = models.LeaderboardSnapshot(
+                ledger_floor=self.floor,
+                applied_ids_json=json.dumps(sorted(self._pending)),
+                week_start=self.week_start,
+                entry_count=len(rows),
+            )
+
+        db.add(snapshot)
+        db.flush()
+        for row in rows:
+            row["snapshot_id"] = snapshot.id
+        for start in range(0, len(rows), SNAPSHOT_INSERT_CHUNK):
+            db.execute(insert(models.LeaderboardSnapshotEntry), rows[start:start + SNAPSHOT_INSERT_CHUNK])
+        db.query(models.LeaderboardSnapshotEntry).filter(
+            models.LeaderboardSnapshotEntry.snapshot_id != snapshot.id,
+        ).delete(synchronize_session=False)
+        db.query(models.LeaderboardSnapshot).filter(
+            models.LeaderboardSnapshot.id != snapshot.id,
+        ).delete(synchronize_session=False)
+        db.commit()
+        self.last_snapshot_at = datetime.now(timezone.utc)
+        return {"snapshot_id": snapshot.id, "entries": len(rows), "ledger_floor": snapshot.ledger_floor}
+
+
+boards = Leaderboards()
+
+
+# ── API helpers ──────────────────────────────────────────────────────────────
+def _require_scope(scope: str, lab_id: Optional[int]) -> Optional[int]:
+    if scope == models.SCOPE_LAB:
+        if not lab_id:
+            raise HTTPException(status_code=400, detail="lab_id is required for the lab leaderboard.")
+        return int(lab_id)
+    return None
+
+
+def _hydrate(db: Session, entries: List[Entry]) -> List[schemas.LeaderboardEntryOut]:
+    if not entries:
+        return []
+    users = {
+        user.id: user
+        for user in db.query(
+            user_models.User.id,
+            user_models.User.username,
+            user_models.User.first_name,
+            user_models.User.last_name,
+            user_models.User.avatar_url,
+        ).filter(user_models.User.id.in_([user_id for _, user_id, _ in entries]))
+    }
+    out = []
+    for rank, user_id, score in entries:
+        user = users.get(user_id)
+        if user is None:
+            boards.drop_user(user_id)   # deleted account; its ledger rows are gone too
+            continue
+        out.append(schemas.LeaderboardEntryOut(
+            rank=rank,
+            user_id=user_id,
+            username=user.username,
+            first_name=user.first_name,
+            last_name=user.last_name,
+            avatar_url=user.avatar_url,
+            score=score,
+        ))
+    return out
+
+
+def get_leaderboard_page(
+    db: Session, scope: str, lab_id: Optional[int], limit: int, offset: int
+) -> schemas.LeaderboardPageOut:
+    lab_id = _require_scope(scope, lab_id)
+
+    def read():
+        board = boards.board(scope, lab_id)
+        return len(board), board.slice(offset, limit), boards.week_start
+
+    total, entries, week_start = boards.read(db, read)
+    return schemas.LeaderboardPageOut(
+        scope=scope,
+        lab_id=lab_id,
+        week_start=week_start if scope == models.SCOPE_WEEKLY else None,
+        total=total,
+        entries=_hydrate(db, entries),
+    )
+
+
+def get_leaderboard_me(
+    db: Session, user_id: int, scope: str, lab_id: Optional[int], radius: int
+) -> schemas.LeaderboardMeOut:
+    lab_id = _require_scope(scope, lab_id)
+
+    def read():
+        board = boards.board(scope, lab_id)
+        return len(board), board.rank(user_id), board.score(user_id), board.around(user_id, radius), boards.week_start
+
+    total, rank, score, around, week_start = boards.read(db, read)
+    return schemas.LeaderboardMeOut(
+        scope=scope,
+        lab_id=lab_id,
+        week_start=week_start if scope == models.SCOPE_WEEKLY else None,
+        total=total,
+        rank=rank,
+        score=int(score or 0),
+        around=_hydrate(db, around),
+    )
+
+
+# ── Lifecycle ────────────────────────────────────────────────────────────────
+def warm_leaderboards() -> None:
+    """Load the boards in the background so the first request does not pay for it."""
+
+    def load():
+        db = SessionLocal()
+        try:
+            boards.ensure_fresh(db)
+        except Exception as exc:
+            print(f"[Campus404] Leaderboard warm-up failed: {exc}")
+        finally:
+            db.close()
+
+    threading.Thread(target=load, name="campus404-leaderboard-warmup", daemon=True).start()
+
+
+@job_handler(LEADERBOARD_SNAPSHOT_JOB)
+def _run_leaderboard_snapshot_job(ctx: JobContext, payload: dict) -> dict:
+    boards.ensure_fresh(ctx.db, force=True)
+    return boards.take_snapshot(ctx.db)
+
+
+periodic_job(LEADERBOARD_SNAPSHOT_JOB, LEADERBOARD_SNAPSHOT_SECONDS)
@@ -15,17 +15,36 @@ from database import Base, engine
 import models                              # User model
 import curriculum.models                   # Lab, Module, Challenge, Badge, UserBadge, ChallengeCompletion
 import guide.models                        # Guide content type
+import analytics.models                    # AttemptRollup, RollupWatermark
+import jobs.models                         # Job queue
+import search.models                       # SearchDocument index
+import xp.models                           # XP ledger
+import idempotency.models                  # Idempotency-Key records
+import leaderboard.models                  # Leaderboard snapshots
 from authentications.router import router as auth_router
 from admin.users    import router as admin_users_router
+from admin.bulk     import router as admin_bulk_router
 from admin.stats    import router as admin_stats_router
 from admin.uploads  import router as upload_router
 from admin.badges   import router as badges_router
 from admin.logs     import router as logs_router
 from admin.site_settings import public_router as site_settings_public_router
 from admin.site_settings import admin_router as site_settings_admin_router
+from admin.site_settings import ensure_site_settings_schema
 from curriculum.router import router as curriculum_router
 from progress.router import router as progress_router
 from guide.router import router as guide_router
+from analytics.router import router as analytics_router
+from jobs.router import router as jobs_router
+from search.router import router as search_router
+from search.router import admin_router as search_admin_router
+from xp.router import router as xp_router
+from leaderboard.router import router as leaderboard_router
+from leaderboard.router import admin_router as leaderboard_admin_router
+from leaderboard.services import warm_leaderboards
+from jobs.services import start_job_runner, stop_job_runner
+from curriculum.attempt_buffer import start_attempt_buffer, stop_attempt_buffer
+from compression import CompressionMiddleware
 
 # Ensure uploads directory exists at startup
 UPLOADS_DIR = Path("/app/uploads")
@@ -41,6 +60,7 @@ except ModuleNotFoundError:
 
 # ── 1. Create tables ──────────────────────────────────────────────────
 Base.metadata.create_all(engine)
+ensure_site_settings_schema(engine)   # once per process; settings requests never inspect the schema
 
 # ── 2. FastAPI app ────────────────────────────────────────────────────
 app = FastAPI(
@@ -58,12 +78,16 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Compress large JSON/text responses (brotli if installed, else gzip); skips encrypted paths
+app.add_middleware(CompressionMiddleware)
+
 # ── 3. Mount static uploads directory ─────────────────────────────────
 app.mount("/uploads", StaticFiles(directory=str(UPLOADS_DIR)), name="uploads")
 
 # ── 4. Include Routers ────────────────────────────────────────────────
 app.include_router(auth_router,        prefix="/api/auth",         tags=["Authentication"])
 app.include_router(admin_users_router, prefix="/api/admin/users",  tags=["Admin – Users"])
+app.include_router(admin_bulk_router,  prefix="/api/admin/bulk",   tags=["Admin – Bulk Operations"])
 app.include_router(admin_stats_router, prefix="/api/admin/stats",  tags=["Admin – Stats"])
 app.include_router(upload_router,      prefix="/api/admin",        tags=["Admin – Media"])
 app.include_router(upload_router,      prefix="/api",              tags=["Media – Public"])
@@ -74,9 +98,30 @@ app.include_router(site_settings_admin_router,  prefix="/api/admin", tags=["Admi
 app.include_router(curriculum_router,  prefix="/api",              tags=["Curriculum"])
 app.include_router(progress_router,    prefix="/api",              tags=["Progress"])
 app.include_router(guide_router,       prefix="/api",              tags=["Guide"])
+app.include_router(analytics_router,   prefix="/api/admin/analytics", tags=["Admin – Analytics"])
+app.include_router(jobs_router,        prefix="/api/admin/jobs",   tags=["Admin – Jobs"])
+app.include_router(search_router,      prefix="/api/search",       tags=["Search"])
+app.include_router(search_admin_router, prefix="/api/admin/search", tags=["Admin – Search"])
+app.include_router(xp_router,          prefix="/api/admin/xp",     tags=["Admin – XP"])
+app.include_router(leaderboard_router, prefix="/api/leaderboard",  tags=["Leaderboard"])
+app.include_router(leaderboard_admin_router, prefix="/api/admin/leaderboard", tags=["Admin – Leaderboard"])
 if _sandbox_available:
     app.include_router(judge_api.router, prefix="/api/judge", tags=["Sandbox"])
 
+# ── 5. Background job runner and attempt write-behind buffer ──────────
+@app.on_event("startup")
+def _start_background_jobs():
+    start_attempt_buffer()
+    start_job_runner()
+    warm_leaderboards()
+
+
+@app.on_event("shutdown")
+def _stop_background_jobs():
+    stop_job_runner()
+    stop_attempt_buffer()   # flushes pending Run attempts
+
+
 @app.get("/")
 def read_root():
     return {"message": "Campus404 Backend API is running.", "sandbox": _sandbox_available}
@@ -12,6 +12,12 @@ from sqlalchemy import text, inspect
 import models as core_models
 import guide.models as guide_models
 import curriculum.models as curriculum_models
+import analytics.models as analytics_models
+import jobs.models as jobs_models
+import search.models as search_models
+import xp.models as xp_models
+import idempotency.models as idempotency_models
+import leaderboard.models as leaderboard_models
 
 # Ensure new hierarchy table exists before data backfills that depend on it.
 Base.metadata.create_all(bind=engine, tables=[curriculum_models.ChallengeGroup.__table__])
@@ -166,6 +172,105 @@ with engine.connect() as conn:
     else:
         print('[SKIP] learn_posts table does not exist yet; module linkage column not applied')
 
+    # ── users: keyset pagination + directory search indexes ──────────
+    user_indexes = [i.get('name') for i in insp.get_indexes('users')]
+    if 'ix_users_created_at_id' not in user_indexes:
+        conn.execute(text('CREATE INDEX ix_users_created_at_id ON users (created_at, id)'))
+        print('[OK] Added index ix_users_created_at_id on users (created_at, id)')
+    else:
+        print('[SKIP] ix_users_created_at_id already exists')
+
+    if engine.dialect.name == 'mysql':
+        # Built with stopwords off: the default InnoDB list makes ngram drop any token
+        # containing "a", "i", ... Replaces ft_users_search, which was built with them.
+        if 'ft_users_search_ngram' not in user_indexes:
+            conn.execute(text('SET SESSION innodb_ft_enable_stopword = OFF'))
+            conn.execute(text(
+                'CREATE FULLTEXT INDEX ft_users_search_ngram ON users '
+                '(username, email, first_name, last_name) WITH PARSER ngram'
+            ))
+            conn.execute(text('SET SESSION innodb_ft_enable_stopword = ON'))
+            print('[OK] Added FULLTEXT index ft_users_search_ngram on users (no stopwords)')
+        else:
+            print('[SKIP] ft_users_search_ngram already exists')
+        if 'ft_users_search' in user_indexes:
+            conn.execute(text('DROP INDEX ft_users_search ON users'))
+            print('[OK] Dropped FULLTEXT index ft_users_search (built with stopwords)')
+
+    # ── challenge_files: content hash for diffing saves and ETags ─────
+    file_cols = [c['name'] for c in insp.get_columns('challenge_files')]
+    if 'content_hash' not in file_cols:
+        conn.execute(text('ALTER TABLE challenge_files ADD COLUMN content_hash VARCHAR(64) NULL'))
+        print('[OK] Added content_hash to challenge_files')
+    else:
+        print('[SKIP] content_hash already exists in challenge_files')
+
+    backfilled = 0
+    while True:
+        rows = conn.execute(text(
+            'SELECT id, content FROM challenge_files WHERE content_hash IS NULL ORDER BY id LIMIT 500'
+        )).fetchall()
+        if not rows:
+            break
+        conn.execute(
+            text('UPDATE challenge_files SET content_hash = :hash WHERE id = :id'),
+            [{'id': fid, 'hash': curriculum_models.content_hash(content)} for fid, content in rows],
+        )
+        backfilled += len(rows)
+    print(f'[OK] Backfilled content_hash for {backfilled} challenge files')
+
+    # ── learn_posts: guide render cache ───────────────────────────────
+    if 'learn_posts' in table_names:
+        post_cols = [c['name'] for c in insp.get_columns('learn_posts')]
+        render_cols = {
+            'rendered_html': 'TEXT NULL',
+            'toc_json': 'TEXT NULL',
+            'toc_depth': 'INTEGER NULL',
+            'word_count': 'INTEGER NOT NULL DEFAULT 0',
+            'reading_minutes': 'INTEGER NOT NULL DEFAULT 1',
+            'text_excerpt': 'VARCHAR(320) NULL',
+            'rendered_at': 'DATETIME NULL',
+        }
+        for col_name, ddl in render_cols.items():
+            if col_name not in post_cols:
+                conn.execute(text(f'ALTER TABLE learn_posts ADD COLUMN {col_name} {ddl}'))
+                print(f'[OK] Added {col_name} to learn_posts')
+            else:
+                print(f'[SKIP] {col_name} already exists in learn_posts')
+
+        from guide.render import clamp_toc_depth, render_guide_html
+        toc_depth = clamp_toc_depth(
+            conn.execute(text('SELECT guide_toc_depth FROM site_settings ORDER BY id LIMIT 1')).scalar()
+            if 'site_settings' in table_names else None
+        )
+        rendered_posts = 0
+        while True:
+            rows = conn.execute(text(
+                'SELECT id, content_html FROM learn_posts WHERE rendered_html IS NULL ORDER BY id LIMIT 100'
+            )).fetchall()
+            if not rows:
+                break
+            params = []
+            for pid, content_html in rows:
+                rendered = render_guide_html(content_html, toc_depth)
+                params.append({
+                    'id': pid,
+                    'html': rendered.html,
+                    'toc': rendered.toc_json,
+                    'depth': rendered.toc_depth,
+                    'words': rendered.word_count,
+                    'minutes': rendered.reading_minutes,
+                    'excerpt': rendered.text_excerpt,
+                    'now': datetime.now(timezone.utc).replace(tzinfo=None),
+                })
+            conn.execute(text(
+                'UPDATE learn_posts SET rendered_html = :html, toc_json = :toc, toc_depth = :depth, '
+                'word_count = :words, reading_minutes = :minutes, text_excerpt = :excerpt, rendered_at = :now '
+                'WHERE id = :id'
+            ), params)
+            rendered_posts += len(rows)
+        print(f'[OK] Rendered guide cache for {rendered_posts} guide pages')
+
     conn.commit()
     print('\nMigration complete.')
 
@@ -196,3 +301,120 @@ Base.metadata.create_all(
     ],
 )
 print('[OK] Ensured audit, guide, and progression tables exist (admin_audit_logs, learn_posts, learn_post_modules, challenge_attempts).')
+
+# Ensure analytics rollup tables exist
+Base.metadata.create_all(
+    bind=engine,
+    tables=[
+        analytics_models.AttemptRollup.__table__,
+        analytics_models.AttemptRollupUser.__table__,
+        analytics_models.RollupWatermark.__table__,
+    ],
+)
+print('[OK] Ensured analytics rollup tables exist (attempt_rollups, attempt_rollup_users, rollup_watermarks).')
+
+# Ensure background job table exists
+Base.metadata.create_all(bind=engine, tables=[jobs_models.Job.__table__])
+print('[OK] Ensured background job table exists (jobs).')
+
+# Ensure sequence allocator table exists (counters are seeded lazily from MAX())
+Base.metadata.create_all(bind=engine, tables=[curriculum_models.SequenceCounter.__table__])
+print('[OK] Ensured sequence allocator table exists (sequence_counters).')
+
+# Ensure search index table exists (FULLTEXT on MySQL) and populate it
+Base.metadata.create_all(bind=engine, tables=[search_models.SearchDocument.__table__])
+print('[OK] Ensured search index table exists (search_documents).')
+
+from database import SessionLocal
+from search.services import rebuild_search_index
+with SessionLocal() as session:
+    indexed = rebuild_search_index(session)
+print(f'[OK] Indexed {indexed} guide pages and labs (with their modules and levels) for search.')
+
+# Ensure the XP ledger exists and open it with each user's current total_xp
+Base.metadata.create_all(bind=engine, tables=[xp_models.XpLedgerEntry.__table__])
+print('[OK] Ensured XP ledger table exists (xp_ledger).')
+
+with engine.connect() as conn:
+    opened = conn.execute(
+        text(
+            'INSERT INTO xp_ledger (user_id, delta, source, created_at) '
+            'SELECT u.id, u.total_xp, :source, :now FROM users u '
+            'WHERE u.total_xp <> 0 AND NOT EXISTS (SELECT 1 FROM xp_ledger l WHERE l.user_id = u.id)'
+        ),
+        {'source': xp_models.XP_SOURCE_OPENING_BALANCE, 'now': datetime.now(timezone.utc)},
+    ).rowcount
+    conn.commit()
+print(f'[OK] Recorded opening XP balances for {opened} users.')
+
+# Ensure per-(user, level) attempt counters exist and backfill them from the attempts log
+Base.metadata.create_all(bind=engine, tables=[curriculum_models.UserChallengeStat.__table__])
+print('[OK] Ensured attempt counter table exists (user_challenge_stats).')
+
+from sqlalchemy import Integer, and_, exists, func, insert, select
+from curriculum.attempts import status_rank
+
+attempt = curriculum_models.ChallengeAttempt
+stat = curriculum_models.UserChallengeStat
+# rank * 100 + status_id keeps MIN() ordered by rank while the status id survives in the remainder
+best_status = func.min(status_rank(attempt.status_id) * 100 + attempt.status_id) % 100
+backfill = insert(stat).from_select(
+    ['user_id', 'challenge_id', 'attempt_count', 'pass_count', 'best_status_id', 'last_attempt_at'],
+    select(
+        attempt.user_id,
+        attempt.challenge_id,
+        func.max(attempt.attempt_number),
+        func.sum(func.coalesce(attempt.is_passed, False).cast(Integer)),
+        best_status,
+        func.max(attempt.created_at),
+    )
+    .where(~exists().where(and_(stat.user_id == attempt.user_id, stat.challenge_id == attempt.challenge_id)))
+    .group_by(attempt.user_id, attempt.challenge_id),
+)
+with engine.connect() as conn:
+    filled = conn.execute(backfill).rowcount
+    conn.commit()
+print(f'[OK] Backfilled attempt counters for {filled} user/level pairs.')
+
+# Ensure the archive summary table exists (old attempts are moved out by the analytics.archive_attempts job)
+Base.metadata.create_all(bind=engine, tables=[analytics_models.AttemptArchiveSummary.__table__])
+print('[OK] Ensured attempt archive summary table exists (attempt_archive_summaries).')
+
+# Ensure Idempotency-Key records exist (submit/complete replay; purged by the idempotency.purge job)
+Base.metadata.create_all(bind=engine, tables=[idempotency_models.IdempotencyRecord.__table__])
+print('[OK] Ensured idempotency record table exists (idempotency_records).')
+
+# Ensure leaderboard snapshot tables exist (written by the leaderboard.snapshot job)
+Base.metadata.create_all(
+    bind=engine,
+    tables=[leaderboard_models.LeaderboardSnapshot.__table__, leaderboard_models.LeaderboardSnapshotEntry.__table__],
+)
+print('[OK] Ensured leaderboard snapshot tables exist (leaderboard_snapshots, leaderboard_snapshot_entries).')
+
+# ── users: streak day + time zone (maintained by progress/streaks.py) ──
+insp = inspect(engine)
+with engine.connect() as conn:
+    user_cols = [c['name'] for c in insp.get_columns('users')]
+    if 'streak_last_day' not in user_cols:
+        conn.execute(text('ALTER TABLE users ADD COLUMN streak_last_day DATE NULL'))
+        print('[OK] Added streak_last_day to users')
+    else:
+        print('[SKIP] streak_last_day already exists in users')
+
+    if 'time_zone' not in user_cols:
+        conn.execute(text('ALTER TABLE users ADD COLUMN time_zone VARCHAR(64) NULL'))
+        print('[OK] Added time_zone to users')
+    else:
+        print('[SKIP] time_zone already exists in users')
+    conn.commit()
+
+# ── badges: declarative auto-award rule (evaluated by curriculum/badge_rules.py) ──
+insp = inspect(engine)
+with engine.connect() as conn:
+    badge_cols = [c['name'] for c in insp.get_columns('badges')]
+    if 'rule_json' not in badge_cols:
+        conn.execute(text('ALTER TABLE badges ADD COLUMN rule_json TEXT NULL'))
+        print('[OK] Added rule_json to badges')
+    else:
+        print('[SKIP] rule_json already exists in badges')
+    conn.commit()
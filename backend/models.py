@@ -5,7 +5,7 @@ Add new models here as features are built.
 """
 from datetime import datetime, timezone
 
-from sqlalchemy import Boolean, Column, DateTime, ForeignKey, Integer, String, Text
+from sqlalchemy import DDL, Boolean, Column, Date, DateTime, ForeignKey, Index, Integer, String, Text, event
 from database import Base
 
 
@@ -23,11 +23,13 @@ class User(Base):
     last_name       = Column(String(50), nullable=True)
     avatar_url      = Column(String(512), nullable=True)       # profile picture URL
     bio             = Column(Text, nullable=True)               # short about me
+    time_zone       = Column(String(64), nullable=True)         # IANA name for streak days; NULL = UTC
 
     # ── Gamification ────────────────────────────────────────────────────
     total_xp        = Column(Integer, default=0, nullable=False)
-    current_streak  = Column(Integer, default=0, nullable=False)  # daily login streak (days)
+    current_streak  = Column(Integer, default=0, nullable=False)  # consecutive local days with activity
     longest_streak  = Column(Integer, default=0, nullable=False)
+    streak_last_day = Column(Date, nullable=True)                 # local date of the last counted activity
 
     # ── Permissions & Status ────────────────────────────────────────────
     is_admin        = Column(Boolean, default=False, nullable=False)
@@ -41,6 +43,30 @@ class User(Base):
                              onupdate=lambda: datetime.now(timezone.utc), nullable=False)
     last_login_at   = Column(DateTime, nullable=True)          # tracks last successful login
 
+    __table_args__ = (
+        # Keyset pagination for the admin directory (ORDER BY created_at DESC, id DESC).
+        Index("ix_users_created_at_id", "created_at", "id"),
+        # Admin directory search; FULLTEXT/ngram on MySQL, plain composite index elsewhere.
+        # Built without the InnoDB stopword list (see the DDL hooks below): ngram drops every
+        # token containing a stopword such as "a" or "i", which hides most names and emails.
+        Index(
+            "ft_users_search_ngram", "username", "email", "first_name", "last_name",
+            mysql_prefix="FULLTEXT", mysql_with_parser="ngram",
+        ),
+    )
+
+
+# innodb_ft_enable_stopword is read when a FULLTEXT index is built; turn it off for the
+# users table only (the indexes are created between these two events).
+event.listen(
+    User.__table__, "before_create",
+    DDL("SET SESSION innodb_ft_enable_stopword = OFF").execute_if(dialect="mysql"),
+)
+event.listen(
+    User.__table__, "after_create",
+    DDL("SET SESSION innodb_ft_enable_stopword = ON").execute_if(dialect="mysql"),
+)
+
 
 class SiteSetting(Base):
     __tablename__ = "site_settings"
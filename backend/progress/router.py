@@ -9,22 +9,30 @@ import hashlib
 import json
 import os
 import re
-from datetime import datetime
-from typing import Dict, List, Optional, Tuple
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Set, Tuple
 
 from cryptography.hazmat.primitives.ciphers.aead import AESGCM
-from fastapi import APIRouter, Depends, HTTPException, Request
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
 from jose import JWTError, jwt
 from pydantic import BaseModel, Field
 from sqlalchemy import func
-from sqlalchemy.orm import Session
+from sqlalchemy.orm import Session, undefer
 
 from authentications.security import ALGORITHM, SECRET_KEY
-from database import get_db
+from database import get_db, insert_ignore
+from responses import FastJSONResponse
 from sandbox.client import JudgeClient
 from sandbox.schemas import CodeSubmission
 import curriculum.models as cm
+from curriculum.attempt_buffer import buffer_attempt, queued_attempts
+from curriculum.attempts import attempt_count, bump_attempt_stats
+from curriculum import badge_rules
+from . import streaks
 import models as user_models
+from idempotency import services as idempotency
+from xp import models as xp_models
+from xp.services import record_xp
 
 router = APIRouter()
 
@@ -90,7 +98,7 @@ class ChallengeGroupProgressOut(BaseModel):
     total_xp: int
     level_count: int
     completed_levels: int
-    levels: List[ChallengeProgressOut]
+    levels: Optional[List[ChallengeProgressOut]] = None
 
 
 class ModuleProgressOut(BaseModel):
@@ -111,9 +119,10 @@ class ModuleProgressOut(BaseModel):
     is_completed: bool
     challenge_count: int
     completed_challenges: int
-    challenge_groups: List[ChallengeGroupProgressOut]
-    badge: Optional[BadgeOut]
-    challenges: List[ChallengeProgressOut]
+    # Expansions: present only when requested through ?include=
+    challenge_groups: Optional[List[ChallengeGroupProgressOut]] = None
+    badge: Optional[BadgeOut] = None
+    challenges: Optional[List[ChallengeProgressOut]] = None
 
 
 class LabProgressOut(BaseModel):
@@ -133,6 +142,7 @@ class UserStatsOut(BaseModel):
     total_xp: int
     current_streak: int
     longest_streak: int
+    time_zone: Optional[str]
     completed_challenges: int
     badges_earned: int
     avatar_url: Optional[str]
@@ -141,6 +151,10 @@ class UserStatsOut(BaseModel):
     last_name: Optional[str]
 
 
+class TimeZoneIn(BaseModel):
+    time_zone: str = Field(..., min_length=1, max_length=64)   # IANA name, e.g. "Europe/Berlin"
+
+
 class ModuleGateOut(BaseModel):
     module_id: int
     total_available_xp: int
@@ -213,9 +227,53 @@ class WorkspaceSubmitOut(BaseModel):
     total_xp: int
     module_gate: ModuleGateOut
     badge_earned: Optional[BadgeOut]
+    badges_earned: List[BadgeOut] = []   # every badge this submit earned, module badge included
 
 
 # ── Helpers ──────────────────────────────────────────────────────────────────
+# ── Sparse progress fieldsets ────────────────────────────────────────────────
+# include= picks module expansions; fields= trims the scalar module summary.
+# "challenges" repeats every level already nested under challenge_groups[].levels,
+# so it is opt-in only.
+PROGRESS_INCLUDE_OPTIONS = ("groups", "levels", "badge", "challenges")
+DEFAULT_PROGRESS_INCLUDE = ("groups", "levels", "badge")
+MODULE_EXPANSION_FIELDS = ("challenge_groups", "badge", "challenges")
+MODULE_SUMMARY_FIELDS = tuple(
+    name for name in ModuleProgressOut.model_fields if name not in MODULE_EXPANSION_FIELDS
+)
+
+
+def _parse_csv_param(raw: Optional[str], allowed: Tuple[str, ...], default: Tuple[str, ...], label: str) -> Set[str]:
+    if raw is None:
+        return set(default)
+    values = {value.strip() for value in raw.split(",") if value.strip()}
+    unknown = values - set(allowed)
+    if unknown:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unknown {label}: {', '.join(sorted(unknown))}. Allowed: {', '.join(allowed)}.",
+        )
+    return values
+
+
+def _parse_progress_include(include: Optional[str]) -> Set[str]:
+    selected = _parse_csv_param(include, PROGRESS_INCLUDE_OPTIONS, DEFAULT_PROGRESS_INCLUDE, "include")
+    if "levels" in selected:
+        selected.add("groups")
+    return selected
+
+
+def _excluded_module_fields(fields: Optional[str]) -> Set[str]:
+    selected = _parse_csv_param(fields, MODULE_SUMMARY_FIELDS, MODULE_SUMMARY_FIELDS, "field")
+    selected.add("module_id")
+    return set(MODULE_SUMMARY_FIELDS) - selected
+
+
+def _get_earned_badge_map(db: Session, user_id: int) -> Dict[int, datetime]:
+    rows = db.query(cm.UserBadge.badge_id, cm.UserBadge.earned_at).filter(cm.UserBadge.user_id == user_id).all()
+    return {badge_id: earned_at for badge_id, earned_at in rows}
+
+
 def _build_badge_url(badge: cm.Badge, base_url: str) -> Optional[str]:
     if badge.image_url:
         return badge.image_url
@@ -322,18 +380,6 @@ def _challenge_is_locked(
     return True
 
 
-def _next_attempt_number(db: Session, user_id: int, challenge_id: int) -> int:
-    max_attempt = (
-        db.query(func.coalesce(func.max(cm.ChallengeAttempt.attempt_number), 0))
-        .filter(
-            cm.ChallengeAttempt.user_id == user_id,
-            cm.ChallengeAttempt.challenge_id == challenge_id,
-        )
-        .scalar()
-    )
-    return int(max_attempt or 0) + 1
-
-
 def _encrypt_payload_for_client(payload: dict, raw_token: str) -> SecureEnvelopeOut:
     key = hashlib.sha256(raw_token.encode("utf-8")).digest()
     iv = os.urandom(12)
@@ -427,6 +473,25 @@ def _to_badge_out(badge: cm.Badge, base_url: str, earned_at: Optional[datetime]
     )
 
 
+def _insert_completion(db: Session, user_id: int, challenge_id: int, xp_awarded: int) -> Optional[cm.ChallengeCompletion]:
+    """Record a completion unless one exists (a double-click or retry); None if it already did."""
+    completion = cm.ChallengeCompletion(
+        user_id=user_id,
+        challenge_id=challenge_id,
+        xp_awarded=xp_awarded,
+        completed_at=datetime.now(timezone.utc),
+    )
+    values = {
+        "user_id": user_id,
+        "challenge_id": challenge_id,
+        "xp_awarded": xp_awarded,
+        "completed_at": completion.completed_at,
+    }
+    if not insert_ignore(db, cm.ChallengeCompletion, values, ("user_id", "challenge_id")):
+        return None
+    return completion
+
+
 def _award_module_badge_if_eligible(
     db: Session,
     user_id: int,
@@ -437,16 +502,27 @@ def _award_module_badge_if_eligible(
     if not unlock_eligible or not module.badge:
         return None
 
-    existing = db.query(cm.UserBadge).filter(
+    existing = db.query(cm.UserBadge.id).filter(
         cm.UserBadge.user_id == user_id,
         cm.UserBadge.badge_id == module.badge.id,
     ).first()
     if existing:
         return None
 
-    earned = cm.UserBadge(user_id=user_id, badge_id=module.badge.id)
-    db.add(earned)
-    return _to_badge_out(module.badge, base_url)
+    # A concurrent request may award it between the check and here; only one insert wins.
+    earned = insert_ignore(
+        db,
+        cm.UserBadge,
+        {"user_id": user_id, "badge_id": module.badge.id, "earned_at": datetime.now(timezone.utc)},
+        ("user_id", "badge_id"),
+    )
+    return _to_badge_out(module.badge, base_url) if earned else None
+
+
+def _award_rule_badges(db: Session, user_id: int, events: Set[str], base_url: str) -> List[BadgeOut]:
+    if not events:
+        return []
+    return [_to_badge_out(badge, base_url) for badge in badge_rules.award_rule_badges(db, user_id, events)]
 
 
 def _to_module_gate_out(module_id: int, summary: dict) -> ModuleGateOut:
@@ -471,7 +547,7 @@ def _strip_html_excerpt(content_html: str, limit: int = 170) -> str:
     return f"{compact[:limit].rstrip()}..."
 
 
-def _build_dynamic_exam_blueprint(module: cm.Module) -> ModuleExamBlueprintOut:
+def _build_dynamic_exam_blueprint(db: Session, module: cm.Module) -> ModuleExamBlueprintOut:
     standard_levels = [
         lvl for lvl in _published_levels(module)
         if lvl.challenge_type != cm.CHALLENGE_TYPE_EXAM
@@ -491,10 +567,17 @@ def _build_dynamic_exam_blueprint(module: cm.Module) -> ModuleExamBlueprintOut:
     base_points = 100 // question_count
     remainder = 100 % question_count
 
+    # Bodies are deferred on Challenge; fetch only the ones the questions quote.
+    content_by_id = dict(
+        db.query(cm.Challenge.id, cm.Challenge.content_html)
+        .filter(cm.Challenge.id.in_([level.id for level in selected_levels]))
+        .all()
+    )
+
     questions: List[DynamicExamQuestionOut] = []
     for index, level in enumerate(selected_levels, start=1):
         display_title = level.custom_title or f"Level {level.level_number}"
-        context = _strip_html_excerpt(level.content_html)
+        context = _strip_html_excerpt(content_by_id.get(level.id))
         points = base_points + (1 if index <= remainder else 0)
 
         questions.append(
@@ -532,8 +615,9 @@ def get_my_stats(request: Request, db: Session = Depends(get_db)):
 
     return UserStatsOut(
         total_xp=current_user.total_xp,
-        current_streak=current_user.current_streak,
+        current_streak=streaks.effective_streak(current_user),
         longest_streak=current_user.longest_streak,
+        time_zone=current_user.time_zone,
         completed_challenges=int(completed or 0),
         badges_earned=int(badges or 0),
         avatar_url=current_user.avatar_url,
@@ -543,6 +627,18 @@ def get_my_stats(request: Request, db: Session = Depends(get_db)):
     )
 
 
+@router.put("/me/time-zone", response_model=UserStatsOut)
+def set_my_time_zone(payload: TimeZoneIn, request: Request, db: Session = Depends(get_db)):
+    """Streak days follow this zone from the next activity on."""
+    current_user = _get_current_user(request, db)
+    try:
+        current_user.time_zone = streaks.validate_time_zone(payload.time_zone)
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+    db.commit()
+    return get_my_stats(request, db)
+
+
 @router.get("/me/badges", response_model=List[BadgeOut])
 def get_my_badges(request: Request, db: Session = Depends(get_db)):
     current_user = _get_current_user(request, db)
@@ -555,50 +651,28 @@ def get_my_badges(request: Request, db: Session = Depends(get_db)):
     return [_to_badge_out(badge, base_url, earned_at=user_badge.earned_at) for user_badge, badge in rows]
 
 
-@router.get("/labs/{slug}/progress", response_model=LabProgressOut)
-def get_lab_progress(slug: str, request: Request, db: Session = Depends(get_db)):
-    current_user = _get_current_user(request, db)
-
-    lab = db.query(cm.Lab).filter(cm.Lab.slug == slug, cm.Lab.is_published == True).first()
-    if not lab:
-        raise HTTPException(status_code=404, detail="Lab not found.")
-
-    base_url = str(request.base_url).rstrip("/")
-    lab_banner_url = f"{base_url}/uploads/{lab.banner_image_path}" if lab.banner_image_path else None
-
-    completion_map = _get_completion_map(db, current_user.id)
-
-    total_xp = 0
-    earned_xp = 0
-    previous_gate_open = True
-    modules_out: List[ModuleProgressOut] = []
-
-    modules_in_lab = sorted(lab.modules, key=lambda module: module.order_index)
-    for module in modules_in_lab:
-        summary = _module_gate_summary(module, completion_map)
-        levels = summary["levels"]
-
-        module_total_xp = summary["total_available_xp"]
-        module_earned_xp = summary["earned_xp"]
-        total_xp += module_total_xp
-        earned_xp += module_earned_xp
-
-        is_module_locked = not previous_gate_open
-
-        badge_out = None
-        if module.badge:
-            earned_at = None
-            earned_badge = db.query(cm.UserBadge).filter(
-                cm.UserBadge.user_id == current_user.id,
-                cm.UserBadge.badge_id == module.badge.id,
-            ).first()
-            if earned_badge:
-                earned_at = earned_badge.earned_at
-            badge_out = _to_badge_out(module.badge, base_url, earned_at=earned_at)
+def _build_module_progress(
+    module: cm.Module,
+    summary: dict,
+    completion_map: Dict[int, cm.ChallengeCompletion],
+    is_module_locked: bool,
+    base_url: str,
+    earned_badges: Dict[int, datetime],
+    include: Set[str],
+) -> ModuleProgressOut:
+    levels = summary["levels"]
+    expansions = {}
+
+    if "badge" in include:
+        expansions["badge"] = (
+            _to_badge_out(module.badge, base_url, earned_at=earned_badges.get(module.badge.id))
+            if module.badge else None
+        )
 
+    challenge_progress: List[ChallengeProgressOut] = []
+    challenge_progress_by_id: Dict[int, ChallengeProgressOut] = {}
+    if include & {"levels", "challenges"}:
         previous_standard_done = True
-        challenge_progress: List[ChallengeProgressOut] = []
-        challenge_progress_by_id: Dict[int, ChallengeProgressOut] = {}
         for level in levels:
             is_done = level.id in completion_map
 
@@ -623,75 +697,112 @@ def get_lab_progress(slug: str, request: Request, db: Session = Depends(get_db))
             challenge_progress.append(progress_item)
             challenge_progress_by_id[level.id] = progress_item
 
+    if "challenges" in include:
+        expansions["challenges"] = challenge_progress
+
+    if "groups" in include:
+        def _group_out(group_id: int, title: str, description: Optional[str], order_index: int, group_levels):
+            group_fields = {}
+            if "levels" in include:
+                group_fields["levels"] = [challenge_progress_by_id[lvl.id] for lvl in group_levels]
+            return ChallengeGroupProgressOut(
+                challenge_id=group_id,
+                title=title,
+                description=description,
+                order_index=order_index,
+                total_xp=int(sum(lvl.xp_reward for lvl in group_levels)),
+                level_count=len(group_levels),
+                completed_levels=len([lvl for lvl in group_levels if lvl.id in completion_map]),
+                **group_fields,
+            )
+
         challenge_groups_out: List[ChallengeGroupProgressOut] = []
         ordered_groups = sorted(
             list(module.challenge_groups or []),
             key=lambda group: (group.order_index, group.id),
         )
-
         for group in ordered_groups:
             group_levels = [lvl for lvl in levels if lvl.challenge_group_id == group.id]
-            level_progress = [challenge_progress_by_id[lvl.id] for lvl in group_levels if lvl.id in challenge_progress_by_id]
-
             challenge_groups_out.append(
-                ChallengeGroupProgressOut(
-                    challenge_id=group.id,
-                    title=group.title,
-                    description=group.description,
-                    order_index=group.order_index,
-                    total_xp=int(sum(lvl.xp_reward for lvl in group_levels)),
-                    level_count=len(group_levels),
-                    completed_levels=len([lvl for lvl in group_levels if lvl.id in completion_map]),
-                    levels=level_progress,
-                )
+                _group_out(group.id, group.title, group.description, group.order_index, group_levels)
             )
 
         ungrouped_levels = [lvl for lvl in levels if lvl.challenge_group_id is None]
         if ungrouped_levels:
-            level_progress = [challenge_progress_by_id[lvl.id] for lvl in ungrouped_levels if lvl.id in challenge_progress_by_id]
             challenge_groups_out.append(
-                ChallengeGroupProgressOut(
-                    challenge_id=0,
-                    title="General Practice",
-                    description="Ungrouped levels",
-                    order_index=10**6,
-                    total_xp=int(sum(lvl.xp_reward for lvl in ungrouped_levels)),
-                    level_count=len(ungrouped_levels),
-                    completed_levels=len([lvl for lvl in ungrouped_levels if lvl.id in completion_map]),
-                    levels=level_progress,
-                )
+                _group_out(0, "General Practice", "Ungrouped levels", 10**6, ungrouped_levels)
             )
+        expansions["challenge_groups"] = challenge_groups_out
+
+    module_banner_url = f"{base_url}/uploads/{module.banner_image_path}" if module.banner_image_path else None
+
+    return ModuleProgressOut(
+        module_id=module.id,
+        unique_id=module.unique_id,
+        slug=module.slug,
+        title=module.title,
+        description=module.description,
+        banner_image_path=module.banner_image_path,
+        banner_url=module_banner_url,
+        order_index=module.order_index,
+        total_xp=summary["total_available_xp"],
+        earned_xp=summary["earned_xp"],
+        progress_percent=summary["progress_percent"],
+        unlock_threshold_percent=MODULE_UNLOCK_THRESHOLD_PERCENT,
+        unlock_eligible=summary["unlock_eligible"],
+        is_locked=is_module_locked,
+        is_completed=summary["module_completed"],
+        challenge_count=len(levels),
+        completed_challenges=len([lvl for lvl in levels if lvl.id in completion_map]),
+        **expansions,
+    )
+
+
+@router.get("/labs/{slug}/progress", response_model=LabProgressOut, response_class=FastJSONResponse)
+def get_lab_progress(
+    slug: str,
+    request: Request,
+    include: Optional[str] = Query(
+        None,
+        description="Comma-separated module expansions: groups, levels, badge, challenges. "
+                    "Defaults to groups,levels,badge; pass an empty value for module summaries only.",
+    ),
+    fields: Optional[str] = Query(None, description="Comma-separated module summary fields to return."),
+    db: Session = Depends(get_db),
+):
+    current_user = _get_current_user(request, db)
+    include_set = _parse_progress_include(include)
+    excluded_fields = _excluded_module_fields(fields)
+
+    lab = db.query(cm.Lab).filter(cm.Lab.slug == slug, cm.Lab.is_published == True).first()
+    if not lab:
+        raise HTTPException(status_code=404, detail="Lab not found.")
+
+    base_url = str(request.base_url).rstrip("/")
+    lab_banner_url = f"{base_url}/uploads/{lab.banner_image_path}" if lab.banner_image_path else None
+
+    completion_map = _get_completion_map(db, current_user.id)
+    earned_badges = _get_earned_badge_map(db, current_user.id) if "badge" in include_set else {}
+
+    total_xp = 0
+    earned_xp = 0
+    previous_gate_open = True
+    modules_out: List[ModuleProgressOut] = []
 
-        module_banner_url = f"{base_url}/uploads/{module.banner_image_path}" if module.banner_image_path else None
+    modules_in_lab = sorted(lab.modules, key=lambda module: module.order_index)
+    for module in modules_in_lab:
+        summary = _module_gate_summary(module, completion_map)
+        total_xp += summary["total_available_xp"]
+        earned_xp += summary["earned_xp"]
 
         modules_out.append(
-            ModuleProgressOut(
-                module_id=module.id,
-                unique_id=module.unique_id,
-                slug=module.slug,
-                title=module.title,
-                description=module.description,
-                banner_image_path=module.banner_image_path,
-                banner_url=module_banner_url,
-                order_index=module.order_index,
-                total_xp=module_total_xp,
-                earned_xp=module_earned_xp,
-                progress_percent=summary["progress_percent"],
-                unlock_threshold_percent=MODULE_UNLOCK_THRESHOLD_PERCENT,
-                unlock_eligible=summary["unlock_eligible"],
-                is_locked=is_module_locked,
-                is_completed=summary["module_completed"],
-                challenge_count=len(levels),
-                completed_challenges=len([lvl for lvl in levels if lvl.id in completion_map]),
-                challenge_groups=challenge_groups_out,
-                badge=badge_out,
-                challenges=challenge_progress,
+            _build_module_progress(
+                module, summary, completion_map, not previous_gate_open, base_url, earned_badges, include_set,
             )
         )
-
         previous_gate_open = previous_gate_open and summary["unlock_eligible"]
 
-    return LabProgressOut(
+    lab_out = LabProgressOut(
         lab_id=lab.id,
         slug=lab.slug,
         title=lab.title,
@@ -703,6 +814,46 @@ def get_lab_progress(slug: str, request: Request, db: Session = Depends(get_db))
         earned_xp=earned_xp,
         modules=modules_out,
     )
+    exclude = {"modules": {"__all__": excluded_fields}} if excluded_fields else None
+    return FastJSONResponse(content=lab_out.model_dump(mode="json", exclude_unset=True, exclude=exclude))
+
+
+@router.get("/modules/{module_id}/progress", response_model=ModuleProgressOut, response_class=FastJSONResponse)
+def get_module_progress(
+    module_id: int,
+    request: Request,
+    include: Optional[str] = Query(
+        None,
+        description="Comma-separated expansions: groups, levels, badge, challenges. Defaults to groups,levels,badge.",
+    ),
+    fields: Optional[str] = Query(None, description="Comma-separated module summary fields to return."),
+    db: Session = Depends(get_db),
+):
+    current_user = _get_current_user(request, db)
+    include_set = _parse_progress_include(include)
+    excluded_fields = _excluded_module_fields(fields)
+
+    module = db.query(cm.Module).filter(cm.Module.id == module_id).first()
+    if not module or not module.lab or not module.lab.is_published:
+        raise HTTPException(status_code=404, detail="Module not found.")
+
+    base_url = str(request.base_url).rstrip("/")
+    completion_map = _get_completion_map(db, current_user.id)
+    earned_badges = _get_earned_badge_map(db, current_user.id) if "badge" in include_set else {}
+    summary = _module_gate_summary(module, completion_map)
+
+    module_out = _build_module_progress(
+        module,
+        summary,
+        completion_map,
+        _module_is_locked(module, completion_map),
+        base_url,
+        earned_badges,
+        include_set,
+    )
+    return FastJSONResponse(
+        content=module_out.model_dump(mode="json", exclude_unset=True, exclude=excluded_fields or None)
+    )
 
 
 @router.get("/modules/{module_id}/gate", response_model=ModuleGateOut)
@@ -735,7 +886,7 @@ def get_dynamic_module_exam(module_id: int, request: Request, db: Session = Depe
     if not summary["standard_levels_completed"]:
         raise HTTPException(status_code=403, detail="Complete all standard levels before accessing the final exam.")
 
-    return _build_dynamic_exam_blueprint(module)
+    return _build_dynamic_exam_blueprint(db, module)
 
 
 @router.post("/challenges/{challenge_id}/complete")
@@ -743,6 +894,25 @@ def complete_challenge(challenge_id: int, request: Request, db: Session = Depend
     current_user = _get_current_user(request, db)
     base_url = str(request.base_url).rstrip("/")
 
+    key = idempotency.request_key(request)
+    if key:
+        replay = idempotency.claim(db, current_user.id, key, f"complete:{challenge_id}", idempotency.fingerprint())
+        if replay is not None:
+            return replay
+
+    try:
+        response = _complete_challenge(db, current_user, challenge_id, base_url)
+        if key:
+            idempotency.finish(db, current_user.id, key, response)
+        db.commit()
+    except Exception:
+        if key:
+            idempotency.release(db, current_user.id, key)
+        raise
+    return response
+
+
+def _complete_challenge(db: Session, current_user: user_models.User, challenge_id: int, base_url: str) -> dict:
     challenge = db.query(cm.Challenge).filter(
         cm.Challenge.id == challenge_id,
         cm.Challenge.is_published == True,
@@ -755,21 +925,19 @@ def complete_challenge(challenge_id: int, request: Request, db: Session = Depend
     if _challenge_is_locked(challenge, module_locked, completion_map):
         raise HTTPException(status_code=403, detail="This level is still locked.")
 
-    existing = completion_map.get(challenge_id)
     xp_gained = 0
     badge_earned = None
-
-    if not existing:
+    rule_badges: List[BadgeOut] = []
+    completion = None
+    if challenge_id not in completion_map:
         xp_awarded = int(challenge.xp_reward)
+        completion = _insert_completion(db, current_user.id, challenge_id, xp_awarded)
+        if completion is None:
+            completion_map = _get_completion_map(db, current_user.id)   # a concurrent request won
 
-        completion = cm.ChallengeCompletion(
-            user_id=current_user.id,
-            challenge_id=challenge_id,
-            xp_awarded=xp_awarded,
-        )
-        db.add(completion)
-
-        attempt_number = _next_attempt_number(db, current_user.id, challenge_id)
+    if completion is not None:
+        attempt_number = bump_attempt_stats(db, current_user.id, challenge_id, 3, True)
+        streak_moved = streaks.record_activity(db, current_user)
         db.add(
             cm.ChallengeAttempt(
                 user_id=current_user.id,
@@ -781,7 +949,7 @@ def complete_challenge(challenge_id: int, request: Request, db: Session = Depend
             )
         )
 
-        current_user.total_xp = int(current_user.total_xp or 0) + xp_awarded
+        record_xp(db, current_user.id, xp_awarded, xp_models.XP_SOURCE_COMPLETION, challenge_id=challenge_id)
         xp_gained = xp_awarded
 
         completion_map[challenge_id] = completion
@@ -793,8 +961,12 @@ def complete_challenge(challenge_id: int, request: Request, db: Session = Depend
             summary["unlock_eligible"],
             base_url,
         )
+        events = {badge_rules.BADGE_EVENT_COMPLETION, badge_rules.BADGE_EVENT_XP}
+        if streak_moved:
+            events.add(badge_rules.BADGE_EVENT_STREAK)
+        rule_badges = _award_rule_badges(db, current_user.id, events, base_url)
 
-        db.commit()
+        db.flush()
         db.refresh(current_user)
     else:
         summary = _module_gate_summary(challenge.module, completion_map)
@@ -804,6 +976,7 @@ def complete_challenge(challenge_id: int, request: Request, db: Session = Depend
         "total_xp": int(current_user.total_xp or 0),
         "module_gate": _to_module_gate_out(challenge.module_id, summary).model_dump(),
         "badge_earned": badge_earned.model_dump() if badge_earned else None,
+        "badges_earned": [badge.model_dump() for badge in ([badge_earned] if badge_earned else []) + rule_badges],
     }
 
 
@@ -816,7 +989,7 @@ async def run_level_code(
 ):
     current_user, raw_token = _get_auth_context(request, db)
 
-    challenge = db.query(cm.Challenge).filter(
+    challenge = db.query(cm.Challenge).options(undefer(cm.Challenge.expected_output)).filter(
         cm.Challenge.id == challenge_id,
         cm.Challenge.is_published == True,
     ).first()
@@ -830,19 +1003,29 @@ async def run_level_code(
 
     result = await _execute_submission(challenge, payload)
     passed = _determine_passed(challenge, result)
-    attempt_number = _next_attempt_number(db, current_user.id, challenge.id)
 
-    db.add(
-        cm.ChallengeAttempt(
-            user_id=current_user.id,
-            challenge_id=challenge.id,
-            attempt_number=attempt_number,
-            status_id=result.status.id,
-            is_passed=passed,
-            xp_awarded=0,
-        )
+    # Run attempts never score, so the row and its counter bump are written behind together;
+    # the number reported for a buffered Run is provisional until the flusher assigns it.
+    attempt = dict(
+        user_id=current_user.id,
+        challenge_id=challenge.id,
+        status_id=result.status.id,
+        is_passed=passed,
+        xp_awarded=0,
     )
-    db.commit()
+    wrote = False
+    if buffer_attempt(**attempt):
+        attempt_number = attempt_count(db, current_user.id, challenge.id) + queued_attempts(current_user.id, challenge.id)
+    else:
+        attempt_number = bump_attempt_stats(db, current_user.id, challenge.id, result.status.id, passed)
+        db.add(cm.ChallengeAttempt(attempt_number=attempt_number, **attempt))
+        wrote = True
+    if streaks.record_activity(db, current_user):
+        # Streak badges earned here show up under /me/badges; Run has no badge field.
+        badge_rules.award_rule_badges(db, current_user.id, {badge_rules.BADGE_EVENT_STREAK})
+        wrote = True
+    if wrote:
+        db.commit()
 
     envelope = _encrypt_payload_for_client(_judge_result_payload(result, passed), raw_token)
 
@@ -865,7 +1048,46 @@ async def submit_level_code(
     current_user, raw_token = _get_auth_context(request, db)
     base_url = str(request.base_url).rstrip("/")
 
-    challenge = db.query(cm.Challenge).filter(
+    # Claimed before the sandbox runs, so a retried submit never executes the code twice.
+    key = idempotency.request_key(request)
+    if key:
+        replay = idempotency.claim(
+            db, current_user.id, key, f"submit:{challenge_id}", idempotency.fingerprint(payload.model_dump_json())
+        )
+        if replay is not None:
+            return _to_submit_out(replay, raw_token)
+
+    try:
+        outcome = await _submit_level_code(db, current_user, challenge_id, payload, base_url)
+        if key:
+            idempotency.finish(db, current_user.id, key, outcome)
+        db.commit()
+    except Exception:
+        if key:
+            idempotency.release(db, current_user.id, key)
+        raise
+    return _to_submit_out(outcome, raw_token)
+
+
+def _to_submit_out(outcome: dict, raw_token: str) -> WorkspaceSubmitOut:
+    """Outcomes are stored with the judge result in clear and encrypted per response."""
+    fields = dict(outcome)
+    judge_payload = fields.pop("judge")
+    return WorkspaceSubmitOut(
+        encrypted=True,
+        envelope=_encrypt_payload_for_client(judge_payload, raw_token),
+        **fields,
+    )
+
+
+async def _submit_level_code(
+    db: Session,
+    current_user: user_models.User,
+    challenge_id: int,
+    payload: WorkspaceSubmitIn,
+    base_url: str,
+) -> dict:
+    challenge = db.query(cm.Challenge).options(undefer(cm.Challenge.expected_output)).filter(
         cm.Challenge.id == challenge_id,
         cm.Challenge.is_published == True,
     ).first()
@@ -879,22 +1101,23 @@ async def submit_level_code(
 
     result = await _execute_submission(challenge, payload)
     passed = _determine_passed(challenge, result)
-    attempt_number = _next_attempt_number(db, current_user.id, challenge.id)
+    attempt_number = bump_attempt_stats(db, current_user.id, challenge.id, result.status.id, passed)
+    events: Set[str] = set()
+    if streaks.record_activity(db, current_user):
+        events.add(badge_rules.BADGE_EVENT_STREAK)
 
-    existing_completion = completion_map.get(challenge.id)
     xp_gained = 0
-
-    if not existing_completion:
+    if challenge.id not in completion_map:
         xp_gained = _calculate_awarded_xp(challenge, passed, attempt_number, payload.exam_metrics)
         if xp_gained > 0:
-            completion = cm.ChallengeCompletion(
-                user_id=current_user.id,
-                challenge_id=challenge.id,
-                xp_awarded=xp_gained,
-            )
-            db.add(completion)
-            completion_map[challenge.id] = completion
-            current_user.total_xp = int(current_user.total_xp or 0) + xp_gained
+            completion = _insert_completion(db, current_user.id, challenge.id, xp_gained)
+            if completion is not None:
+                completion_map[challenge.id] = completion
+                record_xp(db, current_user.id, xp_gained, xp_models.XP_SOURCE_SUBMISSION, challenge_id=challenge.id)
+                events.update((badge_rules.BADGE_EVENT_COMPLETION, badge_rules.BADGE_EVENT_XP))
+            else:
+                xp_gained = 0   # a concurrent request completed it first
+                completion_map = _get_completion_map(db, current_user.id)
 
     db.add(
         cm.ChallengeAttempt(
@@ -922,20 +1145,19 @@ async def submit_level_code(
         summary["unlock_eligible"],
         base_url,
     )
+    rule_badges = _award_rule_badges(db, current_user.id, events, base_url)
 
-    db.commit()
+    db.flush()
     db.refresh(current_user)
 
-    envelope = _encrypt_payload_for_client(_judge_result_payload(result, passed), raw_token)
-
-    return WorkspaceSubmitOut(
-        encrypted=True,
-        envelope=envelope,
-        status=JudgeStatusOut(id=result.status.id, description=result.status.description),
-        passed=passed,
-        attempt_number=attempt_number,
-        xp_gained=xp_gained,
-        total_xp=int(current_user.total_xp or 0),
-        module_gate=_to_module_gate_out(challenge.module_id, summary),
-        badge_earned=badge_earned,
-    )
+    return {
+        "judge": _judge_result_payload(result, passed),
+        "status": {"id": result.status.id, "description": result.status.description},
+        "passed": passed,
+        "attempt_number": attempt_number,
+        "xp_gained": xp_gained,
+        "total_xp": int(current_user.total_xp or 0),
+        "module_gate": _to_module_gate_out(challenge.module_id, summary).model_dump(),
+        "badge_earned": badge_earned.model_dump() if badge_earned else None,
+        "badges_earned": [badge.model_dump() for badge in ([badge_earned] if badge_earned else []) + rule_badges],
+    }
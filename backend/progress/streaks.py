@@ -0,0 +1,108 @@
+"""
+progress/streaks.py — Campus404
+Daily activity streaks, kept incrementally on users.current_streak / longest_streak.
+
+A level run, a submit or a new completion is qualifying activity. The first one on the
+user's local day (users.time_zone, UTC when unset) extends the streak when the last
+counted day was yesterday and restarts it at 1 otherwise; later activity that day is
+answered from the loaded user row and never writes. The hourly streaks.reset_broken job
+zeroes every streak whose last counted day is before the user's local yesterday with a
+single UPDATE, so each timezone's midnight is picked up within the hour.
+"""
+import os
+from datetime import date, datetime, timedelta, timezone, tzinfo
+from typing import Optional
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
+from sqlalchemy import case, or_, update
+from sqlalchemy.orm import Session
+
+import models as user_models
+from jobs.services import JobContext, job_handler, periodic_job
+
+STREAK_RESET_INTERVAL_SECONDS = float(os.getenv("STREAK_RESET_INTERVAL_SECONDS", "3600"))
+STREAK_RESET_JOB = "streaks.reset_broken"
+
+
+def validate_time_zone(name: str) -> str:
+    """Return the IANA name if it is known, else raise ValueError."""
+    name = (name or "").strip()
+    try:
+        ZoneInfo(name)
+    except (ZoneInfoNotFoundError, ValueError):
+        raise ValueError(f"Unknown time zone '{name}'.")
+    return name
+
+
+def _zone(name: Optional[str]) -> tzinfo:
+    if name:
+        try:
+            return ZoneInfo(name)
+        except (ZoneInfoNotFoundError, ValueError):
+            pass
+    return timezone.utc
+
+
+def local_today(time_zone: Optional[str], now: Optional[datetime] = None) -> date:
+    now = now or datetime.now(timezone.utc)
+    return now.astimezone(_zone(time_zone)).date()
+
+
+def effective_streak(user: user_models.User, now: Optional[datetime] = None) -> int:
+    """current_streak, or 0 if it broke since the last reset job ran."""
+    last_day = user.streak_last_day
+    if not last_day or last_day < local_today(user.time_zone, now) - timedelta(days=1):
+        return 0
+    return int(user.current_streak or 0)
+
+
+def record_activity(db: Session, user: user_models.User, now: Optional[datetime] = None) -> bool:
+    """Count today's first qualifying activity; True if the streak moved. Does not commit."""
+    today = local_today(user.time_zone, now)
+    if user.streak_last_day is not None and user.streak_last_day >= today:
+        return False
+
+    User = user_models.User
+    extended = case((User.streak_last_day == today - timedelta(days=1), User.current_streak + 1), else_=1)
+    # MySQL applies SET left to right, so every assignment only reads columns not yet assigned.
+    stmt = (
+        update(User)
+        .where(User.id == user.id, or_(User.streak_last_day.is_(None), User.streak_last_day < today))
+        .ordered_values(
+            (User.longest_streak, case((extended > User.longest_streak, extended), else_=User.longest_streak)),
+            (User.current_streak, extended),
+            (User.streak_last_day, today),
+        )
+        .execution_options(synchronize_session=False)
+    )
+    counted = db.execute(stmt).rowcount == 1
+    db.expire(user, ["current_streak", "longest_streak", "streak_last_day"])
+    return counted
+
+
+def reset_broken_streaks(db: Session, now: Optional[datetime] = None) -> int:
+    """Zero every streak whose last counted day is before the user's local yesterday."""
+    User = user_models.User
+    zones = [
+        name for (name,) in db.query(User.time_zone).filter(User.current_streak > 0).distinct()
+        if name
+    ]
+    utc_yesterday = local_today(None, now) - timedelta(days=1)
+    yesterday = (
+        case({name: local_today(name, now) - timedelta(days=1) for name in zones}, value=User.time_zone, else_=utc_yesterday)
+        if zones else utc_yesterday
+    )
+    updated = db.query(User).filter(
+        User.current_streak > 0,
+        or_(User.streak_last_day.is_(None), User.streak_last_day < yesterday),
+    ).update({User.current_streak: 0}, synchronize_session=False)
+    db.commit()
+    return int(updated or 0)
+
+
+@job_handler(STREAK_RESET_JOB)
+def _run_streak_reset_job(ctx: JobContext, payload: dict) -> dict:
+    return {"reset_streaks": reset_broken_streaks(ctx.db)}
+
+
+periodic_job(STREAK_RESET_JOB, STREAK_RESET_INTERVAL_SECONDS)
@@ -0,0 +1,17 @@
+"""
+responses.py — Campus404
+Opt-in fast JSON response class for heavy endpoints.
+
+Uses orjson when it is installed and falls back to the standard JSONResponse otherwise,
+so endpoints can declare response_class=FastJSONResponse unconditionally.
+"""
+from fastapi.responses import JSONResponse
+
+try:
+    import orjson
+    from fastapi.responses import ORJSONResponse as FastJSONResponse
+except ModuleNotFoundError:  # optional dependency
+    orjson = None
+    FastJSONResponse = JSONResponse
+
+__all__ = ["FastJSONResponse", "orjson"]
@@ -0,0 +1 @@
+"""Full-text search index over guides, labs, modules and levels."""
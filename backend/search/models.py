@@ -0,0 +1,41 @@
+"""
+search/models.py — Campus404
+Denormalized search documents, one row per indexed guide, lab, module or level.
+"""
+from datetime import datetime, timezone
+
+from sqlalchemy import Boolean, Column, DateTime, Index, Integer, String, Text, UniqueConstraint
+
+from database import Base
+
+
+DOC_GUIDE = "guide"
+DOC_LAB = "lab"
+DOC_MODULE = "module"
+DOC_LEVEL = "level"
+DOC_TYPES = (DOC_GUIDE, DOC_LAB, DOC_MODULE, DOC_LEVEL)
+
+
+class SearchDocument(Base):
+    """Plain-text projection of a content row, kept in sync by the owning service on save."""
+    __tablename__ = "search_documents"
+
+    id           = Column(Integer, primary_key=True, index=True)
+    doc_type     = Column(String(16), nullable=False)
+    doc_id       = Column(Integer, nullable=False)
+    # Scope columns let deletes and lab-level visibility apply without rescanning content.
+    lab_id       = Column(Integer, nullable=True, index=True)
+    module_id    = Column(Integer, nullable=True, index=True)
+    title        = Column(String(255), nullable=False)
+    body         = Column(Text, nullable=False)
+    url_path     = Column(String(512), nullable=False)
+    is_published = Column(Boolean, nullable=False, default=False)
+    updated_at   = Column(DateTime, default=lambda: datetime.now(timezone.utc),
+                          onupdate=lambda: datetime.now(timezone.utc), nullable=False)
+
+    __table_args__ = (
+        UniqueConstraint("doc_type", "doc_id", name="uq_search_documents_doc"),
+        # InnoDB FULLTEXT on MySQL; plain indexes elsewhere, where the LIKE fallback is used.
+        Index("ft_search_documents", "title", "body", mysql_prefix="FULLTEXT"),
+        Index("ft_search_documents_title", "title", mysql_prefix="FULLTEXT"),
+    )
@@ -0,0 +1,61 @@
+"""
+search/router.py — Campus404
+Public site search and the admin index rebuild trigger.
+"""
+from typing import Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from jose import JWTError, jwt
+from sqlalchemy.orm import Session
+
+from authentications.security import ALGORITHM, SECRET_KEY
+from database import get_db
+from jobs.schemas import JobOut
+from jobs.services import enqueue_job, job_to_out
+import models as user_models
+from . import models, schemas, services
+
+router = APIRouter()
+admin_router = APIRouter()
+
+
+def _require_admin(request: Request, db: Session) -> user_models.User:
+    auth = request.headers.get("Authorization", "")
+    if not auth.startswith("Bearer "):
+        raise HTTPException(status_code=401, detail="Not authenticated.")
+    try:
+        payload = jwt.decode(auth[7:], SECRET_KEY, algorithms=[ALGORITHM])
+        user_id = payload.get("id")
+    except JWTError:
+        raise HTTPException(status_code=401, detail="Invalid token.")
+
+    user = db.query(user_models.User).filter(user_models.User.id == user_id).first()
+    if not user:
+        raise HTTPException(status_code=401, detail="User not found.")
+    if not user.is_admin:
+        raise HTTPException(status_code=403, detail="Admin access required.")
+    return user
+
+
+@router.get("", response_model=schemas.SearchResultsOut)
+def search(
+    q: str = Query(..., min_length=1, max_length=200),
+    types: Optional[str] = Query(None, description="Comma-separated: guide, lab, module, level."),
+    page: int = Query(1, ge=1, le=200),
+    page_size: int = Query(20, ge=1, le=services.SEARCH_MAX_PAGE_SIZE),
+    db: Session = Depends(get_db),
+):
+    doc_types = None
+    if types:
+        doc_types = [t.strip() for t in types.split(",") if t.strip()]
+        unknown = sorted(set(doc_types) - set(models.DOC_TYPES))
+        if unknown:
+            raise HTTPException(status_code=400, detail=f"Unknown search type: {', '.join(unknown)}.")
+    return services.search_documents(db, q, doc_types=doc_types, page=page, page_size=page_size)
+
+
+@admin_router.post("/rebuild", response_model=JobOut, status_code=202)
+def rebuild_index(request: Request, db: Session = Depends(get_db)):
+    actor = _require_admin(request, db)
+    job = enqueue_job(db, "search.rebuild", {}, created_by_admin_id=actor.id)
+    return job_to_out(job)
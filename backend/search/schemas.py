@@ -0,0 +1,32 @@
+"""
+search/schemas.py — Campus404
+Pydantic schemas for the search API.
+"""
+from typing import List, Literal, Optional
+
+from pydantic import BaseModel
+
+DocType = Literal["guide", "lab", "module", "level"]
+
+
+class SearchHitOut(BaseModel):
+    doc_type: DocType
+    doc_id: int
+    title: str
+    # HTML-escaped text with matched terms wrapped in <mark>.
+    title_html: str
+    snippet_html: str
+    url_path: str
+    lab_id: Optional[int]
+    module_id: Optional[int]
+    score: float
+
+
+class SearchResultsOut(BaseModel):
+    query: str
+    total: int
+    page: int
+    page_size: int
+    engine: Literal["fulltext", "like"]
+    took_ms: float
+    items: List[SearchHitOut]
@@ -0,0 +1,396 @@
+"""
+search/services.py — Campus404
+Incremental search indexing and ranked, highlighted, paginated queries.
+
+Content services call the index_* / remove_* helpers inside their own transaction, so the
+index commits (or rolls back) together with the content change. On MySQL queries use the
+InnoDB FULLTEXT indexes on search_documents; other databases fall back to LIKE matching.
+"""
+from html import escape, unescape
+import re
+import time
+from typing import Iterable, List, Optional, Sequence, Tuple
+
+from sqlalchemy import case, func, inspect, literal, or_
+from sqlalchemy.dialects.mysql import match
+from sqlalchemy.orm import Session, undefer
+
+import curriculum.models as cm
+import guide.models as gm
+from jobs.services import JobContext, job_handler
+from . import models, schemas
+
+SEARCH_MIN_TERM_LENGTH = 3        # innodb_ft_min_token_size default
+SEARCH_MAX_TERMS = 8
+SEARCH_MAX_PAGE_SIZE = 50
+SEARCH_BODY_MAX_CHARS = 60000     # stays inside a MySQL TEXT column
+SEARCH_SNIPPET_CHARS = 180
+SEARCH_REBUILD_CHUNK_SIZE = 200
+
+_HTML_TAG_RE = re.compile(r"<[^>]+>")
+_WS_RE = re.compile(r"\s+")
+_TERM_RE = re.compile(r"\w+", re.UNICODE)
+
+_search_fulltext_available: Optional[bool] = None
+
+
+def html_to_text(content_html: Optional[str]) -> str:
+    text = unescape(_HTML_TAG_RE.sub(" ", content_html or ""))
+    return _WS_RE.sub(" ", text).strip()
+
+
+def _search_fulltext_enabled(db: Session) -> bool:
+    """True when the ft_search_documents FULLTEXT index exists (MySQL)."""
+    global _search_fulltext_available
+    if _search_fulltext_available is None:
+        bind = db.get_bind()
+        if bind.dialect.name != "mysql":
+            _search_fulltext_available = False
+        else:
+            indexes = inspect(bind).get_indexes("search_documents")
+            _search_fulltext_available = any(
+                ix.get("name") == "ft_search_documents" and ix.get("type") == "FULLTEXT"
+                for ix in indexes
+            )
+    return _search_fulltext_available
+
+
+# ── Indexing ─────────────────────────────────────────────────────────────────
+def _upsert_document(
+    db: Session,
+    doc_type: str,
+    doc_id: int,
+    *,
+    title: str,
+    body: str,
+    url_path: str,
+    is_published: bool,
+    lab_id: Optional[int] = None,
+    module_id: Optional[int] = None,
+) -> None:
+    doc = (
+        db.query(models.SearchDocument)
+        .filter(models.SearchDocument.doc_type == doc_type, models.SearchDocument.doc_id == doc_id)
+        .first()
+    )
+    if doc is None:
+        doc = models.SearchDocument(doc_type=doc_type, doc_id=doc_id)
+        db.add(doc)
+    doc.title = (title or "")[:255]
+    doc.body = (body or "")[:SEARCH_BODY_MAX_CHARS]
+    doc.url_path = url_path
+    doc.is_published = bool(is_published)
+    doc.lab_id = lab_id
+    doc.module_id = module_id
+
+
+def remove_documents(db: Session, doc_type: str, doc_ids: Iterable[int]) -> None:
+    ids = list(doc_ids)
+    if not ids:
+        return
+    db.query(models.SearchDocument).filter(
+        models.SearchDocument.doc_type == doc_type,
+        models.SearchDocument.doc_id.in_(ids),
+    ).delete(synchronize_session=False)
+
+
+def remove_level_documents(db: Session, level_ids: Iterable[int]) -> None:
+    remove_documents(db, models.DOC_LEVEL, level_ids)
+
+
+def remove_guide_document(db: Session, post_id: int) -> None:
+    remove_documents(db, models.DOC_GUIDE, [post_id])
+
+
+def remove_lab_documents(db: Session, lab_id: int) -> None:
+    """Drop a lab and every module/level document scoped to it."""
+    db.query(models.SearchDocument).filter(
+        or_(
+            models.SearchDocument.lab_id == lab_id,
+            (models.SearchDocument.doc_type == models.DOC_LAB) & (models.SearchDocument.doc_id == lab_id),
+        )
+    ).delete(synchronize_session=False)
+
+
+def remove_module_documents(db: Session, module_id: int) -> None:
+    """Drop a module and its level documents; guides linked to it keep their own document."""
+    db.query(models.SearchDocument).filter(
+        models.SearchDocument.module_id == module_id,
+        models.SearchDocument.doc_type.in_((models.DOC_MODULE, models.DOC_LEVEL)),
+    ).delete(synchronize_session=False)
+
+
+def index_guide(db: Session, post: gm.GuidePage) -> None:
+    _upsert_document(
+        db,
+        models.DOC_GUIDE,
+        post.id,
+        title=post.title,
+        body=" ".join(part for part in (post.excerpt, html_to_text(post.content_html)) if part),
+        url_path=f"/guide/{post.slug}",
+        is_published=post.is_published,
+    )
+
+
+def index_level(db: Session, level: cm.Challenge) -> None:
+    module = level.module
+    lab = module.lab
+    group = level.challenge_group
+    if level.challenge_type == cm.CHALLENGE_TYPE_EXAM:
+        title = level.custom_title or f"{module.title} Exam"
+    else:
+        title = level.custom_title or (group.title if group else module.title)
+    url_path = f"/labs/{lab.slug}/modules/{module.id}"
+    if group is not None:
+        url_path += f"/challenges/{group.id}"
+    _upsert_document(
+        db,
+        models.DOC_LEVEL,
+        level.id,
+        title=title,
+        body=html_to_text(level.content_html),
+        url_path=url_path,
+        is_published=level.is_published and (group.is_published if group else True),
+        lab_id=lab.id,
+        module_id=module.id,
+    )
+
+
+def index_module(db: Session, module: cm.Module, cascade: bool = False) -> None:
+    lab = module.lab
+    _upsert_document(
+        db,
+        models.DOC_MODULE,
+        module.id,
+        title=module.title,
+        body=module.description or "",
+        url_path=f"/labs/{lab.slug}/modules/{module.id}",
+        is_published=True,
+        lab_id=lab.id,
+        module_id=module.id,
+    )
+    if cascade:
+        for level in (
+            db.query(cm.Challenge)
+            .options(undefer(cm.Challenge.content_html))
+            .filter(cm.Challenge.module_id == module.id)
+        ):
+            index_level(db, level)
+
+
+def index_lab(db: Session, lab: cm.Lab, cascade: bool = False) -> None:
+    """Index a lab; cascade=True also refreshes its modules and levels (slug changes, imports)."""
+    _upsert_document(
+        db,
+        models.DOC_LAB,
+        lab.id,
+        title=lab.title,
+        body=lab.description or "",
+        url_path=f"/labs/{lab.slug}",
+        is_published=lab.is_published,
+        lab_id=lab.id,
+    )
+    if cascade:
+        for module in lab.modules:
+            index_module(db, module, cascade=True)
+
+
+def _delete_orphan_documents(db: Session) -> int:
+    doc = models.SearchDocument
+    owners = (
+        (models.DOC_GUIDE, gm.GuidePage.id),
+        (models.DOC_LAB, cm.Lab.id),
+        (models.DOC_MODULE, cm.Module.id),
+        (models.DOC_LEVEL, cm.Challenge.id),
+    )
+    removed = 0
+    for doc_type, owner_id in owners:
+        removed += db.query(doc).filter(
+            doc.doc_type == doc_type,
+            ~doc.doc_id.in_(db.query(owner_id)),
+        ).delete(synchronize_session=False)
+    return removed
+
+
+def rebuild_search_index(db: Session, progress=None) -> int:
+    """Re-index every guide and lab tree in place, committing per chunk of source rows."""
+    sources = (
+        (gm.GuidePage, index_guide, (undefer(gm.GuidePage.content_html),)),
+        (cm.Lab, lambda session, lab: index_lab(session, lab, cascade=True), ()),
+    )
+    total = sum(int(db.query(func.count(source.id)).scalar() or 0) for source, _, _ in sources)
+    indexed = 0
+    for source, indexer, options in sources:
+        last_id = 0
+        while True:
+            rows = (
+                db.query(source)
+                .options(*options)
+                .filter(source.id > last_id)
+                .order_by(source.id.asc())
+                .limit(SEARCH_REBUILD_CHUNK_SIZE)
+                .all()
+            )
+            if not rows:
+                break
+            for row in rows:
+                indexer(db, row)
+            db.commit()
+            last_id = rows[-1].id
+            indexed += len(rows)
+            if progress is not None:
+                progress(indexed / max(1, total) * 100.0, f"{indexed}/{total} sources")
+
+    _delete_orphan_documents(db)
+    db.commit()
+    return indexed
+
+
+@job_handler("search.rebuild")
+def _run_search_rebuild_job(ctx: JobContext, payload: dict) -> dict:
+    return {"indexed_sources": rebuild_search_index(ctx.db, progress=ctx.progress)}
+
+
+# ── Querying ─────────────────────────────────────────────────────────────────
+def parse_terms(query: str) -> List[str]:
+    terms: List[str] = []
+    for term in _TERM_RE.findall((query or "").lower()):
+        if term not in terms:
+            terms.append(term)
+    return terms[:SEARCH_MAX_TERMS]
+
+
+def highlight(text: str, terms: Sequence[str]) -> str:
+    if not terms:
+        return escape(text)
+    pattern = re.compile("|".join(re.escape(t) for t in sorted(terms, key=len, reverse=True)), re.IGNORECASE)
+    parts, last = [], 0
+    for hit in pattern.finditer(text):
+        parts.append(escape(text[last:hit.start()]))
+        parts.append(f"<mark>{escape(hit.group(0))}</mark>")
+        last = hit.end()
+    parts.append(escape(text[last:]))
+    return "".join(parts)
+
+
+def snippet(body: str, terms: Sequence[str], length: int = SEARCH_SNIPPET_CHARS) -> str:
+    lowered = body.lower()
+    hits = [pos for pos in (lowered.find(term) for term in terms) if pos >= 0]
+    start = 0
+    if hits:
+        start = max(0, min(hits) - length // 3)
+        if start:
+            boundary = body.find(" ", start)
+            start = boundary + 1 if 0 <= boundary < min(hits) else start
+    end = min(len(body), start + length)
+    if end < len(body):
+        boundary = body.rfind(" ", start, end)
+        end = boundary if boundary > start else end
+    text = body[start:end]
+    return ("…" if start else "") + highlight(text, terms) + ("…" if end < len(body) else "")
+
+
+def _visible_documents(db: Session, q):
+    published_labs = db.query(cm.Lab.id).filter(cm.Lab.is_published == True)
+    return q.filter(
+        models.SearchDocument.is_published == True,
+        or_(models.SearchDocument.lab_id.is_(None), models.SearchDocument.lab_id.in_(published_labs)),
+    )
+
+
+def _ranked_query(db: Session, terms: List[str]) -> Tuple[object, object, str]:
+    doc = models.SearchDocument
+    if _search_fulltext_enabled(db) and all(len(t) >= SEARCH_MIN_TERM_LENGTH for t in terms):
+        boolean_query = " ".join(f"+{t}*" for t in terms)
+        score = (
+            match(doc.title, against=boolean_query).in_boolean_mode() * 2
+            + match(doc.title, doc.body, against=boolean_query).in_boolean_mode()
+        )
+        q = db.query(doc, score.label("score")).filter(
+            match(doc.title, doc.body, against=boolean_query).in_boolean_mode()
+        )
+        return q, score, "fulltext"
+
+    score = literal(0)
+    q = db.query(doc)
+    for term in terms:
+        pattern = "%" + term.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+        title_hit = doc.title.ilike(pattern, escape="\\")
+        q = q.filter(or_(title_hit, doc.body.ilike(pattern, escape="\\")))
+        score = score + case((title_hit, 2), else_=1)
+    return q.add_columns(score.label("score")), score, "like"
+
+
+def ranked_doc_ids(
+    db: Session,
+    query: str,
+    doc_type: str,
+    include_unpublished: bool = False,
+    limit: int = 500,
+    is_published: Optional[bool] = None,
+) -> List[int]:
+    """Best-first ids of one document type matching query, for callers that load their own rows."""
+    terms = parse_terms(query)
+    if not terms:
+        return []
+    q, score, _ = _ranked_query(db, terms)
+    q = q.filter(models.SearchDocument.doc_type == doc_type)
+    if not include_unpublished:
+        q = _visible_documents(db, q)
+    if is_published is not None:
+        q = q.filter(models.SearchDocument.is_published == is_published)
+    rows = q.order_by(score.desc(), models.SearchDocument.id.desc()).limit(limit).all()
+    return [doc.doc_id for doc, _ in rows]
+
+
+def search_documents(
+    db: Session,
+    query: str,
+    doc_types: Optional[Sequence[str]] = None,
+    page: int = 1,
+    page_size: int = 20,
+    include_unpublished: bool = False,
+) -> schemas.SearchResultsOut:
+    started = time.perf_counter()
+    page_size = max(1, min(page_size, SEARCH_MAX_PAGE_SIZE))
+    terms = parse_terms(query)
+    items: List[schemas.SearchHitOut] = []
+    total = 0
+    engine = "fulltext" if _search_fulltext_enabled(db) else "like"
+
+    if terms:
+        q, score, engine = _ranked_query(db, terms)
+        if doc_types:
+            q = q.filter(models.SearchDocument.doc_type.in_(list(doc_types)))
+        if not include_unpublished:
+            q = _visible_documents(db, q)
+
+        total = q.order_by(None).count()
+        rows = (
+            q.order_by(score.desc(), models.SearchDocument.updated_at.desc(), models.SearchDocument.id.desc())
+            .offset((page - 1) * page_size)
+            .limit(page_size)
+            .all()
+        )
+        for doc, doc_score in rows:
+            items.append(schemas.SearchHitOut(
+                doc_type=doc.doc_type,
+                doc_id=doc.doc_id,
+                title=doc.title,
+                title_html=highlight(doc.title, terms),
+                snippet_html=snippet(doc.body, terms),
+                url_path=doc.url_path,
+                lab_id=doc.lab_id,
+                module_id=doc.module_id,
+                score=round(float(doc_score or 0), 4),
+            ))
+
+    return schemas.SearchResultsOut(
+        query=query,
+        total=total,
+        page=page,
+        page_size=page_size,
+        engine=engine,
+        took_ms=round((time.perf_counter() - started) * 1000, 2),
+        items=items,
+    )
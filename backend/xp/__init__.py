@@ -0,0 +1 @@
+"""Append-only XP ledger and atomic total_xp accounting."""
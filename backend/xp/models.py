@@ -0,0 +1,39 @@
+"""
+xp/models.py — Campus404
+Append-only XP ledger. Every change to users.total_xp writes one row here in the same
+transaction, so SUM(delta) per user must always equal the user's total_xp.
+"""
+from datetime import datetime, timezone
+
+from sqlalchemy import Column, DateTime, ForeignKey, Index, Integer, String
+
+from database import Base
+
+
+XP_SOURCE_OPENING_BALANCE = "opening_balance"   # total_xp carried over when the ledger was introduced
+XP_SOURCE_COMPLETION = "completion"             # manual level completion
+XP_SOURCE_SUBMISSION = "submission"             # judged workspace submission
+XP_SOURCE_ADMIN_ADJUST = "admin_adjust"         # increase/decrease/set/reset from the admin panel
+XP_SOURCE_PROGRESS_RESET = "progress_reset"     # single or bulk progress reset
+XP_SOURCE_RECALCULATE = "recalculate"           # re-derived from challenge completions
+XP_SOURCES = (
+    XP_SOURCE_OPENING_BALANCE, XP_SOURCE_COMPLETION, XP_SOURCE_SUBMISSION,
+    XP_SOURCE_ADMIN_ADJUST, XP_SOURCE_PROGRESS_RESET, XP_SOURCE_RECALCULATE,
+)
+
+
+class XpLedgerEntry(Base):
+    """One signed XP movement. Rows are never updated or deleted by the application."""
+    __tablename__ = "xp_ledger"
+    __table_args__ = (
+        Index("ix_xp_ledger_user_id_id", "user_id", "id"),
+    )
+
+    id             = Column(Integer, primary_key=True, index=True)
+    user_id        = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
+    delta          = Column(Integer, nullable=False)
+    source         = Column(String(32), nullable=False)
+    challenge_id   = Column(Integer, ForeignKey("challenges.id", ondelete="SET NULL"), nullable=True)
+    actor_admin_id = Column(Integer, ForeignKey("users.id", ondelete="SET NULL"), nullable=True)
+    note           = Column(String(255), nullable=True)
+    created_at     = Column(DateTime, default=lambda: datetime.now(timezone.utc), nullable=False)
@@ -0,0 +1,58 @@
+"""
+xp/router.py — Campus404
+Admin API for the XP ledger: per-user ledger history and on-demand reconciliation.
+"""
+from typing import Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from jose import JWTError, jwt
+from sqlalchemy.orm import Session
+
+from authentications.security import ALGORITHM, SECRET_KEY
+from database import get_db
+from jobs.schemas import JobOut
+from jobs.services import enqueue_job, job_to_out
+import models as user_models
+from . import schemas, services
+
+router = APIRouter()
+
+
+def _require_admin(request: Request, db: Session) -> user_models.User:
+    auth = request.headers.get("Authorization", "")
+    if not auth.startswith("Bearer "):
+        raise HTTPException(status_code=401, detail="Not authenticated.")
+    try:
+        payload = jwt.decode(auth[7:], SECRET_KEY, algorithms=[ALGORITHM])
+        user_id = payload.get("id")
+    except JWTError:
+        raise HTTPException(status_code=401, detail="Invalid token.")
+
+    user = db.query(user_models.User).filter(user_models.User.id == user_id).first()
+    if not user:
+        raise HTTPException(status_code=401, detail="User not found.")
+    if not user.is_admin:
+        raise HTTPException(status_code=403, detail="Admin access required.")
+    return user
+
+
+@router.get("/users/{user_id}/ledger", response_model=schemas.XpLedgerPageOut)
+def get_user_ledger(
+    user_id: int,
+    request: Request,
+    limit: int = Query(50, ge=1, le=services.XP_LEDGER_MAX_LIMIT),
+    before_id: Optional[int] = Query(None, ge=1),
+    db: Session = Depends(get_db),
+):
+    _require_admin(request, db)
+    user = db.query(user_models.User).filter(user_models.User.id == user_id).first()
+    if not user:
+        raise HTTPException(status_code=404, detail="User not found.")
+    return services.list_ledger(db, user, limit, before_id)
+
+
+@router.post("/reconcile", response_model=JobOut, status_code=202)
+def reconcile(payload: schemas.XpReconcilePayload, request: Request, db: Session = Depends(get_db)):
+    actor = _require_admin(request, db)
+    job = enqueue_job(db, services.XP_RECONCILE_JOB, payload.model_dump(), created_by_admin_id=actor.id)
+    return job_to_out(job)
@@ -0,0 +1,34 @@
+"""
+xp/schemas.py — Campus404
+Pydantic schemas for the XP ledger and reconciler.
+"""
+from datetime import datetime
+from typing import List, Optional
+
+from pydantic import BaseModel
+
+
+class XpReconcilePayload(BaseModel):
+    # When true, users.total_xp is reset to the ledger sum for every drifted user.
+    repair: bool = False
+
+
+class XpLedgerEntryOut(BaseModel):
+    id: int
+    user_id: int
+    delta: int
+    source: str
+    challenge_id: Optional[int] = None
+    actor_admin_id: Optional[int] = None
+    note: Optional[str] = None
+    created_at: datetime
+
+    model_config = {"from_attributes": True}
+
+
+class XpLedgerPageOut(BaseModel):
+    user_id: int
+    total_xp: int
+    ledger_xp: int
+    items: List[XpLedgerEntryOut]
+    next_before_id: Optional[int] = None
@@ -0,0 +1,242 @@
+"""
+xp/services.py — Campus404
+XP accounting on top of the append-only ledger.
+
+users.total_xp is only ever changed by a server-side UPDATE (total_xp = total_xp + delta)
+paired with a ledger row in the same transaction, so concurrent awards cannot lose
+updates. Set-style admin operations lock the user row and record the difference. A
+periodic reconciler compares ledger sums with total_xp in bulk and reports drift.
+"""
+from datetime import datetime, timezone
+import os
+from typing import Iterable, List, Optional, Tuple, Union
+
+from sqlalchemy import Integer, func, insert, literal, select, update
+from sqlalchemy.orm import Session
+
+from jobs.services import JobContext, job_handler, periodic_job
+import models as user_models
+from . import models, schemas
+
+XP_RECONCILE_JOB = "xp.reconcile"
+XP_RECONCILE_INTERVAL_SECONDS = float(os.getenv("XP_RECONCILE_INTERVAL_SECONDS", "3600"))
+XP_RECONCILE_CHUNK_SIZE = 1000
+XP_RECONCILE_SAMPLE_SIZE = 50
+XP_LEDGER_MAX_LIMIT = 200
+
+
+def _ledger_sum():
+    """Correlated SUM(delta) for users.id, usable in SELECT, WHERE and UPDATE ... SET."""
+    return (
+        select(func.coalesce(func.sum(models.XpLedgerEntry.delta), 0))
+        .where(models.XpLedgerEntry.user_id == user_models.User.id)
+        .scalar_subquery()
+    )
+
+
+# ── Writes ───────────────────────────────────────────────────────────────────
+def record_xp(
+    db: Session,
+    user_id: int,
+    delta: int,
+    source: str,
+    challenge_id: Optional[int] = None,
+    actor_admin_id: Optional[int] = None,
+    note: Optional[str] = None,
+) -> None:
+    """Apply delta to users.total_xp atomically and append its ledger row. Does not commit.
+
+    The in-session User keeps its old total_xp until the commit expires it.
+    """
+    delta = int(delta)
+    if delta == 0:
+        return
+    # UPDATE first: the user row lock is taken before the ledger insert, which keeps
+    # concurrent awards and locked set operations serialized per user.
+    db.execute(
+        update(user_models.User)
+        .where(user_models.User.id == user_id)
+        .values(total_xp=user_models.User.total_xp + delta)
+        .execution_options(synchronize_session=False)
+    )
+    db.add(
+        models.XpLedgerEntry(
+            user_id=user_id,
+            delta=delta,
+            source=source,
+            challenge_id=challenge_id,
+            actor_admin_id=actor_admin_id,
+            note=note[:255] if note else None,
+        )
+    )
+
+
+def locked_total_xp(db: Session, user_id: int) -> int:
+    """Read total_xp with the user row locked until the transaction ends."""
+    value = (
+        db.query(user_models.User.total_xp)
+        .filter(user_models.User.id == user_id)
+        .with_for_update()
+        .scalar()
+    )
+    return int(value or 0)
+
+
+def set_xp(
+    db: Session,
+    user_id: int,
+    target: int,
+    source: str,
+    actor_admin_id: Optional[int] = None,
+    note: Optional[str] = None,
+) -> Tuple[int, int]:
+    """Move total_xp to target (floored at 0) under a row lock; returns (before, after)."""
+    before = locked_total_xp(db, user_id)
+    after = max(0, int(target))
+    record_xp(db, user_id, after - before, source, actor_admin_id=actor_admin_id, note=note)
+    return before, after
+
+
+def set_xp_bulk(
+    db: Session,
+    user_ids: List[int],
+    target: Union[int, object],
+    source: str,
+    actor_admin_id: Optional[int] = None,
+    note: Optional[str] = None,
+) -> int:
+    """Set-based set_xp for a chunk of users. Does not commit.
+
+    target is an int or a SQL expression correlated to users.id (e.g. a completion sum).
+    Returns the number of users whose total changed.
+    """
+    if not user_ids:
+        return 0
+    User = user_models.User
+    target_expr = literal(max(0, int(target)), Integer) if isinstance(target, int) else target
+    db.query(User.id).filter(User.id.in_(user_ids)).with_for_update().all()
+
+    changed = db.execute(
+        insert(models.XpLedgerEntry).from_select(
+            ["user_id", "delta", "source", "actor_admin_id", "note", "created_at"],
+            select(
+                User.id,
+                target_expr - User.total_xp,
+                literal(source),
+                literal(actor_admin_id, Integer),
+                literal(note[:255] if note else None),
+                literal(datetime.now(timezone.utc)),
+            ).where(User.id.in_(user_ids), User.total_xp != target_expr),
+        )
+    ).rowcount
+    db.execute(
+        update(User)
+        .where(User.id.in_(user_ids), User.total_xp != target_expr)
+        .values(total_xp=target_expr)
+        .execution_options(synchronize_session=False)
+    )
+    return int(changed or 0)
+
+
+# ── Reads ────────────────────────────────────────────────────────────────────
+def ledger_total(db: Session, user_id: int) -> int:
+    value = (
+        db.query(func.coalesce(func.sum(models.XpLedgerEntry.delta), 0))
+        .filter(models.XpLedgerEntry.user_id == user_id)
+        .scalar()
+    )
+    return int(value or 0)
+
+
+def list_ledger(db: Session, user: user_models.User, limit: int, before_id: Optional[int]) -> schemas.XpLedgerPageOut:
+    q = db.query(models.XpLedgerEntry).filter(models.XpLedgerEntry.user_id == user.id)
+    if before_id is not None:
+        q = q.filter(models.XpLedgerEntry.id < before_id)
+    rows = q.order_by(models.XpLedgerEntry.id.desc()).limit(limit + 1).all()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    return schemas.XpLedgerPageOut(
+        user_id=user.id,
+        total_xp=int(user.total_xp or 0),
+        ledger_xp=ledger_total(db, user.id),
+        items=[schemas.XpLedgerEntryOut.model_validate(row) for row in rows],
+        next_before_id=rows[-1].id if has_more and rows else None,
+    )
+
+
+# ── Reconciler ───────────────────────────────────────────────────────────────
+def _iter_user_id_chunks(db: Session, chunk_size: int) -> Iterable[List[int]]:
+    last_id = 0
+    while True:
+        ids = [
+            int(row[0])
+            for row in db.query(user_models.User.id)
+            .filter(user_models.User.id > last_id)
+            .order_by(user_models.User.id.asc())
+            .limit(chunk_size)
+            .all()
+        ]
+        if not ids:
+            return
+        yield ids
+        last_id = ids[-1]
+
+
+def reconcile_xp(db: Session, repair: bool = False, progress=None) -> dict:
+    """Compare ledger sums with users.total_xp, one grouped query per chunk of users."""
+    User = user_models.User
+    ledger_sum = _ledger_sum()
+    total_users = int(db.query(func.count(User.id)).scalar() or 0)
+    checked = drifted = abs_drift = repaired = 0
+    sample: List[dict] = []
+
+    for ids in _iter_user_id_chunks(db, XP_RECONCILE_CHUNK_SIZE):
+        rows = (
+            db.query(User.id, User.total_xp, ledger_sum.label("ledger_xp"))
+            .filter(User.id.in_(ids), User.total_xp != ledger_sum)
+            .all()
+        )
+        checked += len(ids)
+        for row in rows:
+            drift = int(row.total_xp or 0) - int(row.ledger_xp or 0)
+            drifted += 1
+            abs_drift += abs(drift)
+            if len(sample) < XP_RECONCILE_SAMPLE_SIZE:
+                sample.append({
+                    "user_id": int(row.id),
+                    "total_xp": int(row.total_xp or 0),
+                    "ledger_xp": int(row.ledger_xp or 0),
+                    "drift": drift,
+                })
+        if repair and rows:
+            # The ledger is the source of truth; total_xp is a cached sum of it.
+            repaired += int(db.execute(
+                update(User)
+                .where(User.id.in_([int(row.id) for row in rows]), User.total_xp != ledger_sum)
+                .values(total_xp=ledger_sum)
+                .execution_options(synchronize_session=False)
+            ).rowcount or 0)
+            db.commit()
+        else:
+            db.rollback()  # end the read transaction between chunks
+        if progress is not None:
+            progress(checked / max(1, total_users) * 100.0, f"{checked}/{total_users} users")
+
+    if drifted:
+        print(f"[Campus404] XP reconcile: {drifted} user(s) drifted from the ledger "
+              f"(total |drift| {abs_drift}){', repaired' if repair else ''}.")
+    return {
+        "checked_users": checked,
+        "drifted_users": drifted,
+        "total_abs_drift": abs_drift,
+        "repaired_users": repaired,
+        "sample": sample,
+    }
+
+
+@job_handler(XP_RECONCILE_JOB, payload_model=schemas.XpReconcilePayload)
+def _run_xp_reconcile_job(ctx: JobContext, payload: schemas.XpReconcilePayload) -> dict:
+    return reconcile_xp(ctx.db, repair=payload.repair, progress=ctx.progress)
+
+
+periodic_job(XP_RECONCILE_JOB, XP_RECONCILE_INTERVAL_SECONDS)
@@ -67,6 +67,7 @@ export const api = {
   // Levels (Exercise layer)
   getLevels:        (challengeGroupId) => req('GET', `/challenges/${challengeGroupId}/levels`),
   getLevel:         (id)               => req('GET', `/levels/${id}`),
+  getPublishedLevel:(id)               => req('GET', `/levels/${id}/published`),
   createLevel:      (body)             => req('POST', '/levels', body),
   updateLevel:      (id, body)         => req('PATCH', `/levels/${id}`, body),
   deleteLevel:      (id)               => req('DELETE', `/levels/${id}`),
@@ -94,6 +95,9 @@ export const api = {
   deleteGuidePage: (id) => req('DELETE', `/admin/guide/${id}`),
   getGuidePageBySlug: (slug) => req('GET', `/guide/${slug}`),
 
+  // Site search (guides, labs, modules, levels)
+  search: (q, params = {}) => req('GET', `/search?${new URLSearchParams({ q, ...params }).toString()}`),
+
   // Student workspace
   runWorkspaceLevel: (challengeId, body) => req('POST', `/workspace/levels/${challengeId}/run`, body),
   submitWorkspaceLevel: (challengeId, body) => req('POST', `/workspace/levels/${challengeId}/submit`, body),
@@ -6,60 +6,12 @@ import { api } from '../admin/curriculum/api';
 import { DEFAULT_SITE_SETTINGS, useSiteSettings } from '../../utils/siteSettings';
 import './GuidePage.css';
 
-const MAX_HEADING_DEPTH = 4;
-
-const slugifyHeading = (value) =>
-  String(value || '')
-    .toLowerCase()
-    .trim()
-    .replace(/[^a-z0-9\s-]/g, '')
-    .replace(/\s+/g, '-')
-    .replace(/-+/g, '-')
-    .replace(/^-|-$/g, '') || 'section';
-
-const parseGuideContent = (html, depth) => {
-  const safeHtml = html || '';
-  const clampedDepth = Math.max(2, Math.min(MAX_HEADING_DEPTH, Number(depth) || 3));
-
-  if (!safeHtml || typeof window === 'undefined' || typeof window.DOMParser !== 'function') {
-    return { guideHtml: safeHtml, tocItems: [] };
-  }
-
-  try {
-    const parser = new window.DOMParser();
-    const doc = parser.parseFromString(`<article>${safeHtml}</article>`, 'text/html');
-    const root = doc.body.firstElementChild;
-    if (!root) return { guideHtml: safeHtml, tocItems: [] };
-
-    const selectors = [];
-    for (let level = 2; level <= clampedDepth; level += 1) {
-      selectors.push(`h${level}`);
-    }
-
-    const headings = Array.from(root.querySelectorAll(selectors.join(',')));
-    const idCount = new Map();
-    const tocItems = [];
-
-    headings.forEach((heading) => {
-      const text = heading.textContent?.trim();
-      if (!text) return;
-
-      const baseId = `guide-${slugifyHeading(text)}`;
-      const seen = idCount.get(baseId) || 0;
-      idCount.set(baseId, seen + 1);
-
-      const id = seen === 0 ? baseId : `${baseId}-${seen + 1}`;
-      heading.id = id;
-
-      const level = Number(heading.tagName.slice(1)) || 2;
-      tocItems.push({ id, text, level });
-    });
-
-    return { guideHtml: root.innerHTML, tocItems };
-  } catch {
-    return { guideHtml: safeHtml, tocItems: [] };
-  }
-};
+// The API returns sanitized HTML with heading anchors and a nested TOC built on save.
+const flattenToc = (items) =>
+  (items || []).flatMap((item) => [
+    { id: item.id, text: item.text, level: item.level },
+    ...flattenToc(item.children),
+  ]);
 
 const formatDate = (value) => {
   if (!value) return '';
@@ -73,12 +25,6 @@ const formatDate = (value) => {
   });
 };
 
-const estimateMinutes = (html) => {
-  const text = (html || '').replace(/<[^>]+>/g, ' ');
-  const words = text.split(/\s+/).filter(Boolean).length;
-  return Math.max(1, Math.ceil(words / 220));
-};
-
 const indentClassByLevel = (level) => {
   if (level <= 2) return '';
   if (level === 3) return 'level-3';
@@ -98,7 +44,6 @@ export default function GuidePage() {
   const [activeHeadingId, setActiveHeadingId] = useState('');
   const [shareNotice, setShareNotice] = useState('');
 
-  const tocDepth = Number(siteSettings.guide_toc_depth) || DEFAULT_SITE_SETTINGS.guide_toc_depth;
   const showToc = Boolean(siteSettings.guide_show_toc);
   const showSocialShare = Boolean(siteSettings.guide_show_social_share);
   const authorName = siteSettings.guide_default_author || DEFAULT_SITE_SETTINGS.guide_default_author;
@@ -130,11 +75,11 @@ export default function GuidePage() {
   const error = loading ? null : viewState.error;
 
   const parsedGuide = useMemo(
-    () => parseGuideContent(post?.content_html, tocDepth),
-    [post?.content_html, tocDepth],
+    () => ({ guideHtml: post?.content_html || '', tocItems: flattenToc(post?.toc) }),
+    [post?.content_html, post?.toc],
   );
 
-  const readingMinutes = useMemo(() => estimateMinutes(post?.content_html), [post?.content_html]);
+  const readingMinutes = post?.reading_minutes || 1;
   const chapterCount = useMemo(() => {
     const chapterHeadings = parsedGuide.tocItems.filter((item) => item.level === 2);
     return chapterHeadings.length || parsedGuide.tocItems.length;
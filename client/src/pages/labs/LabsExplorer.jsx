@@ -81,7 +81,7 @@ export default function LabsExplorer() {
         await Promise.allSettled(
           labsList.map(async (lab) => {
             try {
-              const res = await fetch(`${API_URL}/progress/labs/${lab.slug}/progress`, { headers: authH() });
+              const res = await fetch(`${API_URL}/progress/labs/${lab.slug}/progress?include=&fields=is_completed`, { headers: authH() });
               if (res.ok) {
                 const data = await res.json();
                 progressMap[lab.slug] = {
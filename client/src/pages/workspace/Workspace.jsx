@@ -17,6 +17,9 @@ import './Workspace.css';
 const token = () => localStorage.getItem('token');
 const authH = () => ({ Authorization: `Bearer ${token()}` });
 
+// Lab progress nests levels under challenge_groups; the flat module.challenges list is opt-in.
+const moduleLevels = (mod) => (mod?.challenge_groups || []).flatMap((group) => group.levels || []);
+
 const getLangExtension = (languageId) => {
   switch (Number(languageId)) {
     case 71: return python();
@@ -165,7 +168,7 @@ export default function Workspace() {
             return;
           }
         } else {
-          targetLevel = (targetModule.challenges || []).find(
+          targetLevel = moduleLevels(targetModule).find(
             (lvl) => Number(lvl.level_number) === Number(levelNumber),
           );
           if (!targetLevel || targetLevel.is_locked) {
@@ -174,7 +177,7 @@ export default function Workspace() {
           }
         }
 
-        const levelDetail = await api.getLevel(targetLevel.challenge_id);
+        const levelDetail = await api.getPublishedLevel(targetLevel.challenge_id);
         if (cancelled) return;
 
         const normalizedFiles = (levelDetail.files || []).length
@@ -311,7 +314,7 @@ export default function Workspace() {
             setTimeout(() => navigate(`/labs/${slug}/modules/${moduleId}/challenges/${challengeId}`), 900);
           }
         } else {
-          const nextLevel = (moduleProgress?.challenges || []).find(
+          const nextLevel = moduleLevels(moduleProgress).find(
             (lvl) => Number(lvl.level_number) === Number(levelNumber) + 1,
           );
 
@@ -359,7 +362,7 @@ export default function Workspace() {
         </button>
 
         <div className="ws-level-track">
-          {((challengeId ? challengeProgress?.levels : moduleProgress.challenges) || []).map((lvl, idx) => {
+          {((challengeId ? challengeProgress?.levels : moduleLevels(moduleProgress)) || []).map((lvl, idx) => {
             let stateClass = 'future';
             if (lvl.is_completed) stateClass = 'done';
             const isCurrent = challengeId